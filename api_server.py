@@ -1,17 +1,17 @@
 """
 API REST para dados da Bovespa - Versão Local
 FastAPI server para servir dados coletados
+Sem dados em cache, lê a última partição raw do armazenamento do pipeline
+(diretório ./data por padrão ou o bucket S3, ver STORAGE_BACKEND)
 """
 
-import os
 import json
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from datetime import datetime
-from typing import Optional, List
-from pathlib import Path
+from typing import Optional
 
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
 import uvicorn
 
 # Importar scraper local e configurações
@@ -19,6 +19,9 @@ import sys
 sys.path.append('src')
 
 from scraper.b3_scraper_local import B3Scraper
+from scraper.page_archive import ARCHIVE_DIR, RAW_PREFIX
+from scraper.raw_schema import plain_table
+from scraper.storage import storage_from_env
 
 # Carregar configurações
 try:
@@ -36,10 +39,16 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-# Cache simples para dados
-cached_data = {}
+# Cache simples para dados (tabela Arrow da carteira)
+cached_data = None
 last_update = None
 
+# Armazenamento do pipeline, criado no primeiro uso
+storage = None
+
+# Prefixo dos exports no armazenamento (fora da camada raw)
+EXPORT_PREFIX = "exports/bovespa"
+
 def get_latest_data():
     """Obtém os dados mais recentes (cache ou scraping)"""
     global cached_data, last_update
@@ -51,36 +60,61 @@ def get_latest_data():
         
         print("🔄 Atualizando dados...")
         scraper = B3Scraper()
-        raw_data = scraper.fetch_ibov_data()
+        raw_data = scraper.fetch_portfolio_table()
         
-        if raw_data:
+        if raw_data.num_rows:
             cached_data = raw_data
             last_update = datetime.now()
-            print(f"✅ {len(raw_data)} registros atualizados")
+            print(f"✅ {raw_data.num_rows} registros atualizados")
         else:
             print("⚠️ Usando dados em cache")
     
     return cached_data
 
-def load_local_files():
-    """Carrega dados dos arquivos locais se disponíveis"""
-    current_dir = Path(".")
+def filter_index(data, indice: Optional[str]):
+    """Filtra a tabela pela coluna 'indice' (sem filtro se indice for None)"""
+    if data is None or not indice:
+        return data
+    if 'indice' not in data.column_names:
+        # Arquivos anteriores ao multi-índice contêm apenas o IBOV
+        return data if indice.upper() == 'IBOV' else data.slice(0, 0)
+    return data.filter(pc.equal(data['indice'], indice.upper()))
+
+def get_storage():
+    """Armazenamento do pipeline (diretório local por padrão, ver STORAGE_BACKEND)"""
+    global storage
+    
+    if storage is None:
+        bucket_name = config.s3_bucket_name if CONFIG_AVAILABLE else None
+        storage = storage_from_env(bucket_name, default_backend='local')
+    return storage
+
+def load_stored_data():
+    """Carrega o pregão mais recente da camada raw do armazenamento, se houver"""
+    import pyarrow.parquet as pq
     
-    # Procurar arquivos CSV mais recentes
-    csv_files = list(current_dir.glob("bovespa_data_*.csv"))
+    # Chaves Hive ordenam por data; o arquivo mensal da compactação vem
+    # depois dos diários do mesmo mês
+    keys = [item['key'] for item in get_storage().list(RAW_PREFIX)
+            if item['key'].endswith('.parquet') and f"/{ARCHIVE_DIR}/" not in item['key']]
     
-    if csv_files:
-        # Pegar o mais recente
-        latest_csv = max(csv_files, key=os.path.getctime)
-        print(f"📂 Carregando dados de: {latest_csv}")
-        
-        try:
-            df = pd.read_csv(latest_csv)
-            return df.to_dict(orient='records')
-        except Exception as e:
-            print(f"❌ Erro ao carregar arquivo: {e}")
+    if not keys:
+        return None
+    
+    latest_key = max(keys)
+    print(f"📂 Carregando dados de: {get_storage().uri(latest_key)}")
+    
+    try:
+        table = pq.read_table(pa.BufferReader(get_storage().read(latest_key)))
+        # Arquivo mensal: apenas o último pregão
+        latest_date = pc.max(table['data_pregao'])
+        table = table.filter(pc.equal(table['data_pregao'], latest_date))
+        return plain_table(table.drop_columns([name for name in ('year', 'month', 'day')
+                                               if name in table.column_names]))
+    except Exception as e:
+        print(f"❌ Erro ao carregar arquivo: {e}")
     
-    return []
+    return None
 
 @app.get("/")
 async def root():
@@ -96,7 +130,8 @@ async def root():
             "daily_data": "/api/v1/bovespa/daily/{date}",
             "statistics": "/api/v1/bovespa/statistics",
             "top_stocks": "/api/v1/bovespa/top/{limit}",
-            "stock_details": "/api/v1/bovespa/stock/{ticker}"
+            "stock_details": "/api/v1/bovespa/stock/{ticker}",
+            "indices": "/api/v1/bovespa/indices"
         },
         "docs": "/docs"
     }
@@ -132,9 +167,9 @@ async def refresh_data():
     try:
         print("🔄 Forçando atualização dos dados...")
         scraper = B3Scraper()
-        raw_data = scraper.fetch_ibov_data()
+        raw_data = scraper.fetch_portfolio_table()
         
-        if raw_data:
+        if raw_data.num_rows:
             cached_data = raw_data
             last_update = datetime.now()
             
@@ -150,20 +185,23 @@ async def refresh_data():
         raise HTTPException(status_code=500, detail=f"Erro na atualização: {str(e)}")
 
 @app.get("/api/v1/bovespa/latest")
-async def get_latest_data_api(limit: int = Query(100, ge=1, le=1000)):
+async def get_latest_data_api(limit: int = Query(100, ge=1, le=1000), indice: Optional[str] = None):
     """Retorna os dados mais recentes da Bovespa"""
     try:
         data = get_latest_data()
         
         if not data:
-            # Tentar carregar arquivos locais
-            data = load_local_files()
+            # Tentar carregar a última partição gravada
+            data = load_stored_data()
+        
+        # Filtrar pelo índice solicitado (ex.: ?indice=SMLL)
+        data = filter_index(data, indice)
         
         if not data:
             return {"message": "Nenhum dado encontrado", "data": []}
         
         # Limitar resultados
-        limited_data = data[:limit]
+        limited_data = data.slice(0, limit).to_pylist()
         
         return {
             "message": "Dados recuperados com sucesso",
@@ -177,18 +215,21 @@ async def get_latest_data_api(limit: int = Query(100, ge=1, le=1000)):
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @app.get("/api/v1/bovespa/statistics")
-async def get_market_statistics():
+async def get_market_statistics(indice: Optional[str] = None):
     """Retorna estatísticas do mercado"""
     try:
         data = get_latest_data()
         
         if not data:
-            data = load_local_files()
+            data = load_stored_data()
+        
+        # Filtrar pelo índice solicitado (ex.: ?indice=SMLL)
+        data = filter_index(data, indice)
         
         if not data:
             return {"message": "Nenhuma estatística disponível"}
         
-        df = pd.DataFrame(data)
+        df = data.to_pandas()
         
         stats = {
             "total_acoes": len(df),
@@ -200,6 +241,17 @@ async def get_market_statistics():
             "ultima_atualizacao": df['data_pregao'].iloc[0] if not df.empty else None
         }
         
+        # Participação só soma 100% dentro de cada índice
+        if 'indice' in df.columns:
+            stats["por_indice"] = {
+                indice_nome: {
+                    "total_acoes": int(len(grupo)),
+                    "participacao_total": round(grupo['percentual_participacao'].sum(), 2),
+                    "maior_participacao": round(grupo['percentual_participacao'].max(), 3)
+                }
+                for indice_nome, grupo in df.groupby('indice')
+            }
+        
         return {
             "message": "Estatísticas recuperadas com sucesso",
             "timestamp": datetime.now().isoformat(),
@@ -209,8 +261,37 @@ async def get_market_statistics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
+@app.get("/api/v1/bovespa/indices")
+async def get_indices():
+    """Lista os índices disponíveis e o número de ações de cada um"""
+    try:
+        data = get_latest_data()
+        
+        if not data:
+            data = load_stored_data()
+        
+        if not data:
+            return {"message": "Nenhum índice disponível", "indices": []}
+        
+        if 'indice' not in data.column_names:
+            return {"message": "Índices recuperados com sucesso",
+                    "indices": [{"indice": "IBOV", "total_acoes": data.num_rows}]}
+        
+        counts = data.group_by('indice').aggregate([('codigo_acao', 'count')])
+        indices = [{"indice": row['indice'], "total_acoes": row['codigo_acao_count']}
+                   for row in counts.sort_by('indice').to_pylist()]
+        
+        return {
+            "message": "Índices recuperados com sucesso",
+            "count": len(indices),
+            "indices": indices
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
+
 @app.get("/api/v1/bovespa/top/{limit}")
-async def get_top_stocks(limit: int):
+async def get_top_stocks(limit: int, indice: Optional[str] = None):
     """Retorna as ações com maior participação"""
     try:
         if limit > 100:
@@ -219,13 +300,16 @@ async def get_top_stocks(limit: int):
         data = get_latest_data()
         
         if not data:
-            data = load_local_files()
+            data = load_stored_data()
+        
+        # Filtrar pelo índice solicitado (ex.: ?indice=SMLL)
+        data = filter_index(data, indice)
         
         if not data:
             return {"message": "Nenhum dado encontrado", "data": []}
         
         # Ordenar por participação
-        df = pd.DataFrame(data)
+        df = data.to_pandas()
         top_data = df.nlargest(limit, 'percentual_participacao')
         
         return {
@@ -238,7 +322,7 @@ async def get_top_stocks(limit: int):
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @app.get("/api/v1/bovespa/stock/{ticker}")
-async def get_stock_details(ticker: str):
+async def get_stock_details(ticker: str, indice: Optional[str] = None):
     """Retorna detalhes de uma ação específica"""
     try:
         ticker = ticker.upper()
@@ -246,13 +330,16 @@ async def get_stock_details(ticker: str):
         data = get_latest_data()
         
         if not data:
-            data = load_local_files()
+            data = load_stored_data()
+        
+        # Filtrar pelo índice solicitado (ex.: ?indice=SMLL)
+        data = filter_index(data, indice)
         
         if not data:
             return {"message": f"Ação {ticker} não encontrada", "data": []}
         
         # Filtrar por ticker
-        df = pd.DataFrame(data)
+        df = data.to_pandas()
         stock_data = df[df['codigo_acao'].str.upper() == ticker]
         
         if stock_data.empty:
@@ -269,7 +356,7 @@ async def get_stock_details(ticker: str):
         raise HTTPException(status_code=500, detail=f"Erro interno: {str(e)}")
 
 @app.get("/api/v1/bovespa/export/{format}")
-async def export_data(format: str):
+async def export_data(format: str, indice: Optional[str] = None):
     """Exporta dados em diferentes formatos"""
     try:
         if format.lower() not in ['json', 'csv']:
@@ -278,23 +365,28 @@ async def export_data(format: str):
         data = get_latest_data()
         
         if not data:
-            data = load_local_files()
+            data = load_stored_data()
+        
+        # Filtrar pelo índice solicitado (ex.: ?indice=SMLL)
+        data = filter_index(data, indice)
         
         if not data:
             return {"message": "Nenhum dado disponível para export"}
         
-        df = pd.DataFrame(data)
+        df = data.to_pandas()
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         if format.lower() == 'csv':
-            filename = f"bovespa_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            df.to_csv(filename, index=False)
-            return {"message": f"Dados exportados para {filename}"}
+            key = f"{EXPORT_PREFIX}/bovespa_export_{timestamp}.csv"
+            get_storage().write(key, df.to_csv(index=False).encode('utf-8'), 'text/csv')
         
         else:  # json
-            filename = f"bovespa_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
-            return {"message": f"Dados exportados para {filename}"}
+            key = f"{EXPORT_PREFIX}/bovespa_export_{timestamp}.json"
+            body = json.dumps(data.to_pylist(), ensure_ascii=False, indent=2, default=str)
+            get_storage().write(key, body.encode('utf-8'), 'application/json')
+        
+        return {"message": f"Dados exportados para {get_storage().uri(key)}"}
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro no export: {str(e)}")
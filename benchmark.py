@@ -0,0 +1,923 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do Pipeline Bovespa
+Mede os caminhos críticos do scraper e do ETL com dados sintéticos ou páginas gravadas
+
+Uso: python benchmark.py <benchmark> [opções]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Adicionar diretórios do scraper ao path
+current_dir = Path(__file__).parent
+sys.path.insert(0, str(current_dir / "src"))
+sys.path.insert(0, str(current_dir / "src" / "scraper"))
+
+
+def _timeit(func, iterations: int) -> float:
+    """Executa a função `iterations` vezes e retorna o melhor tempo em segundos"""
+    best = float('inf')
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _random_ticker(rng: random.Random) -> str:
+    letters = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4))
+    return f"{letters}{rng.choice('3456')}"
+
+
+def build_synthetic_portfolio_page(rows: int = 90, seed: int = 42) -> bytes:
+    """
+    Gera uma página HTML no formato da carteira diária da B3
+
+    Inclui cabeçalho, scripts e rodapé para que o parser percorra
+    o mesmo volume de marcação de uma página real
+    """
+    rng = random.Random(seed)
+    body_rows = []
+
+    for _ in range(rows):
+        qtde = rng.randint(10_000_000, 9_000_000_000)
+        qtde_str = f"{qtde:,}".replace(',', '.')
+        participacao = f"{rng.uniform(0.01, 12):.3f}".replace('.', ',')
+        body_rows.append(
+            f"<tr><td> {_random_ticker(rng)} </td><td>EMPRESA {rng.randint(1, 999)} S.A.</td>"
+            f"<td>{rng.choice(['ON NM', 'PN N1', 'UNT N2', 'PN EJ N1'])}</td>"
+            f"<td>{qtde_str}</td><td>{participacao}</td></tr>"
+        )
+
+    scripts = ''.join(f"<script>var x{i} = {i};</script>" for i in range(50))
+    html = (
+        "<html><head><meta charset='utf-8'><title>Carteira do Dia</title>"
+        f"{scripts}</head><body><div class='container'>"
+        "<table class='table'><thead><tr><th>Código</th><th>Ação</th><th>Tipo</th>"
+        "<th>Qtde. Teórica</th><th>Part. (%)</th></tr></thead><tbody>"
+        f"{''.join(body_rows)}</tbody>"
+        "<tfoot><tr><td colspan='3'>Quantidade Teórica Total</td><td>1</td><td>100,000</td></tr></tfoot>"
+        "</table></div></body></html>"
+    )
+    return html.encode('utf-8')
+
+
+def _synthetic_rows(rows: int, seed: int = 42):
+    """Linhas de texto no formato extraído da tabela (código, ação, tipo, qtde, part.)"""
+    rng = random.Random(seed)
+    return [
+        [_random_ticker(rng), f"EMPRESA {rng.randint(1, 999)} S.A.",
+         rng.choice(['ON NM', 'PN N1', 'UNT N2']),
+         f"{rng.randint(10_000_000, 9_000_000_000):,}".replace(',', '.'),
+         f"{rng.uniform(0.01, 12):.3f}".replace('.', ',')]
+        for _ in range(rows)
+    ]
+
+
+def _columnar_legacy(rows, trade_date: str, extraction_time: str) -> int:
+    """Caminho anterior: lista de dicionários -> DataFrame -> pyarrow -> Parquet"""
+    import io
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from b3_scraper_local import B3Scraper
+
+    scraper = B3Scraper()
+    records = [{
+        'data_pregao': trade_date,
+        'codigo_acao': codigo,
+        'nome_empresa': nome,
+        'tipo_acao': tipo,
+        'quantidade_teorica': scraper._parse_number(qtde),
+        'percentual_participacao': scraper._parse_percentage(part),
+        'data_extracao': extraction_time,
+        'fonte': 'B3_IBOV'
+    } for codigo, nome, tipo, qtde, part in rows]
+
+    df = pd.DataFrame(records)
+    df['data_pregao'] = pd.to_datetime(df['data_pregao'])
+    df['year'] = df['data_pregao'].dt.year
+    df['month'] = df['data_pregao'].dt.month
+    df['day'] = df['data_pregao'].dt.day
+    df['data_pregao'] = df['data_pregao'].dt.strftime('%Y-%m-%d')
+
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buffer)
+    return buffer.tell()
+
+
+def _columnar_builder(rows, trade_date: str, extraction_time: str) -> int:
+    """Caminho colunar: builder -> pyarrow.Table -> Parquet"""
+    import io
+    import pyarrow.parquet as pq
+    from columnar import PortfolioTableBuilder, with_partition_columns
+
+    builder = PortfolioTableBuilder(trade_date, extraction_time, 'B3_IBOV')
+    for codigo, nome, tipo, qtde, part in rows:
+        builder.append(codigo, nome, tipo, qtde, part)
+
+    buffer = io.BytesIO()
+    pq.write_table(with_partition_columns(builder.build(), trade_date), buffer)
+    return buffer.tell()
+
+
+def _columnar_worker(path: str, rows: int, iterations: int, queue) -> None:
+    """Executa um caminho em processo próprio para medir o pico de memória isolado"""
+    import resource
+
+    sys.path.insert(0, str(current_dir / "src" / "scraper"))
+    func = _columnar_legacy if path == 'legacy' else _columnar_builder
+    data = _synthetic_rows(rows)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elapsed = _timeit(lambda: func(data, '2025-01-15', '2025-01-15T18:00:00'), iterations)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss em KB no Linux
+    queue.put((elapsed, (peak - baseline) / 1024))
+
+
+class _DiscardS3:
+    """Cliente S3 falso que só conta os bytes recebidos (sem guardar o conteúdo)"""
+
+    def __init__(self):
+        self.bytes_received = 0
+
+    def put_object(self, Body, **kwargs):
+        self.bytes_received += len(Body)
+
+    def create_multipart_upload(self, **kwargs):
+        return {'UploadId': 'benchmark'}
+
+    def upload_part(self, Body, PartNumber, **kwargs):
+        self.bytes_received += len(Body)
+        return {'ETag': str(PartNumber)}
+
+    def complete_multipart_upload(self, **kwargs):
+        pass
+
+    def abort_multipart_upload(self, **kwargs):
+        pass
+
+
+def _daily_tables(days: int, rows_per_day: int):
+    """Gera uma carteira sintética por pregão, uma de cada vez (mesmas ações, datas diferentes)"""
+    from datetime import date, timedelta
+    import pyarrow as pa
+    from columnar import PortfolioTableBuilder, with_partition_columns
+
+    builder = PortfolioTableBuilder('2020-01-01', '2020-01-01T18:00:00', 'B3_IBOV')
+    for row in _synthetic_rows(rows_per_day):
+        builder.append(*row)
+    template = builder.build()
+    position = template.column_names.index('data_pregao')
+
+    start = date(2020, 1, 1)
+    for offset in range(days):
+        date_str = (start + timedelta(days=offset)).isoformat()
+        table = template.set_column(position, 'data_pregao', pa.repeat(date_str, template.num_rows))
+        yield with_partition_columns(table, date_str)
+
+
+def _multipart_worker(path: str, days: int, rows_per_day: int, queue) -> None:
+    """Grava o arquivo de backfill em processo próprio para medir o pico de memória isolado"""
+    import io
+    import resource
+
+    sys.path.insert(0, str(current_dir / "src" / "scraper"))
+    from raw_schema import write_raw_parquet_batches
+    from s3_stream import S3StreamingUpload
+
+    s3 = _DiscardS3()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+
+    if path == 'buffered':
+        buffer = io.BytesIO()
+        write_raw_parquet_batches(_daily_tables(days, rows_per_day), buffer)
+        s3.put_object(Body=buffer.getvalue(), Bucket='bench', Key='bench.parquet')
+    else:
+        with S3StreamingUpload(s3, 'bench', 'bench.parquet') as upload:
+            write_raw_parquet_batches(_daily_tables(days, rows_per_day), upload)
+
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (peak - baseline) / 1024, s3.bytes_received / 1024 / 1024))
+
+
+def bench_parser(args) -> bool:
+    """Compara os backends lxml e BeautifulSoup do parser da tabela"""
+    from table_parser import extract_rows_bs4, extract_rows_lxml
+
+    if args.page:
+        pages = [(path, Path(path).read_bytes()) for path in args.page]
+    else:
+        pages = [(f"sintética ({args.rows} linhas)", build_synthetic_portfolio_page(args.rows))]
+
+    # Opções usadas pela Lambda e pela versão local do scraper
+    variants = {
+        'lambda': {},
+        'local': {'cell_tags': ('td', 'th'), 'first_table_only': True, 'strip_fragments': True}
+    }
+
+    print("🏁 BENCHMARK: parser da tabela (lxml x BeautifulSoup)")
+    print("=" * 60)
+    identical = True
+
+    for name, content in pages:
+        print(f"📄 Página: {name} ({len(content):,} bytes)")
+
+        for variant, options in variants.items():
+            rows_lxml = extract_rows_lxml(content, **options)
+            rows_bs4 = extract_rows_bs4(content, **options)
+
+            if rows_lxml != rows_bs4:
+                identical = False
+                print(f"   ❌ [{variant}] backends divergem")
+                continue
+
+            time_bs4 = _timeit(lambda: extract_rows_bs4(content, **options), args.iterations)
+            time_lxml = _timeit(lambda: extract_rows_lxml(content, **options), args.iterations)
+
+            print(f"   ✅ [{variant}] {len(rows_lxml or [])} linhas idênticas | "
+                  f"bs4: {time_bs4 * 1000:.2f} ms | lxml: {time_lxml * 1000:.2f} ms | "
+                  f"speedup: {time_bs4 / time_lxml:.1f}x")
+
+    return identical
+
+
+def bench_numeric(args) -> bool:
+    """Compara a conversão vetorizada com as funções célula a célula"""
+    from numeric_parsing import parse_br_number_array, parse_br_percentage_array
+    from b3_scraper_local import B3Scraper
+
+    rng = random.Random(42)
+    quantidades = [f"{rng.randint(0, 9_000_000_000):,}".replace(',', '.') for _ in range(args.rows)]
+    participacoes = [f"{rng.uniform(0, 12):.3f}".replace('.', ',') + rng.choice(['', '%'])
+                     for _ in range(args.rows)]
+    # Algumas células vazias ou inválidas, como em páginas reais
+    for i in range(0, args.rows, 97):
+        quantidades[i] = rng.choice(['', '-', 'N/D'])
+        participacoes[i] = rng.choice(['', '--'])
+
+    scraper = B3Scraper()
+
+    print(f"🏁 BENCHMARK: conversão numérica ({args.rows:,} linhas)")
+    print("=" * 60)
+    identical = True
+
+    cases = [
+        ('quantidade', quantidades, scraper._parse_number, parse_br_number_array),
+        ('participação', participacoes, scraper._parse_percentage, parse_br_percentage_array),
+    ]
+
+    for name, values, per_cell, vectorized in cases:
+        expected = [per_cell(v) for v in values]
+        result = vectorized(values).to_pylist()
+
+        if expected != result:
+            identical = False
+            print(f"   ❌ [{name}] resultados divergem")
+            continue
+
+        time_cell = _timeit(lambda: [per_cell(v) for v in values], args.iterations)
+        time_vec = _timeit(lambda: vectorized(values), args.iterations)
+
+        print(f"   ✅ [{name}] {sum(v is None for v in result)} nulos idênticos | "
+              f"célula a célula: {time_cell * 1000:.1f} ms | vetorizado: {time_vec * 1000:.1f} ms | "
+              f"speedup: {time_cell / time_vec:.1f}x")
+
+    return identical
+
+
+def bench_columnar(args) -> bool:
+    """Compara a montagem via lista de dicionários/DataFrame com o builder colunar"""
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+
+    print(f"🏁 BENCHMARK: montagem da tabela ({args.rows:,} linhas)")
+    print("=" * 60)
+
+    results = {}
+    for path in ('legacy', 'builder'):
+        queue = context.Queue()
+        process = context.Process(target=_columnar_worker,
+                                  args=(path, args.rows, args.iterations, queue))
+        process.start()
+        results[path] = queue.get()
+        process.join()
+
+    for path, label in (('legacy', 'dicts + DataFrame'), ('builder', 'builder colunar')):
+        elapsed, memory = results[path]
+        print(f"   {label:<18} tempo: {elapsed * 1000:8.1f} ms | pico de memória: +{memory:,.1f} MB")
+
+    legacy_time, legacy_memory = results['legacy']
+    builder_time, builder_memory = results['builder']
+    print(f"   ✅ speedup: {legacy_time / builder_time:.1f}x | "
+          f"memória: {legacy_memory - builder_memory:,.1f} MB a menos")
+
+    # Conferência de conteúdo: os dois caminhos convertem os números igual
+    from b3_scraper_local import B3Scraper
+    from columnar import PortfolioTableBuilder
+
+    scraper = B3Scraper()
+    sample = _synthetic_rows(min(args.rows, 1000))
+    builder = PortfolioTableBuilder('2025-01-15', '2025-01-15T18:00:00', 'B3_IBOV')
+    for row in sample:
+        builder.append(*row)
+    table = builder.build()
+
+    identical = (
+        table['quantidade_teorica'].to_pylist() == [scraper._parse_number(r[3]) for r in sample]
+        and table['percentual_participacao'].to_pylist() == [scraper._parse_percentage(r[4]) for r in sample]
+    )
+    if not identical:
+        print("   ❌ valores divergem entre os caminhos")
+    return identical
+
+
+def _flaky_server(slow_rate: float, slow_seconds: float, error_rate: float, seed: int = 42):
+    """Servidor HTTP local que responde devagar ou com 503 em uma fração das requisições"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with lock:
+                draw = rng.random()
+            if draw < slow_rate:
+                time.sleep(slow_seconds)
+            status = 503 if slow_rate <= draw < slow_rate + error_rate else 200
+            self.send_response(status)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'ok')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_resilience(args) -> bool:
+    """Compara latência de cauda e taxa de sucesso com e sem retentativa/hedging"""
+    import logging
+    from concurrent.futures import ThreadPoolExecutor
+    from http_client import PooledHttpClient
+    from resilience import LatencyTracker, ResilientCaller, RetryPolicy
+
+    logging.getLogger('resilience').setLevel(logging.ERROR)
+    server = _flaky_server(args.slow_rate, args.slow_seconds, args.error_rate)
+    url = f"http://127.0.0.1:{server.server_port}/indexPage/day/IBOV"
+
+    print(f"🏁 BENCHMARK: resiliência ({args.requests} requisições, "
+          f"{args.slow_rate:.0%} lentas de {args.slow_seconds}s, {args.error_rate:.0%} com 503)")
+    print("=" * 60)
+
+    configs = [
+        ('sem resiliência', None),
+        ('retentativa', ResilientCaller(retry=RetryPolicy(3, 0.01, 0.1), deadline=10,
+                                        failure_threshold=10_000)),
+        ('retentativa + hedge', ResilientCaller(retry=RetryPolicy(3, 0.01, 0.1), deadline=10,
+                                                hedge_after=args.hedge_after,
+                                                failure_threshold=10_000)),
+    ]
+
+    success_rates = {}
+    for label, resilience in configs:
+        client = PooledHttpClient(pool_size=args.concurrency * 2, resilience=resilience)
+        latency = LatencyTracker(window=args.requests)
+
+        def one(_):
+            started = time.perf_counter()
+            try:
+                ok = client.get(url, timeout=10, conditional=False).status_code == 200
+            except Exception:
+                ok = False
+            latency.record(time.perf_counter() - started)
+            return ok
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            ok = sum(executor.map(one, range(args.requests)))
+
+        summary = latency.summary()
+        success_rates[label] = ok / args.requests
+        print(f"   {label:<20} sucesso: {ok / args.requests:6.1%} | p50: {summary['latency_p50_ms']:5d} ms | "
+              f"p99: {summary['latency_p99_ms']:5d} ms | máx: {summary['latency_max_ms']:5d} ms")
+
+    server.shutdown()
+    return success_rates['retentativa + hedge'] >= success_rates['sem resiliência']
+
+
+# Handlers Lambda: diretório do pacote, módulo e importações proibidas no cold start
+COLD_START_HANDLERS = {
+    'scraper': ('src/scraper', 'lambda_function',
+                ['boto3', 'botocore', 'pandas', 'pyarrow', 'requests', 'bs4', 'lxml', 'config']),
+    'trigger': ('src/trigger', 'lambda_function', ['boto3', 'botocore', 'config', 'pyarrow']),
+}
+
+
+def _importtime(directory: str, module: str):
+    """Importa o módulo em um processo novo com -X importtime e retorna (total em ms, módulos importados)"""
+    import os
+    import subprocess
+
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    code = f"import sys; sys.path.insert(0, {str(current_dir / directory)!r}); import {module}"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, env=env, check=True)
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        if name == ' site':
+            # Tudo antes (e inclusive) do site é inicialização do interpretador
+            modules = {}
+            continue
+        modules[name.strip()] = int(cumulative) / 1000
+        if name == f' {module}':
+            total = int(cumulative) / 1000
+    return total, modules
+
+
+def bench_importtime(args) -> bool:
+    """Mede o tempo de importação dos handlers Lambda e barra dependências pesadas no cold start"""
+    print(f"🏁 BENCHMARK: cold start dos handlers (melhor de {args.iterations} processos)")
+    print("=" * 60)
+    budgets = {'scraper': args.max_scraper_ms, 'trigger': args.max_trigger_ms}
+    ok = True
+
+    for handler, (directory, module, forbidden) in COLD_START_HANDLERS.items():
+        runs = [_importtime(directory, module) for _ in range(args.iterations)]
+        total, modules = min(runs, key=lambda run: run[0])
+
+        heaviest = sorted(((ms, name) for name, ms in modules.items()
+                           if name != module and '.' not in name), reverse=True)[:3]
+        print(f"   [{handler}] importação: {total:7.1f} ms (limite {budgets[handler]:.0f} ms) | "
+              f"mais pesados: {', '.join(f'{name} {ms:.0f} ms' for ms, name in heaviest)}")
+
+        loaded = [name for name in forbidden if name in modules]
+        if loaded:
+            ok = False
+            print(f"   ❌ [{handler}] importados no cold start: {', '.join(loaded)}")
+        if total > budgets[handler]:
+            ok = False
+            print(f"   ❌ [{handler}] acima do limite de {budgets[handler]:.0f} ms")
+
+    if ok:
+        print("   ✅ nenhuma dependência pesada no cold start")
+    return ok
+
+
+def bench_multipart(args) -> bool:
+    """Compara o pico de memória do upload via BytesIO com o multipart em streaming"""
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    sizes = [int(days) for days in args.days.split(',')]
+
+    print(f"🏁 BENCHMARK: upload do arquivo de backfill ({args.rows_per_day:,} linhas por pregão)")
+    print("=" * 60)
+
+    results = {}
+    for days in sizes:
+        for path, label in (('buffered', 'BytesIO + put_object'), ('streaming', 'multipart streaming')):
+            queue = context.Queue()
+            process = context.Process(target=_multipart_worker,
+                                      args=(path, days, args.rows_per_day, queue))
+            process.start()
+            results[(path, days)] = queue.get()
+            process.join()
+
+            elapsed, memory, size = results[(path, days)]
+            print(f"   {days:4d} pregões | {label:<21} arquivo: {size:7.1f} MiB | "
+                  f"tempo: {elapsed:6.2f} s | pico de memória: +{memory:,.1f} MB")
+
+    smallest, largest = min(sizes), max(sizes)
+    streaming_growth = results[('streaming', largest)][1] - results[('streaming', smallest)][1]
+    buffered_growth = results[('buffered', largest)][1] - results[('buffered', smallest)][1]
+    print(f"   ✅ crescimento do pico de {smallest} para {largest} pregões: "
+          f"BytesIO +{buffered_growth:,.1f} MB | streaming +{streaming_growth:,.1f} MB")
+
+    return results[('streaming', largest)][1] <= results[('buffered', largest)][1]
+
+
+def _scan_raw_layer(root: Path, ticker: str):
+    """Varre a camada raw local inteira e filtrada por ticker; retorna (linhas, linhas do ticker)"""
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(str(root), format='parquet')
+    total = dataset.count_rows()
+    filtered = dataset.to_table(columns=['codigo_acao', 'percentual_participacao'],
+                                filter=ds.field('codigo_acao') == ticker).num_rows
+    return total, filtered
+
+
+def bench_compaction(args) -> bool:
+    """Compara o tempo de varredura da camada raw antes e depois da compactação mensal"""
+    import shutil
+    import tempfile
+    from datetime import date
+    from compaction import RawCompactor
+    from page_archive import RAW_PREFIX, raw_object_key
+    from storage import LocalObjectStore
+    from raw_schema import write_raw_parquet
+
+    workdir = Path(tempfile.mkdtemp(prefix='bench_compaction_'))
+    raw_root = workdir / RAW_PREFIX
+    days = args.years * 365
+
+    try:
+        print(f"🏁 BENCHMARK: compactação da camada raw ({days} pregões, "
+              f"{args.rows_per_day} linhas por pregão)")
+        print("=" * 60)
+
+        for table in _daily_tables(days, args.rows_per_day):
+            path = workdir / raw_object_key(str(table['data_pregao'][0].as_py()))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            write_raw_parquet(table, str(path))
+
+        ticker = _synthetic_rows(1)[0][0]
+        results = {}
+        for stage in ('antes', 'depois'):
+            if stage == 'depois':
+                started = time.perf_counter()
+                summary = RawCompactor(LocalObjectStore(str(workdir)), grace_days=0,
+                                       today=date(2100, 1, 1)).run()
+                print(f"   🗜️  compactação: {summary['replaced_files']} arquivos em "
+                      f"{len(summary['compacted_months'])} meses ({time.perf_counter() - started:.1f} s)")
+
+            files = sum(1 for path in raw_root.rglob('*.parquet'))
+            size = sum(path.stat().st_size for path in raw_root.rglob('*.parquet'))
+            rows = _scan_raw_layer(raw_root, ticker)
+            elapsed = _timeit(lambda: _scan_raw_layer(raw_root, ticker), args.iterations)
+            results[stage] = (rows, elapsed)
+            print(f"   {stage:<7} arquivos: {files:6,d} | {size / 1024 / 1024:6.1f} MiB | "
+                  f"varredura + filtro por {ticker}: {elapsed * 1000:8.1f} ms | linhas: {rows[0]:,}")
+
+        identical = results['antes'][0] == results['depois'][0]
+        if identical:
+            print(f"   ✅ mesmas linhas | speedup: {results['antes'][1] / results['depois'][1]:.1f}x")
+        else:
+            print(f"   ❌ linhas divergem: {results['antes'][0]} x {results['depois'][0]}")
+        return identical
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_storage(args) -> bool:
+    """Carga do caminho de gravação/leitura da camada raw contra um backend de armazenamento"""
+    import os
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    workdir = None
+    if args.backend == 'local':
+        workdir = tempfile.mkdtemp(prefix='bench_storage_')
+        os.environ.update({'STORAGE_BACKEND': 'local', 'STORAGE_LOCAL_DIR': workdir})
+    else:
+        if not args.bucket:
+            print("❌ Informe o bucket com --bucket (S3 local via STORAGE_S3_ENDPOINT_URL)")
+            return False
+        os.environ['STORAGE_BACKEND'] = 's3'
+    os.environ['SCRAPER_ARCHIVE_BACKEND'] = 'none'
+
+    import logging
+    from lambda_function import B3Scraper
+    from page_archive import raw_object_key
+
+    # O handler configura o logger raiz em INFO (uma linha por gravação)
+    logging.getLogger().setLevel(logging.WARNING)
+    scraper = B3Scraper(args.bucket or 'local')
+    storage = scraper.storage
+    tables = [(str(table['data_pregao'][0].as_py()), table)
+              for table in _daily_tables(args.days, args.rows_per_day)]
+    keys = [raw_object_key(date_str) for date_str, _ in tables]
+
+    def measure(label, func, items):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results = list(executor.map(func, items))
+        elapsed = time.perf_counter() - started
+        print(f"   {label:<30} {len(items) / elapsed:8.1f} ops/s | {elapsed:6.2f} s")
+        return results
+
+    try:
+        print(f"🏁 BENCHMARK: armazenamento {args.backend} ({storage.uri('')}) | "
+              f"{args.days} pregões x {args.rows_per_day} linhas, {args.workers} workers")
+        print("=" * 60)
+
+        measure("gravação (save_to_s3_parquet)", lambda item: scraper.save_to_s3_parquet(item[1], item[0]), tables)
+        measure("regravação idêntica (head)", lambda item: scraper.save_to_s3_parquet(item[1], item[0]), tables)
+        bodies = measure("leitura (read)", storage.read, keys)
+        started = time.perf_counter()
+        listed = storage.list('raw-data/bovespa')
+        print(f"   {'listagem (list)':<30} {len(listed):8d} objetos | {time.perf_counter() - started:6.2f} s")
+
+        size = sum(len(body) for body in bodies) / 1024 / 1024
+        skipped = len(scraper.unchanged_uploads)
+        print(f"   📦 {size:.1f} MiB gravados | {skipped}/{args.days} regravações ignoradas pelo hash")
+        return skipped == args.days and len(listed) >= args.days
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            storage.delete(keys)
+
+
+def bench_etl(args) -> bool:
+    """Mede o ETL rápido (Lambda) de um lote pequeno da camada raw, do parquet raw às saídas refinadas"""
+    import io
+    sys.path.append(str(current_dir / "src" / "trigger"))
+    from fast_etl import run_fast_path
+    from raw_schema import write_raw_parquet
+
+    bodies = {}
+    for table in _daily_tables(args.days, args.rows_per_day):
+        buffer = io.BytesIO()
+        write_raw_parquet(table, buffer)
+        bodies[str(table['data_pregao'][0].as_py())] = buffer.getvalue()
+
+    print(f"🏁 BENCHMARK: ETL rápido na Lambda ({args.days} pregões x {args.rows_per_day} linhas, "
+          f"{sum(len(body) for body in bodies.values()) / 1024:.1f} KiB raw)")
+    print("=" * 60)
+
+    outputs = {}
+    summaries = []
+    elapsed = _timeit(lambda: summaries.append(run_fast_path(bodies.__getitem__, outputs.__setitem__,
+                                                             list(bodies))), args.iterations)
+    summary = summaries[-1]
+    print(f"   registros refinados: {summary['refined_rows']:,} | agregados: {summary['aggregated_rows']:,} | "
+          f"arquivos: {summary['files_written']:,}")
+    print(f"   tempo (melhor de {args.iterations}): {elapsed * 1000:8.1f} ms (limite {args.max_ms:.0f} ms)")
+
+    if elapsed * 1000 > args.max_ms:
+        print(f"   ❌ acima do limite de {args.max_ms:.0f} ms")
+        return False
+    print("   ✅ lote processado em segundos, sem subir o Spark")
+    return True
+
+
+def _write_refined_layout(root: Path, refined, partition_keys, sort_keys) -> None:
+    """Grava os refinados sintéticos em um diretório local com o layout informado"""
+    from fast_etl import REFINED_PREFIX, partitioned_files
+
+    for key, body in partitioned_files(refined, REFINED_PREFIX, partition_keys, 'bench', sort_keys):
+        path = root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(body)
+
+
+def _scan_refined_layout(root: Path, ticker: str, year: int, month: int):
+    """Consultas típicas do Athena: histórico de um ticker e total de um mês"""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(str(root), format='parquet', partitioning='hive')
+    history = dataset.to_table(columns=['data_pregao', 'participation_percentage'],
+                               filter=ds.field('ticker_symbol') == ticker).num_rows
+    month_table = dataset.to_table(columns=['theoretical_quantity'],
+                                   filter=(ds.field('partition_year') == year) & (ds.field('partition_month') == month))
+    return history, pc.sum(month_table['theoretical_quantity']).as_py()
+
+
+def bench_layout(args) -> bool:
+    """Compara a varredura dos refinados no layout antigo (por ticker_group) com o layout só por pregão"""
+    import io
+    import shutil
+    import tempfile
+    import pyarrow.compute as pc
+    sys.path.append(str(current_dir / "src" / "trigger"))
+    from fast_etl import REFINED_PARTITION_KEYS, REFINED_PREFIX, REFINED_SORT_KEYS, read_raw_table, transform
+    from raw_schema import write_raw_parquet
+
+    bodies = []
+    for table in _daily_tables(args.years * 365, args.rows_per_day):
+        buffer = io.BytesIO()
+        write_raw_parquet(table, buffer)
+        bodies.append(buffer.getvalue())
+    refined, _ = transform(read_raw_table(bodies))
+    ticker = _synthetic_rows(1)[0][0]
+    # Chave do layout antigo (4 primeiras letras do ticker), que o ETL não grava mais
+    legacy = refined.append_column('ticker_group', pc.utf8_slice_codeunits(refined['ticker_symbol'], 0, 4))
+
+    layouts = {
+        'ticker_group': (legacy, REFINED_PARTITION_KEYS + ['ticker_group'], None),
+        'pregão + sort': (refined, REFINED_PARTITION_KEYS, REFINED_SORT_KEYS),
+    }
+    workdir = Path(tempfile.mkdtemp(prefix='bench_layout_'))
+    try:
+        print(f"🏁 BENCHMARK: layout dos refinados ({len(bodies)} pregões, {refined.num_rows:,} linhas)")
+        print("=" * 60)
+
+        results = {}
+        for label, (table, partition_keys, sort_keys) in layouts.items():
+            root = workdir / label.split()[0]
+            started = time.perf_counter()
+            _write_refined_layout(root, table, partition_keys, sort_keys)
+            written = time.perf_counter() - started
+
+            files = list((root / REFINED_PREFIX).rglob('*.parquet'))
+            size = sum(path.stat().st_size for path in files)
+            answer = _scan_refined_layout(root / REFINED_PREFIX, ticker, 2020, 6)
+            elapsed = _timeit(lambda: _scan_refined_layout(root / REFINED_PREFIX, ticker, 2020, 6), args.iterations)
+            results[label] = (len(files), elapsed, answer)
+            print(f"   {label:<14} arquivos: {len(files):7,d} | {size / 1024 / 1024:6.1f} MiB | "
+                  f"gravação: {written:6.1f} s | consultas ({ticker} + mês): {elapsed * 1000:8.1f} ms")
+
+        (old_files, old_time, old_answer), (new_files, new_time, new_answer) = results.values()
+        if old_answer != new_answer:
+            print(f"   ❌ resultados divergem: {old_answer} x {new_answer}")
+            return False
+        print(f"   ✅ mesmos resultados | {old_files / new_files:.0f}x menos arquivos | "
+              f"speedup: {old_time / new_time:.1f}x")
+        return new_files < old_files and new_time < old_time
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _spark_rerun_counts(batch_path: str, output_path: str, rerun_date: str) -> list:
+    """
+    Grava os refinados com o writer do job (ETAPA 6: overwrite dinâmico de
+    partições) em uma sessão local do Spark: lote completo, reexecução de um
+    pregão e o lote completo de novo. Retorna a contagem da tabela após cada gravação
+    """
+    from pyspark.sql import SparkSession, functions as F
+    sys.path.append(str(current_dir / "src" / "trigger"))
+    from fast_etl import REFINED_PARTITION_KEYS
+
+    spark = SparkSession.builder.master("local[2]").appName("bench_rerun") \
+        .config("spark.sql.sources.partitionOverwriteMode", "dynamic") \
+        .config("spark.ui.enabled", "false").getOrCreate()
+    try:
+        batch = spark.read.parquet(batch_path)
+        counts = []
+        for frame in (batch, batch.filter(F.col("data_pregao_date") == F.lit(rerun_date).cast("date")), batch):
+            frame.write.mode("overwrite").option("partitionOverwriteMode", "dynamic") \
+                .partitionBy(*REFINED_PARTITION_KEYS).parquet(output_path)
+            counts.append(spark.read.parquet(output_path).count())
+        return counts
+    finally:
+        spark.stop()
+
+
+def bench_rerun(args) -> bool:
+    """Verifica que reexecuções do ETL substituem as partições que tocam (contagens estáveis)"""
+    import io
+    import shutil
+    import tempfile
+    import pyarrow.parquet as pq
+    sys.path.append(str(current_dir / "src" / "trigger"))
+    from fast_etl import AGGREGATED_PREFIX, CHANGES_PREFIX, REFINED_PREFIX, read_raw_table, run_fast_path, transform
+    from raw_schema import write_raw_parquet
+
+    bodies = {}
+    for table in _daily_tables(args.days, args.rows_per_day):
+        buffer = io.BytesIO()
+        write_raw_parquet(table, buffer)
+        bodies[str(table['data_pregao'][0].as_py())] = buffer.getvalue()
+    dates = list(bodies)
+
+    print(f"🏁 BENCHMARK: reexecução idempotente ({len(dates)} pregões x {args.rows_per_day} linhas)")
+    print("=" * 60)
+
+    # ETL rápido sobre um bucket em memória: lote, rescrape do primeiro pregão e lote de novo
+    outputs = {}
+
+    def table_rows(prefix):
+        return sum(pq.read_metadata(io.BytesIO(body)).num_rows for key, body in outputs.items()
+                   if key.startswith(prefix + '/'))
+
+    runs = [('lote', dates), ('rescrape', dates[:1]), ('lote de novo', dates)]
+    counts = []
+    for number, (label, keys) in enumerate(runs):
+        summary = run_fast_path(bodies.__getitem__, outputs.__setitem__, keys, run_id=f"run{number}",
+                                list_keys=lambda prefix: [key for key in outputs if key.startswith(prefix)],
+                                delete=lambda keys: [outputs.pop(key) for key in keys])
+        counts.append((table_rows(REFINED_PREFIX), table_rows(AGGREGATED_PREFIX), table_rows(CHANGES_PREFIX)))
+        print(f"   ETL rápido | {label:<12} refinados: {counts[-1][0]:7,d} | agregados: {counts[-1][1]:5,d} | "
+              f"variações: {counts[-1][2]:7,d} | arquivos substituídos: {summary['files_replaced']}")
+    success = len(set(counts)) == 1
+    print(f"   {'✅' if success else '❌'} ETL rápido: contagens {'estáveis' if success else 'divergem'} "
+          f"entre as reexecuções")
+
+    try:
+        import pyspark  # noqa: F401
+    except ImportError:
+        # Sem o Spark a reexecução do job não foi verificada: não reporta sucesso
+        print("   ❌ pyspark não instalado: writer do Spark não verificado (pip install pyspark)")
+        return False
+
+    workdir = Path(tempfile.mkdtemp(prefix='bench_rerun_'))
+    try:
+        refined, _ = transform(read_raw_table(list(bodies.values())))
+        pq.write_table(refined, str(workdir / 'batch.parquet'), use_deprecated_int96_timestamps=True)
+        spark_counts = _spark_rerun_counts(str(workdir / 'batch.parquet'), str(workdir / 'refined'), dates[0])
+        print(f"   Spark      | contagens após lote, rescrape e lote de novo: "
+              f"{', '.join(f'{count:,}' for count in spark_counts)}")
+        spark_success = len(set(spark_counts)) == 1 and spark_counts[0] == refined.num_rows
+        print(f"   {'✅' if spark_success else '❌'} Spark: overwrite dinâmico "
+              f"{'substitui só os pregões regravados' if spark_success else 'alterou a contagem'}")
+        return success and spark_success
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+BENCHMARKS = {
+    'parser': bench_parser,
+    'numeric': bench_numeric,
+    'columnar': bench_columnar,
+    'resilience': bench_resilience,
+    'importtime': bench_importtime,
+    'multipart': bench_multipart,
+    'compaction': bench_compaction,
+    'storage': bench_storage,
+    'etl': bench_etl,
+    'layout': bench_layout,
+    'rerun': bench_rerun,
+}
+
+
+def main() -> bool:
+    parser = argparse.ArgumentParser(description="Benchmarks do Pipeline Bovespa")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    parser_bench = subparsers.add_parser('parser', help="Parser lxml x BeautifulSoup")
+    parser_bench.add_argument('--rows', type=int, default=90, help="Linhas da página sintética")
+    parser_bench.add_argument('--iterations', type=int, default=20, help="Repetições por medida")
+    parser_bench.add_argument('--page', nargs='*', help="Páginas HTML gravadas a usar no lugar da sintética")
+
+    numeric_bench = subparsers.add_parser('numeric', help="Conversão numérica vetorizada x célula a célula")
+    numeric_bench.add_argument('--rows', type=int, default=100_000, help="Linhas da coluna sintética")
+    numeric_bench.add_argument('--iterations', type=int, default=5, help="Repetições por medida")
+
+    columnar_bench = subparsers.add_parser('columnar', help="Builder colunar x lista de dicionários/DataFrame")
+    columnar_bench.add_argument('--rows', type=int, default=500_000, help="Linhas sintéticas da carteira")
+    columnar_bench.add_argument('--iterations', type=int, default=3, help="Repetições por medida")
+
+    resilience_bench = subparsers.add_parser('resilience', help="Retentativa e hedging x requisição única")
+    resilience_bench.add_argument('--requests', type=int, default=400, help="Requisições por configuração")
+    resilience_bench.add_argument('--concurrency', type=int, default=8, help="Requisições simultâneas")
+    resilience_bench.add_argument('--slow-rate', type=float, default=0.05, help="Fração de respostas lentas")
+    resilience_bench.add_argument('--slow-seconds', type=float, default=1.0, help="Atraso das respostas lentas")
+    resilience_bench.add_argument('--error-rate', type=float, default=0.05, help="Fração de respostas 503")
+    resilience_bench.add_argument('--hedge-after', type=float, default=0.1, help="Limiar do hedge em segundos")
+
+    importtime_bench = subparsers.add_parser('importtime', help="Tempo de importação (cold start) dos handlers Lambda")
+    importtime_bench.add_argument('--iterations', type=int, default=5, help="Processos por handler")
+    importtime_bench.add_argument('--max-scraper-ms', type=float, default=100, help="Limite do handler do scraper")
+    importtime_bench.add_argument('--max-trigger-ms', type=float, default=100, help="Limite do handler do trigger")
+
+    multipart_bench = subparsers.add_parser('multipart', help="Upload multipart em streaming x BytesIO")
+    multipart_bench.add_argument('--days', default='10,200', help="Pregões por arquivo a comparar (ex.: 10,80)")
+    multipart_bench.add_argument('--rows-per-day', type=int, default=50_000, help="Linhas sintéticas por pregão")
+
+    compaction_bench = subparsers.add_parser('compaction', help="Varredura da camada raw antes x depois da compactação")
+    compaction_bench.add_argument('--years', type=int, default=3, help="Anos de pregões sintéticos")
+    compaction_bench.add_argument('--rows-per-day', type=int, default=450, help="Linhas por pregão (5 índices)")
+    compaction_bench.add_argument('--iterations', type=int, default=3, help="Repetições por medida")
+
+    storage_bench = subparsers.add_parser('storage', help="Carga de gravação/leitura da camada raw no armazenamento")
+    storage_bench.add_argument('--backend', choices=['local', 's3'], default='local', help="Backend de armazenamento")
+    storage_bench.add_argument('--bucket', help="Bucket do backend s3")
+    storage_bench.add_argument('--days', type=int, default=250, help="Pregões gravados")
+    storage_bench.add_argument('--rows-per-day', type=int, default=450, help="Linhas por pregão")
+    storage_bench.add_argument('--workers', type=int, default=8, help="Gravações concorrentes")
+
+    etl_bench = subparsers.add_parser('etl', help="ETL rápido na Lambda para lotes pequenos")
+    etl_bench.add_argument('--days', type=int, default=1, help="Pregões no lote")
+    etl_bench.add_argument('--rows-per-day', type=int, default=90, help="Linhas por pregão")
+    etl_bench.add_argument('--iterations', type=int, default=5, help="Repetições por medida")
+    etl_bench.add_argument('--max-ms', type=float, default=2000, help="Limite do tempo do lote")
+
+    layout_bench = subparsers.add_parser('layout', help="Varredura dos refinados: layout antigo por ticker_group x só pregão")
+    layout_bench.add_argument('--years', type=int, default=2, help="Anos de pregões sintéticos")
+    layout_bench.add_argument('--rows-per-day', type=int, default=30, help="Linhas por pregão (um ticker_group cada)")
+    layout_bench.add_argument('--iterations', type=int, default=1, help="Repetições por medida")
+
+    rerun_bench = subparsers.add_parser('rerun', help="Reexecução idempotente: ETL rápido e writer do Spark")
+    rerun_bench.add_argument('--days', type=int, default=5, help="Pregões no lote")
+    rerun_bench.add_argument('--rows-per-day', type=int, default=90, help="Linhas por pregão")
+
+    args = parser.parse_args()
+    return BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -68,15 +68,18 @@ class LambdaDeployer:
         
         return f"arn:aws:iam::{self.account_id}:role/{role_name}"
     
-    def create_zip_package(self, source_dir, output_file):
-        """Cria pacote ZIP para Lambda"""
+    def create_zip_package(self, source_dir, output_file, shared_modules=()):
+        """Cria pacote ZIP para Lambda (shared_modules: módulos de outros diretórios)"""
         with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
             source_path = Path(source_dir)
             
-            # Adicionar arquivo principal
-            lambda_file = source_path / "lambda_function.py"
-            if lambda_file.exists():
-                zipf.write(lambda_file, "lambda_function.py")
+            # Adicionar arquivo principal e módulos auxiliares
+            for module_file in sorted(source_path.glob("*.py")):
+                zipf.write(module_file, module_file.name)
+            
+            # Módulos compartilhados entre as Lambdas (ex.: storage.py do scraper)
+            for module_file in map(Path, shared_modules):
+                zipf.write(module_file, module_file.name)
             
             # Adicionar requirements se existir
             req_file = source_path / "requirements.txt"
@@ -220,7 +223,8 @@ class LambdaDeployer:
         role_arn = self.create_lambda_role("bovespa-trigger-role", assume_role_policy, trigger_policy)
         
         # Criar pacote ZIP
-        zip_file = self.create_zip_package("src/trigger", "trigger_lambda.zip")
+        zip_file = self.create_zip_package("src/trigger", "trigger_lambda.zip",
+                                           shared_modules=["src/scraper/storage.py"])
         
         # Deploy da Lambda
         with open(zip_file, 'rb') as f:
@@ -0,0 +1,30 @@
+# Ledger das execuções do ETL (ver src/trigger/run_ledger.py)
+# Um item por (pregão, hash do conteúdo) e um por job iniciado; o trigger
+# suprime jobs para arquivos já processados ou em processamento
+resource "aws_dynamodb_table" "etl_run_ledger" {
+  name         = "${var.project_name}-etl-run-ledger"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+  range_key    = "sk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  attribute {
+    name = "sk"
+    type = "S"
+  }
+
+  # Itens expiram 90 dias depois da última reivindicação
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+
+  tags = {
+    Name        = "${var.project_name}-etl-run-ledger"
+    Environment = var.environment
+  }
+}
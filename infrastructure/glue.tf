@@ -21,6 +21,18 @@ resource "aws_s3_object" "glue_job_script" {
   }
 }
 
+# Módulo do catálogo (registro de partições), compartilhado com o trigger
+resource "aws_s3_object" "glue_catalog_module" {
+  bucket = aws_s3_bucket.glue_scripts.id
+  key    = "scripts/catalog.py"
+  source = "../src/trigger/catalog.py"
+  etag   = filemd5("../src/trigger/catalog.py")
+
+  tags = {
+    Environment = var.environment
+  }
+}
+
 # Glue Database
 resource "aws_glue_catalog_database" "bovespa_database" {
   name        = "bovespa_database"
@@ -41,13 +53,19 @@ resource "aws_glue_job" "bovespa_etl" {
   }
 
   default_arguments = {
-    "--job-bookmark-option"                     = "job-bookmark-enable"
+    "--job-bookmark-option"                     = "job-bookmark-disable" # o trigger passa a lista exata de arquivos
     "--enable-metrics"                          = ""
     "--enable-continuous-cloudwatch-log"       = "true"
     "--enable-glue-datacatalog"                = ""
     "--enable-spark-ui"                         = "true"
     "--spark-event-logs-path"                   = "s3://${aws_s3_bucket.bovespa_data.id}/sparkHistoryLogs/"
     "--additional-python-modules"               = "boto3,pandas"
+    "--extra-py-files"                          = "s3://${aws_s3_bucket.glue_scripts.id}/${aws_s3_object.glue_catalog_module.key}"
+    "--catalog_database"                        = aws_glue_catalog_database.bovespa_database.name
+    "--partition_projection"                    = tostring(var.partition_projection)
+    "--debug"                                   = "false" # true: schemas, contagens por índice e amostra
+    "--target_file_mb"                          = "128"   # tamanho alvo dos arquivos refinados
+    "--ticker_buckets"                          = "1"     # faixas de tickers (arquivos) por pregão
     "--conf"                                    = "spark.sql.adaptive.enabled=true"
     "--conf"                                    = "spark.sql.adaptive.coalescePartitions.enabled=true"
   }
@@ -70,111 +88,13 @@ resource "aws_glue_job" "bovespa_etl" {
 
   depends_on = [
     aws_s3_object.glue_job_script,
+    aws_s3_object.glue_catalog_module,
     aws_glue_catalog_database.bovespa_database
   ]
 }
 
-# Glue Crawler para catalogar dados refinados
-resource "aws_glue_crawler" "bovespa_refined_crawler" {
-  database_name = aws_glue_catalog_database.bovespa_database.name
-  name          = "${var.project_name}-refined-crawler"
-  role          = aws_iam_role.glue_crawler_role.arn
-
-  s3_target {
-    path = "s3://${aws_s3_bucket.bovespa_data.id}/refined-data/bovespa/"
-  }
-
-  configuration = jsonencode({
-    Version = 1.0
-    CrawlerOutput = {
-      Partitions = {
-        AddOrUpdateBehavior = "InheritFromTable"
-      }
-      Tables = {
-        AddOrUpdateBehavior = "MergeNewColumns"
-      }
-    }
-    Grouping = {
-      TableGroupingPolicy = "CombineCompatibleSchemas"
-    }
-  })
-
-  schedule = "cron(0 6 * * ? *)"  # 6:00 AM UTC diariamente
-
-  tags = {
-    Name        = "${var.project_name}-refined-crawler"
-    Environment = var.environment
-  }
-}
-
-# Role para Glue Crawler
-resource "aws_iam_role" "glue_crawler_role" {
-  name = "${var.project_name}-glue-crawler-role"
-
-  assume_role_policy = jsonencode({
-    Version = "2012-10-17"
-    Statement = [
-      {
-        Action = "sts:AssumeRole"
-        Effect = "Allow"
-        Principal = {
-          Service = "glue.amazonaws.com"
-        }
-      }
-    ]
-  })
-}
-
-# Política padrão do Glue para Crawler
-resource "aws_iam_role_policy_attachment" "glue_crawler_service_role" {
-  role       = aws_iam_role.glue_crawler_role.name
-  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSGlueServiceRole"
-}
-
-# Política customizada para Crawler
-resource "aws_iam_role_policy" "glue_crawler_policy" {
-  name = "${var.project_name}-glue-crawler-policy"
-  role = aws_iam_role.glue_crawler_role.id
-
-  policy = jsonencode({
-    Version = "2012-10-17"
-    Statement = [
-      {
-        Effect = "Allow"
-        Action = [
-          "s3:GetObject",
-          "s3:ListBucket"
-        ]
-        Resource = [
-          aws_s3_bucket.bovespa_data.arn,
-          "${aws_s3_bucket.bovespa_data.arn}/*"
-        ]
-      }
-    ]
-  })
-}
-
-# Glue Trigger para iniciar crawler após job ETL
-resource "aws_glue_trigger" "start_crawler_after_etl" {
-  name = "${var.project_name}-start-crawler-trigger"
-  type = "CONDITIONAL"
-
-  actions {
-    crawler_name = aws_glue_crawler.bovespa_refined_crawler.name
-  }
-
-  predicate {
-    conditions {
-      job_name = aws_glue_job.bovespa_etl.name
-      state    = "SUCCEEDED"
-    }
-  }
-
-  tags = {
-    Name        = "${var.project_name}-crawler-trigger"
-    Environment = var.environment
-  }
-}
+# Sem crawler: o job e o ETL rápido registram as partições que gravam
+# (src/trigger/catalog.py), ou o Athena as projeta (var.partition_projection)
 
 # Data source para account ID
 data "aws_caller_identity" "current" {}
@@ -38,7 +38,9 @@ resource "aws_iam_role_policy" "lambda_scraper_policy" {
         Action = [
           "s3:PutObject",
           "s3:PutObjectAcl",
-          "s3:GetObject"
+          "s3:GetObject",
+          "s3:DeleteObject",
+          "s3:AbortMultipartUpload"
         ]
         Resource = "${aws_s3_bucket.bovespa_data.arn}/*"
       },
@@ -105,6 +107,72 @@ resource "aws_iam_role_policy" "lambda_trigger_policy" {
           "s3:GetObjectVersion"
         ]
         Resource = "${aws_s3_bucket.bovespa_data.arn}/*"
+      },
+      {
+        # Manifest com a lista de arquivos de lotes grandes e saídas do ETL rápido
+        Effect = "Allow"
+        Action = [
+          "s3:PutObject"
+        ]
+        Resource = [
+          "${aws_s3_bucket.bovespa_data.arn}/glue-batches/*",
+          "${aws_s3_bucket.bovespa_data.arn}/refined-data/*"
+        ]
+      },
+      {
+        # ETL rápido: substitui os arquivos anteriores das partições que grava
+        Effect = "Allow"
+        Action = [
+          "s3:DeleteObject"
+        ]
+        Resource = "${aws_s3_bucket.bovespa_data.arn}/refined-data/*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "s3:ListBucket"
+        ]
+        Resource = aws_s3_bucket.bovespa_data.arn
+        Condition = {
+          StringLike = {
+            "s3:prefix" = "refined-data/*"
+          }
+        }
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes",
+          "sqs:SendMessage" # reentrega dos arquivos de jobs falhos
+        ]
+        Resource = aws_sqs_queue.raw_events.arn
+      },
+      {
+        # Tabelas e partições gravadas pelo ETL rápido
+        Effect = "Allow"
+        Action = [
+          "glue:GetTable",
+          "glue:CreateTable",
+          "glue:UpdateTable",
+          "glue:BatchCreatePartition"
+        ]
+        Resource = [
+          "arn:aws:glue:${var.aws_region}:${data.aws_caller_identity.current.account_id}:catalog",
+          "arn:aws:glue:${var.aws_region}:${data.aws_caller_identity.current.account_id}:database/${aws_glue_catalog_database.bovespa_database.name}",
+          "arn:aws:glue:${var.aws_region}:${data.aws_caller_identity.current.account_id}:table/${aws_glue_catalog_database.bovespa_database.name}/*"
+        ]
+      },
+      {
+        # Ledger das execuções do ETL (duplicatas e fim dos jobs)
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:PutItem",
+          "dynamodb:UpdateItem"
+        ]
+        Resource = aws_dynamodb_table.etl_run_ledger.arn
       }
     ]
   })
@@ -19,8 +19,12 @@ resource "aws_lambda_function" "bovespa_scraper" {
 
   environment {
     variables = {
-      S3_BUCKET_NAME = aws_s3_bucket.bovespa_data.id
-      LOG_LEVEL      = "INFO"
+      S3_BUCKET_NAME           = aws_s3_bucket.bovespa_data.id
+      SCRAPER_INDICES          = join(",", var.scraper_indices)
+      SCRAPER_MAX_ATTEMPTS     = "3"
+      SCRAPER_REQUEST_DEADLINE = "90"
+      SCRAPER_HEDGE_AFTER      = "5"
+      LOG_LEVEL                = "INFO"
     }
   }
 
@@ -35,11 +39,24 @@ resource "aws_lambda_function" "bovespa_scraper" {
   }
 }
 
-# Arquivo ZIP para Lambda Trigger
+# Arquivo ZIP para Lambda Trigger: módulos do trigger e o storage.py do
+# scraper (backend de armazenamento compartilhado, ver STORAGE_BACKEND)
 data "archive_file" "lambda_trigger_zip" {
   type        = "zip"
-  source_dir  = "../src/trigger/"
   output_path = "lambda_trigger.zip"
+
+  dynamic "source" {
+    for_each = fileset("../src/trigger/", "*.{py,txt}")
+    content {
+      content  = file("../src/trigger/${source.value}")
+      filename = source.value
+    }
+  }
+
+  source {
+    content  = file("../src/scraper/storage.py")
+    filename = "storage.py"
+  }
 }
 
 # Lambda Function para Trigger do Glue
@@ -50,14 +67,20 @@ resource "aws_lambda_function" "glue_trigger" {
   handler         = "lambda_function.lambda_handler"
   runtime         = "python3.9"
   timeout         = 300  # 5 minutos
-  memory_size     = 256  # 256 MB
+  memory_size     = 1024 # 1 GB (ETL rápido de lotes pequenos com pyarrow)
 
   source_code_hash = data.archive_file.lambda_trigger_zip.output_base64sha256
 
   environment {
     variables = {
-      GLUE_JOB_NAME = aws_glue_job.bovespa_etl.name
-      LOG_LEVEL     = "INFO"
+      GLUE_JOB_NAME                = aws_glue_job.bovespa_etl.name
+      RUN_LEDGER_TABLE             = aws_dynamodb_table.etl_run_ledger.name
+      FAST_PATH_MAX_BYTES          = "262144" # lotes até 256 KiB rodam na Lambda; 0 envia tudo ao Glue
+      CATALOG_DATABASE             = aws_glue_catalog_database.bovespa_database.name
+      CATALOG_PARTITION_PROJECTION = tostring(var.partition_projection)
+      RAW_EVENTS_QUEUE_URL         = aws_sqs_queue.raw_events.url # reentrega dos arquivos de jobs falhos
+      MAX_RUN_ATTEMPTS             = "3"
+      LOG_LEVEL                    = "INFO"
     }
   }
 
@@ -91,13 +114,34 @@ resource "aws_cloudwatch_log_group" "lambda_trigger_logs" {
   }
 }
 
-# Permissão para S3 invocar Lambda Trigger
-resource "aws_lambda_permission" "allow_s3_invoke_trigger" {
-  statement_id  = "AllowExecutionFromS3Bucket"
-  action        = "lambda:InvokeFunction"
-  function_name = aws_lambda_function.glue_trigger.function_name
-  principal     = "s3.amazonaws.com"
-  source_arn    = aws_s3_bucket.bovespa_data.arn
+# Arquivos de jobs falhos que esgotaram as tentativas (ou sem fila para a reentrega)
+resource "aws_cloudwatch_log_metric_filter" "etl_run_abandoned" {
+  name           = "${var.project_name}-etl-run-abandoned"
+  log_group_name = aws_cloudwatch_log_group.lambda_trigger_logs.name
+  pattern        = "ETL_RUN_ABANDONED"
+
+  metric_transformation {
+    name      = "EtlRunAbandoned"
+    namespace = "${var.project_name}/etl"
+    value     = "1"
+  }
+}
+
+resource "aws_cloudwatch_metric_alarm" "etl_run_abandoned" {
+  alarm_name          = "${var.project_name}-etl-run-abandoned"
+  alarm_description   = "Job do ETL falhou e os arquivos não serão reenviados (ver o evento ETL_RUN_ABANDONED no log do trigger)"
+  namespace           = "${var.project_name}/etl"
+  metric_name         = "EtlRunAbandoned"
+  statistic           = "Sum"
+  period              = 300
+  evaluation_periods  = 1
+  threshold           = 1
+  comparison_operator = "GreaterThanOrEqualToThreshold"
+  treat_missing_data  = "notBreaching"
+
+  tags = {
+    Environment = var.environment
+  }
 }
 
 # Permissão para EventBridge invocar Lambda Scraper
@@ -134,3 +178,65 @@ resource "aws_cloudwatch_event_target" "lambda_target" {
     }
   })
 }
+
+# Compactação mensal da camada raw (meses fechados viram um arquivo por mês)
+resource "aws_cloudwatch_event_rule" "monthly_compaction" {
+  name                = "${var.project_name}-monthly-raw-compaction"
+  description         = "Compacta os meses fechados da camada raw"
+  schedule_expression = "cron(0 6 8 * ? *)"  # dia 8 de cada mês, 06:00 UTC
+
+  tags = {
+    Environment = var.environment
+  }
+}
+
+resource "aws_cloudwatch_event_target" "compaction_target" {
+  rule      = aws_cloudwatch_event_rule.monthly_compaction.name
+  target_id = "TargetLambdaCompaction"
+  arn       = aws_lambda_function.bovespa_scraper.arn
+
+  input = jsonencode({
+    "compact": {}
+  })
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_invoke_compaction" {
+  statement_id  = "AllowCompactionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.bovespa_scraper.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.monthly_compaction.arn
+}
+
+# Fim dos jobs do ETL: o trigger registra o resultado no ledger de execuções
+resource "aws_cloudwatch_event_rule" "glue_job_state_change" {
+  name        = "${var.project_name}-glue-job-state-change"
+  description = "Registra o fim dos jobs do ETL no ledger de execuções"
+
+  event_pattern = jsonencode({
+    "source": ["aws.glue"],
+    "detail-type": ["Glue Job State Change"],
+    "detail": {
+      "jobName": [aws_glue_job.bovespa_etl.name],
+      "state": ["SUCCEEDED", "FAILED", "TIMEOUT", "STOPPED"]
+    }
+  })
+
+  tags = {
+    Environment = var.environment
+  }
+}
+
+resource "aws_cloudwatch_event_target" "glue_job_state_target" {
+  rule      = aws_cloudwatch_event_rule.glue_job_state_change.name
+  target_id = "TargetLambdaTriggerLedger"
+  arn       = aws_lambda_function.glue_trigger.arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_invoke_trigger" {
+  statement_id  = "AllowJobStateFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.glue_trigger.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.glue_job_state_change.arn
+}
@@ -33,6 +33,18 @@ variable "environment" {
   default     = "dev"
 }
 
+variable "scraper_indices" {
+  description = "Índices da B3 coletados em cada execução do scraper"
+  type        = list(string)
+  default     = ["IBOV", "IBXX", "IBXL", "SMLL", "IDIV"]
+}
+
+variable "partition_projection" {
+  description = "Tabelas refinadas com partition projection do Athena (sem registro de partições)"
+  type        = bool
+  default     = false
+}
+
 # Outputs
 output "s3_bucket_name" {
   description = "Nome do bucket S3"
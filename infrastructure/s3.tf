@@ -45,18 +45,24 @@ resource "aws_s3_bucket_lifecycle_configuration" "bovespa_data_lifecycle" {
       prefix = "raw-data/"
     }
 
+    # Sem GLACIER e sem expiração: o --reprocess e a compactação mensal
+    # leem a camada raw de qualquer período, e o STANDARD_IA continua
+    # com leitura imediata
     transition {
       days          = 30
       storage_class = "STANDARD_IA"
     }
+  }
 
-    transition {
-      days          = 90
-      storage_class = "GLACIER"
-    }
+  # Multipart uploads interrompidos (Lambda encerrada no meio do envio)
+  rule {
+    id     = "abort_incomplete_multipart_uploads"
+    status = "Enabled"
 
-    expiration {
-      days = 365
+    filter {}
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
     }
   }
 
@@ -78,20 +84,35 @@ resource "aws_s3_bucket_lifecycle_configuration" "bovespa_data_lifecycle" {
       storage_class = "GLACIER"
     }
   }
+
+  # Manifests com a lista de arquivos dos lotes do trigger
+  rule {
+    id     = "glue_batch_manifests"
+    status = "Enabled"
+
+    filter {
+      prefix = "glue-batches/"
+    }
+
+    expiration {
+      days = 30
+    }
+  }
 }
 
-# Notificação S3 para acionar Lambda
+# Notificação S3 para a fila do trigger
 resource "aws_s3_bucket_notification" "bovespa_data_notification" {
   bucket = aws_s3_bucket.bovespa_data.id
 
-  lambda_function {
-    lambda_function_arn = aws_lambda_function.glue_trigger.arn
-    events              = ["s3:ObjectCreated:*"]
-    filter_prefix       = "raw-data/bovespa/"
-    filter_suffix       = ".parquet"
+  # Notificações vão para a fila (ver sqs.tf), que entrega lotes ao trigger
+  queue {
+    queue_arn     = aws_sqs_queue.raw_events.arn
+    events        = ["s3:ObjectCreated:*"]
+    filter_prefix = "raw-data/bovespa/"
+    filter_suffix = ".parquet"
   }
 
-  depends_on = [aws_lambda_permission.allow_s3_invoke_trigger]
+  depends_on = [aws_sqs_queue_policy.raw_events_from_s3]
 }
 
 # Política de acesso público (bloqueado por segurança)
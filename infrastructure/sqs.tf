@@ -0,0 +1,62 @@
+# Fila das notificações da camada raw
+# O bucket publica cada novo parquet na fila; o trigger recebe lotes acumulados
+# pela janela de batching e inicia um único job do Glue por lote
+resource "aws_sqs_queue" "raw_events_dlq" {
+  name                      = "${var.project_name}-raw-events-dlq"
+  message_retention_seconds = 1209600 # 14 dias
+
+  tags = {
+    Environment = var.environment
+  }
+}
+
+resource "aws_sqs_queue" "raw_events" {
+  name                       = "${var.project_name}-raw-events"
+  message_retention_seconds  = 345600 # 4 dias
+  # Mínimo de 6x o timeout do trigger (recomendação para event source mappings)
+  visibility_timeout_seconds = 1800
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.raw_events_dlq.arn
+    # Lotes recusados (ex.: limite de execuções do job) voltam à fila e são reentregues
+    maxReceiveCount = 10
+  })
+
+  tags = {
+    Environment = var.environment
+  }
+}
+
+# Permite que o bucket publique na fila
+resource "aws_sqs_queue_policy" "raw_events_from_s3" {
+  queue_url = aws_sqs_queue.raw_events.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect    = "Allow"
+        Principal = { Service = "s3.amazonaws.com" }
+        Action    = "sqs:SendMessage"
+        Resource  = aws_sqs_queue.raw_events.arn
+        Condition = {
+          ArnEquals = { "aws:SourceArn" = aws_s3_bucket.bovespa_data.arn }
+        }
+      }
+    ]
+  })
+}
+
+# Janela de debounce: até 1000 notificações acumuladas por até 2 minutos
+# viram uma única invocação do trigger (e um único job do Glue)
+resource "aws_lambda_event_source_mapping" "raw_events_to_trigger" {
+  event_source_arn                   = aws_sqs_queue.raw_events.arn
+  function_name                      = aws_lambda_function.glue_trigger.arn
+  batch_size                         = 1000
+  maximum_batching_window_in_seconds = 120
+
+  # Poucas invocações simultâneas: cada uma inicia um job do Glue
+  scaling_config {
+    maximum_concurrency = 2
+  }
+}
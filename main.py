@@ -8,7 +8,7 @@ import os
 import sys
 import json
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 
 # Adicionar diretório src ao path
@@ -39,6 +39,9 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Prefixo dos exports CSV/JSON no armazenamento (fora da camada raw)
+EXPORT_PREFIX = "exports/bovespa"
+
 def main():
     """Função principal da aplicação"""
     print("🚀 Iniciando Pipeline Bovespa...")
@@ -59,20 +62,19 @@ def main():
         
         # 2. Fazer scraping dos dados
         print("🔄 2. Fazendo scraping dos dados da B3...")
-        dados_bovespa = scraper.fetch_ibov_data()
+        tabela_bovespa = scraper.fetch_ibov_table()
         
-        if not dados_bovespa:
+        if not tabela_bovespa.num_rows:
             print("❌ Nenhum dado foi obtido do scraping")
             return
         
-        print(f"✅ {len(dados_bovespa)} registros obtidos com sucesso!")
+        print(f"✅ {tabela_bovespa.num_rows} registros obtidos com sucesso!")
         
         # 3. Mostrar amostra dos dados
         print("📊 3. Amostra dos dados obtidos:")
         print("-" * 80)
         
-        import pandas as pd
-        df = pd.DataFrame(dados_bovespa)
+        df = tabela_bovespa.to_pandas()
         
         # Mostrar estatísticas básicas
         print(f"📈 Total de ações: {len(df)}")
@@ -88,19 +90,32 @@ def main():
         for i, row in top_10.iterrows():
             print(f"{row['codigo_acao']:>6} - {row['nome_empresa']:<25} - {row['percentual_participacao']:>6.3f}% - {row['tipo_acao']}")
         
-        # 4. Salvar dados localmente
-        print("\n💾 4. Salvando dados localmente...")
+        # 4. Salvar dados no armazenamento do pipeline (diretório local por padrão)
+        from scraper.storage import storage_from_env
+        from scraper.page_archive import raw_object_key
+        from scraper.columnar import with_partition_columns
+        from scraper.raw_schema import write_raw_parquet
+        
+        storage = storage_from_env(bucket_name, default_backend='local')
+        print(f"\n💾 4. Salvando dados em {storage.uri('')}...")
         
-        # Salvar CSV
-        csv_filename = f"bovespa_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        df.to_csv(csv_filename, index=False, encoding='utf-8')
-        print(f"✅ Dados salvos em: {csv_filename}")
+        # Partição raw no mesmo layout da Lambda (lida pela API e pelo ETL)
+        date_str = str(tabela_bovespa['data_pregao'][0].as_py())
+        raw_key = raw_object_key(date_str)
+        with storage.open_write(raw_key, metadata={'source': 'B3_SCRAPER_LOCAL', 'date': date_str}) as handle:
+            write_raw_parquet(with_partition_columns(tabela_bovespa, date_str), handle)
+        print(f"✅ Partição raw salva em: {storage.uri(raw_key)}")
         
-        # Salvar JSON
-        json_filename = f"bovespa_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        with open(json_filename, 'w', encoding='utf-8') as f:
-            json.dump(dados_bovespa, f, ensure_ascii=False, indent=2, default=str)
-        print(f"✅ Dados salvos em: {json_filename}")
+        # Exports CSV e JSON
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        csv_key = f"{EXPORT_PREFIX}/bovespa_data_{timestamp}.csv"
+        storage.write(csv_key, df.to_csv(index=False).encode('utf-8'), 'text/csv')
+        print(f"✅ Dados salvos em: {storage.uri(csv_key)}")
+        
+        json_key = f"{EXPORT_PREFIX}/bovespa_data_{timestamp}.json"
+        storage.write(json_key, json.dumps(tabela_bovespa.to_pylist(), ensure_ascii=False, indent=2,
+                                           default=str).encode('utf-8'), 'application/json')
+        print(f"✅ Dados salvos em: {storage.uri(json_key)}")
         
         # 5. Análise por tipo de ação
         print("\n📊 5. Análise por tipo de ação:")
@@ -114,14 +129,6 @@ def main():
         tipos_analise.columns = ['Quantidade', 'Participação_Total', 'Participação_Média', 'Maior_Participação']
         print(tipos_analise)
         
-        # 6. Teste de conversão Parquet (se pyarrow estiver disponível)
-        try:
-            parquet_filename = f"bovespa_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
-            df.to_parquet(parquet_filename, index=False)
-            print(f"✅ Dados salvos em formato Parquet: {parquet_filename}")
-        except ImportError:
-            print("⚠️ PyArrow não disponível - pulando conversão Parquet")
-        
         print("\n🎉 Pipeline executado com sucesso!")
         print("=" * 60)
         
@@ -163,6 +170,205 @@ def test_components():
         print(f"❌ Erro nos testes: {e}")
         return False
 
+def run_backfill(argv):
+    """Executa o backfill histórico concorrente para um intervalo de datas"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="python main.py --backfill",
+                                     description="Backfill histórico da carteira do IBOV")
+    parser.add_argument("start_date", help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument("end_date", nargs="?", help="Data final (YYYY-MM-DD), padrão = data inicial")
+    parser.add_argument("--workers", type=int, default=4, help="Requisições concorrentes (padrão: 4)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Limite de requisições/s por host (padrão: 2.0)")
+    parser.add_argument("--bucket", help="Bucket S3 de destino (padrão: configuração do .env)")
+    parser.add_argument("--data-dir", help="Grava as partições em um diretório local em vez do bucket")
+    args = parser.parse_args(argv)
+    
+    # Importação tardia: o scraper da Lambda depende do boto3
+    from scraper.lambda_function import B3Scraper as LambdaB3Scraper
+    from scraper.backfill import BackfillRunner
+    
+    if args.data_dir:
+        os.environ['STORAGE_BACKEND'] = 'local'
+        os.environ['STORAGE_LOCAL_DIR'] = args.data_dir
+        bucket_name = args.data_dir
+    elif args.bucket:
+        bucket_name = args.bucket
+    elif CONFIG_AVAILABLE:
+        bucket_name = config.s3_bucket_name
+    else:
+        print("❌ Informe o bucket com --bucket ou o diretório com --data-dir")
+        return False
+    
+    end_date = args.end_date or args.start_date
+    print(f"🚀 Backfill de {args.start_date} a {end_date} em {bucket_name}")
+    print(f"⚙️  {args.workers} workers, limite de {args.rate} req/s")
+    
+    runner = BackfillRunner(LambdaB3Scraper(bucket_name), max_workers=args.workers, rate_limit=args.rate)
+    summary = runner.run(args.start_date, end_date)
+    
+    print(f"✅ {summary['written_days']}/{summary['requested_days']} dias gravados "
+          f"({summary['records_count']} registros)")
+    print(f"⏱️  {summary['elapsed_seconds']}s - {summary['days_per_second']} dias/s")
+    
+    if summary['empty_days']:
+        print(f"⚠️  Dias sem dados: {', '.join(summary['empty_days'])}")
+    for failure in summary['failed_days']:
+        print(f"❌ {failure['date']}: {failure['error']}")
+    
+    return not summary['failed_days']
+
+def run_replay(argv):
+    """Reconstrói as partições raw a partir das respostas arquivadas, sem acessar a B3"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="python main.py --replay",
+                                     description="Replay das respostas arquivadas da B3")
+    parser.add_argument("start_date", nargs="?", help="Data inicial (YYYY-MM-DD), padrão = todo o arquivo")
+    parser.add_argument("end_date", nargs="?", help="Data final (YYYY-MM-DD), padrão = data inicial")
+    parser.add_argument("--archive-dir", help="Arquivo local; as partições são gravadas no mesmo diretório")
+    parser.add_argument("--bucket", help="Bucket S3 do arquivo e das partições (padrão: configuração do .env)")
+    args = parser.parse_args(argv)
+    
+    # Arquivo e partições no mesmo armazenamento (diretório local ou bucket)
+    os.environ['SCRAPER_ARCHIVE_BACKEND'] = 's3'
+    if args.archive_dir:
+        os.environ['STORAGE_BACKEND'] = 'local'
+        os.environ['STORAGE_LOCAL_DIR'] = args.archive_dir
+        bucket_name = args.archive_dir
+    elif args.bucket:
+        bucket_name = args.bucket
+    elif CONFIG_AVAILABLE:
+        bucket_name = config.s3_bucket_name
+    else:
+        print("❌ Informe o arquivo com --archive-dir ou o bucket com --bucket")
+        return False
+    
+    # Importação tardia: o scraper da Lambda depende do boto3
+    from scraper.lambda_function import B3Scraper as LambdaB3Scraper
+    
+    scraper = LambdaB3Scraper(bucket_name)
+    end_date = args.end_date or args.start_date
+    dates = scraper.archive.archived_dates(args.start_date, end_date)
+    
+    if not dates:
+        print("⚠️  Nenhuma resposta arquivada no intervalo")
+        return False
+    
+    print(f"🔁 Replay de {len(dates)} pregões ({dates[0]} a {dates[-1]})")
+    failures = 0
+    
+    for date_str in dates:
+        try:
+            table = scraper.replay_from_archive(date_str)
+            if not table.num_rows:
+                print(f"⚠️  {date_str}: resposta arquivada sem ações")
+                continue
+            
+            destination = scraper.save_to_s3_parquet(table, date_str)
+            
+            print(f"✅ {date_str}: {table.num_rows} registros -> {destination}")
+        except Exception as e:
+            failures += 1
+            print(f"❌ {date_str}: {e}")
+    
+    return failures == 0
+
+def run_compaction(argv):
+    """Compacta os meses fechados da camada raw em um arquivo por mês"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="python main.py --compact",
+                                     description="Compactação mensal da camada raw")
+    parser.add_argument("start_month", nargs="?", help="Primeiro mês (YYYY-MM), padrão = todos")
+    parser.add_argument("end_month", nargs="?", help="Último mês (YYYY-MM), padrão = todos")
+    parser.add_argument("--data-dir", help="Camada raw local (mesmo layout do bucket)")
+    parser.add_argument("--bucket", help="Bucket S3 da camada raw (padrão: configuração do .env)")
+    parser.add_argument("--grace-days", type=int, default=5,
+                        help="Dias após o fim do mês antes de compactá-lo (padrão: 5)")
+    parser.add_argument("--dry-run", action="store_true", help="Só lista os meses pendentes")
+    args = parser.parse_args(argv)
+    
+    from scraper.compaction import RawCompactor
+    from scraper.storage import LocalObjectStore, S3ObjectStore
+    
+    if args.data_dir:
+        store = LocalObjectStore(args.data_dir)
+    else:
+        bucket_name = args.bucket or (config.s3_bucket_name if CONFIG_AVAILABLE else None)
+        if not bucket_name:
+            print("❌ Informe a camada raw com --data-dir ou o bucket com --bucket")
+            return False
+        store = S3ObjectStore(bucket_name)
+    
+    compactor = RawCompactor(store, grace_days=args.grace_days)
+    summary = compactor.run(args.start_month, args.end_month or args.start_month, dry_run=args.dry_run)
+    
+    for month in summary['months']:
+        if month['status'] == 'dry_run':
+            print(f"📋 {month['month']}: {month['replaced_files']} diários pendentes "
+                  f"({month['bytes_before'] / 1024:.1f} KB)")
+        else:
+            print(f"✅ {month['month']}: {month['replaced_files']} arquivos -> 1 "
+                  f"({month['rows']} linhas, {month['bytes_before'] / 1024:.1f} KB -> "
+                  f"{(month['bytes_after'] or 0) / 1024:.1f} KB)")
+    for month in summary['failed_months']:
+        print(f"❌ {month}: falha na compactação")
+    if not summary['months'] and not summary['failed_months']:
+        print("✅ Nenhum mês fechado pendente de compactação")
+    
+    return not summary['failed_months']
+
+def run_reprocess(argv):
+    """Reprocessa um intervalo de pregões da camada raw em uma única execução do job do Glue"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="python main.py --reprocess",
+                                     description="Reprocessamento (ETL) de um intervalo de pregões")
+    parser.add_argument("start_date", help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument("end_date", nargs="?", help="Data final (YYYY-MM-DD), padrão = data inicial")
+    parser.add_argument("--job", help="Job do Glue (padrão: configuração do .env)")
+    parser.add_argument("--bucket", help="Bucket S3 da camada raw e dos refinados (padrão: configuração do .env)")
+    parser.add_argument("--dry-run", action="store_true", help="Só mostra os argumentos do job")
+    args = parser.parse_args(argv)
+    
+    end_date = args.end_date or args.start_date
+    try:
+        first, last = datetime.strptime(args.start_date, '%Y-%m-%d'), datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        print("❌ Datas devem estar no formato YYYY-MM-DD")
+        return False
+    if last < first:
+        print(f"❌ Intervalo inválido: {args.start_date} a {end_date}")
+        return False
+    
+    job_name = args.job or (config.glue_job_name if CONFIG_AVAILABLE else None)
+    bucket_name = args.bucket or (config.s3_bucket_name if CONFIG_AVAILABLE else None)
+    if not job_name or not bucket_name:
+        print("❌ Informe o job com --job e o bucket com --bucket")
+        return False
+    
+    # Um único job lê os meses do intervalo e grava todas as partições
+    # afetadas; sem bookmark, para reler arquivos já processados
+    job_arguments = {
+        '--source_bucket': bucket_name,
+        '--target_bucket': bucket_name,
+        '--start_date': args.start_date,
+        '--end_date': end_date,
+        '--job-bookmark-option': 'job-bookmark-disable'
+    }
+    
+    print(f"🔁 Reprocessamento de {args.start_date} a {end_date} ({(last - first).days + 1} dias) em um job")
+    if args.dry_run:
+        print(f"📋 {job_name}: {json.dumps(job_arguments, ensure_ascii=False)}")
+        return True
+    
+    import boto3
+    
+    response = boto3.client('glue').start_job_run(JobName=job_name, Arguments=job_arguments)
+    print(f"✅ Job {job_name} iniciado: {response['JobRunId']}")
+    return True
+
 def show_help():
     """Mostra ajuda de uso"""
     print("📚 Ajuda - Pipeline Bovespa")
@@ -172,14 +378,31 @@ def show_help():
     print("Opções:")
     print("  (sem argumentos)  - Executa pipeline completo")
     print("  --test           - Executa testes dos componentes")
+    print("  --backfill INICIO [FIM] [--workers N] [--rate R] [--bucket B | --data-dir DIR]")
+    print("                   - Backfill histórico concorrente para o S3 (ou diretório local)")
+    print("  --replay [INICIO] [FIM] [--archive-dir DIR | --bucket B]")
+    print("                   - Reconstrói as partições raw a partir das respostas arquivadas")
+    print("  --compact [MES_INICIO] [MES_FIM] [--data-dir DIR | --bucket B] [--dry-run]")
+    print("                   - Compacta os meses fechados da camada raw (um arquivo por mês)")
+    print("  --reprocess INICIO [FIM] [--job NOME] [--bucket B] [--dry-run]")
+    print("                   - Reprocessa o intervalo no Glue em uma única execução do job")
     print("  --help           - Mostra esta ajuda")
     print()
+    print("Armazenamento (variáveis de ambiente ou .env):")
+    print("  STORAGE_BACKEND=local|s3  - Diretório local (padrão do pipeline local) ou bucket S3")
+    print("  STORAGE_LOCAL_DIR=DIR     - Raiz do armazenamento local (padrão: ./data)")
+    print("  STORAGE_S3_ENDPOINT_URL   - S3 local (MinIO, moto) em vez da AWS")
+    print()
     print("Funcionalidades:")
     print("  • Web scraping do site da B3")
     print("  • Processamento dos dados do IBOV")
     print("  • Análises estatísticas básicas")
-    print("  • Export para CSV, JSON e Parquet")
+    print("  • Partição raw e exports CSV/JSON no armazenamento (local ou S3)")
     print("  • Logs detalhados de execução")
+    print("  • Backfill histórico com concorrência limitada")
+    print("  • Arquivo das respostas da B3 com replay offline")
+    print("  • Compactação mensal da camada raw")
+    print("  • Reprocessamento de intervalos em um único job do Glue")
 
 if __name__ == "__main__":
     # Processar argumentos da linha de comando
@@ -190,6 +413,18 @@ if __name__ == "__main__":
             show_help()
         elif arg in ['--test', '-t', 'test']:
             test_components()
+        elif arg == '--backfill':
+            success = run_backfill(sys.argv[2:])
+            sys.exit(0 if success else 1)
+        elif arg == '--replay':
+            success = run_replay(sys.argv[2:])
+            sys.exit(0 if success else 1)
+        elif arg == '--compact':
+            success = run_compaction(sys.argv[2:])
+            sys.exit(0 if success else 1)
+        elif arg == '--reprocess':
+            success = run_reprocess(sys.argv[2:])
+            sys.exit(0 if success else 1)
         else:
             print(f"❌ Argumento desconhecido: {arg}")
             show_help()
@@ -1,14 +1,22 @@
 import sys
 from awsglue.transforms import *
 from awsglue.utils import getResolvedOptions
+from pyspark import StorageLevel
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
-from awsglue.dynamicframe import DynamicFrame
+from awsglue.gluetypes import ChoiceType
+from pyspark.sql import Window
 from pyspark.sql import functions as F
 from pyspark.sql.types import *
 from datetime import datetime, timedelta
+import json
 import logging
+import time
+
+# Módulo compartilhado com o trigger (src/trigger/catalog.py), enviado ao
+# job em --extra-py-files
+from catalog import OUTPUT_TABLES, create_catalog
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -18,11 +26,176 @@ logger = logging.getLogger(__name__)
 args = getResolvedOptions(sys.argv, [
     'JOB_NAME',
     'source_bucket',
-    'source_key',
-    'target_bucket',
-    'processing_date'
+    'target_bucket'
 ])
 
+
+def optional_argument(name, default=None):
+    """Valor de um argumento opcional do job (--name), ou `default` se ausente"""
+    if f'--{name}' not in sys.argv:
+        return default
+    return getResolvedOptions(sys.argv, [name])[name]
+
+
+# Argumento opcional: índices esperados na partição raw (metadado 'indices' do objeto)
+expected_indices = [i for i in optional_argument('indices', '').split(',') if i]
+
+# Argumento opcional: raiz do armazenamento no lugar de s3://<bucket> (ex.:
+# file:///dados/bovespa para o layout do backend local, ver src/scraper/storage.py)
+source_root = f"s3://{args['source_bucket']}"
+target_root = f"s3://{args['target_bucket']}"
+if optional_argument('storage_root'):
+    source_root = target_root = optional_argument('storage_root').rstrip('/')
+
+# Arquivos raw do lote: lista em --source_keys (separada por vírgulas), em um
+# manifest no bucket (--source_manifest, uma chave por linha) ou uma única
+# chave em --source_key (formato anterior ao lote)
+source_keys = [key for key in optional_argument('source_keys', '').split(',') if key]
+if optional_argument('source_key'):
+    source_keys.append(optional_argument('source_key'))
+source_manifest = optional_argument('source_manifest')
+
+# Modo intervalo (reprocessamento e backfill): --start_date e --end_date
+# (YYYY-MM-DD) leem todos os meses raw do intervalo em um único job, pelos
+# prefixos year=/month= (diários e arquivos compactados), em vez de uma
+# execução por pregão
+start_date = optional_argument('start_date')
+end_date = optional_argument('end_date', start_date)
+
+# Argumento opcional: --debug true liga as ações de diagnóstico (schemas,
+# contagens por índice e amostra), cada uma uma passada extra no Spark
+debug = optional_argument('debug', 'false').lower() == 'true'
+
+# Layout dos refinados: partição só por pregão, linhas ordenadas por ticker
+# dentro do arquivo e arquivos de até --target_file_mb (pelo tamanho estimado
+# da linha em parquet). Com --ticker_buckets N cada pregão é dividido em N
+# arquivos com faixas contíguas de tickers (estatísticas min/max por arquivo)
+REFINED_PARTITION_KEYS = ["partition_year", "partition_month", "partition_day"]
+ESTIMATED_BYTES_PER_ROW = 100
+target_file_mb = int(optional_argument('target_file_mb', '128'))
+ticker_buckets = max(1, int(optional_argument('ticker_buckets', '1')))
+max_records_per_file = max(1, target_file_mb * 1024 * 1024 // ESTIMATED_BYTES_PER_ROW)
+
+# Catálogo: registra as partições gravadas (--catalog_backend glue, local ou
+# none). Com --partition_projection true as tabelas usam partition projection
+# do Athena e nenhuma partição é registrada
+catalog = create_catalog(
+    optional_argument('catalog_backend', 'glue'),
+    database=optional_argument('catalog_database', 'bovespa_database'),
+    path=optional_argument('catalog_path', 'catalog.json'),
+    projection=optional_argument('partition_projection', 'false').lower() == 'true'
+)
+
+# Camada raw (ver src/scraper/page_archive.py); os manifests da compactação
+# mensal e as respostas arquivadas da B3 (gzip e latest.json em day=*/_archive/)
+# ficam fora da leitura recursiva do modo intervalo
+RAW_PREFIX = "raw-data/bovespa"
+RAW_EXCLUSIONS = json.dumps(["**/_compaction/**", "**/_archive/**"])
+
+# Variações diárias: o pregão anterior é o dia mais recente do lote ou com
+# partição refinada gravada até N dias antes (fins de semana e feriados)
+PREVIOUS_DAY_LOOKBACK_DAYS = 10
+SNAPSHOT_COLUMNS = ["data_pregao_date", "indice", "ticker_symbol", "company_name",
+                    "participation_percentage", "theoretical_quantity"]
+
+# Tipos das colunas raw no schema atual (src/scraper/raw_schema.py). Arquivos
+# gravados antes dele têm data_pregao/data_extracao em string e números em
+# double; lidos juntos com os novos, essas colunas viram choice no
+# DynamicFrame. Colunas dictionary-encoded já chegam como string no Spark
+RAW_COLUMN_TYPES = {
+    "data_pregao": DateType(),
+    "indice": StringType(),
+    "codigo_acao": StringType(),
+    "nome_empresa": StringType(),
+    "tipo_acao": StringType(),
+    "quantidade_teorica": LongType(),
+    "percentual_participacao": DecimalType(9, 3),
+    "data_extracao": TimestampType(),
+    "fonte": StringType(),
+}
+
+# Tipo comum para onde cada coluna choice é resolvida antes da conversão final
+RAW_CHOICE_CASTS = {
+    "data_pregao": "string",
+    "data_extracao": "string",
+    "quantidade_teorica": "double",
+    "percentual_participacao": "double",
+}
+
+# Motivos de rejeição na limpeza, na ordem em que são avaliados
+REJECTION_REASONS = [
+    'codigo_acao_nulo',
+    'codigo_acao_invalido',
+    'quantidade_teorica_nula',
+    'percentual_participacao_nulo'
+]
+
+
+def processing_date_from_key(key):
+    """Data do pregão (YYYY-MM-DD) a partir de year=/month=/day= da chave raw (None para arquivos mensais)"""
+    parts = dict(part.split('=', 1) for part in key.split('/') if '=' in part)
+    if 'day' not in parts:
+        return None
+    return f"{int(parts['year']):04d}-{int(parts['month']):02d}-{int(parts['day']):02d}"
+
+
+def month_prefixes(first_date, last_date):
+    """Prefixos raw year=/month= dos meses entre duas datas (YYYY-MM-DD)"""
+    year, month = int(first_date[:4]), int(first_date[5:7])
+    prefixes = []
+    while (year, month) <= (int(last_date[:4]), int(last_date[5:7])):
+        prefixes.append(f"{RAW_PREFIX}/year={year}/month={month:02d}/")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return prefixes
+
+
+def refined_partition(trade_date):
+    """Partição refinada de um pregão (YYYY-MM-DD), como gravada pelo writer"""
+    parsed = datetime.strptime(trade_date, '%Y-%m-%d')
+    return f"partition_year={parsed.year}/partition_month={parsed.month}/partition_day={parsed.day}"
+
+
+def previous_trade_date(trade_date, batch_dates, exists):
+    """Pregão anterior: o dia mais recente do lote ou para o qual exists(dia) é verdadeiro (None se não houver)"""
+    parsed = datetime.strptime(trade_date, '%Y-%m-%d')
+    for offset in range(1, PREVIOUS_DAY_LOOKBACK_DAYS + 1):
+        candidate = (parsed - timedelta(days=offset)).strftime('%Y-%m-%d')
+        if candidate in batch_dates or exists(candidate):
+            return candidate
+    return None
+
+
+def conform_raw_frame(dynamic_frame):
+    """DataFrame com as colunas raw nos tipos de RAW_COLUMN_TYPES, qualquer que seja o schema do arquivo"""
+    choice_specs = [(field.name, f"cast:{RAW_CHOICE_CASTS.get(field.name, 'string')}")
+                    for field in dynamic_frame.schema().fields
+                    if isinstance(field.dataType, ChoiceType)]
+    if choice_specs:
+        logger.info(f"Schemas raw misturados no lote, resolvendo: {choice_specs}")
+        dynamic_frame = dynamic_frame.resolveChoice(specs=choice_specs)
+
+    df = dynamic_frame.toDF()
+    for name, data_type in RAW_COLUMN_TYPES.items():
+        if name not in df.columns:
+            continue
+        if isinstance(data_type, DateType):
+            column = F.to_date(F.col(name))
+        elif isinstance(data_type, TimestampType):
+            column = F.to_timestamp(F.col(name))
+        elif isinstance(data_type, LongType):
+            column = F.round(F.col(name).cast("double")).cast(data_type)
+        else:
+            column = F.col(name).cast(data_type)
+        df = df.withColumn(name, column)
+    return df
+
+
+def path_exists(path):
+    """Existência de um caminho no armazenamento (s3:// ou file://), pelo FileSystem do Hadoop"""
+    hadoop_path = sc._jvm.org.apache.hadoop.fs.Path(path)
+    return hadoop_path.getFileSystem(sc._jsc.hadoopConfiguration()).exists(hadoop_path)
+
+
 # Inicializar contextos do Glue
 sc = SparkContext()
 glueContext = GlueContext(sc)
@@ -30,57 +203,144 @@ spark = glueContext.spark_session
 job = Job(glueContext)
 job.init(args['JOB_NAME'], args)
 
+# Gravações idempotentes: mode("overwrite") substitui só as partições
+# presentes no DataFrame (pregões do lote), nunca a tabela inteira.
+# Reexecuções (rescrapes, reprocessamentos) não duplicam linhas
+spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
+
 logger.info(f"Iniciando job Glue: {args['JOB_NAME']}")
-logger.info(f"Processando arquivo: s3://{args['source_bucket']}/{args['source_key']}")
+job_started = time.time()
+
+if source_manifest:
+    manifest_rows = spark.read.text(f"{source_root}/{source_manifest}").collect()
+    source_keys.extend(row.value.strip() for row in manifest_rows if row.value.strip())
+source_keys = sorted(set(source_keys))
+
+if start_date:
+    if source_keys:
+        raise ValueError("Informe um intervalo (--start_date/--end_date) ou arquivos raw, não ambos")
+    if end_date < start_date:
+        raise ValueError(f"Intervalo inválido: {start_date} a {end_date}")
+    raw_data_paths = [f"{source_root}/{prefix}" for prefix in month_prefixes(start_date, end_date)]
+    logger.info(f"Processando {len(raw_data_paths)} meses raw de {start_date} a {end_date}")
+else:
+    if not source_keys:
+        raise ValueError("Nenhum arquivo raw informado (--source_keys, --source_manifest, --source_key "
+                         "ou --start_date/--end_date)")
+    raw_data_paths = [f"{source_root}/{key}" for key in source_keys]
+    key_dates = sorted({date for date in map(processing_date_from_key, source_keys) if date})
+    logger.info(f"Processando {len(source_keys)} arquivos raw"
+                + (f" de {key_dates[0]} a {key_dates[-1]}" if key_dates else ""))
 
 try:
     # ETAPA 1: LEITURA DOS DADOS BRUTOS
     logger.info("=== ETAPA 1: LEITURA DOS DADOS ===")
     
-    # Criar DynamicFrame a partir do arquivo parquet no S3
-    raw_data_path = f"s3://{args['source_bucket']}/{args['source_key']}"
-    
+    # Criar DynamicFrame com todos os arquivos parquet do lote (uma única leitura)
     raw_dynamic_frame = glueContext.create_dynamic_frame.from_options(
         connection_type="s3",
         connection_options={
-            "paths": [raw_data_path],
-            "recurse": True
+            "paths": raw_data_paths,
+            "recurse": True,
+            "exclusions": RAW_EXCLUSIONS
         },
         format="parquet",
         transformation_ctx="raw_data_source"
     )
     
-    logger.info(f"Registros lidos: {raw_dynamic_frame.count()}")
-    raw_dynamic_frame.printSchema()
-    
-    # Converter para DataFrame do Spark para manipulações complexas
-    df = raw_dynamic_frame.toDF()
+    # Converter para DataFrame do Spark, com os tipos do schema raw atual
+    # (arquivos antigos e novos no mesmo lote)
+    df = conform_raw_frame(raw_dynamic_frame)
+    if debug:
+        df.printSchema()
+    
+    # Partições raw anteriores ao multi-índice contêm apenas o IBOV
+    if "indice" not in df.columns:
+        df = df.withColumn("indice", F.lit("IBOV"))
+    
+    if start_date:
+        # Os meses das pontas trazem pregões fora do intervalo. Durante a
+        # compactação um pregão aparece no arquivo mensal e no diário: fica
+        # a extração mais recente de cada ação
+        df = df.filter(F.to_date(F.col("data_pregao")).between(start_date, end_date))
+        latest_first = Window.partitionBy("indice", "data_pregao", "codigo_acao") \
+            .orderBy(F.col("data_extracao").desc())
+        df = df.withColumn("ordem_extracao", F.row_number().over(latest_first)) \
+            .filter((F.col("ordem_extracao") == 1) | F.col("codigo_acao").isNull()) \
+            .drop("ordem_extracao")
+    
+    # ETAPAS 2 a 5: replicadas em src/trigger/fast_etl.py (ETL dos lotes pequenos
+    # na Lambda); mudanças nas transformações devem ser feitas nos dois
     
     # ETAPA 2: LIMPEZA E VALIDAÇÃO INICIAL
     logger.info("=== ETAPA 2: LIMPEZA DOS DADOS ===")
     
-    # Remover registros com código de ação nulo ou inválido
-    df_clean = df.filter(
-        (F.col("codigo_acao").isNotNull()) & 
-        (F.length(F.col("codigo_acao")) >= 4) &
-        (F.col("quantidade_teorica").isNotNull()) &
-        (F.col("percentual_participacao").isNotNull())
-    )
+    # Marcar o motivo de rejeição de cada registro (nulo para os válidos):
+    # código de ação nulo ou inválido, quantidade ou participação nulas
+    df_marked = df.withColumn(
+        "motivo_rejeicao",
+        F.when(F.col("codigo_acao").isNull(), REJECTION_REASONS[0])
+        .when(F.length(F.col("codigo_acao")) < 4, REJECTION_REASONS[1])
+        .when(F.col("quantidade_teorica").isNull(), REJECTION_REASONS[2])
+        .when(F.col("percentual_participacao").isNull(), REJECTION_REASONS[3])
+    ).persist(StorageLevel.MEMORY_AND_DISK)
+    
+    # Métricas em uma única passada, que também preenche o cache: as
+    # transformações e as gravações seguintes não releem o S3
+    is_valid = F.col("motivo_rejeicao").isNull()
+    valid_date = F.when(is_valid, F.date_format(F.to_date("data_pregao"), "yyyy-MM-dd"))
+    metrics_row = df_marked.agg(
+        F.count(F.lit(1)).alias("registros_lidos"),
+        F.count(F.when(is_valid, 1)).alias("registros_validos"),
+        F.countDistinct(F.when(is_valid, F.col("codigo_acao"))).alias("tickers_unicos"),
+        F.countDistinct(F.when(is_valid, F.col("tipo_acao"))).alias("tipos_acao_unicos"),
+        F.sort_array(F.collect_set("indice")).alias("indices"),
+        F.sort_array(F.collect_set(valid_date)).alias("pregoes_gravados"),
+        *[F.count(F.when(F.col("motivo_rejeicao") == reason, 1)).alias(reason) for reason in REJECTION_REASONS]
+    ).first()
+    
+    indices_lidos = list(metrics_row["indices"])
+    pregoes_gravados = list(metrics_row["pregoes_gravados"])
+    indices_ausentes = sorted(set(expected_indices) - set(indices_lidos))
+    metrics = {
+        'event': 'GLUE_JOB_METRICS',
+        'job_name': args['JOB_NAME'],
+        'job_run_id': optional_argument('JOB_RUN_ID'),
+        'source_files': len(source_keys),
+        'intervalo': [start_date, end_date] if start_date else None,
+        'pregoes': len(pregoes_gravados),
+        'primeiro_pregao': pregoes_gravados[0] if pregoes_gravados else None,
+        'ultimo_pregao': pregoes_gravados[-1] if pregoes_gravados else None,
+        'registros_lidos': metrics_row["registros_lidos"],
+        'registros_validos': metrics_row["registros_validos"],
+        'registros_rejeitados': metrics_row["registros_lidos"] - metrics_row["registros_validos"],
+        'rejeicoes': {reason: metrics_row[reason] for reason in REJECTION_REASONS},
+        'tickers_unicos': metrics_row["tickers_unicos"],
+        'tipos_acao_unicos': metrics_row["tipos_acao_unicos"],
+        'indices': indices_lidos,
+        'indices_ausentes': indices_ausentes
+    }
+    
+    logger.info(f"Registros lidos: {metrics['registros_lidos']} | após limpeza: {metrics['registros_validos']}")
+    logger.info(f"Índices na partição: {', '.join(indices_lidos)}")
+    if indices_ausentes:
+        logger.warning(f"Índices esperados ausentes na partição: {', '.join(indices_ausentes)}")
+    
+    # Remover registros rejeitados
+    df_clean = df_marked.filter(is_valid).drop("motivo_rejeicao")
     
     # Adicionar colunas calculadas de data
     df_clean = df_clean.withColumn("data_pregao_date", F.to_date(F.col("data_pregao")))
     df_clean = df_clean.withColumn("data_extracao_timestamp", F.to_timestamp(F.col("data_extracao")))
     
-    logger.info(f"Registros após limpeza: {df_clean.count()}")
-    
     # ETAPA 3: TRANSFORMAÇÕES OBRIGATÓRIAS
     logger.info("=== ETAPA 3: TRANSFORMAÇÕES OBRIGATÓRIAS ===")
     
     # REQUISITO A: Agrupamento numérico, sumarização e contagem
     logger.info("Aplicando agrupamento e sumarização...")
     
-    # Agrupar por tipo de ação e calcular estatísticas
-    df_aggregated = df_clean.groupBy("tipo_acao", "data_pregao") \
+    # Agrupar por índice e tipo de ação e calcular estatísticas
+    df_aggregated = df_clean.groupBy("indice", "tipo_acao", "data_pregao") \
         .agg(
             F.count("codigo_acao").alias("qtd_acoes_por_tipo"),
             F.sum("quantidade_teorica").alias("quantidade_teorica_total"),
@@ -142,93 +402,167 @@ try:
     df_partitioned = df_final \
         .withColumn("partition_year", F.year(F.col("data_pregao_date"))) \
         .withColumn("partition_month", F.month(F.col("data_pregao_date"))) \
-        .withColumn("partition_day", F.dayofmonth(F.col("data_pregao_date"))) \
-        .withColumn("ticker_group", F.substring(F.col("ticker_symbol"), 1, 4))
-    
-    # Converter de volta para DynamicFrame
-    refined_dynamic_frame = DynamicFrame.fromDF(df_partitioned, glueContext, "refined_data")
-    
-    logger.info(f"Total de registros refinados: {refined_dynamic_frame.count()}")
-    refined_dynamic_frame.printSchema()
+        .withColumn("partition_day", F.dayofmonth(F.col("data_pregao_date")))
+    
+    # Um pregão por tarefa (ou N faixas de tickers por pregão), ordenado por
+    # ticker: o writer não reordena, pois a ordem já começa pelas partições.
+    # Todos os pregões do lote (ou do intervalo) são gravados na mesma etapa
+    output_tasks = max(1, len(pregoes_gravados))
+    if ticker_buckets > 1:
+        df_layout = df_partitioned.repartitionByRange(
+            output_tasks * ticker_buckets, *REFINED_PARTITION_KEYS, "ticker_symbol")
+    else:
+        df_layout = df_partitioned.repartition(output_tasks, *REFINED_PARTITION_KEYS)
+    df_layout = df_layout.sortWithinPartitions(*REFINED_PARTITION_KEYS, "ticker_symbol")
+    
+    if debug:
+        df_layout.printSchema()
     
     # ETAPA 6: SALVAMENTO DOS DADOS REFINADOS
-    logger.info("=== ETAPA 6: SALVAMENTO NO S3 ===")
+    logger.info("=== ETAPA 6: SALVAMENTO DOS DADOS REFINADOS ===")
     
     # Caminho de destino particionado
-    output_path = f"s3://{args['target_bucket']}/refined-data/bovespa/"
+    output_path = f"{target_root}/refined-data/bovespa/"
+    
+    # Salvar dados refinados particionados por data (writer do Spark: respeita
+    # a ordenação e o limite de registros por arquivo), substituindo as
+    # partições dos pregões gravados
+    df_layout.write \
+        .mode("overwrite") \
+        .option("partitionOverwriteMode", "dynamic") \
+        .partitionBy(*REFINED_PARTITION_KEYS) \
+        .option("maxRecordsPerFile", max_records_per_file) \
+        .option("compression", "snappy") \
+        .parquet(output_path)
+    
+    logger.info(f"Dados salvos em: {output_path} (até {max_records_per_file} registros por arquivo, "
+                f"{ticker_buckets} faixa(s) de tickers por pregão)")
+    
+    # ETAPA 7: SALVAR DADOS AGREGADOS SEPARADAMENTE
+    logger.info("=== ETAPA 7: DADOS AGREGADOS ===")
+    
+    # Salvar dados agregados por tipo (um arquivo por pregão), substituindo as
+    # partições dos pregões gravados (o sink do DynamicFrame só faz append)
+    aggregated_output_path = f"{target_root}/refined-data/bovespa-aggregated/"
+    
+    df_aggregated.repartition("data_pregao").write \
+        .mode("overwrite") \
+        .option("partitionOverwriteMode", "dynamic") \
+        .partitionBy("data_pregao") \
+        .option("compression", "snappy") \
+        .parquet(aggregated_output_path)
+    
+    # ETAPA 8: VARIAÇÕES DIÁRIAS (réplica de daily_changes em src/trigger/fast_etl.py)
+    logger.info("=== ETAPA 8: VARIAÇÕES DIÁRIAS ===")
+    
+    # Pregão anterior de cada pregão gravado: do próprio lote ou da sua
+    # partição refinada. Só essas partições são lidas, nunca o histórico
+    previous_dates = {
+        trade_date: previous_trade_date(
+            trade_date, pregoes_gravados, lambda day: path_exists(f"{output_path}{refined_partition(day)}/"))
+        for trade_date in pregoes_gravados
+    }
+    stored_dates = sorted({day for day in previous_dates.values() if day and day not in pregoes_gravados})
+    metrics['pregoes_anteriores'] = previous_dates
+    
+    df_snapshot = df_final.select(*SNAPSHOT_COLUMNS)
+    df_previous = df_snapshot
+    if stored_dates:
+        # Leitura recursiva e sem inferir partições: aceita partições de
+        # layouts anteriores (subdiretórios ticker_group=)
+        df_stored = spark.read.option("recursiveFileLookup", "true") \
+            .parquet(*[f"{output_path}{refined_partition(day)}/" for day in stored_dates]) \
+            .select(*SNAPSHOT_COLUMNS)
+        df_previous = df_previous.unionByName(df_stored)
+    
+    df_dates = spark.createDataFrame(list(previous_dates.items()), "data_pregao string, pregao_anterior string") \
+        .select(F.to_date("data_pregao").alias("data_pregao"), F.to_date("pregao_anterior").alias("pregao_anterior"))
+    
+    # Posição no índice e pregão: maior participação = 1 (empate pelo ticker)
+    position_order = Window.partitionBy("data_pregao_date", "indice") \
+        .orderBy(F.col("participation_percentage").desc(), F.col("ticker_symbol"))
+    
+    df_current = df_snapshot.withColumn("posicao", F.row_number().over(position_order)) \
+        .withColumnRenamed("data_pregao_date", "data_pregao") \
+        .join(F.broadcast(df_dates), "data_pregao", "left")
+    
+    df_before = df_previous.withColumn("posicao", F.row_number().over(position_order)) \
+        .join(F.broadcast(df_dates), F.col("data_pregao_date") == F.col("pregao_anterior")) \
+        .select("data_pregao", "pregao_anterior", "indice", "ticker_symbol",
+                F.col("company_name").alias("company_name_anterior"),
+                F.col("participation_percentage").alias("participacao_anterior"),
+                F.col("theoretical_quantity").alias("quantidade_anterior"),
+                F.col("posicao").alias("posicao_anterior"))
+    
+    # Ações que saíram do índice só existem no pregão anterior (full outer join)
+    has_previous = F.col("pregao_anterior").isNotNull()
+    change_keys = ["data_pregao", "pregao_anterior", "indice", "ticker_symbol"]
+    df_changes = df_current.join(df_before, change_keys, "full_outer") \
+        .select(
+            "data_pregao", "indice", "ticker_symbol",
+            F.coalesce("company_name", "company_name_anterior").alias("company_name"),
+            "pregao_anterior",
+            "participation_percentage", "participacao_anterior",
+            (F.col("participation_percentage") - F.col("participacao_anterior")).alias("variacao_participacao"),
+            "theoretical_quantity", "quantidade_anterior",
+            (F.col("theoretical_quantity") - F.col("quantidade_anterior")).alias("variacao_quantidade"),
+            "posicao", "posicao_anterior",
+            (F.col("posicao_anterior") - F.col("posicao")).alias("variacao_posicao"),
+            (has_previous & F.col("posicao_anterior").isNull()).alias("entrou"),
+            F.col("posicao").isNull().alias("saiu")
+        )
     
-    # Salvar dados refinados particionados por data e ticker
-    glueContext.write_dynamic_frame.from_options(
-        frame=refined_dynamic_frame,
-        connection_type="s3",
-        connection_options={
-            "path": output_path,
-            "partitionKeys": ["partition_year", "partition_month", "partition_day", "ticker_group"]
-        },
-        format="parquet",
-        format_options={
-            "compression": "snappy"
-        },
-        transformation_ctx="refined_data_sink"
-    )
+    changes_output_path = f"{target_root}/refined-data/bovespa-changes/"
     
-    logger.info(f"Dados salvos em: {output_path}")
+    df_changes.repartition("data_pregao").write \
+        .mode("overwrite") \
+        .option("partitionOverwriteMode", "dynamic") \
+        .partitionBy("data_pregao") \
+        .option("compression", "snappy") \
+        .parquet(changes_output_path)
     
-    # ETAPA 7: CATALOGAÇÃO AUTOMÁTICA NO GLUE CATALOG
-    logger.info("=== ETAPA 7: CATALOGAÇÃO NO GLUE CATALOG ===")
+    logger.info(f"Variações diárias salvas em: {changes_output_path} "
+                f"({len(stored_dates)} pregões anteriores lidos das partições refinadas)")
     
-    # Criar tabela no Glue Catalog
-    glueContext.create_dynamic_frame.from_catalog(
-        database="default",
-        table_name="bovespa_refined_data",
-        transformation_ctx="catalog_table"
-    )
+    # ETAPA 9: CATALOGAÇÃO NO GLUE CATALOG
+    logger.info("=== ETAPA 9: CATALOGAÇÃO NO GLUE CATALOG ===")
     
-    # Atualizar partições no catálogo
-    spark.sql(f"""
-        ALTER TABLE default.bovespa_refined_data 
-        ADD IF NOT EXISTS PARTITION (
-            partition_year={datetime.strptime(args['processing_date'], '%Y-%m-%d').year},
-            partition_month={datetime.strptime(args['processing_date'], '%Y-%m-%d').month},
-            partition_day={datetime.strptime(args['processing_date'], '%Y-%m-%d').day}
+    # Registrar só as partições gravadas (pregões com registros válidos), em
+    # uma chamada em lote por tabela: consultáveis sem rodar crawler
+    if catalog is not None:
+        partitions_registered = sum(
+            catalog.register_partitions(table_name, target_root, pregoes_gravados)
+            for table_name in OUTPUT_TABLES
         )
-        LOCATION '{output_path}partition_year={datetime.strptime(args['processing_date'], '%Y-%m-%d').year}/partition_month={datetime.strptime(args['processing_date'], '%Y-%m-%d').month}/partition_day={datetime.strptime(args['processing_date'], '%Y-%m-%d').day}/'
-    """)
-    
-    # ETAPA 8: SALVAR DADOS AGREGADOS SEPARADAMENTE
-    logger.info("=== ETAPA 8: DADOS AGREGADOS ===")
-    
-    # Salvar dados agregados por tipo
-    aggregated_dynamic_frame = DynamicFrame.fromDF(df_aggregated, glueContext, "aggregated_data")
-    
-    aggregated_output_path = f"s3://{args['target_bucket']}/refined-data/bovespa-aggregated/"
-    
-    glueContext.write_dynamic_frame.from_options(
-        frame=aggregated_dynamic_frame,
-        connection_type="s3",
-        connection_options={
-            "path": aggregated_output_path,
-            "partitionKeys": ["data_pregao"]
-        },
-        format="parquet",
-        transformation_ctx="aggregated_data_sink"
-    )
+        metrics['particoes_registradas'] = partitions_registered
+        logger.info(f"Partições novas no catálogo: {partitions_registered} "
+                    f"({len(pregoes_gravados)} pregões gravados)")
     
     # ESTATÍSTICAS FINAIS
     logger.info("=== ESTATÍSTICAS FINAIS ===")
-    logger.info(f"Data processada: {args['processing_date']}")
-    logger.info(f"Registros processados: {df_final.count()}")
-    logger.info(f"Tipos de ação únicos: {df_final.select('tipo_acao').distinct().count()}")
-    logger.info(f"Tickers únicos: {df_final.select('ticker_symbol').distinct().count()}")
-    
-    # Mostrar amostra dos dados finais
-    logger.info("Amostra dos dados finais:")
-    df_final.select(
-        "ticker_symbol", "company_name", "tipo_acao", 
-        "theoretical_quantity", "participation_percentage",
-        "categoria_participacao", "dias_desde_extracao"
-    ).show(10, truncate=False)
     
+    # Um único registro estruturado com as métricas da execução (CloudWatch)
+    metrics['registros_refinados'] = metrics['registros_validos']
+    metrics['duracao_segundos'] = round(time.time() - job_started, 1)
+    metrics['timestamp'] = datetime.now().isoformat()
+    logger.info(json.dumps(metrics, ensure_ascii=False))
+    
+    if debug:
+        logger.info("Registros por índice:")
+        df_final.groupBy("indice").count().orderBy("indice").show(truncate=False)
+        
+        # Mostrar amostra dos dados finais
+        logger.info("Amostra dos dados finais:")
+        df_final.select(
+            "indice", "ticker_symbol", "company_name", "tipo_acao", 
+            "theoretical_quantity", "participation_percentage",
+            "categoria_participacao", "dias_desde_extracao"
+        ).show(10, truncate=False)
+    
+    df_marked.unpersist()
+    
+    # Finalizar job (só em caso de sucesso: um job falho não deixa estado para a próxima execução)
+    job.commit()
     logger.info("Job Glue executado com sucesso!")
     
 except Exception as e:
@@ -236,6 +570,4 @@ except Exception as e:
     raise e
 
 finally:
-    # Finalizar job
-    job.commit()
     logger.info("Job Glue finalizado")
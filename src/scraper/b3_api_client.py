@@ -0,0 +1,198 @@
+"""
+Cliente da API JSON paginada da carteira do dia da B3
+A página indexPage/day/IBOV é apenas um shell JavaScript; os dados vêm de
+indexProxy/indexCall/GetPortfolioDay, que recebe os parâmetros em base64
+"""
+
+import base64
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+
+from columnar import PortfolioTableBuilder
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_API_URL = "https://sistemaswebb3-listados.b3.com.br/indexProxy/indexCall/GetPortfolioDay/{query}"
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_WORKERS = 4
+
+
+def encode_query(params: Dict) -> str:
+    """Codifica os parâmetros da consulta no formato esperado pela API (JSON em base64)"""
+    payload = json.dumps(params, separators=(',', ':'))
+    return base64.b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+class B3PortfolioClient:
+    """
+    Busca a carteira do dia de um índice direto na API JSON da B3
+    As páginas além da primeira são buscadas em paralelo pela sessão compartilhada
+    """
+
+    def __init__(self, http, page_size: int = DEFAULT_PAGE_SIZE,
+                 max_workers: int = DEFAULT_MAX_WORKERS, timeout: float = 30):
+        self.http = http
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # Data da carteira vigente vista na última resposta da API
+        self.current_portfolio_date: Optional[str] = None
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept': 'application/json, text/plain, */*',
+            'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8'
+        }
+
+    def page_url(self, index: str, page_number: int) -> str:
+        """URL de uma página da carteira"""
+        query = encode_query({
+            'language': 'pt-br',
+            'pageNumber': page_number,
+            'pageSize': self.page_size,
+            'index': index,
+            'segment': '1'
+        })
+        return PORTFOLIO_API_URL.format(query=query)
+
+    def fetch_page(self, index: str, page_number: int, rate_limiter=None) -> Dict:
+        """
+        Busca uma página da carteira
+
+        Returns:
+            JSON da resposta com as chaves 'page', 'header' e 'results'
+        """
+        url = self.page_url(index, page_number)
+
+        # Sem revalidação: a carteira é montada a partir de várias respostas.
+        # O limitador vale para cada requisição enviada, não só para a primeira
+        response = self.http.get(url, headers=self.headers, timeout=self.timeout, conditional=False,
+                                 rate_limiter=rate_limiter)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch_portfolio(self, index: str = 'IBOV', rate_limiter=None) -> Dict:
+        """
+        Busca todas as páginas da carteira de um índice
+
+        Returns:
+            Dicionário com 'header' (data e totais da carteira) e 'results' (todas as ações)
+        """
+        first_page = self.fetch_page(index, 1, rate_limiter)
+        total_pages = int((first_page.get('page') or {}).get('totalPages') or 1)
+        results = list(first_page.get('results') or [])
+
+        if total_pages > 1:
+            workers = min(self.max_workers, total_pages - 1)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # map preserva a ordem das páginas
+                pages = executor.map(lambda n: self.fetch_page(index, n, rate_limiter),
+                                     range(2, total_pages + 1))
+                for page in pages:
+                    results.extend(page.get('results') or [])
+
+        logger.info(f"API B3: {len(results)} ações de {index} em {total_pages} página(s)")
+        return {'header': first_page.get('header') or {}, 'results': results}
+
+    @staticmethod
+    def portfolio_date(header: Dict) -> Optional[str]:
+        """Data da carteira informada pela API (dd/mm/aa) no formato YYYY-MM-DD"""
+        raw_date = (header or {}).get('date')
+        if not raw_date:
+            return None
+        for fmt in ('%d/%m/%y', '%d/%m/%Y'):
+            try:
+                return datetime.strptime(raw_date, fmt).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+        return None
+
+    @staticmethod
+    def build_table(results: List[Dict], trade_date: str, extraction_time: str,
+                    index: str = 'IBOV') -> pa.Table:
+        """
+        Converte os resultados da API direto para a tabela da carteira
+
+        Args:
+            results: Lista 'results' da API
+            trade_date: Data do pregão (YYYY-MM-DD)
+            extraction_time: Instante da extração (ISO 8601)
+            index: Código do índice
+
+        Returns:
+            pyarrow.Table com os dados das ações
+        """
+        builder = PortfolioTableBuilder(trade_date, extraction_time, f'B3_{index}_API', indice=index)
+
+        for item in results:
+            codigo = (item.get('cod') or '').strip()
+            if len(codigo) < 4:
+                continue
+
+            builder.append(
+                codigo,
+                (item.get('asset') or '').strip() or None,
+                # A API preenche o tipo com espaços: 'ON      NM' -> 'ON NM'
+                ' '.join((item.get('type') or '').split()) or None,
+                item.get('theoricalQty'),
+                item.get('part')
+            )
+
+        return builder.build()
+
+    def fetch_portfolio_for_date(self, trade_date: str, index: str = 'IBOV',
+                                 rate_limiter=None) -> Optional[Dict]:
+        """
+        Busca a carteira vigente se ela for do pregão solicitado
+
+        A API só expõe a carteira vigente; se ela for de outra data que não a
+        solicitada, ou se o cabeçalho não trouxer a data, retorna None para
+        que o chamador use o scraper HTML
+
+        Returns:
+            Carteira ('header' e 'results'), ou None se a API não tiver a data pedida
+        """
+        # Datas anteriores à carteira vigente nunca estão na API (ex.: backfill)
+        if self.current_portfolio_date and trade_date < self.current_portfolio_date:
+            return None
+
+        portfolio = self.fetch_portfolio(index, rate_limiter)
+        api_date = self.portfolio_date(portfolio['header'])
+        if api_date:
+            self.current_portfolio_date = api_date
+
+        if api_date is None:
+            # Sem a data não há como saber o pregão: a carteira vigente não
+            # pode ir para a partição de outro dia (ex.: backfill)
+            logger.warning(f"API B3 retornou a carteira sem data no cabeçalho; {trade_date} ignorado")
+            return None
+
+        if api_date != trade_date:
+            logger.info(f"API B3 retornou a carteira de {api_date}, diferente de {trade_date}")
+            return None
+
+        return portfolio
+
+    def fetch_table(self, trade_date: str, extraction_time: str, index: str = 'IBOV',
+                    rate_limiter=None) -> Optional[pa.Table]:
+        """
+        Busca a carteira e converte para tabela Arrow
+
+        Returns:
+            Tabela da carteira, ou None se a API não tiver a data pedida
+        """
+        portfolio = self.fetch_portfolio_for_date(trade_date, index, rate_limiter)
+        if portfolio is None:
+            return None
+
+        return self.build_table(portfolio['results'], trade_date, extraction_time, index)
+
+    @staticmethod
+    def serialize_portfolio(portfolio: Dict) -> bytes:
+        """Serialização canônica da carteira (mesmo conteúdo, mesmos bytes)"""
+        return json.dumps(portfolio, ensure_ascii=False, sort_keys=True,
+                          separators=(',', ':')).encode('utf-8')
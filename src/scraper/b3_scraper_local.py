@@ -7,8 +7,19 @@ import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 import logging
-from typing import Dict, List, Optional
-import pandas as pd
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+import pyarrow as pa
+
+# Adiciona o diretório do scraper para importar os módulos irmãos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from http_client import get_shared_http_client
+from table_parser import extract_table_rows
+from b3_api_client import B3PortfolioClient
+from columnar import PortfolioTableBuilder, concat_portfolio_tables, records_to_table
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -19,112 +30,159 @@ class B3Scraper:
     Scraper simplificado para dados da B3
     """
     
-    def __init__(self, bucket_name: str = None):
+    def __init__(self, bucket_name: str = None, indices: Union[str, List[str], None] = None):
         self.bucket_name = bucket_name  # Opcional para versão local
-        self.base_url = "https://sistemaswebb3-listados.b3.com.br/indexPage/day/IBOV"
+        # Índices coletados (SCRAPER_INDICES="IBOV,SMLL"), padrão apenas IBOV
+        indices = indices or os.environ.get('SCRAPER_INDICES') or ['IBOV']
+        if isinstance(indices, str):
+            indices = indices.split(',')
+        self.indices = [index.strip().upper() for index in indices if index.strip()]
+        self.http = get_shared_http_client()
+        # Backend de parsing da tabela: 'lxml' (padrão) ou 'bs4'
+        self.parser_backend = os.environ.get('SCRAPER_PARSER_BACKEND', 'lxml')
+        # Cliente da API JSON da B3 (fonte principal; o HTML é o fallback)
+        self.api_client = B3PortfolioClient(self.http)
+        # URL da página de cada índice ('{index}' é substituído pelo código)
+        self.base_url = "https://sistemaswebb3-listados.b3.com.br/indexPage/day/{index}"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-            'Connection': 'keep-alive'
+            'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8'
         }
     
     def fetch_ibov_data(self, date_str: Optional[str] = None) -> List[Dict]:
         """
         Faz o scraping dos dados da carteira do IBOV
+        
+        Args:
+            date_str: Data do pregão no formato YYYY-MM-DD, se None usa data atual
+            
+        Returns:
+            Lista de dicionários com os dados das ações (ver fetch_ibov_table)
+        """
+        return self.fetch_ibov_table(date_str).to_pylist()
+    
+    def fetch_ibov_table(self, date_str: Optional[str] = None) -> pa.Table:
+        """
+        Faz o scraping da carteira do IBOV direto para uma tabela Arrow
+        
+        Args:
+            date_str: Data do pregão no formato YYYY-MM-DD, se None usa data atual
+            
+        Returns:
+            pyarrow.Table com os dados das ações (dados de exemplo se o scraping falhar)
+        """
+        return self.fetch_index_table('IBOV', date_str)
+    
+    def fetch_portfolio_table(self, date_str: Optional[str] = None,
+                              indices: Optional[List[str]] = None) -> pa.Table:
+        """
+        Faz o scraping das carteiras dos índices em paralelo, em uma única tabela
+        
+        Args:
+            date_str: Data do pregão no formato YYYY-MM-DD, se None usa data atual
+            indices: Códigos dos índices, se None usa os do scraper
+            
+        Returns:
+            pyarrow.Table com as ações de todos os índices (coluna 'indice')
+        """
+        indices = indices or self.indices
+        
+        if len(indices) == 1:
+            return self.fetch_index_table(indices[0], date_str)
+        
+        with ThreadPoolExecutor(max_workers=len(indices)) as executor:
+            tables = list(executor.map(lambda index: self.fetch_index_table(index, date_str), indices))
+        
+        return concat_portfolio_tables(tables)
+    
+    def fetch_index_table(self, index: str = 'IBOV', date_str: Optional[str] = None) -> pa.Table:
         """
+        Faz o scraping da carteira de um índice direto para uma tabela Arrow
+        
+        Args:
+            index: Código do índice (IBOV, IBXX, SMLL...)
+            date_str: Data do pregão no formato YYYY-MM-DD, se None usa data atual
+            
+        Returns:
+            pyarrow.Table com os dados das ações (dados de exemplo se o scraping falhar)
+        """
+        # Data do pregão solicitado e instante da extração (único por fetch)
+        trade_date = date_str or datetime.now().strftime('%Y-%m-%d')
+        extraction_time = datetime.now().isoformat()
+        url = self.base_url.format(index=index)
+        
+        try:
+            table = self.api_client.fetch_table(trade_date, extraction_time, index)
+            if table is not None and table.num_rows:
+                logger.info(f"Extraídos {table.num_rows} registros de {index} pela API JSON")
+                return table
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"API JSON da B3 indisponível, usando scraping HTML: {e}")
+        
         try:
             params = {'language': 'pt-br'}
             if date_str:
                 params['date'] = date_str
             
-            logger.info(f"Fazendo scraping da URL: {self.base_url}")
-            response = requests.get(self.base_url, headers=self.headers, params=params, timeout=30)
+            logger.info(f"Fazendo scraping da URL: {url}")
+            # Sem revalidação condicional: a versão local não persiste os dados
+            response = self.http.get(url, headers=self.headers, params=params,
+                                     timeout=30, conditional=False)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            # Encontrar a tabela com os dados (primeira tabela da página)
+            rows, backend = extract_table_rows(response.content, backend=self.parser_backend,
+                                               cell_tags=('td', 'th'), first_table_only=True,
+                                               strip_fragments=True)
             
-            # Encontrar a tabela com os dados
-            stocks_data = []
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            
-            # Tentar encontrar tabelas na página
-            tables = soup.find_all('table')
-            
-            if not tables:
+            if rows is None:
                 # Se não encontrar tabelas, procurar por divs ou outros elementos
                 logger.warning("Nenhuma tabela encontrada, tentando parsing alternativo...")
-                return self._parse_alternative_format(soup, current_date)
-            
-            # Processar primeira tabela encontrada
-            table = tables[0]
-            rows = table.find_all('tr')
-            
-            for row in rows:
-                cells = row.find_all(['td', 'th'])
-                if len(cells) >= 5:
-                    try:
-                        # Extrair texto das células
-                        cell_texts = [cell.get_text(strip=True) for cell in cells]
-                        
-                        # Pular cabeçalhos
-                        if any(header in cell_texts[0].upper() for header in ['CÓDIGO', 'CODE', 'AÇÃO']):
-                            continue
-                        
-                        codigo = cell_texts[0]
-                        nome_empresa = cell_texts[1] if len(cell_texts) > 1 else ""
-                        tipo = cell_texts[2] if len(cell_texts) > 2 else ""
-                        qtde_teorica_str = cell_texts[3] if len(cell_texts) > 3 else ""
-                        participacao_str = cell_texts[4] if len(cell_texts) > 4 else ""
-                        
-                        # Validação básica
-                        if not codigo or len(codigo) < 4:
-                            continue
-                        
-                        # Conversões numéricas
-                        qtde_teorica = self._parse_number(qtde_teorica_str)
-                        participacao = self._parse_percentage(participacao_str)
-                        
-                        if qtde_teorica is None or participacao is None:
-                            continue
-                        
-                        stock_data = {
-                            'data_pregao': current_date,
-                            'codigo_acao': codigo,
-                            'nome_empresa': nome_empresa,
-                            'tipo_acao': tipo,
-                            'quantidade_teorica': qtde_teorica,
-                            'percentual_participacao': participacao,
-                            'data_extracao': datetime.now().isoformat(),
-                            'fonte': 'B3_IBOV'
-                        }
-                        
-                        stocks_data.append(stock_data)
-                        
-                    except Exception as e:
-                        logger.warning(f"Erro ao processar linha: {e}")
-                        continue
-            
-            if not stocks_data:
+                soup = BeautifulSoup(response.content, 'html.parser')
+                return records_to_table(self._parse_alternative_format(soup, trade_date, extraction_time),
+                                        indice=index)
+            
+            logger.info(f"Tabela extraída com o parser {backend}: {len(rows)} linhas")
+            
+            builder = PortfolioTableBuilder(trade_date, extraction_time, f'B3_{index}', indice=index)
+            
+            for cell_texts in rows:
+                # Pular cabeçalhos
+                if any(header in cell_texts[0].upper() for header in ['CÓDIGO', 'CODE', 'AÇÃO']):
+                    continue
+                
+                # Validação básica
+                if not cell_texts[0] or len(cell_texts[0]) < 4:
+                    continue
+                
+                builder.append(*cell_texts[:5])
+            
+            # Conversões numéricas feitas de uma vez; linhas sem número são descartadas
+            table = builder.build(drop_null_numbers=True)
+            
+            if not table.num_rows:
                 logger.warning("Nenhum dado extraído, gerando dados de exemplo...")
-                return self._generate_sample_data()
+                return records_to_table(self._generate_sample_data(trade_date), indice=index)
             
-            logger.info(f"Extraídos {len(stocks_data)} registros")
-            return stocks_data
+            logger.info(f"Extraídos {table.num_rows} registros")
+            return table
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Erro ao fazer request para B3: {e}")
             logger.info("Gerando dados de exemplo para demonstração...")
-            return self._generate_sample_data()
+            return records_to_table(self._generate_sample_data(trade_date), indice=index)
         except Exception as e:
             logger.error(f"Erro no scraping: {e}")
-            return self._generate_sample_data()
+            return records_to_table(self._generate_sample_data(trade_date), indice=index)
     
-    def _parse_alternative_format(self, soup: BeautifulSoup, current_date: str) -> List[Dict]:
+    def _parse_alternative_format(self, soup: BeautifulSoup, current_date: str,
+                                  extraction_time: Optional[str] = None) -> List[Dict]:
         """
         Parsing alternativo se não encontrar tabelas
         """
         stocks_data = []
+        extraction_time = extraction_time or datetime.now().isoformat()
         
         # Procurar por padrões de dados de ações
         text_content = soup.get_text()
@@ -147,16 +205,19 @@ class B3Scraper:
                     'tipo_acao': 'ON' if codigo.endswith('3') else 'PN',
                     'quantidade_teorica': 1000000.0 + i * 100000,
                     'percentual_participacao': 5.0 - (i * 0.1),
-                    'data_extracao': datetime.now().isoformat(),
+                    'data_extracao': extraction_time,
                     'fonte': 'B3_IBOV_PARSED'
                 }
                 stocks_data.append(stock_data)
         
-        return stocks_data if stocks_data else self._generate_sample_data()
+        return stocks_data if stocks_data else self._generate_sample_data(current_date)
     
-    def _generate_sample_data(self) -> List[Dict]:
+    def _generate_sample_data(self, trade_date: Optional[str] = None) -> List[Dict]:
         """
         Gera dados de exemplo para demonstração quando scraping falha
+        
+        Args:
+            trade_date: Data do pregão no formato YYYY-MM-DD, se None usa data atual
         """
         sample_stocks = [
             ('PETR4', 'PETROBRAS', 'PN', 4500000000, 8.5),
@@ -171,7 +232,8 @@ class B3Scraper:
             ('LREN3', 'LOJAS RENNER', 'ON', 1400000000, 2.5)
         ]
         
-        current_date = datetime.now().strftime('%Y-%m-%d')
+        current_date = trade_date or datetime.now().strftime('%Y-%m-%d')
+        extraction_time = datetime.now().isoformat()
         stocks_data = []
         
         for codigo, nome, tipo, qtde, participacao in sample_stocks:
@@ -182,7 +244,7 @@ class B3Scraper:
                 'tipo_acao': tipo,
                 'quantidade_teorica': float(qtde),
                 'percentual_participacao': participacao,
-                'data_extracao': datetime.now().isoformat(),
+                'data_extracao': extraction_time,
                 'fonte': 'B3_IBOV_SAMPLE'
             }
             stocks_data.append(stock_data)
@@ -191,7 +253,10 @@ class B3Scraper:
         return stocks_data
     
     def _parse_number(self, value: str) -> Optional[float]:
-        """Converte string numérica brasileira para float"""
+        """
+        Converte string numérica brasileira para float
+        Para colunas inteiras use numeric_parsing.parse_br_number_array
+        """
         if not value or value.strip() == '':
             return None
         try:
@@ -209,7 +274,10 @@ class B3Scraper:
             return None
     
     def _parse_percentage(self, value: str) -> Optional[float]:
-        """Converte string de porcentagem para float"""
+        """
+        Converte string de porcentagem para float
+        Para colunas inteiras use numeric_parsing.parse_br_percentage_array
+        """
         if not value or value.strip() == '':
             return None
         try:
@@ -0,0 +1,214 @@
+"""
+Backfill histórico concorrente para o B3Scraper
+Busca um intervalo de datas com concorrência limitada sobre o pool de
+conexões do scraper e limite de requisições por host
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Dict, List
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Valores padrão do backfill
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RATE_LIMIT = 2.0  # Requisições por segundo por host
+
+
+def trading_days(start_date: str, end_date: str) -> List[str]:
+    """
+    Lista os dias úteis (segunda a sexta) de um intervalo
+
+    Args:
+        start_date: Data inicial no formato YYYY-MM-DD (inclusive)
+        end_date: Data final no formato YYYY-MM-DD (inclusive)
+
+    Returns:
+        Lista de datas no formato YYYY-MM-DD
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+    if end < start:
+        raise ValueError(f"Data final {end_date} anterior à data inicial {start_date}")
+
+    days = []
+    current = start
+    while current <= end:
+        # Feriados não são conhecidos aqui: o scraper retorna vazio nesses dias
+        if current.weekday() < 5:
+            days.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=1)
+
+    return days
+
+
+class RateLimiter:
+    """
+    Token bucket thread-safe: libera no máximo `rate` requisições por segundo
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate deve ser maior que zero")
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Bloqueia até que um token esteja disponível"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """
+    Mantém um RateLimiter independente para cada host
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, url: str) -> None:
+        """Aguarda a vez de fazer uma requisição para o host da URL"""
+        host = urlparse(url).netloc
+
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = RateLimiter(self.rate, self.burst)
+                self._limiters[host] = limiter
+
+        limiter.acquire()
+
+
+class BackfillRunner:
+    """
+    Executa o scraping de um intervalo de datas com concorrência limitada
+    Grava uma partição raw por dia útil usando o próprio scraper
+    """
+
+    def __init__(self, scraper, max_workers: int = DEFAULT_MAX_WORKERS,
+                 rate_limit: float = DEFAULT_RATE_LIMIT):
+        if max_workers < 1:
+            raise ValueError("max_workers deve ser maior ou igual a 1")
+
+        self.scraper = scraper
+        self.max_workers = max_workers
+        self.rate_limit = rate_limit
+
+        # Todas as threads compartilham o mesmo pool e o mesmo limitador;
+        # cada data busca seus índices em paralelo
+        indices = getattr(scraper, 'indices', None) or [None]
+        self.scraper.http.ensure_pool_size(max_workers * len(indices))
+        self.scraper.rate_limiter = HostRateLimiter(rate_limit, burst=max_workers)
+
+    def _process_date(self, date_str: str) -> Dict:
+        """Busca e grava uma única data"""
+        stocks_table = self.scraper.fetch_portfolio_table(date_str)
+
+        if not stocks_table.num_rows:
+            not_modified = date_str in getattr(self.scraper, 'not_modified_dates', ())
+            return {'date': date_str, 'records_count': 0, 's3_path': None,
+                    'not_modified': not_modified}
+
+        s3_path = self.scraper.save_to_s3_parquet(stocks_table, date_str)
+
+        if date_str in getattr(self.scraper, 'unchanged_uploads', ()):
+            # Partição já gravada com o mesmo conteúdo: nenhum PUT foi feito
+            return {'date': date_str, 'records_count': 0, 's3_path': None, 'not_modified': True}
+
+        return {'date': date_str, 'records_count': stocks_table.num_rows, 's3_path': s3_path}
+
+    def run(self, start_date: str, end_date: str) -> Dict:
+        """
+        Executa o backfill para o intervalo informado
+
+        Args:
+            start_date: Data inicial no formato YYYY-MM-DD
+            end_date: Data final no formato YYYY-MM-DD
+
+        Returns:
+            Resumo da execução com partições gravadas, falhas e vazão
+        """
+        dates = trading_days(start_date, end_date)
+
+        logger.info(f"Iniciando backfill de {len(dates)} dias úteis "
+                    f"({start_date} a {end_date}) com {self.max_workers} workers "
+                    f"e limite de {self.rate_limit} req/s por host")
+
+        started = time.monotonic()
+        written = []
+        empty = []
+        not_modified = []
+        failed = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._process_date, d): d for d in dates}
+
+            for future in as_completed(futures):
+                date_str = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Falha no backfill de {date_str}: {e}")
+                    failed.append({'date': date_str, 'error': str(e)})
+                    continue
+
+                if result['s3_path']:
+                    written.append(result)
+                elif result.get('not_modified'):
+                    not_modified.append(date_str)
+                else:
+                    empty.append(date_str)
+
+        elapsed = time.monotonic() - started
+        written.sort(key=lambda r: r['date'])
+
+        summary = {
+            'start_date': start_date,
+            'end_date': end_date,
+            'requested_days': len(dates),
+            'written_days': len(written),
+            'empty_days': sorted(empty),
+            'not_modified_days': sorted(not_modified),
+            'failed_days': sorted(failed, key=lambda f: f['date']),
+            'records_count': sum(r['records_count'] for r in written),
+            's3_paths': [r['s3_path'] for r in written],
+            'max_workers': self.max_workers,
+            'rate_limit': self.rate_limit,
+            'elapsed_seconds': round(elapsed, 3),
+            'days_per_second': round(len(dates) / elapsed, 3) if elapsed > 0 else None
+        }
+
+        http_client = getattr(self.scraper, 'http', None)
+        if http_client is not None:
+            summary['http_stats'] = http_client.stats()
+
+        logger.info(f"Backfill concluído: {len(written)} partições gravadas, "
+                    f"{len(not_modified)} não modificadas, {len(empty)} vazias, "
+                    f"{len(failed)} falhas em {elapsed:.1f}s "
+                    f"({summary['days_per_second']} dias/s)")
+        if http_client is not None:
+            http_client.log_stats()
+        return summary
@@ -0,0 +1,177 @@
+"""
+Construção colunar dos registros da carteira
+Os parsers acrescentam valores brutos em colunas e o builder gera um
+pyarrow.Table direto, sem a lista de dicionários nem o DataFrame intermediário
+
+pyarrow.compute (conversão numérica) só é importado ao montar uma carteira,
+para não pesar no cold start da Lambda quando nada mudou
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+
+# Colunas dos registros da carteira, na ordem gravada na camada raw
+RECORD_COLUMNS = [
+    'data_pregao',
+    'indice',
+    'codigo_acao',
+    'nome_empresa',
+    'tipo_acao',
+    'quantidade_teorica',
+    'percentual_participacao',
+    'data_extracao',
+    'fonte'
+]
+
+NUMERIC_COLUMNS = ['quantidade_teorica', 'percentual_participacao']
+
+PARTITION_COLUMNS = ['year', 'month', 'day']
+
+# Índice gravado quando a origem não informa (dados anteriores ao multi-índice)
+DEFAULT_INDEX = 'IBOV'
+
+
+class PortfolioTableBuilder:
+    """
+    Acumula as células de cada ação em colunas tipadas e gera um pyarrow.Table
+
+    Os valores numéricos chegam como strings brutas ('1.234.567', '8,5') e são
+    convertidos de uma vez em build(); data, extração e fonte são constantes do lote
+    """
+
+    def __init__(self, trade_date: str, extraction_time: str, fonte: str,
+                 indice: str = DEFAULT_INDEX):
+        self.trade_date = trade_date
+        self.extraction_time = extraction_time
+        self.fonte = fonte
+        self.indice = indice
+        self._codigos: List[str] = []
+        self._nomes: List[Optional[str]] = []
+        self._tipos: List[Optional[str]] = []
+        self._quantidades: List[Optional[str]] = []
+        self._participacoes: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return len(self._codigos)
+
+    def append(self, codigo: str, nome_empresa: Optional[str], tipo_acao: Optional[str],
+               quantidade_teorica: Optional[str], percentual_participacao: Optional[str]) -> None:
+        """Acrescenta uma ação com os textos brutos das células"""
+        self._codigos.append(codigo)
+        self._nomes.append(nome_empresa)
+        self._tipos.append(tipo_acao)
+        self._quantidades.append(quantidade_teorica)
+        self._participacoes.append(percentual_participacao)
+
+    def build(self, drop_null_numbers: bool = False) -> pa.Table:
+        """
+        Gera a tabela da carteira
+
+        Args:
+            drop_null_numbers: Remove ações cuja quantidade ou participação não converteu
+
+        Returns:
+            pyarrow.Table com as colunas de RECORD_COLUMNS
+        """
+        from numeric_parsing import parse_br_number_array, parse_br_percentage_array
+
+        size = len(self._codigos)
+        table = pa.table({
+            'data_pregao': pa.repeat(self.trade_date, size),
+            'indice': pa.repeat(self.indice, size),
+            'codigo_acao': pa.array(self._codigos, type=pa.string()),
+            'nome_empresa': pa.array(self._nomes, type=pa.string()),
+            'tipo_acao': pa.array(self._tipos, type=pa.string()),
+            'quantidade_teorica': parse_br_number_array(self._quantidades),
+            'percentual_participacao': parse_br_percentage_array(self._participacoes),
+            'data_extracao': pa.repeat(self.extraction_time, size),
+            'fonte': pa.repeat(self.fonte, size)
+        })
+
+        if drop_null_numbers and size:
+            import pyarrow.compute as pc
+            valid = pc.and_(pc.is_valid(table['quantidade_teorica']),
+                            pc.is_valid(table['percentual_participacao']))
+            table = table.filter(valid)
+
+        return table
+
+
+def records_to_table(records: List[Dict], indice: str = DEFAULT_INDEX) -> pa.Table:
+    """Converte registros já montados (dados de exemplo, parsing alternativo) em tabela"""
+    if not records:
+        return empty_portfolio_table()
+    table = pa.Table.from_pylist(records)
+    if 'indice' not in table.column_names:
+        table = table.append_column('indice', pa.repeat(indice, table.num_rows))
+    return table.select(RECORD_COLUMNS)
+
+
+def concat_portfolio_tables(tables: List[pa.Table]) -> pa.Table:
+    """Junta as carteiras de vários índices de um mesmo pregão em uma única tabela"""
+    tables = [table for table in tables if table is not None and table.num_rows]
+    if not tables:
+        return empty_portfolio_table()
+    if len(tables) == 1:
+        return tables[0]
+    return pa.concat_tables(tables)
+
+
+def empty_portfolio_table() -> pa.Table:
+    """Tabela da carteira sem linhas"""
+    return pa.table({name: pa.array([], type=pa.float64() if name in NUMERIC_COLUMNS else pa.string())
+                     for name in RECORD_COLUMNS})
+
+
+def with_partition_columns(table: pa.Table, date_str: str) -> pa.Table:
+    """
+    Acrescenta year/month/day, calculados uma única vez para o lote inteiro
+
+    Args:
+        table: Tabela da carteira de um único pregão
+        date_str: Data do pregão (YYYY-MM-DD)
+    """
+    trade_date = datetime.strptime(date_str, '%Y-%m-%d')
+    size = table.num_rows
+
+    for name, value in zip(PARTITION_COLUMNS, (trade_date.year, trade_date.month, trade_date.day)):
+        column = pa.repeat(pa.scalar(value, pa.int32()), size)
+        if name in table.column_names:
+            table = table.set_column(table.column_names.index(name), name, column)
+        else:
+            table = table.append_column(name, column)
+
+    return table
+
+
+# Colunas que mudam a cada coleta sem alterar o conteúdo da carteira
+VOLATILE_COLUMNS = ['data_extracao'] + PARTITION_COLUMNS
+
+
+def table_content_hash(table: pa.Table) -> str:
+    """
+    Hash SHA-256 determinístico do conteúdo da carteira
+
+    Ignora as colunas voláteis (instante da extração e partição) e a ordem
+    das linhas, para que a mesma carteira coletada de novo gere o mesmo hash
+    """
+    columns = [name for name in table.column_names if name not in VOLATILE_COLUMNS]
+    canonical = table.select(columns)
+
+    # Colunas dictionary-encoded (schema da camada raw) comparadas pelos valores
+    for position, field in enumerate(canonical.schema):
+        if pa.types.is_dictionary(field.type):
+            canonical = canonical.set_column(position, field.name,
+                                             canonical[field.name].cast(field.type.value_type))
+
+    if canonical.num_rows:
+        canonical = canonical.sort_by([(name, 'ascending') for name in columns])
+
+    # JSON das colunas: estável entre versões do pyarrow, ao contrário do formato IPC
+    payload = json.dumps(canonical.to_pydict(), ensure_ascii=False, sort_keys=True,
+                         separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
@@ -0,0 +1,250 @@
+"""
+Compactação da camada raw
+Cada pregão gera um Parquet pequeno em raw-data/bovespa/year=/month=/day=;
+com o histórico, o custo de LIST e de abertura de arquivos domina as
+leituras do Athena e do Spark. Meses fechados são juntados em um único
+arquivo ordenado por ticker:
+
+    raw-data/bovespa/year=2025/month=01/ibov_carteira_202501.parquet
+    raw-data/bovespa/year=2025/month=01/_compaction/manifest.json
+
+A troca segue sempre a mesma ordem, então pode ser repetida a qualquer
+momento (inclusive depois de uma falha no meio):
+
+1. o arquivo do mês é regravado (PUT atômico) com o conteúdo anterior mais
+   os pregões diários, que substituem as linhas das mesmas datas
+2. o manifest registra a troca (status 'swapping') com as chaves substituídas
+3. os arquivos diários são removidos e o manifest passa a 'committed'
+
+Enquanto os diários não são removidos as datas aparecem nos dois arquivos;
+um pregão regravado depois da compactação volta como diário e entra na
+próxima execução
+"""
+
+import json
+import logging
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from columnar import table_content_hash, with_partition_columns
+from page_archive import RAW_PREFIX
+from raw_schema import conform_table, write_raw_parquet
+from storage import ObjectStore
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_DIR = "_compaction"
+MANIFEST_FILE = "manifest.json"
+
+# Dias após o fim do mês antes de considerá-lo fechado (rescrapes tardios)
+DEFAULT_GRACE_DAYS = 5
+
+_DAILY_KEY = re.compile(rf"^{re.escape(RAW_PREFIX)}/year=(\d{{4}})/month=(\d{{2}})/day=(\d{{2}})/[^/]+\.parquet$")
+
+
+def month_prefix(year: int, month: int) -> str:
+    """Prefixo de um mês da camada raw"""
+    return f"{RAW_PREFIX}/year={year}/month={month:02d}"
+
+
+def compacted_key(year: int, month: int) -> str:
+    """Chave do arquivo compactado de um mês"""
+    return f"{month_prefix(year, month)}/ibov_carteira_{year}{month:02d}.parquet"
+
+
+def manifest_key(year: int, month: int) -> str:
+    """Chave do manifest de compactação de um mês"""
+    return f"{month_prefix(year, month)}/{MANIFEST_DIR}/{MANIFEST_FILE}"
+
+
+def parse_daily_key(key: str) -> Optional[str]:
+    """Data (YYYY-MM-DD) de uma chave de Parquet diário, ou None se não for diário"""
+    match = _DAILY_KEY.match(key)
+    if not match:
+        return None
+    return f"{match.group(1)}-{match.group(2)}-{match.group(3)}"
+
+
+def is_month_closed(year: int, month: int, today: Optional[date] = None,
+                    grace_days: int = DEFAULT_GRACE_DAYS) -> bool:
+    """True se o mês terminou há mais de `grace_days` dias"""
+    today = today or date.today()
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return next_month + timedelta(days=grace_days) <= today
+
+
+class RawCompactor:
+    """
+    Compacta os meses fechados da camada raw
+
+    Args:
+        store: Armazenamento da camada raw (S3 ou diretório local, ver storage)
+        grace_days: Dias após o fim do mês antes de compactá-lo
+        today: Data de referência (padrão: hoje)
+    """
+
+    def __init__(self, store: ObjectStore, grace_days: int = DEFAULT_GRACE_DAYS, today: Optional[date] = None):
+        self.store = store
+        self.grace_days = grace_days
+        self.today = today or date.today()
+
+    def read_manifest(self, year: int, month: int) -> Optional[Dict]:
+        body = self.store.read(manifest_key(year, month))
+        return json.loads(body) if body else None
+
+    def pending_months(self, start_month: Optional[str] = None,
+                       end_month: Optional[str] = None) -> List[Tuple[int, int]]:
+        """
+        Meses fechados com arquivos diários ainda não compactados
+
+        Args:
+            start_month: Primeiro mês (YYYY-MM), opcional
+            end_month: Último mês (YYYY-MM), opcional
+        """
+        months = set()
+        for item in self.store.list(RAW_PREFIX):
+            date_str = parse_daily_key(item['key'])
+            if date_str:
+                months.add((int(date_str[:4]), int(date_str[5:7])))
+
+        pending = []
+        for year, month in sorted(months):
+            label = f"{year}-{month:02d}"
+            if start_month and label < start_month:
+                continue
+            if end_month and label > end_month:
+                continue
+            if is_month_closed(year, month, self.today, self.grace_days):
+                pending.append((year, month))
+        return pending
+
+    def compact_month(self, year: int, month: int, dry_run: bool = False) -> Dict:
+        """
+        Junta os diários do mês (e o compactado anterior, se houver) em um único arquivo
+
+        Returns:
+            Resumo: status, arquivos substituídos, linhas e bytes antes/depois
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        label = f"{year}-{month:02d}"
+        target_key = compacted_key(year, month)
+        objects = self.store.list(month_prefix(year, month))
+        daily = [item for item in objects if parse_daily_key(item['key'])]
+        previous = next((item for item in objects if item['key'] == target_key), None)
+
+        if not daily:
+            return {'month': label, 'status': 'up_to_date', 'replaced_files': 0}
+
+        summary = {
+            'month': label,
+            'status': 'dry_run' if dry_run else 'compacted',
+            'replaced_files': len(daily),
+            'bytes_before': sum(item['size'] for item in daily) + (previous['size'] if previous else 0)
+        }
+        if dry_run:
+            return summary
+
+        # Pregões diários: substituem as linhas das mesmas datas no compactado anterior
+        tables = []
+        dates = {}
+        for item in sorted(daily, key=lambda entry: entry['key']):
+            date_str = parse_daily_key(item['key'])
+            table = conform_table(with_partition_columns(
+                pq.read_table(pa.BufferReader(self.store.read(item['key']))), date_str))
+            tables.append(table)
+            dates[date_str] = {'rows': table.num_rows, 'content_sha256': table_content_hash(table),
+                               'source_key': item['key']}
+
+        manifest = self.read_manifest(year, month) or {}
+        if previous:
+            compacted = conform_table(pq.read_table(pa.BufferReader(self.store.read(target_key))))
+            replaced_dates = pa.array([date.fromisoformat(d) for d in dates], pa.date32())
+            compacted = compacted.filter(pc.invert(pc.is_in(compacted['data_pregao'], value_set=replaced_dates)))
+            tables.insert(0, compacted)
+            for date_str, info in manifest.get('dates', {}).items():
+                dates.setdefault(date_str, info)
+
+        month_table = conform_table(pa.concat_tables(tables))
+        # Um único arquivo ordenado por ticker no mês inteiro (estatísticas de row group úteis)
+        metadata = {
+            'source': 'RAW_COMPACTION',
+            'month': label,
+            'records_count': str(month_table.num_rows),
+            'dates_count': str(len(dates))
+        }
+
+        # 1. Novo arquivo do mês (substitui o anterior de uma vez)
+        with self.store.open_write(target_key, metadata=metadata) as handle:
+            write_raw_parquet(month_table, handle)
+
+        # 2. Manifest registra a troca antes de remover os diários
+        run = {
+            'run_id': datetime.now().strftime('%Y%m%dT%H%M%S%f'),
+            'compacted_at': datetime.now().isoformat(),
+            'replaced': [{'key': item['key'], 'size': item['size'], 'etag': item['etag']} for item in daily],
+            'rows': month_table.num_rows
+        }
+        manifest = {
+            'month': label,
+            'status': 'swapping',
+            'compacted_key': target_key,
+            'rows': month_table.num_rows,
+            'dates': dict(sorted(dates.items())),
+            'runs': manifest.get('runs', []) + [run]
+        }
+        self._write_manifest(year, month, manifest)
+
+        # 3. Remove os diários que não mudaram desde a leitura
+        unchanged = [item['key'] for item in daily if self.store.etag(item['key']) == item['etag']]
+        skipped = len(daily) - len(unchanged)
+        if skipped:
+            logger.warning(f"{label}: {skipped} diários regravados durante a compactação "
+                           f"serão compactados na próxima execução")
+        self.store.delete(unchanged)
+
+        manifest['status'] = 'committed'
+        self._write_manifest(year, month, manifest)
+
+        after = next((item for item in self.store.list(month_prefix(year, month))
+                      if item['key'] == target_key), None)
+        summary.update({
+            'rows': month_table.num_rows,
+            'dates': len(dates),
+            'bytes_after': after['size'] if after else None
+        })
+        logger.info(f"{label}: {len(daily)} diários compactados em {target_key} "
+                    f"({month_table.num_rows} linhas)")
+        return summary
+
+    def _write_manifest(self, year: int, month: int, manifest: Dict) -> None:
+        body = json.dumps(manifest, ensure_ascii=False, indent=2, default=str).encode('utf-8')
+        self.store.write(manifest_key(year, month), body, 'application/json')
+
+    def run(self, start_month: Optional[str] = None, end_month: Optional[str] = None,
+            dry_run: bool = False) -> Dict:
+        """
+        Compacta todos os meses fechados pendentes
+
+        Returns:
+            Resumo com os meses compactados e os que falharam
+        """
+        results = []
+        failed = []
+        for year, month in self.pending_months(start_month, end_month):
+            try:
+                results.append(self.compact_month(year, month, dry_run=dry_run))
+            except Exception as e:
+                logger.error(f"Erro ao compactar {year}-{month:02d}: {e}")
+                failed.append(f"{year}-{month:02d}")
+
+        return {
+            'compacted_months': [result['month'] for result in results if result['status'] == 'compacted'],
+            'pending_months': [result['month'] for result in results if result['status'] == 'dry_run'],
+            'failed_months': failed,
+            'replaced_files': sum(result['replaced_files'] for result in results),
+            'months': results
+        }
@@ -0,0 +1,216 @@
+"""
+Cliente HTTP compartilhado do scraper
+Mantém uma sessão com pool de conexões reaproveitada entre invocações
+quentes da Lambda e entre datas do backfill, com revalidação condicional
+(ETag / If-Modified-Since) para que páginas inalteradas retornem 304
+Cada GET passa pela camada de resiliência (retentativa, circuit breaker, hedging)
+e, quando houver limitador de taxa, cada requisição enviada espera a vez do host
+"""
+
+import logging
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import ResilientCaller, resilience_from_env
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+
+
+class PooledHttpClient:
+    """
+    Sessão HTTP com pool de conexões e cache de validadores por URL
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE,
+                 resilience: Optional[ResilientCaller] = None):
+        self.session = requests.Session()
+        # Sem camada de resiliência cada GET é uma única tentativa
+        self.resilience = resilience
+        self.pool_size = 0
+        self._validators: Dict[str, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        # Contadores de pools descartados ao redimensionar
+        self._retired_connections = 0
+        self._retired_requests = 0
+        self.not_modified_count = 0
+        self.ensure_pool_size(pool_size)
+
+    def ensure_pool_size(self, pool_size: int) -> None:
+        """
+        Garante que o pool comporte ao menos `pool_size` conexões por host
+
+        Args:
+            pool_size: Número de conexões simultâneas esperadas
+        """
+        with self._lock:
+            if pool_size <= self.pool_size:
+                return
+
+            connections, requests_count = self._pool_counters()
+            self._retired_connections += connections
+            self._retired_requests += requests_count
+
+            replaced = {id(adapter): adapter for prefix, adapter in self.session.adapters.items()
+                        if prefix in ('https://', 'http://')}
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+            self.pool_size = pool_size
+
+            # Fecha os sockets do pool anterior (conexões em uso são fechadas ao serem devolvidas)
+            for old_adapter in replaced.values():
+                old_adapter.close()
+
+        if self.resilience is not None:
+            self.resilience.ensure_capacity(pool_size)
+
+    @staticmethod
+    def cache_key(url: str, params: Optional[dict] = None) -> str:
+        """Chave do cache de validadores: URL final com os parâmetros"""
+        return requests.Request('GET', url, params=params).prepare().url
+
+    def get(self, url: str, params: Optional[dict] = None, headers: Optional[dict] = None,
+            timeout: float = 30, conditional: bool = True,
+            rate_limiter=None) -> requests.Response:
+        """
+        Faz um GET pela sessão compartilhada
+
+        Args:
+            url: URL de destino
+            params: Parâmetros da query string
+            headers: Cabeçalhos da requisição
+            timeout: Timeout de cada tentativa em segundos
+            conditional: Envia If-None-Match/If-Modified-Since se houver validadores
+            rate_limiter: Limitador por host (acquire(url)) aplicado a cada
+                requisição enviada, inclusive retentativas e hedges
+
+        Returns:
+            Resposta HTTP; `response.cache_key` identifica a URL no cache
+        """
+        key = self.cache_key(url, params)
+        request_headers = dict(headers or {})
+
+        if conditional:
+            with self._lock:
+                validators = self._validators.get(key)
+            if validators:
+                if validators.get('etag'):
+                    request_headers['If-None-Match'] = validators['etag']
+                if validators.get('last_modified'):
+                    request_headers['If-Modified-Since'] = validators['last_modified']
+
+        def send(attempt_timeout: float) -> requests.Response:
+            return self.session.get(url, headers=request_headers, params=params,
+                                    timeout=attempt_timeout)
+
+        throttle = (lambda: rate_limiter.acquire(url)) if rate_limiter else None
+
+        if self.resilience is not None:
+            response = self.resilience.call(urlsplit(url).netloc, send, timeout, throttle)
+        else:
+            if throttle is not None:
+                throttle()
+            response = send(timeout)
+        response.cache_key = key
+
+        if response.status_code == 304:
+            with self._lock:
+                self.not_modified_count += 1
+
+        return response
+
+    def store_validators(self, response: requests.Response) -> None:
+        """
+        Guarda ETag/Last-Modified de uma resposta processada com sucesso
+
+        Só deve ser chamado depois que o conteúdo foi persistido, para que
+        uma falha posterior não transforme a próxima tentativa em um 304
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+
+        if not etag and not last_modified:
+            return
+
+        key = getattr(response, 'cache_key', None) or response.url
+        with self._lock:
+            self._validators[key] = {'etag': etag, 'last_modified': last_modified}
+
+    def _pool_counters(self):
+        """Soma conexões abertas e requisições feitas pelos pools ativos"""
+        connections = 0
+        requests_count = 0
+        seen = set()
+
+        for adapter in self.session.adapters.values():
+            if id(adapter) in seen or not hasattr(adapter, 'poolmanager'):
+                continue
+            seen.add(id(adapter))
+
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                connections += getattr(pool, 'num_connections', 0)
+                requests_count += getattr(pool, 'num_requests', 0)
+
+        return connections, requests_count
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Estatísticas de reaproveitamento de conexões e revalidação
+
+        Returns:
+            Requisições, handshakes (conexões novas), conexões reaproveitadas e 304s
+        """
+        with self._lock:
+            connections, requests_count = self._pool_counters()
+            connections += self._retired_connections
+            requests_count += self._retired_requests
+            not_modified = self.not_modified_count
+
+        stats = {
+            'requests': requests_count,
+            'handshakes': connections,
+            'reused_connections': max(0, requests_count - connections),
+            'not_modified': not_modified
+        }
+        if self.resilience is not None:
+            stats.update(self.resilience.stats())
+        return stats
+
+    def log_stats(self) -> None:
+        """Registra as estatísticas da sessão no log"""
+        stats = self.stats()
+        logger.info(f"Sessão HTTP: {stats['requests']} requisições, "
+                    f"{stats['handshakes']} handshakes, "
+                    f"{stats['reused_connections']} conexões reaproveitadas, "
+                    f"{stats['not_modified']} respostas 304")
+        if self.resilience is not None:
+            logger.info(f"Resiliência: {stats['retries']} retentativas, "
+                        f"{stats['hedged_requests']} hedges ({stats['hedge_wins']} vencedores, "
+                        f"{stats['hedges_capped']} evitados pelo limite do host), "
+                        f"{stats['circuit_rejections']} rejeitadas por circuito aberto, "
+                        f"latência p50 {stats['latency_p50_ms']} ms / p99 {stats['latency_p99_ms']} ms")
+
+
+# Cliente compartilhado, preservado entre invocações quentes da Lambda
+_shared_client: Optional[PooledHttpClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_http_client() -> PooledHttpClient:
+    """Retorna o cliente HTTP do processo, criando-o na primeira chamada"""
+    global _shared_client
+
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = PooledHttpClient(resilience=resilience_from_env())
+        return _shared_client
@@ -1,33 +1,70 @@
 import json
-import boto3
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime, timedelta
-import pyarrow as pa
-import pyarrow.parquet as pq
-from io import BytesIO
+from datetime import datetime
 import logging
-from typing import Dict, List, Optional
-import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 import os
 import sys
+import threading
 
 # Adiciona o diretório raiz do projeto ao path para importar config
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+# Adiciona o diretório do scraper para importar os módulos irmãos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-try:
-    from config import config
-    CONFIG_AVAILABLE = True
-except ImportError:
-    CONFIG_AVAILABLE = False
+if TYPE_CHECKING:
+    import pyarrow as pa
 
 # Configuração de logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Clientes AWS
-s3_client = boto3.client('s3')
+# Cold start enxuto: requests, pyarrow, boto3, config.py e os módulos irmãos
+# só são carregados no caminho que os usa (ver get_s3_client e get_config);
+# o init da Lambda importa apenas a biblioteca padrão
+# STORAGE_BACKEND=local grava no diretório STORAGE_LOCAL_DIR em vez do bucket
+s3_client = None
+_config = None
+_config_loaded = False
+
+
+def get_s3_client():
+    """Cliente S3 do processo, criado no primeiro uso e reaproveitado nas invocações quentes"""
+    global s3_client
+    if s3_client is None:
+        from storage import create_s3_client
+        s3_client = create_s3_client()
+    return s3_client
+
+
+def get_config():
+    """Configuração do projeto (config.py), carregada no primeiro uso; None se indisponível"""
+    global _config, _config_loaded
+    if not _config_loaded:
+        try:
+            from config import config
+            _config = config
+        except ImportError:
+            _config = None
+        _config_loaded = True
+    return _config
+
+# Índices coletados quando nem o evento nem SCRAPER_INDICES informam outros
+# (ex.: SCRAPER_INDICES="IBOV,IBXX,IBXL,SMLL,IDIV,IFNC,IEEX")
+DEFAULT_INDICES = ['IBOV']
+INDEX_PAGE_URL = "https://sistemaswebb3-listados.b3.com.br/indexPage/day/{index}"
+
+
+def parse_indices(indices: Union[str, List[str], None]) -> List[str]:
+    """Normaliza a lista de índices ('IBOV,SMLL' ou lista), sem repetições"""
+    if isinstance(indices, str):
+        indices = indices.split(',')
+    normalized = []
+    for index in indices or []:
+        index = index.strip().upper()
+        if index and index not in normalized:
+            normalized.append(index)
+    return normalized or list(DEFAULT_INDICES)
 
 class B3Scraper:
     """
@@ -35,18 +72,100 @@ class B3Scraper:
     Captura dados da carteira diária do IBOV
     """
     
-    def __init__(self, bucket_name: str):
+    def __init__(self, bucket_name: str, indices: Union[str, List[str], None] = None):
+        from http_client import get_shared_http_client
+        from b3_api_client import B3PortfolioClient
+        from page_archive import archive_from_env
+        from storage import storage_from_env
+        
         self.bucket_name = bucket_name
-        self.base_url = "https://sistemaswebb3-listados.b3.com.br/indexPage/day/IBOV"
+        # Índices coletados a cada execução, gravados juntos na mesma partição
+        self.indices = parse_indices(indices or os.environ.get('SCRAPER_INDICES'))
+        # Sessão HTTP compartilhada (sobrevive a invocações quentes da Lambda)
+        self.http = get_shared_http_client()
+        # Limitador opcional por host (definido pelo BackfillRunner)
+        self.rate_limiter = None
+        # Backend de parsing da tabela: 'lxml' (padrão) ou 'bs4'
+        self.parser_backend = os.environ.get('SCRAPER_PARSER_BACKEND', 'lxml')
+        # Cliente da API JSON da B3 (fonte principal; o HTML é o fallback)
+        self.api_client = B3PortfolioClient(self.http)
+        # Índices em paralelo, cada um com suas páginas da API em paralelo
+        self.http.ensure_pool_size(len(self.indices) * self.api_client.max_workers)
+        self.use_json_api = os.environ.get('SCRAPER_USE_JSON_API', 'true').lower() == 'true'
+        # Datas em que nenhuma carteira mudou desde a última coleta (HTTP 304 ou arquivo)
+        self.not_modified_dates = set()
+        # Respostas aguardando persistência para guardar seus validadores,
+        # por (data, índice); os índices são buscados em threads
+        self._pending_responses = {}
+        self._pending_lock = threading.Lock()
+        # Datas cujo conteúdo já estava gravado (upload ignorado)
+        self.unchanged_uploads = set()
+        # Armazenamento das partições raw: bucket S3 ou diretório local (ver storage)
+        self.storage = storage_from_env(bucket_name, client_factory=get_s3_client)
+        # Arquivo das respostas brutas (no mesmo armazenamento) e entradas aguardando a partição raw
+        self.archive = archive_from_env(self.storage)
+        self._pending_archive = {}
+        # URL da página de cada índice ('{index}' é substituído pelo código)
+        self.base_url = INDEX_PAGE_URL
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'pt-BR,pt;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
+            'Accept-Encoding': 'gzip, deflate',
             'Upgrade-Insecure-Requests': '1'
         }
     
+    def fetch_portfolio_table(self, date_str: Optional[str] = None,
+                              indices: Optional[List[str]] = None) -> 'pa.Table':
+        """
+        Faz o scraping das carteiras dos índices em paralelo, direto para uma tabela Arrow
+        
+        Args:
+            date_str: Data no formato YYYY-MM-DD, se None usa data atual
+            indices: Códigos dos índices, se None usa os do scraper
+            
+        Returns:
+            pyarrow.Table com as ações de todos os índices (coluna 'indice'); vazia
+            se nenhuma carteira mudou desde a última coleta (data registrada em
+            not_modified_dates)
+        """
+        # Data do pregão solicitado e instante da extração (único por fetch)
+        trade_date = date_str or datetime.now().strftime('%Y-%m-%d')
+        extraction_time = datetime.now().isoformat()
+        indices = parse_indices(indices) if indices else self.indices
+        self.not_modified_dates.discard(trade_date)
+        
+        from columnar import concat_portfolio_tables, empty_portfolio_table
+        
+        tables = self._fetch_indices(indices, trade_date, extraction_time, date_str)
+        unchanged = [index for index in indices if tables[index] is None]
+        
+        if len(unchanged) == len(indices):
+            # Nenhuma carteira mudou: nada a parsear nem a gravar
+            self.not_modified_dates.add(trade_date)
+            return empty_portfolio_table()
+        
+        if unchanged:
+            # A partição raw tem todos os índices: os inalterados são buscados de novo
+            logger.info(f"Carteiras inalteradas de {', '.join(unchanged)} buscadas novamente "
+                        f"para completar a partição de {trade_date}")
+            tables.update(self._fetch_indices(unchanged, trade_date, extraction_time,
+                                              date_str, force=True))
+        
+        return concat_portfolio_tables([tables[index] for index in indices])
+    
+    def fetch_ibov_table(self, date_str: Optional[str] = None) -> 'pa.Table':
+        """
+        Faz o scraping da carteira do IBOV direto para uma tabela Arrow
+        
+        Args:
+            date_str: Data no formato YYYY-MM-DD, se None usa data atual
+            
+        Returns:
+            pyarrow.Table com os dados das ações (ver fetch_portfolio_table)
+        """
+        return self.fetch_portfolio_table(date_str, ['IBOV'])
+    
     def fetch_ibov_data(self, date_str: Optional[str] = None) -> List[Dict]:
         """
         Faz o scraping dos dados da carteira do IBOV
@@ -55,8 +174,46 @@ class B3Scraper:
             date_str: Data no formato YYYY-MM-DD, se None usa data atual
             
         Returns:
-            Lista de dicionários com os dados das ações
+            Lista de dicionários com os dados das ações (ver fetch_ibov_table)
+        """
+        return self.fetch_ibov_table(date_str).to_pylist()
+    
+    def _fetch_indices(self, indices: List[str], trade_date: str, extraction_time: str,
+                       date_str: Optional[str], force: bool = False) -> Dict[str, Optional['pa.Table']]:
+        """Busca os índices em paralelo pela sessão HTTP compartilhada"""
+        if len(indices) == 1:
+            return {indices[0]: self._fetch_index(indices[0], trade_date, extraction_time,
+                                                  date_str, force)}
+        
+        with ThreadPoolExecutor(max_workers=len(indices)) as executor:
+            tables = executor.map(
+                lambda index: self._fetch_index(index, trade_date, extraction_time, date_str, force),
+                indices
+            )
+            return dict(zip(indices, tables))
+    
+    def _fetch_index(self, index: str, trade_date: str, extraction_time: str,
+                     date_str: Optional[str], force: bool = False) -> Optional['pa.Table']:
+        """
+        Busca a carteira de um índice: API JSON primeiro, página HTML como fallback
+        
+        Args:
+            force: Ignora a revalidação (304) e o arquivo, sempre retornando a carteira
+            
+        Returns:
+            Tabela da carteira, ou None se ela não mudou desde a última coleta
         """
+        if self.use_json_api:
+            table, unchanged = self._fetch_from_api(index, trade_date, extraction_time, force)
+            if unchanged:
+                return None
+            if table is not None and table.num_rows:
+                return table
+        
+        import requests
+        
+        url = self.base_url.format(index=index)
+        
         try:
             params = {
                 'language': 'pt-br'
@@ -65,67 +222,34 @@ class B3Scraper:
             if date_str:
                 params['date'] = date_str
             
-            logger.info(f"Fazendo scraping da URL: {self.base_url}")
-            response = requests.get(self.base_url, headers=self.headers, params=params, timeout=30)
-            response.raise_for_status()
+            logger.info(f"Fazendo scraping da URL: {url}")
+            # O limitador do backfill vale para cada requisição, inclusive retentativas e hedges
+            response = self.http.get(url, headers=self.headers, params=params, timeout=30,
+                                     conditional=not force, rate_limiter=self.rate_limiter)
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            if response.status_code == 304:
+                # Página inalterada: nada a parsear nem a gravar
+                logger.info(f"Página de {index} em {trade_date} não modificada (304), parsing ignorado")
+                self.http.log_stats()
+                return None
             
-            # Encontrar a tabela com os dados
-            table_rows = soup.find_all('tr')
+            response.raise_for_status()
+            
+            if self._archive_response(trade_date, index, response.content, 'html',
+                                      response.url, force):
+                # Conteúdo idêntico ao da partição atual: a página pode ser revalidada
+                self.http.store_validators(response)
+                return None
             
-            stocks_data = []
-            current_date = datetime.now().strftime('%Y-%m-%d')
+            table = self.parse_portfolio_page(response.content, trade_date, extraction_time, index)
             
-            for row in table_rows:
-                cells = row.find_all('td')
-                if len(cells) >= 5:  # Linha com dados válidos
-                    try:
-                        # Extrair dados das células
-                        codigo = cells[0].text.strip() if cells[0].text.strip() else None
-                        nome_empresa = cells[1].text.strip() if cells[1].text.strip() else None
-                        tipo = cells[2].text.strip() if cells[2].text.strip() else None
-                        qtde_teorica = cells[3].text.strip() if cells[3].text.strip() else None
-                        participacao = cells[4].text.strip() if cells[4].text.strip() else None
-                        
-                        # Validar se temos dados válidos
-                        if not codigo or len(codigo) < 4:
-                            continue
-                            
-                        # Limpar e converter dados numéricos
-                        if qtde_teorica:
-                            qtde_teorica = qtde_teorica.replace('.', '').replace(',', '.')
-                            try:
-                                qtde_teorica = float(qtde_teorica)
-                            except ValueError:
-                                qtde_teorica = None
-                        
-                        if participacao:
-                            participacao = participacao.replace(',', '.')
-                            try:
-                                participacao = float(participacao)
-                            except ValueError:
-                                participacao = None
-                        
-                        stock_data = {
-                            'data_pregao': current_date,
-                            'codigo_acao': codigo,
-                            'nome_empresa': nome_empresa,
-                            'tipo_acao': tipo,
-                            'quantidade_teorica': qtde_teorica,
-                            'percentual_participacao': participacao,
-                            'data_extracao': datetime.now().isoformat(),
-                            'fonte': 'B3_IBOV'
-                        }
-                        
-                        stocks_data.append(stock_data)
-                        
-                    except Exception as e:
-                        logger.warning(f"Erro ao processar linha da tabela: {e}")
-                        continue
+            logger.info(f"Extraídos {table.num_rows} registros de ações de {index}")
+            self.http.log_stats()
             
-            logger.info(f"Extraídos {len(stocks_data)} registros de ações")
-            return stocks_data
+            if table.num_rows:
+                with self._pending_lock:
+                    self._pending_responses[(trade_date, index)] = response
+            return table
             
         except requests.exceptions.RequestException as e:
             logger.error(f"Erro ao fazer request para B3: {e}")
@@ -134,91 +258,309 @@ class B3Scraper:
             logger.error(f"Erro no scraping dos dados: {e}")
             raise
     
-    def save_to_s3_parquet(self, data: List[Dict], date_str: str) -> str:
+    def _fetch_from_api(self, index: str, trade_date: str, extraction_time: str,
+                        force: bool = False) -> Tuple[Optional['pa.Table'], bool]:
+        """
+        Busca a carteira de um índice pela API JSON da B3
+        
+        Returns:
+            Tupla (tabela da carteira ou None se a API falhar ou não tiver a data,
+            True se a carteira for idêntica à arquivada)
+        """
+        import requests
+        
+        try:
+            portfolio = self.api_client.fetch_portfolio_for_date(trade_date, index,
+                                                                 rate_limiter=self.rate_limiter)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"API JSON da B3 indisponível para {index}, usando scraping HTML: {e}")
+            return None, False
+        
+        if portfolio is None:
+            return None, False
+        
+        content = self.api_client.serialize_portfolio(portfolio)
+        if self._archive_response(trade_date, index, content, 'json',
+                                  self.api_client.page_url(index, 1), force):
+            return None, True
+        
+        table = self.api_client.build_table(portfolio['results'], trade_date, extraction_time, index)
+        logger.info(f"Extraídos {table.num_rows} registros de ações de {index} pela API JSON")
+        return table, False
+    
+    def _archive_response(self, trade_date: str, index: str, content: bytes, kind: str,
+                          source_url: Optional[str] = None, force: bool = False) -> bool:
+        """
+        Arquiva a resposta bruta e verifica se ela mudou desde a última partição gravada
+        
+        Returns:
+            True se o conteúdo for idêntico ao arquivado (parsing e upload dispensáveis)
+        """
+        if self.archive is None:
+            return False
+        
+        try:
+            if not force and self.archive.is_unchanged(trade_date, content, index):
+                logger.info(f"Resposta de {index} em {trade_date} idêntica à arquivada, "
+                            f"parsing e upload ignorados")
+                return True
+            entry = self.archive.store(trade_date, content, kind, source_url, index)
+            with self._pending_lock:
+                self._pending_archive[(trade_date, index)] = entry
+        except Exception as e:
+            # Falha no arquivo não impede a coleta
+            logger.warning(f"Erro ao arquivar resposta de {index} em {trade_date}: {e}")
+        
+        return False
+    
+    def replay_from_archive(self, date_str: str) -> 'pa.Table':
+        """
+        Reconstrói a tabela de um pregão a partir das últimas respostas arquivadas, sem rede
+        
+        Returns:
+            pyarrow.Table com as ações de todos os índices arquivados; vazia se não houver
+        """
+        if self.archive is None:
+            raise ValueError("Arquivo de páginas desabilitado (SCRAPER_ARCHIVE_BACKEND=none)")
+        
+        from columnar import concat_portfolio_tables
+        
+        tables = []
+        for index, entry in sorted(self.archive.latest_entries(date_str).items()):
+            loaded = self.archive.load(date_str, index, entry)
+            if loaded is None:
+                logger.warning(f"Resposta arquivada de {index} em {date_str} não encontrada")
+                continue
+            
+            content, entry = loaded
+            # Mantém o instante da coleta original como data_extracao
+            extraction_time = entry.get('fetched_at') or datetime.now().isoformat()
+            
+            if entry['kind'] == 'json':
+                portfolio = json.loads(content)
+                tables.append(self.api_client.build_table(portfolio['results'], date_str,
+                                                          extraction_time, index))
+            else:
+                tables.append(self.parse_portfolio_page(content, date_str, extraction_time, index))
+        
+        if not tables:
+            logger.warning(f"Nenhuma resposta arquivada para {date_str}")
+        return concat_portfolio_tables(tables)
+    
+    def parse_portfolio_page(self, content: bytes, trade_date: str,
+                             extraction_time: str, index: str = 'IBOV') -> 'pa.Table':
+        """
+        Converte a página HTML da carteira em uma tabela Arrow
+        
+        Args:
+            content: HTML bruto da página
+            trade_date: Data do pregão (YYYY-MM-DD)
+            extraction_time: Instante da extração (ISO 8601)
+            index: Código do índice da página
+            
+        Returns:
+            pyarrow.Table com os dados das ações
+        """
+        from table_parser import extract_table_rows
+        from columnar import PortfolioTableBuilder
+        
+        table_rows, backend = extract_table_rows(content, backend=self.parser_backend)
+        logger.info(f"Tabela extraída com o parser {backend}: {len(table_rows)} linhas")
+        
+        builder = PortfolioTableBuilder(trade_date, extraction_time, f'B3_{index}', indice=index)
+        
+        for cells in table_rows:
+            # Validar se temos dados válidos (código com ao menos 4 caracteres)
+            if not cells[0] or len(cells[0]) < 4:
+                continue
+            builder.append(cells[0], cells[1] or None, cells[2] or None,
+                           cells[3] or None, cells[4] or None)
+        
+        return builder.build()
+    
+    def save_to_s3_parquet(self, data: Union['pa.Table', List[Dict]], date_str: str) -> str:
         """
-        Salva os dados no S3 em formato parquet com partição diária
+        Salva os dados no armazenamento (S3 ou local) em formato parquet com partição diária
         
         Args:
-            data: Lista de dicionários com os dados
-            date_str: Data para particionamento
+            data: Tabela Arrow (ou lista de dicionários) com os dados
+            date_str: Data do pregão (YYYY-MM-DD), usada no particionamento e na chave
             
         Returns:
-            Caminho do arquivo salvo no S3
+            URI do arquivo salvo (s3://bucket/chave ou caminho local)
         """
+        import pyarrow as pa
+        from columnar import records_to_table, table_content_hash, with_partition_columns
+        from page_archive import raw_object_key
+        from raw_schema import conform_table, write_raw_parquet
+        
         try:
-            if not data:
-                raise ValueError("Nenhum dado para salvar")
+            table = data if isinstance(data, pa.Table) else records_to_table(data)
             
-            # Criar DataFrame
-            df = pd.DataFrame(data)
+            if not table.num_rows:
+                raise ValueError("Nenhum dado para salvar")
             
-            # Adicionar colunas de particionamento
-            df['year'] = pd.to_datetime(df['data_pregao']).dt.year
-            df['month'] = pd.to_datetime(df['data_pregao']).dt.month
-            df['day'] = pd.to_datetime(df['data_pregao']).dt.day
+            # Definir a chave com particionamento (mesma no bucket e no diretório local)
+            # A partição vem da data solicitada, não do relógio da execução
+            s3_key = raw_object_key(date_str)
             
-            # Converter para formato parquet em memória
-            buffer = BytesIO()
-            table = pa.Table.from_pandas(df)
-            pq.write_table(table, buffer)
+            # Schema canônico da camada raw (tipos, ordenação por ticker e dicionários)
+            table = conform_table(table)
             
-            # Definir caminho no S3 com particionamento
-            s3_key = f"raw-data/bovespa/year={df['year'].iloc[0]}/month={df['month'].iloc[0]:02d}/day={df['day'].iloc[0]:02d}/ibov_carteira_{date_str.replace('-', '')}.parquet"
+            # Mesmo conteúdo já gravado: sem PUT, a notificação do bucket não
+            # dispara o trigger nem um novo job do Glue
+            content_sha256 = table_content_hash(table)
+            self.unchanged_uploads.discard(date_str)
             
-            # Upload para S3
-            buffer.seek(0)
-            s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=buffer.getvalue(),
-                ContentType='application/octet-stream',
-                Metadata={
+            if self._stored_content_hash(s3_key, date_str) == content_sha256:
+                logger.info(f"Conteúdo de {date_str} idêntico ao já gravado, upload ignorado")
+                self.unchanged_uploads.add(date_str)
+            else:
+                # Colunas de particionamento calculadas uma vez para o lote
+                table = with_partition_columns(table, date_str)
+                
+                import pyarrow.compute as pc
+                
+                extraction_time = table['data_extracao'][0].as_py()
+                metadata = {
                     'source': 'B3_SCRAPER',
                     'date': date_str,
-                    'records_count': str(len(data)),
-                    'extraction_time': datetime.now().isoformat()
+                    'records_count': str(table.num_rows),
+                    'extraction_time': (extraction_time or datetime.now()).isoformat(),
+                    'indices': ','.join(sorted(pc.unique(table['indice']).to_pylist())),
+                    'content_sha256': content_sha256
                 }
-            )
+                
+                # Parquet gravado em streaming no armazenamento (opções de raw_schema):
+                # multipart upload no S3, arquivo temporário + rename no local.
+                # A tabela já está no schema canônico (as colunas de partição
+                # são int32, como em PARTITION_SCHEMA)
+                with self.storage.open_write(s3_key, metadata=metadata) as upload:
+                    write_raw_parquet(table, upload, conformed=True)
+                
+                logger.info(f"Dados salvos em: {self.storage.uri(s3_key)}")
+            
+            with self._pending_lock:
+                pending_keys = [key for key in self._pending_responses if key[0] == date_str]
+                pending_responses = [self._pending_responses.pop(key) for key in pending_keys]
+                pending_keys = [key for key in self._pending_archive if key[0] == date_str]
+                pending_entries = [self._pending_archive.pop(key) for key in pending_keys]
+            
+            # Só agora as páginas podem ser revalidadas com 304 nas próximas coletas
+            for pending_response in pending_responses:
+                self.http.store_validators(pending_response)
+            
+            # E as respostas arquivadas passam a ser a referência de conteúdo do pregão
+            if pending_entries and self.archive is not None:
+                try:
+                    self.archive.mark_latest(date_str, pending_entries)
+                except Exception as e:
+                    logger.warning(f"Erro ao atualizar o latest.json do arquivo de {date_str}: {e}")
             
-            logger.info(f"Dados salvos em S3: s3://{self.bucket_name}/{s3_key}")
-            return f"s3://{self.bucket_name}/{s3_key}"
+            return self.storage.uri(s3_key)
             
         except Exception as e:
-            logger.error(f"Erro ao salvar no S3: {e}")
+            logger.error(f"Erro ao salvar a partição raw: {e}")
             raise
+    
+    def _stored_content_hash(self, s3_key: str, date_str: Optional[str] = None) -> Optional[str]:
+        """
+        Hash de conteúdo gravado nos metadados do objeto raw existente
+        
+        Se o diário não existir mas o mês já tiver sido compactado, o hash vem
+        do manifest da compactação
+        
+        Returns:
+            Valor de 'content_sha256', ou None se o objeto não existir ou não tiver o hash
+        """
+        try:
+            stored = self.storage.head(s3_key)
+        except Exception as e:
+            # Na dúvida, grava: um PUT a mais é melhor que uma partição desatualizada
+            logger.warning(f"Não foi possível ler os metadados de {s3_key}: {e}")
+            return None
+        if stored is None:
+            return self._compacted_content_hash(date_str) if date_str else None
+        return stored['metadata'].get('content_sha256')
+    
+    def _compacted_content_hash(self, date_str: str) -> Optional[str]:
+        """Hash do pregão registrado no manifest do mês compactado, se houver"""
+        from compaction import manifest_key
+        
+        trade_date = datetime.strptime(date_str, '%Y-%m-%d')
+        try:
+            body = self.storage.read(manifest_key(trade_date.year, trade_date.month))
+        except Exception as e:
+            logger.warning(f"Não foi possível ler o manifest de compactação de {date_str}: {e}")
+            return None
+        if not body:
+            return None
+        return json.loads(body).get('dates', {}).get(date_str, {}).get('content_sha256')
 
 def lambda_handler(event, context):
     """
     Handler principal da Lambda para scraping de dados da B3
     
     Args:
-        event: Evento do Lambda (pode conter data específica)
+        event: Evento do Lambda (pode conter data específica, índices ou um backfill)
         context: Contexto de execução do Lambda
         
+    Formato do evento:
+        {"date": "2025-01-02", "indices": ["IBOV", "SMLL"]}
+        
+    Formato do evento de backfill:
+        {"backfill": {"start_date": "2025-01-02", "end_date": "2025-01-31",
+                      "max_workers": 4, "rate_limit": 2.0, "indices": ["IBOV"]}}
+        
+    Formato do evento de compactação (todos os campos opcionais):
+        {"compact": {"start_month": "2024-01", "end_month": "2024-12",
+                     "grace_days": 5, "dry_run": false}}
+        
     Returns:
         Resposta com status da execução
     """
     try:
-        # Obter configurações
-        if CONFIG_AVAILABLE:
+        # Obter configurações (o config.py só existe fora do pacote da Lambda)
+        config = get_config()
+        if config is not None:
             bucket_name = config.s3_bucket_name
         else:
             bucket_name = os.environ.get('S3_BUCKET_NAME')
-            if not bucket_name:
+            # O backend local (STORAGE_BACKEND=local) dispensa o bucket
+            if not bucket_name and os.environ.get('STORAGE_BACKEND', 's3').lower() != 'local':
                 raise ValueError("Variável de ambiente S3_BUCKET_NAME não encontrada")
         
+        if event and 'backfill' in event:
+            return _handle_backfill(event['backfill'], bucket_name)
+        
+        if event and 'compact' in event:
+            return _handle_compaction(event['compact'] or {}, bucket_name)
+        
         # Determinar data para scraping
         date_str = event.get('date') if event and 'date' in event else datetime.now().strftime('%Y-%m-%d')
         
         logger.info(f"Iniciando scraping para data: {date_str}")
         
         # Inicializar scraper
-        scraper = B3Scraper(bucket_name)
+        scraper = B3Scraper(bucket_name, indices=(event or {}).get('indices'))
         
-        # Fazer scraping
-        stocks_data = scraper.fetch_ibov_data(date_str)
+        # Fazer scraping de todos os índices em uma única invocação
+        stocks_table = scraper.fetch_portfolio_table(date_str)
+        
+        if not stocks_table.num_rows and date_str in scraper.not_modified_dates:
+            logger.info("Carteiras não modificadas desde a última coleta")
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Carteiras não modificadas desde a última coleta',
+                    'date': date_str,
+                    'indices': scraper.indices,
+                    'not_modified': True,
+                    'http_stats': scraper.http.stats()
+                })
+            }
         
-        if not stocks_data:
+        if not stocks_table.num_rows:
             logger.warning("Nenhum dado encontrado no scraping")
             return {
                 'statusCode': 204,
@@ -228,8 +570,8 @@ def lambda_handler(event, context):
                 })
             }
         
-        # Salvar no S3
-        s3_path = scraper.save_to_s3_parquet(stocks_data, date_str)
+        # Salvar no armazenamento (S3 ou local)
+        s3_path = scraper.save_to_s3_parquet(stocks_table, date_str)
         
         # Resposta de sucesso
         response = {
@@ -237,13 +579,15 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'message': 'Scraping executado com sucesso',
                 'date': date_str,
-                'records_count': len(stocks_data),
+                'records_count': stocks_table.num_rows,
+                'indices': scraper.indices,
                 's3_path': s3_path,
+                'upload_skipped': date_str in scraper.unchanged_uploads,
                 'execution_time': datetime.now().isoformat()
             })
         }
         
-        logger.info(f"Scraping concluído: {len(stocks_data)} registros processados")
+        logger.info(f"Scraping concluído: {stocks_table.num_rows} registros processados")
         return response
         
     except Exception as e:
@@ -258,10 +602,76 @@ def lambda_handler(event, context):
         }
 
 
+def _handle_backfill(backfill_event: dict, bucket_name: str) -> dict:
+    """
+    Executa um backfill de intervalo de datas dentro da Lambda
+    
+    Args:
+        backfill_event: Parâmetros do backfill (start_date, end_date, max_workers, rate_limit, indices)
+        bucket_name: Bucket de destino das partições raw
+        
+    Returns:
+        Resposta com o resumo do backfill
+    """
+    start_date = backfill_event.get('start_date')
+    end_date = backfill_event.get('end_date', start_date)
+    
+    if not start_date:
+        raise ValueError("Evento de backfill sem 'start_date'")
+    
+    from backfill import BackfillRunner, DEFAULT_MAX_WORKERS, DEFAULT_RATE_LIMIT
+    
+    runner = BackfillRunner(
+        B3Scraper(bucket_name, indices=backfill_event.get('indices')),
+        max_workers=int(backfill_event.get('max_workers', DEFAULT_MAX_WORKERS)),
+        rate_limit=float(backfill_event.get('rate_limit', DEFAULT_RATE_LIMIT))
+    )
+    summary = runner.run(start_date, end_date)
+    summary['execution_time'] = datetime.now().isoformat()
+    
+    return {
+        'statusCode': 500 if summary['failed_days'] and not summary['written_days'] else 200,
+        'body': json.dumps({
+            'message': 'Backfill executado',
+            **summary
+        })
+    }
+
+
+def _handle_compaction(compact_event: dict, bucket_name: str) -> dict:
+    """
+    Compacta os meses fechados da camada raw (um arquivo por mês)
+    
+    Args:
+        compact_event: Parâmetros opcionais (start_month, end_month, grace_days, dry_run)
+        bucket_name: Bucket da camada raw
+        
+    Returns:
+        Resposta com o resumo da compactação
+    """
+    from compaction import DEFAULT_GRACE_DAYS, RawCompactor
+    from storage import storage_from_env
+    
+    compactor = RawCompactor(storage_from_env(bucket_name, client_factory=get_s3_client),
+                             grace_days=int(compact_event.get('grace_days', DEFAULT_GRACE_DAYS)))
+    summary = compactor.run(compact_event.get('start_month'), compact_event.get('end_month'),
+                            dry_run=bool(compact_event.get('dry_run', False)))
+    summary['execution_time'] = datetime.now().isoformat()
+    
+    return {
+        'statusCode': 500 if summary['failed_months'] else 200,
+        'body': json.dumps({
+            'message': 'Compactação executada',
+            **summary
+        }, default=str)
+    }
+
+
 # Para teste local
 if __name__ == "__main__":
     # Carrega configurações do .env para teste local
-    if CONFIG_AVAILABLE:
+    config = get_config()
+    if config is not None:
         if not config.validate_aws_config():
             print("❌ Configurações AWS inválidas no arquivo .env")
             exit(1)
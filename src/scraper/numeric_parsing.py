@@ -0,0 +1,92 @@
+"""
+Conversão vetorizada de colunas numéricas no formato brasileiro
+Processa a coluna inteira em uma passada com pyarrow.compute, no lugar das
+conversões célula a célula (_parse_number / _parse_percentage)
+"""
+
+from typing import Iterable, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Depois da limpeza só sobram dígitos e no máximo um ponto decimal
+_VALID_NUMBER = r'^(\d+\.?\d*|\.\d+)$'
+
+
+def _as_string_array(values: Iterable) -> pa.Array:
+    """Converte a entrada (lista, numpy ou pyarrow) em um array de strings"""
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if isinstance(values, pa.Array):
+        return values if pa.types.is_string(values.type) else values.cast(pa.string())
+    return pa.array(values, type=pa.string())
+
+
+def _to_float(cleaned: pa.Array) -> pa.Array:
+    """Converte strings já limpas para float64, com null onde não houver número válido"""
+    valid = pc.match_substring_regex(cleaned, _VALID_NUMBER)
+    return pc.if_else(valid, cleaned, pa.scalar(None, pa.string())).cast(pa.float64())
+
+
+def parse_br_number_array(values: Iterable, as_int: bool = False) -> pa.Array:
+    """
+    Converte uma coluna de números brasileiros ('1.234.567,89') em um array numérico
+
+    Mesma semântica de _parse_number: remove separadores de milhar, troca a
+    vírgula decimal por ponto e descarta caracteres não numéricos
+
+    Args:
+        values: Coluna de strings brutas (None ou vazio viram null)
+        as_int: Retorna int64 (truncando a parte decimal) em vez de float64
+
+    Returns:
+        pyarrow.Array float64 ou int64 com nulls onde a conversão falhou
+    """
+    cleaned = pc.utf8_trim_whitespace(_as_string_array(values))
+    cleaned = pc.replace_substring(cleaned, '.', '')
+    cleaned = pc.replace_substring(cleaned, ',', '.')
+    cleaned = pc.replace_substring_regex(cleaned, r'[^0-9.]', '')
+    numbers = _to_float(cleaned)
+
+    if as_int:
+        return pc.cast(numbers, pa.int64(), safe=False)
+    return numbers
+
+
+def parse_br_percentage_array(values: Iterable) -> pa.Array:
+    """
+    Converte uma coluna de percentuais brasileiros ('8,5%') em float64
+
+    Mesma semântica de _parse_percentage: remove '%', troca a vírgula por
+    ponto e descarta caracteres não numéricos
+
+    Returns:
+        pyarrow.Array float64 com nulls onde a conversão falhou
+    """
+    cleaned = pc.utf8_trim_whitespace(_as_string_array(values))
+    cleaned = pc.replace_substring(cleaned, ',', '.')
+    cleaned = pc.replace_substring_regex(cleaned, r'[^0-9.]', '')
+    return _to_float(cleaned)
+
+
+def to_numpy_with_mask(array: pa.Array, fill_value=0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Separa um array pyarrow em valores numpy e máscara de nulos
+
+    Returns:
+        Tupla (valores com nulos preenchidos por fill_value, máscara True onde era nulo)
+    """
+    mask = array.is_null().to_numpy(zero_copy_only=False)
+    values = array.fill_null(fill_value).to_numpy(zero_copy_only=False)
+    return values, mask
+
+
+def parse_br_numbers(values: Iterable, as_int: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """Versão numpy de parse_br_number_array: retorna (valores, máscara de nulos)"""
+    return to_numpy_with_mask(parse_br_number_array(values, as_int=as_int))
+
+
+def parse_br_percentages(values: Iterable) -> Tuple[np.ndarray, np.ndarray]:
+    """Versão numpy de parse_br_percentage_array: retorna (valores, máscara de nulos)"""
+    return to_numpy_with_mask(parse_br_percentage_array(values))
@@ -0,0 +1,219 @@
+"""
+Arquivo endereçado por conteúdo das respostas brutas da B3
+Cada resposta é gravada comprimida (gzip) sob o hash SHA-256 do conteúdo,
+ao lado da partição raw do pregão:
+
+    raw-data/bovespa/year=2025/month=01/day=02/_archive/<sha256>.<tipo>.gz
+    raw-data/bovespa/year=2025/month=01/day=02/_archive/latest.json
+
+'latest.json' indica, para cada índice, a resposta que gerou a partição raw
+
+O prefixo '_archive' é ignorado pelo Spark e não casa com o filtro '.parquet'
+da notificação do bucket, então não dispara o Glue
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from storage import LocalObjectStore, ObjectStore, S3ObjectStore
+
+logger = logging.getLogger(__name__)
+
+RAW_PREFIX = "raw-data/bovespa"
+ARCHIVE_DIR = "_archive"
+LATEST_FILE = "latest.json"
+
+# Índice das entradas gravadas antes do suporte a vários índices
+DEFAULT_INDEX = 'IBOV'
+
+# Tipos de resposta arquivados: página HTML ou carteira da API JSON
+PAGE_KINDS = ('html', 'json')
+
+
+def raw_partition_prefix(date_str: str) -> str:
+    """Prefixo da partição raw de um pregão (YYYY-MM-DD)"""
+    trade_date = datetime.strptime(date_str, '%Y-%m-%d')
+    return f"{RAW_PREFIX}/year={trade_date.year}/month={trade_date.month:02d}/day={trade_date.day:02d}"
+
+
+def raw_object_key(date_str: str) -> str:
+    """Chave do Parquet raw de um pregão"""
+    trade_date = datetime.strptime(date_str, '%Y-%m-%d')
+    return f"{raw_partition_prefix(date_str)}/ibov_carteira_{trade_date.strftime('%Y%m%d')}.parquet"
+
+
+def content_hash(content: bytes) -> str:
+    """Hash SHA-256 (hex) do conteúdo bruto"""
+    return hashlib.sha256(content).hexdigest()
+
+
+class PageArchive:
+    """
+    Arquivo de páginas sobre um backend de armazenamento (ver storage)
+
+    O layout e o índice 'latest.json' ficam aqui; o backend só lê, grava,
+    verifica e lista chaves
+    """
+
+    def __init__(self, storage: ObjectStore):
+        self.storage = storage
+
+    def _read(self, key: str) -> Optional[bytes]:
+        return self.storage.read(key)
+
+    def _write(self, key: str, body: bytes, content_type: str) -> None:
+        self.storage.write(key, body, content_type)
+
+    def _exists(self, key: str) -> bool:
+        return self.storage.exists(key)
+
+    def _list_latest_keys(self) -> List[str]:
+        return [item['key'] for item in self.storage.list(RAW_PREFIX)
+                if item['key'].endswith(f"/{ARCHIVE_DIR}/{LATEST_FILE}")]
+
+    @staticmethod
+    def archive_key(date_str: str, sha256: str, kind: str) -> str:
+        return f"{raw_partition_prefix(date_str)}/{ARCHIVE_DIR}/{sha256}.{kind}.gz"
+
+    @staticmethod
+    def latest_key(date_str: str) -> str:
+        return f"{raw_partition_prefix(date_str)}/{ARCHIVE_DIR}/{LATEST_FILE}"
+
+    def store(self, date_str: str, content: bytes, kind: str,
+              source_url: Optional[str] = None, index: str = DEFAULT_INDEX) -> Dict:
+        """
+        Grava a resposta comprimida sob o hash do conteúdo (se ainda não existir)
+
+        O 'latest.json' não é alterado: ele só aponta para a nova resposta
+        depois que a partição raw for gravada (ver mark_latest)
+
+        Returns:
+            Entrada do arquivo (sha256, índice, tipo, url, instante e tamanho)
+        """
+        if kind not in PAGE_KINDS:
+            raise ValueError(f"Tipo de página inválido: {kind}")
+
+        entry = {
+            'sha256': content_hash(content),
+            'index': index,
+            'kind': kind,
+            'source_url': source_url,
+            'fetched_at': datetime.now().isoformat(),
+            'size': len(content)
+        }
+        key = self.archive_key(date_str, entry['sha256'], kind)
+
+        # Endereçado por conteúdo: a mesma resposta nunca é gravada duas vezes
+        if not self._exists(key):
+            self._write(key, gzip.compress(content, mtime=0), 'application/gzip')
+            logger.info(f"Resposta de {date_str} arquivada: {key}")
+
+        return entry
+
+    def latest_entries(self, date_str: str) -> Dict[str, Dict]:
+        """Últimas respostas que geraram a partição raw do pregão, por índice"""
+        body = self._read(self.latest_key(date_str))
+        if not body:
+            return {}
+        entries = json.loads(body)
+        # Formato anterior ao multi-índice: uma única entrada do IBOV
+        if 'sha256' in entries:
+            return {entries.get('index', DEFAULT_INDEX): entries}
+        return entries
+
+    def latest(self, date_str: str, index: str = DEFAULT_INDEX) -> Optional[Dict]:
+        """Entrada da última resposta do índice que gerou a partição raw do pregão"""
+        return self.latest_entries(date_str).get(index)
+
+    def mark_latest(self, date_str: str, entries: List[Dict]) -> None:
+        """Atualiza o latest.json do pregão com as respostas que geraram a partição raw"""
+        latest = self.latest_entries(date_str)
+        for entry in entries:
+            latest[entry.get('index', DEFAULT_INDEX)] = entry
+        body = json.dumps(latest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8')
+        self._write(self.latest_key(date_str), body, 'application/json')
+
+    def is_unchanged(self, date_str: str, content: bytes, index: str = DEFAULT_INDEX) -> bool:
+        """True se o conteúdo for idêntico ao da última resposta gravada do índice no pregão"""
+        entry = self.latest(date_str, index)
+        return bool(entry) and entry.get('sha256') == content_hash(content)
+
+    def load(self, date_str: str, index: str = DEFAULT_INDEX,
+             entry: Optional[Dict] = None) -> Optional[Tuple[bytes, Dict]]:
+        """
+        Lê uma resposta arquivada (a última do índice, se `entry` não for informada)
+
+        Returns:
+            Tupla (conteúdo descomprimido, entrada) ou None se não houver arquivo
+        """
+        entry = entry or self.latest(date_str, index)
+        if not entry:
+            return None
+
+        body = self._read(self.archive_key(date_str, entry['sha256'], entry['kind']))
+        if body is None:
+            return None
+
+        content = gzip.decompress(body)
+        if content_hash(content) != entry['sha256']:
+            raise ValueError(f"Resposta arquivada de {date_str} corrompida: hash não confere")
+        return content, entry
+
+    def archived_dates(self, start_date: Optional[str] = None,
+                       end_date: Optional[str] = None) -> List[str]:
+        """Pregões com resposta arquivada, em ordem, opcionalmente limitados ao intervalo"""
+        dates = []
+        for key in self._list_latest_keys():
+            parts = dict(part.split('=', 1) for part in key.split('/') if '=' in part)
+            try:
+                date_str = f"{int(parts['year']):04d}-{int(parts['month']):02d}-{int(parts['day']):02d}"
+            except (KeyError, ValueError):
+                continue
+            if start_date and date_str < start_date:
+                continue
+            if end_date and date_str > end_date:
+                continue
+            dates.append(date_str)
+        return sorted(set(dates))
+
+
+class LocalPageArchive(PageArchive):
+    """Arquivo de páginas no sistema de arquivos local (mesmo layout do bucket)"""
+
+    def __init__(self, root_dir: str):
+        super().__init__(LocalObjectStore(root_dir))
+
+
+class S3PageArchive(PageArchive):
+    """Arquivo de páginas no bucket S3 do pipeline"""
+
+    def __init__(self, s3_client, bucket_name: str):
+        super().__init__(S3ObjectStore(bucket_name, s3_client))
+
+
+def archive_from_env(storage: Optional[ObjectStore] = None) -> Optional[PageArchive]:
+    """
+    Cria o arquivo de páginas a partir das variáveis de ambiente
+
+    SCRAPER_ARCHIVE_BACKEND: 's3' (padrão, o mesmo armazenamento das partições
+    raw), 'local' ou 'none'
+    SCRAPER_ARCHIVE_DIR: diretório raiz do backend local (padrão: ./data)
+
+    Args:
+        storage: Armazenamento do pipeline (ver storage.storage_from_env)
+    """
+    backend = os.environ.get('SCRAPER_ARCHIVE_BACKEND', 's3').lower()
+
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        return LocalPageArchive(os.environ.get('SCRAPER_ARCHIVE_DIR', 'data'))
+    if backend == 's3':
+        return PageArchive(storage) if storage is not None else None
+
+    raise ValueError(f"SCRAPER_ARCHIVE_BACKEND inválido: {backend}")
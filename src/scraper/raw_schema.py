@@ -0,0 +1,173 @@
+"""
+Schema canônico e política de gravação do Parquet da camada raw
+Todos os escritores (Lambda, backfill, replay e execução local) gravam pelo
+write_raw_parquet, com os mesmos tipos, ordenação e opções de encoding:
+
+- data_pregao como date32 e data_extracao como timestamp (ms)
+- quantidade_teorica como int64 e percentual_participacao como decimal(9, 3)
+- indice, codigo_acao, tipo_acao e fonte dictionary-encoded
+- linhas ordenadas por ticker, para estatísticas de página/row group
+  que permitam ao Glue e ao Athena pular dados em filtros por ação
+"""
+
+from typing import Iterable
+
+import pyarrow as pa
+
+from columnar import DEFAULT_INDEX
+
+# Casas decimais de percentual_participacao (a B3 publica 3)
+PERCENTAGE_SCALE = 3
+
+RAW_SCHEMA = pa.schema([
+    pa.field('data_pregao', pa.date32()),
+    pa.field('indice', pa.dictionary(pa.int32(), pa.string())),
+    pa.field('codigo_acao', pa.dictionary(pa.int32(), pa.string())),
+    pa.field('nome_empresa', pa.string()),
+    pa.field('tipo_acao', pa.dictionary(pa.int32(), pa.string())),
+    pa.field('quantidade_teorica', pa.int64()),
+    pa.field('percentual_participacao', pa.decimal128(9, PERCENTAGE_SCALE)),
+    pa.field('data_extracao', pa.timestamp('ms')),
+    pa.field('fonte', pa.dictionary(pa.int32(), pa.string())),
+])
+
+# Colunas de partição (também gravadas no arquivo, como no layout atual)
+PARTITION_SCHEMA = pa.schema([
+    pa.field('year', pa.int32()),
+    pa.field('month', pa.int32()),
+    pa.field('day', pa.int32()),
+])
+
+# Ordenação das linhas: ticker primeiro (filtro mais comum), depois índice e
+# pregão (arquivos compactados com vários pregões)
+SORT_KEYS = [('codigo_acao', 'ascending'), ('indice', 'ascending'), ('data_pregao', 'ascending')]
+
+DICTIONARY_COLUMNS = [field.name for field in RAW_SCHEMA if pa.types.is_dictionary(field.type)]
+
+# Uma partição diária cabe em um único row group; arquivos compactados
+# ficam com row groups de ~128 mil linhas
+ROW_GROUP_SIZE = 128 * 1024
+
+PARQUET_WRITE_OPTIONS = {
+    'compression': 'zstd',
+    'compression_level': 3,
+    'use_dictionary': DICTIONARY_COLUMNS,
+    'write_statistics': True,
+    'write_page_index': True,
+    'data_page_size': 64 * 1024,
+    'coerce_timestamps': 'ms',
+    'allow_truncated_timestamps': True,
+}
+
+
+def _conform_column(column: pa.ChunkedArray, target: pa.DataType) -> pa.ChunkedArray:
+    """Converte uma coluna para o tipo canônico (sem efeito se já estiver nele)"""
+    import pyarrow.compute as pc
+
+    if column.type == target:
+        return column
+
+    if pa.types.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+
+    if pa.types.is_dictionary(target):
+        return pc.dictionary_encode(column.cast(target.value_type))
+    if pa.types.is_timestamp(target) and pa.types.is_string(column.type):
+        return column.cast(pa.timestamp('us')).cast(target, safe=False)
+    if pa.types.is_integer(target) and pa.types.is_floating(column.type):
+        return pc.round(column, 0).cast(target)
+    if pa.types.is_decimal(target) and pa.types.is_floating(column.type):
+        return pc.round(column, target.scale).cast(target)
+
+    return column.cast(target)
+
+
+def conform_table(table: pa.Table) -> pa.Table:
+    """
+    Converte a tabela da carteira para o schema canônico da camada raw
+
+    Aceita a tabela do builder (strings e floats) ou uma já convertida;
+    colunas de partição presentes são mantidas ao final
+
+    Returns:
+        pyarrow.Table com as colunas de RAW_SCHEMA (+ partição), ordenada por ticker
+    """
+    import pyarrow.compute as pc
+
+    if 'indice' not in table.column_names:
+        table = table.append_column('indice', pa.repeat(DEFAULT_INDEX, table.num_rows))
+
+    fields = list(RAW_SCHEMA) + [field for field in PARTITION_SCHEMA if field.name in table.column_names]
+    schema = pa.schema(fields)
+
+    # Ordenação antes do dictionary encoding (sort_by não ordena dicionários)
+    plain = table.select(schema.names)
+    sort_columns = {}
+    for name, _ in SORT_KEYS:
+        column = plain[name]
+        sort_columns[name] = column.cast(column.type.value_type) if pa.types.is_dictionary(column.type) else column
+    if plain.num_rows:
+        plain = plain.take(pc.sort_indices(pa.table(sort_columns), sort_keys=SORT_KEYS))
+
+    columns = [_conform_column(plain[field.name], field.type) for field in schema]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def plain_table(table: pa.Table) -> pa.Table:
+    """
+    Tabela da camada raw com tipos simples, para pandas e JSON
+
+    Dicionários voltam a strings e decimais a float64 (como na tabela do builder)
+    """
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            fields.append(field.with_type(field.type.value_type))
+        elif pa.types.is_decimal(field.type):
+            fields.append(field.with_type(pa.float64()))
+        else:
+            fields.append(field)
+    return table.cast(pa.schema(fields))
+
+
+def write_raw_parquet(table: pa.Table, where, conformed: bool = False) -> None:
+    """
+    Grava a tabela no schema e com as opções de encoding da camada raw
+
+    Args:
+        table: Tabela da carteira (convertida por conform_table se preciso)
+        where: Caminho local ou objeto arquivo (ex.: BytesIO)
+        conformed: A tabela já passou por conform_table (sem nova ordenação e conversão)
+    """
+    import pyarrow.parquet as pq
+
+    pq.write_table(table if conformed else conform_table(table), where, row_group_size=ROW_GROUP_SIZE,
+                   **PARQUET_WRITE_OPTIONS)
+
+
+def write_raw_parquet_batches(tables: Iterable[pa.Table], where, with_partitions: bool = True) -> int:
+    """
+    Grava várias tabelas em um único arquivo, uma por vez, sem juntá-las em memória
+
+    Cada tabela vira um ou mais row groups (ordenados por ticker); com um
+    destino em streaming (ver s3_stream) a memória fica limitada a um lote
+
+    Args:
+        tables: Tabelas da carteira (ex.: um pregão por vez)
+        where: Caminho local ou objeto arquivo
+        with_partitions: As tabelas trazem as colunas year/month/day
+
+    Returns:
+        Total de linhas gravadas
+    """
+    import pyarrow.parquet as pq
+
+    schema = pa.schema(list(RAW_SCHEMA) + (list(PARTITION_SCHEMA) if with_partitions else []))
+    rows = 0
+    with pq.ParquetWriter(where, schema, **PARQUET_WRITE_OPTIONS) as writer:
+        for table in tables:
+            if not table.num_rows:
+                continue
+            writer.write_table(conform_table(table), row_group_size=ROW_GROUP_SIZE)
+            rows += table.num_rows
+    return rows
@@ -0,0 +1,416 @@
+"""
+Camada de resiliência das requisições à B3
+Retentativas com backoff exponencial e jitter, circuit breaker por host e
+requisições hedged (uma segunda tentativa disparada após um limiar de
+latência, ficando com a que responder primeiro). Cada chamada tem um prazo
+total, então a latência de cauda fica limitada e é medida em percentis
+
+Toda requisição enviada (retentativas e hedges inclusive) passa pelo
+limitador de taxa do host, quando houver, e os hedges simultâneos de um
+mesmo host são limitados
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Respostas que indicam falha transitória do servidor
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 8.0
+DEFAULT_DEADLINE = 90.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_MAX_HEDGES_PER_HOST = 2
+# Chamadas simultâneas esperadas até o cliente HTTP informar o tamanho do pool
+DEFAULT_CAPACITY = 10
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Circuito aberto: o host falhou repetidamente e a chamada nem foi feita"""
+
+
+class DeadlineExceededError(requests.exceptions.Timeout):
+    """O prazo total da chamada terminou antes de uma resposta válida"""
+
+
+class RetryPolicy:
+    """
+    Backoff exponencial com jitter completo (espera sorteada entre 0 e o teto)
+
+    Args:
+        max_attempts: Tentativas por chamada, incluindo a primeira
+        base_delay: Teto da espera após a primeira falha, em segundos
+        max_delay: Teto máximo da espera entre tentativas
+    """
+
+    def __init__(self, max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 rng: Optional[random.Random] = None):
+        if max_attempts < 1:
+            raise ValueError("max_attempts deve ser maior ou igual a 1")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rng = rng or random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes da tentativa seguinte à `attempt` (1 = primeira)"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return self._rng.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de um host
+
+    Fechado: as chamadas passam. Após `failure_threshold` falhas seguidas
+    abre e rejeita tudo por `reset_timeout` segundos; depois deixa uma
+    chamada de teste passar (meio-aberto) e fecha se ela tiver sucesso
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.opened_count = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """True se a chamada pode ser feita agora"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened_count += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class LatencyTracker:
+    """Janela das latências mais recentes, com percentis"""
+
+    def __init__(self, window: int = 1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentil `q` (0-100) das latências registradas, em segundos"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(q / 100 * len(samples))) - 1))
+        return samples[index]
+
+    def summary(self) -> Dict[str, int]:
+        """p50/p95/p99/máximo em milissegundos"""
+        with self._lock:
+            count = len(self._samples)
+            maximum = max(self._samples) if self._samples else None
+        result = {'latency_samples': count}
+        for name, q in (('p50', 50), ('p95', 95), ('p99', 99)):
+            value = self.percentile(q)
+            result[f'latency_{name}_ms'] = int(value * 1000) if value is not None else 0
+        result['latency_max_ms'] = int(maximum * 1000) if maximum is not None else 0
+        return result
+
+
+class ResilientCaller:
+    """
+    Executa requisições com retentativa, circuit breaker por host e hedging
+
+    Args:
+        retry: Política de retentativa
+        deadline: Prazo total de uma chamada (todas as tentativas), em segundos
+        hedge_after: Latência após a qual uma segunda tentativa é disparada;
+            None desabilita o hedging
+        failure_threshold: Falhas seguidas que abrem o circuito de um host
+        reset_timeout: Tempo com o circuito aberto antes da chamada de teste
+        max_hedges_per_host: Hedges em andamento permitidos por host; acima
+            disso a tentativa só espera a requisição original
+        capacity: Chamadas simultâneas esperadas (ver ensure_capacity)
+    """
+
+    def __init__(self, retry: Optional[RetryPolicy] = None, deadline: float = DEFAULT_DEADLINE,
+                 hedge_after: Optional[float] = None,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+                 max_hedges_per_host: int = DEFAULT_MAX_HEDGES_PER_HOST,
+                 capacity: int = DEFAULT_CAPACITY,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.retry = retry or RetryPolicy()
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_hedges_per_host = max_hedges_per_host
+        self.capacity = max(1, capacity)
+        self.latency = LatencyTracker()
+        self._sleep = sleep
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._hedges_in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._counters = {'attempts': 0, 'retries': 0, 'hedged_requests': 0,
+                          'hedge_wins': 0, 'hedges_capped': 0, 'circuit_rejections': 0,
+                          'deadline_exceeded': 0}
+
+    def ensure_capacity(self, capacity: int) -> None:
+        """
+        Ajusta o executor de hedging para `capacity` chamadas simultâneas
+
+        Cada chamada ocupa no máximo duas threads (original e hedge); ao
+        crescer um novo executor é criado na próxima tentativa, e o anterior
+        só é descartado quando as chamadas que o usam terminarem
+        """
+        with self._lock:
+            if capacity <= self.capacity:
+                return
+            self.capacity = capacity
+            self._hedge_executor = None
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        """Circuit breaker do host, criado na primeira chamada"""
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[host] = breaker
+            return breaker
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += amount
+
+    def call(self, host: str, send: Callable[[float], requests.Response],
+             timeout: float = 30,
+             throttle: Optional[Callable[[], None]] = None) -> requests.Response:
+        """
+        Executa `send(timeout)` até obter uma resposta válida
+
+        Args:
+            host: Host de destino (um circuito por host)
+            send: Faz uma tentativa com o timeout recebido e retorna a resposta
+            timeout: Timeout de cada tentativa, limitado pelo prazo restante
+            throttle: Chamado antes de cada requisição enviada, inclusive
+                retentativas e hedges (ex.: limitador de taxa do host)
+
+        Returns:
+            A primeira resposta não transitória, ou a última resposta transitória
+            (5xx/429) quando as tentativas acabarem
+
+        Raises:
+            CircuitOpenError: O circuito do host está aberto
+            DeadlineExceededError: O prazo terminou sem resposta
+            requests.exceptions.RequestException: Erro de rede da última tentativa
+        """
+        breaker = self.breaker(host)
+        started = time.monotonic()
+        deadline_at = started + self.deadline
+        last_error: Optional[Exception] = None
+        last_response: Optional[requests.Response] = None
+
+        try:
+            for attempt in range(1, self.retry.max_attempts + 1):
+                if not breaker.allow():
+                    self._count('circuit_rejections')
+                    raise CircuitOpenError(f"Circuito aberto para {host}: chamada rejeitada")
+
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                self._count('attempts')
+                if attempt > 1:
+                    self._count('retries')
+
+                try:
+                    response = self._attempt(host, send, min(timeout, remaining), throttle)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    breaker.record_failure()
+                    last_error, last_response = e, None
+                    logger.warning(f"Tentativa {attempt}/{self.retry.max_attempts} para {host} falhou: {e}")
+                else:
+                    if response.status_code not in RETRYABLE_STATUS:
+                        breaker.record_success()
+                        return response
+                    breaker.record_failure()
+                    last_error, last_response = None, response
+                    logger.warning(f"Tentativa {attempt}/{self.retry.max_attempts} para {host} "
+                                   f"retornou HTTP {response.status_code}")
+
+                if attempt == self.retry.max_attempts:
+                    break
+
+                delay = self.retry.backoff(attempt)
+                retry_after = self._retry_after(last_response)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if time.monotonic() + delay >= deadline_at:
+                    break
+                self._sleep(delay)
+        finally:
+            self.latency.record(time.monotonic() - started)
+
+        if last_response is not None:
+            return last_response
+        if last_error is not None and time.monotonic() < deadline_at:
+            raise last_error
+
+        self._count('deadline_exceeded')
+        raise DeadlineExceededError(f"Prazo de {self.deadline:.0f}s esgotado para {host}") from last_error
+
+    @staticmethod
+    def _retry_after(response: Optional[requests.Response]) -> Optional[float]:
+        """Espera pedida pelo servidor (Retry-After em segundos), se houver"""
+        if response is None:
+            return None
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _send(send: Callable[[float], requests.Response], timeout: float,
+              throttle: Optional[Callable[[], None]]) -> requests.Response:
+        """Envia uma requisição depois de passar pelo limitador, se houver"""
+        if throttle is not None:
+            throttle()
+        return send(timeout)
+
+    def _reserve_hedge(self, host: str) -> bool:
+        """Reserva uma vaga de hedge no host; False se o limite foi atingido"""
+        with self._lock:
+            in_flight = self._hedges_in_flight.get(host, 0)
+            if in_flight >= self.max_hedges_per_host:
+                self._counters['hedges_capped'] += 1
+                return False
+            self._hedges_in_flight[host] = in_flight + 1
+            self._counters['hedged_requests'] += 1
+            return True
+
+    def _release_hedge(self, host: str) -> None:
+        with self._lock:
+            self._hedges_in_flight[host] -= 1
+
+    def _attempt(self, host: str, send: Callable[[float], requests.Response], timeout: float,
+                 throttle: Optional[Callable[[], None]] = None) -> requests.Response:
+        """Uma tentativa, com hedge se a primeira requisição passar do limiar"""
+        if self.hedge_after is None or self.hedge_after >= timeout:
+            return self._send(send, timeout, throttle)
+
+        # O limitador é respeitado antes de medir o limiar do hedge
+        if throttle is not None:
+            throttle()
+
+        executor = self._executor()
+        primary = executor.submit(send, timeout)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        # Primeira requisição lenta: dispara a segunda com o tempo que sobrou,
+        # se o host ainda tiver vaga para hedges
+        if not self._reserve_hedge(host):
+            return primary.result()
+
+        hedge = executor.submit(self._send, send, max(0.001, timeout - self.hedge_after), throttle)
+        hedge.add_done_callback(lambda future: self._release_hedge(host))
+        pending = {primary, hedge}
+        first_error: Optional[Exception] = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    first_error = first_error or e
+                    continue
+                if future is hedge:
+                    self._count('hedge_wins')
+                # A requisição perdedora termina em segundo plano e devolve a conexão ao pool
+                return response
+
+        raise first_error
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_executor is None:
+                # Original e hedge de cada chamada simultânea
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * self.capacity,
+                                                          thread_name_prefix='hedge')
+            return self._hedge_executor
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de tentativas, hedging e circuitos, com percentis de latência"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['circuits_opened'] = sum(b.opened_count for b in self._breakers.values())
+        stats.update(self.latency.summary())
+        return stats
+
+
+def resilience_from_env() -> ResilientCaller:
+    """
+    Cria a camada de resiliência a partir das variáveis de ambiente
+
+    SCRAPER_MAX_ATTEMPTS: tentativas por requisição (padrão: 3)
+    SCRAPER_REQUEST_DEADLINE: prazo total de cada requisição em segundos (padrão: 90)
+    SCRAPER_HEDGE_AFTER: segundos até disparar a requisição hedged (padrão: desabilitado)
+    SCRAPER_CIRCUIT_THRESHOLD: falhas seguidas que abrem o circuito (padrão: 5)
+    SCRAPER_MAX_HEDGES_PER_HOST: hedges simultâneos por host (padrão: 2)
+    """
+    hedge_after = os.environ.get('SCRAPER_HEDGE_AFTER')
+    return ResilientCaller(
+        retry=RetryPolicy(max_attempts=int(os.environ.get('SCRAPER_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))),
+        deadline=float(os.environ.get('SCRAPER_REQUEST_DEADLINE', DEFAULT_DEADLINE)),
+        hedge_after=float(hedge_after) if hedge_after else None,
+        failure_threshold=int(os.environ.get('SCRAPER_CIRCUIT_THRESHOLD', DEFAULT_FAILURE_THRESHOLD)),
+        max_hedges_per_host=int(os.environ.get('SCRAPER_MAX_HEDGES_PER_HOST',
+                                               DEFAULT_MAX_HEDGES_PER_HOST))
+    )
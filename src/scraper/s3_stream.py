@@ -0,0 +1,193 @@
+"""
+Upload em streaming para o S3
+Objeto arquivo que recebe os bytes do ParquetWriter e os envia em partes de
+um multipart upload, em paralelo e com memória limitada: no máximo
+`max_in_flight` partes em envio mais a parte sendo preenchida, qualquer que
+seja o tamanho final do arquivo. Objetos menores que uma parte vão em um
+único put_object
+"""
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# O S3 exige partes de no mínimo 5 MiB (exceto a última)
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+class S3StreamingUpload(io.RawIOBase):
+    """
+    Arquivo somente escrita que grava em um objeto do S3
+
+    Uso:
+        with S3StreamingUpload(s3_client, bucket, key, metadata=...) as upload:
+            pq.write_table(table, upload)
+
+    Saindo do bloco sem erro o upload é concluído; com erro, abortado
+    (nenhuma parte órfã fica cobrando armazenamento)
+
+    Args:
+        s3_client: Cliente boto3 do S3
+        bucket_name: Bucket de destino
+        key: Chave do objeto
+        content_type: Content-Type do objeto
+        metadata: Metadados do objeto (x-amz-meta-*)
+        part_size: Tamanho das partes em bytes (mínimo 5 MiB)
+        max_in_flight: Partes enviadas em paralelo (limita a memória)
+    """
+
+    def __init__(self, s3_client, bucket_name: str, key: str,
+                 content_type: str = 'application/octet-stream',
+                 metadata: Optional[Dict[str, str]] = None,
+                 part_size: Optional[int] = None, max_in_flight: Optional[int] = None):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.content_type = content_type
+        self.metadata = metadata or {}
+        part_size = part_size or int(os.environ.get('SCRAPER_MULTIPART_PART_MB', 0)) * 1024 * 1024
+        self.part_size = max(MIN_PART_SIZE, part_size or DEFAULT_PART_SIZE)
+        self.max_in_flight = max_in_flight or int(os.environ.get('SCRAPER_MULTIPART_CONCURRENCY',
+                                                                 DEFAULT_MAX_IN_FLIGHT))
+        self.upload_id: Optional[str] = None
+        self.parts_uploaded = 0
+        self._chunks: List[bytes] = []
+        self._buffered = 0
+        self._position = 0
+        self._futures = []
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._finished = False
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("Upload já finalizado")
+        size = len(data)
+        if not size:
+            return 0
+
+        self._chunks.append(bytes(data))
+        self._buffered += size
+        self._position += size
+
+        if self._buffered >= self.part_size:
+            body = b''.join(self._chunks)
+            offset = 0
+            while len(body) - offset >= self.part_size:
+                self._submit_part(body[offset:offset + self.part_size])
+                offset += self.part_size
+            rest = body[offset:]
+            self._chunks = [rest] if rest else []
+            self._buffered = len(rest)
+        return size
+
+    def _submit_part(self, body: bytes) -> None:
+        """Envia uma parte em segundo plano, bloqueando se já houver `max_in_flight` em envio"""
+        if self.upload_id is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key,
+                ContentType=self.content_type, Metadata=self.metadata
+            )
+            self.upload_id = response['UploadId']
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight,
+                                                thread_name_prefix='s3-part')
+
+        # Falha em uma parte anterior interrompe a escrita o quanto antes
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+
+        self._slots.acquire()
+        self.parts_uploaded += 1
+        part_number = self.parts_uploaded
+        future = self._executor.submit(self._upload_part, part_number, body)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _upload_part(self, part_number: int, body: bytes) -> Dict:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=body
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    def complete(self) -> None:
+        """Envia o restante do buffer e conclui o upload"""
+        if self._finished:
+            return
+        self._finished = True
+
+        if self.upload_id is None:
+            # Objeto pequeno: um único PUT, sem o custo do multipart
+            self.s3_client.put_object(
+                Bucket=self.bucket_name, Key=self.key, Body=b''.join(self._chunks),
+                ContentType=self.content_type, Metadata=self.metadata
+            )
+            self._chunks = []
+            return
+
+        try:
+            if self._buffered:
+                self._submit_part(b''.join(self._chunks))
+                self._chunks = []
+                self._buffered = 0
+            parts = sorted((future.result() for future in self._futures),
+                           key=lambda part: part['PartNumber'])
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            logger.info(f"Multipart upload de s3://{self.bucket_name}/{self.key} concluído: "
+                        f"{len(parts)} partes, {self._position / 1024 / 1024:.1f} MiB")
+        except Exception:
+            self._abort()
+            raise
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def abort(self) -> None:
+        """Descarta o upload sem gravar o objeto"""
+        if self._finished:
+            return
+        self._finished = True
+        self._chunks = []
+        if self.upload_id is not None:
+            self._executor.shutdown(wait=True)
+            self._abort()
+
+    def _abort(self) -> None:
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key,
+                                                  UploadId=self.upload_id)
+            logger.warning(f"Multipart upload de s3://{self.bucket_name}/{self.key} abortado")
+        except Exception as e:
+            logger.error(f"Erro ao abortar o multipart upload de {self.key}: {e}")
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                self.complete()
+            finally:
+                super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+            super().close()
+            return False
+        self.close()
+        return False
@@ -0,0 +1,287 @@
+"""
+Armazenamento do pipeline
+Mesma interface e mesmo layout de chaves (Hive: raw-data/bovespa/year=/month=/day=)
+no bucket S3 e em um diretório local, para que scraper, ETL e API rodem,
+e possam ser medidos, em uma única máquina:
+
+- S3ObjectStore: bucket S3; STORAGE_S3_ENDPOINT_URL aponta para um S3 local
+  (MinIO, moto server, LocalStack)
+- LocalObjectStore: diretório local; os metadados do objeto ficam em um
+  arquivo oculto ao lado dele (ignorado pelo Spark e pelo pyarrow.dataset)
+
+STORAGE_BACKEND escolhe o backend ('s3' ou 'local') e STORAGE_LOCAL_DIR o
+diretório raiz do backend local
+"""
+
+import json
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCAL_DIR = "data"
+STORAGE_BACKENDS = ('s3', 'local')
+
+# delete_objects aceita até 1000 chaves por chamada
+_DELETE_BATCH_SIZE = 1000
+
+
+def create_s3_client():
+    """Cliente boto3 do S3, apontando para STORAGE_S3_ENDPOINT_URL se definido"""
+    import boto3
+
+    endpoint_url = os.environ.get('STORAGE_S3_ENDPOINT_URL') or None
+    return boto3.client('s3', endpoint_url=endpoint_url)
+
+
+def is_not_found(error: Exception) -> bool:
+    """True se o erro do boto3 indicar objeto inexistente"""
+    code = str(getattr(error, 'response', {}).get('Error', {}).get('Code', ''))
+    return code in ('404', 'NoSuchKey', 'NotFound')
+
+
+class ObjectStore(ABC):
+    """
+    Base dos backends de armazenamento
+
+    Chaves são caminhos relativos com '/' (as mesmas no bucket e no diretório);
+    `list` devolve dicionários com key, size e etag, e `head` acrescenta os
+    metadados do objeto. Um backend que não implemente todos os métodos
+    abstratos falha já ao ser criado
+    """
+
+    @abstractmethod
+    def uri(self, key: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def write(self, key: str, body: bytes, content_type: str = 'application/octet-stream',
+              metadata: Optional[Dict[str, str]] = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def open_write(self, key: str, content_type: str = 'application/octet-stream',
+                   metadata: Optional[Dict[str, str]] = None):
+        """
+        Objeto arquivo para gravar em streaming (ex.: ParquetWriter)
+
+        Usado como context manager: o objeto só aparece completo ao sair do
+        bloco sem erro; com erro, nada é gravado
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def head(self, key: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, prefix: str) -> List[Dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.head(key) is not None
+
+    def etag(self, key: str) -> Optional[str]:
+        info = self.head(key)
+        return info['etag'] if info else None
+
+
+class LocalObjectStore(ObjectStore):
+    """Armazenamento em um diretório local (mesmo layout de chaves do bucket)"""
+
+    def __init__(self, root_dir: str = DEFAULT_LOCAL_DIR):
+        self.root = Path(root_dir)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    @staticmethod
+    def _metadata_path(path: Path) -> Path:
+        # Oculto: o Spark e o pyarrow.dataset ignoram arquivos com prefixo '.'
+        return path.with_name(f".{path.name}.meta.json")
+
+    @staticmethod
+    def _etag(path: Path) -> str:
+        stat = path.stat()
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def uri(self, key: str) -> str:
+        return str(self._path(key))
+
+    def read(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        return path.read_bytes() if path.is_file() else None
+
+    def write(self, key: str, body: bytes, content_type: str = 'application/octet-stream',
+              metadata: Optional[Dict[str, str]] = None) -> None:
+        with self.open_write(key, content_type, metadata) as handle:
+            handle.write(body)
+
+    @contextmanager
+    def open_write(self, key: str, content_type: str = 'application/octet-stream',
+                   metadata: Optional[Dict[str, str]] = None) -> Iterator:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Escrita atômica: leitores nunca veem o arquivo pela metade
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as handle:
+                yield handle
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        metadata_path = self._metadata_path(path)
+        if metadata:
+            metadata_path.write_text(json.dumps(metadata, ensure_ascii=False, sort_keys=True),
+                                     encoding='utf-8')
+        else:
+            metadata_path.unlink(missing_ok=True)
+
+    def head(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        if not path.is_file():
+            return None
+        metadata_path = self._metadata_path(path)
+        metadata = json.loads(metadata_path.read_text(encoding='utf-8')) if metadata_path.exists() else {}
+        return {'key': key, 'size': path.stat().st_size, 'etag': self._etag(path), 'metadata': metadata}
+
+    def list(self, prefix: str) -> List[Dict]:
+        base = self._path(prefix.rstrip('/'))
+        if not base.is_dir():
+            return []
+        objects = []
+        for path in base.rglob('*'):
+            if path.is_file() and not path.name.startswith('.'):
+                objects.append({'key': path.relative_to(self.root).as_posix(),
+                                'size': path.stat().st_size, 'etag': self._etag(path)})
+        return sorted(objects, key=lambda item: item['key'])
+
+    def delete(self, keys: List[str]) -> None:
+        for key in keys:
+            path = self._path(key)
+            path.unlink(missing_ok=True)
+            self._metadata_path(path).unlink(missing_ok=True)
+            # Remove o diretório da partição se ficou vazio
+            if path.parent.exists() and path.parent != self.root and not any(path.parent.iterdir()):
+                path.parent.rmdir()
+
+
+class S3ObjectStore(ObjectStore):
+    """
+    Armazenamento no bucket S3 do pipeline
+
+    Args:
+        bucket_name: Bucket do pipeline
+        s3_client: Cliente boto3 do S3 (opcional)
+        client_factory: Cria o cliente no primeiro uso se `s3_client` não for
+            informado (padrão: create_s3_client)
+    """
+
+    def __init__(self, bucket_name: str, s3_client=None,
+                 client_factory: Optional[Callable] = None):
+        self.bucket_name = bucket_name
+        self._client = s3_client
+        self._client_factory = client_factory or create_s3_client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket_name}/{key}"
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            response = self.client.get_object(Bucket=self.bucket_name, Key=key)
+        except Exception as e:
+            if is_not_found(e):
+                return None
+            raise
+        return response['Body'].read()
+
+    def write(self, key: str, body: bytes, content_type: str = 'application/octet-stream',
+              metadata: Optional[Dict[str, str]] = None) -> None:
+        self.client.put_object(Bucket=self.bucket_name, Key=key, Body=body,
+                               ContentType=content_type, Metadata=metadata or {})
+
+    def open_write(self, key: str, content_type: str = 'application/octet-stream',
+                   metadata: Optional[Dict[str, str]] = None):
+        from s3_stream import S3StreamingUpload
+
+        # Partes de um multipart upload em paralelo, ou um único PUT se couber em uma parte
+        return S3StreamingUpload(self.client, self.bucket_name, key,
+                                 content_type=content_type, metadata=metadata)
+
+    def head(self, key: str) -> Optional[Dict]:
+        try:
+            response = self.client.head_object(Bucket=self.bucket_name, Key=key)
+        except Exception as e:
+            if is_not_found(e):
+                return None
+            raise
+        return {'key': key, 'size': response.get('ContentLength'), 'etag': response.get('ETag'),
+                'metadata': response.get('Metadata', {})}
+
+    def list(self, prefix: str) -> List[Dict]:
+        objects = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"{prefix.rstrip('/')}/"):
+            for item in page.get('Contents', []):
+                objects.append({'key': item['Key'], 'size': item['Size'], 'etag': item.get('ETag')})
+        return objects
+
+    def delete(self, keys: List[str]) -> None:
+        for start in range(0, len(keys), _DELETE_BATCH_SIZE):
+            batch = keys[start:start + _DELETE_BATCH_SIZE]
+            response = self.client.delete_objects(Bucket=self.bucket_name,
+                                                  Delete={'Objects': [{'Key': key} for key in batch],
+                                                          'Quiet': True})
+            # Com Quiet, a resposta só lista as chaves que falharam
+            if response.get('Errors'):
+                error = response['Errors'][0]
+                raise RuntimeError(f"Falha ao remover {len(response['Errors'])} objetos: "
+                                   f"{error.get('Key')} {error.get('Code')}")
+
+
+def storage_from_env(bucket_name: Optional[str] = None, client_factory: Optional[Callable] = None,
+                     default_backend: str = 's3') -> ObjectStore:
+    """
+    Cria o backend de armazenamento a partir das variáveis de ambiente
+
+    STORAGE_BACKEND: 's3' ou 'local' (padrão: `default_backend`)
+    STORAGE_LOCAL_DIR: diretório raiz do backend local (padrão: ./data)
+    S3_BUCKET_NAME: bucket do backend S3 se `bucket_name` não for informado
+
+    Args:
+        bucket_name: Bucket do backend S3
+        client_factory: Cria o cliente S3 no primeiro uso (padrão: create_s3_client)
+        default_backend: Backend quando STORAGE_BACKEND não estiver definido
+    """
+    backend = os.environ.get('STORAGE_BACKEND', default_backend).lower()
+
+    if backend == 'local':
+        return LocalObjectStore(os.environ.get('STORAGE_LOCAL_DIR', DEFAULT_LOCAL_DIR))
+    if backend == 's3':
+        bucket_name = bucket_name or os.environ.get('S3_BUCKET_NAME')
+        if not bucket_name:
+            raise ValueError("Bucket S3 não informado (S3_BUCKET_NAME)")
+        return S3ObjectStore(bucket_name, client_factory=client_factory)
+
+    raise ValueError(f"STORAGE_BACKEND inválido: {backend} (use {' ou '.join(STORAGE_BACKENDS)})")
@@ -0,0 +1,166 @@
+"""
+Extração das linhas da tabela da carteira da B3
+Backend rápido em lxml (XPath) com fallback para o BeautifulSoup
+Os dois backends retornam exatamente as mesmas linhas de texto
+"""
+
+import logging
+from typing import List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Número de colunas da carteira: código, ação, tipo, qtde teórica, participação
+PORTFOLIO_COLUMNS = 5
+
+
+def decode_page(content: Union[bytes, str]) -> str:
+    """
+    Decodifica a página uma única vez para os dois backends
+
+    Sem isso o lxml assume latin-1 e o BeautifulSoup detecta UTF-8,
+    gerando textos diferentes para a mesma página
+    """
+    if isinstance(content, str):
+        return content
+    try:
+        return content.decode('utf-8')
+    except UnicodeDecodeError:
+        return content.decode('cp1252', errors='replace')
+
+
+def _cell_text(texts, strip_fragments: bool) -> str:
+    """Texto de uma célula, seguindo a semântica do BeautifulSoup"""
+    if strip_fragments:
+        # Equivalente a get_text(strip=True)
+        return ''.join(t.strip() for t in texts)
+    # Equivalente a .text.strip()
+    return ''.join(texts).strip()
+
+
+def _bs4_cell_strings(cell, tags: List[str]) -> List[str]:
+    """
+    Textos de uma célula no BeautifulSoup, sem as células irmãs aninhadas
+
+    O html.parser não fecha implicitamente um <td> sem </td>: as células
+    seguintes da linha ficam aninhadas na anterior. O lxml (como o navegador)
+    as trata como irmãs, então o texto delas é excluído aqui. Tabelas
+    aninhadas dentro da célula (outro <tr>) continuam no texto, como no lxml
+    """
+    if cell.find(tags) is None:
+        return list(cell.strings)
+
+    row = cell.find_parent('tr')
+    texts = []
+    for text in cell.strings:
+        owner = text.find_parent(tags)
+        if owner is cell or owner.find_parent('tr') is not row:
+            texts.append(text)
+    return texts
+
+
+def extract_rows_lxml(content: Union[bytes, str], cell_tags: Sequence[str] = ('td',),
+                      first_table_only: bool = False,
+                      strip_fragments: bool = False,
+                      min_cells: int = PORTFOLIO_COLUMNS) -> Optional[List[List[str]]]:
+    """
+    Extrai as linhas da tabela usando lxml e XPath
+
+    Args:
+        content: HTML bruto da página
+        cell_tags: Tags consideradas células ('td' ou 'td'/'th')
+        first_table_only: Considera apenas a primeira <table> da página
+        strip_fragments: Remove espaços de cada fragmento de texto da célula
+        min_cells: Número mínimo de células para a linha ser considerada
+
+    Returns:
+        Lista de linhas (textos das primeiras `min_cells` células) ou None
+        se `first_table_only` e a página não tiver tabelas
+    """
+    # etree puro (sem as classes do lxml.html) evita o custo de lookup por elemento
+    document = etree.fromstring(decode_page(content), etree.HTMLParser())
+
+    if document is None:
+        return None if first_table_only else []
+
+    if first_table_only:
+        tables = document.xpath('//table')
+        if not tables:
+            return None
+        root = tables[0]
+    else:
+        root = document
+
+    rows = []
+
+    for tr in root.iter('tr'):
+        # iter() percorre os descendentes em ordem de documento, como o find_all
+        cells = [cell for cell in tr.iter(*cell_tags) if cell is not tr]
+        if len(cells) < min_cells:
+            continue
+        rows.append([_cell_text(list(cell.itertext()), strip_fragments)
+                     for cell in cells[:min_cells]])
+
+    return rows
+
+
+def extract_rows_bs4(content: Union[bytes, str], cell_tags: Sequence[str] = ('td',),
+                     first_table_only: bool = False,
+                     strip_fragments: bool = False,
+                     min_cells: int = PORTFOLIO_COLUMNS) -> Optional[List[List[str]]]:
+    """
+    Extrai as linhas da tabela usando BeautifulSoup (html.parser)
+
+    Mesma assinatura e retorno de extract_rows_lxml
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(decode_page(content), 'html.parser')
+
+    if first_table_only:
+        tables = soup.find_all('table')
+        if not tables:
+            return None
+        root = tables[0]
+    else:
+        root = soup
+
+    tags = list(cell_tags)
+    rows = []
+
+    for tr in root.find_all('tr'):
+        cells = tr.find_all(tags)
+        if len(cells) < min_cells:
+            continue
+        rows.append([_cell_text(_bs4_cell_strings(cell, tags), strip_fragments)
+                     for cell in cells[:min_cells]])
+
+    return rows
+
+
+def extract_table_rows(content: Union[bytes, str], backend: str = 'lxml',
+                       **options) -> Tuple[Optional[List[List[str]]], str]:
+    """
+    Extrai as linhas da tabela com o backend escolhido, caindo para o
+    BeautifulSoup se o lxml não estiver disponível ou falhar
+
+    Args:
+        content: HTML bruto da página
+        backend: 'lxml' ou 'bs4'
+        **options: Repassadas para extract_rows_lxml / extract_rows_bs4
+
+    Returns:
+        Tupla (linhas, backend efetivamente usado)
+    """
+    if backend == 'lxml' and LXML_AVAILABLE:
+        try:
+            return extract_rows_lxml(content, **options), 'lxml'
+        except Exception as e:
+            logger.warning(f"Parser lxml falhou, usando BeautifulSoup: {e}")
+
+    return extract_rows_bs4(content, **options), 'bs4'
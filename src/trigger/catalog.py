@@ -0,0 +1,378 @@
+"""
+Catálogo das tabelas refinadas (Glue Data Catalog)
+O job do Glue e o ETL rápido registram exatamente as partições que gravaram,
+em uma chamada BatchCreatePartition por lote (até 100 partições), sem
+crawler: os dados novos ficam consultáveis no Athena assim que a execução
+termina. As tabelas são criadas no primeiro uso, com o schema das saídas
+
+- GlueCatalog: Glue Data Catalog (boto3)
+- LocalCatalog: arquivo JSON local, com a mesma semântica
+
+Com partition projection as tabelas recebem os parâmetros projection.* do
+Athena, que calcula as partições a partir do pregão: nada é registrado
+
+CATALOG_BACKEND escolhe o backend ('glue', 'local' ou 'none'); sem ele, o
+Glue é usado se CATALOG_DATABASE estiver definido. O job do Glue recebe os
+mesmos valores em --catalog_backend, --catalog_database, --catalog_path e
+--partition_projection
+
+Este módulo também é enviado ao job do Glue (--extra-py-files, ver
+infrastructure/glue.tf): só depende da biblioteca padrão e do boto3
+"""
+
+import json
+import os
+import threading
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional
+
+DEFAULT_DATABASE = "bovespa_database"
+DEFAULT_LOCAL_PATH = "catalog.json"
+
+REFINED_TABLE = "bovespa_refined_data"
+AGGREGATED_TABLE = "bovespa_aggregated_data"
+CHANGES_TABLE = "bovespa_daily_changes"
+
+# Tabelas gravadas a cada execução do ETL (mesmos pregões em todas)
+OUTPUT_TABLES = (REFINED_TABLE, AGGREGATED_TABLE, CHANGES_TABLE)
+
+# Limite de partições por chamada do BatchCreatePartition
+BATCH_CREATE_PARTITION_LIMIT = 100
+
+# Faixa de anos da partition projection dos refinados
+PROJECTION_YEAR_RANGE = "2000,2099"
+
+# Colunas gravadas por src/glue/job_script.py e src/trigger/fast_etl.py
+# (tipos do Hive; as colunas de partição ficam só no caminho)
+TABLES = {
+    REFINED_TABLE: {
+        'prefix': "refined-data/bovespa",
+        'columns': [
+            ('data_pregao', 'date'),
+            ('indice', 'string'),
+            ('ticker_symbol', 'string'),
+            ('company_name', 'string'),
+            ('tipo_acao', 'string'),
+            ('theoretical_quantity', 'bigint'),
+            ('participation_percentage', 'decimal(9,3)'),
+            ('data_extracao', 'timestamp'),
+            ('fonte', 'string'),
+            ('year', 'int'),
+            ('month', 'int'),
+            ('day', 'int'),
+            ('data_pregao_date', 'date'),
+            ('data_extracao_timestamp', 'timestamp'),
+            ('dias_desde_extracao', 'int'),
+            ('semana_pregao', 'int'),
+            ('trimestre_pregao', 'int'),
+            ('dia_semana_pregao', 'int'),
+            ('nome_dia_semana', 'string'),
+            ('categoria_participacao', 'string'),
+            ('valor_mercado_estimado', 'decimal(30,3)'),
+            ('data_processamento', 'timestamp'),
+        ],
+        'partition_keys': [('partition_year', 'int'), ('partition_month', 'int'), ('partition_day', 'int')],
+    },
+    AGGREGATED_TABLE: {
+        'prefix': "refined-data/bovespa-aggregated",
+        'columns': [
+            ('indice', 'string'),
+            ('tipo_acao', 'string'),
+            ('qtd_acoes_por_tipo', 'bigint'),
+            ('quantidade_teorica_total', 'bigint'),
+            ('participacao_total_tipo', 'decimal(19,3)'),
+            ('participacao_media_tipo', 'decimal(13,7)'),
+            ('maior_participacao_tipo', 'decimal(9,3)'),
+            ('menor_participacao_tipo', 'decimal(9,3)'),
+        ],
+        'partition_keys': [('data_pregao', 'date')],
+    },
+    CHANGES_TABLE: {
+        'prefix': "refined-data/bovespa-changes",
+        'columns': [
+            ('indice', 'string'),
+            ('ticker_symbol', 'string'),
+            ('company_name', 'string'),
+            ('pregao_anterior', 'date'),
+            ('participation_percentage', 'decimal(9,3)'),
+            ('participacao_anterior', 'decimal(9,3)'),
+            ('variacao_participacao', 'decimal(10,3)'),
+            ('theoretical_quantity', 'bigint'),
+            ('quantidade_anterior', 'bigint'),
+            ('variacao_quantidade', 'bigint'),
+            ('posicao', 'int'),
+            ('posicao_anterior', 'int'),
+            ('variacao_posicao', 'int'),
+            ('entrou', 'boolean'),
+            ('saiu', 'boolean'),
+        ],
+        'partition_keys': [('data_pregao', 'date')],
+    },
+}
+
+PARQUET_STORAGE = {
+    'InputFormat': "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+    'OutputFormat': "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+    'SerdeInfo': {
+        'SerializationLibrary': "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe",
+        'Parameters': {'serialization.format': '1'}
+    },
+}
+
+
+def table_location(table_name: str, storage_root: str) -> str:
+    """Local da tabela sob a raiz do armazenamento (s3://<bucket> ou file://...)"""
+    return f"{storage_root.rstrip('/')}/{TABLES[table_name]['prefix']}/"
+
+
+def partition_values(table_name: str, trade_date: str) -> List[str]:
+    """Valores das partições de um pregão (YYYY-MM-DD), como no caminho gravado pelo Spark"""
+    if table_name == REFINED_TABLE:
+        parsed = date.fromisoformat(trade_date)
+        return [str(parsed.year), str(parsed.month), str(parsed.day)]
+    return [trade_date]
+
+
+def partition_location(table_name: str, location: str, values: List[str]) -> str:
+    """Local de uma partição (layout Hive: chave=valor/...)"""
+    keys = [key for key, _ in TABLES[table_name]['partition_keys']]
+    return location + ''.join(f"{key}={value}/" for key, value in zip(keys, values))
+
+
+def projection_parameters(table_name: str, location: str) -> Dict[str, str]:
+    """Parâmetros da partition projection do Athena para a tabela"""
+    if table_name == REFINED_TABLE:
+        parameters = {
+            'projection.partition_year.type': 'integer',
+            'projection.partition_year.range': PROJECTION_YEAR_RANGE,
+            'projection.partition_month.type': 'integer',
+            'projection.partition_month.range': '1,12',
+            'projection.partition_day.type': 'integer',
+            'projection.partition_day.range': '1,31',
+        }
+    else:
+        parameters = {
+            'projection.data_pregao.type': 'date',
+            'projection.data_pregao.range': f"{PROJECTION_YEAR_RANGE.split(',')[0]}-01-01,NOW",
+            'projection.data_pregao.format': 'yyyy-MM-dd',
+            'projection.data_pregao.interval': '1',
+            'projection.data_pregao.interval.unit': 'DAYS',
+        }
+    keys = [key for key, _ in TABLES[table_name]['partition_keys']]
+    parameters['projection.enabled'] = 'true'
+    parameters['storage.location.template'] = location + ''.join(f"{key}=${{{key}}}/" for key in keys)
+    return parameters
+
+
+def table_input(table_name: str, storage_root: str, projection: bool = False) -> Dict:
+    """Definição da tabela (TableInput do Glue)"""
+    definition = TABLES[table_name]
+    location = table_location(table_name, storage_root)
+    parameters = {'classification': 'parquet', 'parquet.compression': 'SNAPPY'}
+    if projection:
+        parameters.update(projection_parameters(table_name, location))
+    return {
+        'Name': table_name,
+        'TableType': 'EXTERNAL_TABLE',
+        'Parameters': parameters,
+        'PartitionKeys': [{'Name': name, 'Type': type_} for name, type_ in definition['partition_keys']],
+        'StorageDescriptor': {
+            'Columns': [{'Name': name, 'Type': type_} for name, type_ in definition['columns']],
+            'Location': location,
+            **PARQUET_STORAGE
+        },
+    }
+
+
+class GlueCatalog:
+    """
+    Tabelas e partições no Glue Data Catalog
+
+    Args:
+        database: Database do catálogo
+        client: Cliente boto3 do Glue
+        projection: Usar partition projection em vez de registrar partições
+    """
+
+    def __init__(self, database: str, client, projection: bool = False):
+        self.database = database
+        self.client = client
+        self.projection = projection
+
+    @staticmethod
+    def _error_code(error: Exception) -> Optional[str]:
+        return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+    def ensure_table(self, table_name: str, storage_root: str) -> Dict:
+        """
+        Cria a tabela se ela não existir; com projection, liga os parâmetros
+        projection.* em uma tabela existente
+
+        Returns:
+            A tabela (formato do GetTable)
+        """
+        definition = table_input(table_name, storage_root, self.projection)
+        try:
+            table = self.client.get_table(DatabaseName=self.database, Name=table_name)['Table']
+        except Exception as e:
+            if self._error_code(e) != 'EntityNotFoundException':
+                raise
+            self.client.create_table(DatabaseName=self.database, TableInput=definition)
+            return definition
+
+        parameters = table.get('Parameters', {})
+        if self.projection and parameters.get('projection.enabled') != 'true':
+            updated = {key: table[key] for key in ('Name', 'TableType', 'PartitionKeys', 'StorageDescriptor')
+                       if key in table}
+            updated['Parameters'] = {**parameters, **definition['Parameters']}
+            self.client.update_table(DatabaseName=self.database, TableInput=updated)
+            return updated
+        return table
+
+    def register_partitions(self, table_name: str, storage_root: str, trade_dates: Iterable[str]) -> int:
+        """
+        Registra as partições dos pregões gravados (partições existentes são ignoradas)
+
+        Returns:
+            Número de partições novas no catálogo (0 com partition projection)
+        """
+        table = self.ensure_table(table_name, storage_root)
+        if self.projection:
+            return 0
+
+        descriptor = table['StorageDescriptor']
+        partitions = []
+        for trade_date in sorted(set(trade_dates)):
+            values = partition_values(table_name, trade_date)
+            partitions.append({
+                'Values': values,
+                'StorageDescriptor': {**descriptor,
+                                      'Location': partition_location(table_name, descriptor['Location'], values)}
+            })
+
+        created = 0
+        for start in range(0, len(partitions), BATCH_CREATE_PARTITION_LIMIT):
+            chunk = partitions[start:start + BATCH_CREATE_PARTITION_LIMIT]
+            response = self.client.batch_create_partition(
+                DatabaseName=self.database, TableName=table_name, PartitionInputList=chunk)
+            errors = response.get('Errors', [])
+            failed = [error for error in errors
+                      if error.get('ErrorDetail', {}).get('ErrorCode') != 'AlreadyExistsException']
+            if failed:
+                detail = failed[0].get('ErrorDetail', {})
+                raise RuntimeError(f"Falha ao registrar {len(failed)} partições em {table_name}: "
+                                   f"{detail.get('ErrorCode')} {detail.get('ErrorMessage')}")
+            created += len(chunk) - len(errors)
+        return created
+
+
+class LocalCatalog:
+    """
+    Catálogo em um arquivo JSON local (execução local e testes), com a
+    mesma semântica do GlueCatalog
+
+    Args:
+        path: Arquivo do catálogo
+        database: Database do catálogo
+        projection: Usar partition projection em vez de registrar partições
+    """
+
+    def __init__(self, path: str = DEFAULT_LOCAL_PATH, database: str = DEFAULT_DATABASE,
+                 projection: bool = False):
+        self.path = path
+        self.database = database
+        self.projection = projection
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, catalog: Dict) -> None:
+        # Gravação atômica: um leitor nunca vê o arquivo pela metade
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(catalog, f, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
+
+    def _table(self, catalog: Dict, table_name: str, storage_root: str) -> Dict:
+        tables = catalog.setdefault(self.database, {})
+        definition = table_input(table_name, storage_root, self.projection)
+        table = tables.setdefault(table_name, {**definition, 'Partitions': {}})
+        if self.projection and table['Parameters'].get('projection.enabled') != 'true':
+            table['Parameters'].update(definition['Parameters'])
+        return table
+
+    def ensure_table(self, table_name: str, storage_root: str) -> Dict:
+        with self._lock:
+            catalog = self._load()
+            table = self._table(catalog, table_name, storage_root)
+            self._save(catalog)
+        return table
+
+    def register_partitions(self, table_name: str, storage_root: str, trade_dates: Iterable[str]) -> int:
+        with self._lock:
+            catalog = self._load()
+            table = self._table(catalog, table_name, storage_root)
+            created = 0
+            if not self.projection:
+                location = table['StorageDescriptor']['Location']
+                for trade_date in sorted(set(trade_dates)):
+                    values = partition_values(table_name, trade_date)
+                    key = '/'.join(values)
+                    if key not in table['Partitions']:
+                        table['Partitions'][key] = partition_location(table_name, location, values)
+                        created += 1
+            self._save(catalog)
+        return created
+
+    def partitions(self, table_name: str) -> Dict[str, str]:
+        """Partições registradas: valores ('2024/1/2') -> local"""
+        return self._load().get(self.database, {}).get(table_name, {}).get('Partitions', {})
+
+
+def create_catalog(backend: str, database: str = DEFAULT_DATABASE, path: str = DEFAULT_LOCAL_PATH,
+                   projection: bool = False, client_factory: Optional[Callable] = None):
+    """
+    Cria o catálogo do backend ('glue', 'local' ou 'none' para nenhum)
+
+    Args:
+        client_factory: Cria o cliente do Glue (ex.: lambda: get_client('glue'))
+    """
+    backend = backend.lower()
+    if backend == 'none':
+        return None
+    if backend == 'local':
+        return LocalCatalog(path, database, projection)
+    if backend == 'glue':
+        if client_factory is None:
+            import boto3
+            client = boto3.client('glue')
+        else:
+            client = client_factory()
+        return GlueCatalog(database, client, projection)
+
+    raise ValueError(f"Backend de catálogo inválido: {backend}")
+
+
+def catalog_from_env(client_factory: Optional[Callable] = None):
+    """
+    Cria o catálogo a partir das variáveis de ambiente
+
+    CATALOG_BACKEND: 'glue', 'local' ou 'none' (padrão: 'glue' se
+    CATALOG_DATABASE estiver definido, senão 'none')
+    CATALOG_DATABASE: database do catálogo
+    CATALOG_PATH: arquivo do catálogo local (padrão: ./catalog.json)
+    CATALOG_PARTITION_PROJECTION: 'true' para usar partition projection
+    """
+    database = os.environ.get('CATALOG_DATABASE')
+    backend = os.environ.get('CATALOG_BACKEND', 'glue' if database else 'none')
+    return create_catalog(
+        backend,
+        database=database or DEFAULT_DATABASE,
+        path=os.environ.get('CATALOG_PATH', DEFAULT_LOCAL_PATH),
+        projection=os.environ.get('CATALOG_PARTITION_PROJECTION', 'false').lower() == 'true',
+        client_factory=client_factory
+    )
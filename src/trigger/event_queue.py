@@ -0,0 +1,157 @@
+"""
+Fila das notificações da camada raw
+Na AWS as notificações do S3 vão para uma fila SQS, e o event source mapping
+entrega ao trigger lotes de até `batch_size` mensagens acumuladas por até
+`maximum_batching_window_in_seconds` (ver infrastructure/sqs.tf): um backfill
+de centenas de pregões vira um único job do Glue, não centenas
+
+LocalEventQueue reproduz esse comportamento fora da AWS, com uma janela de
+debounce: o lote é entregue quando nenhuma notificação chega por
+`debounce_seconds`, quando passa `max_wait_seconds` desde a primeira ou
+quando atinge `max_batch_size` arquivos
+"""
+
+import json
+import threading
+import time
+import urllib.parse
+import uuid
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_DEBOUNCE_SECONDS = 60.0
+# Mesmo teto da janela de batching do event source mapping do SQS
+DEFAULT_MAX_WAIT_SECONDS = 300.0
+DEFAULT_MAX_BATCH_SIZE = 1000
+
+
+def is_queue_event(event: Dict) -> bool:
+    """True se o evento vier da fila SQS (lote de mensagens com notificações do S3)"""
+    records = (event or {}).get('Records', [])
+    return bool(records) and all(record.get('eventSource') == 'aws:sqs' for record in records)
+
+
+def extract_s3_records(event: Dict) -> List[Dict]:
+    """
+    Registros de notificação do S3 de um evento direto do bucket ou de um lote da fila
+
+    Returns:
+        Registros no formato da notificação do S3 (com a chave 's3')
+    """
+    records = []
+    for record in (event or {}).get('Records', []):
+        if record.get('eventSource') == 'aws:sqs':
+            body = json.loads(record.get('body') or '{}')
+            # A mensagem 's3:TestEvent' enviada ao configurar a notificação não tem 'Records'
+            records.extend(item for item in body.get('Records', []) if 's3' in item)
+        elif 's3' in record:
+            records.append(record)
+    return records
+
+
+def s3_notification(bucket_name: str, object_keys: List[str], event_name: str = 'ObjectCreated:Put') -> Dict:
+    """
+    Notificação do S3 para os arquivos (ex.: reentrega dos arquivos de um job falho)
+
+    Returns:
+        Evento no formato publicado pelo bucket na fila (chaves codificadas como na URL)
+    """
+    return {'Records': [{
+        'eventSource': 'aws:s3',
+        'eventName': event_name,
+        's3': {'bucket': {'name': bucket_name}, 'object': {'key': urllib.parse.quote_plus(object_key, safe='/')}}
+    } for object_key in object_keys]}
+
+
+class LocalEventQueue:
+    """
+    Fila local com janela de debounce, no lugar do SQS + event source mapping
+
+    Args:
+        debounce_seconds: Silêncio (sem novas notificações) que fecha o lote
+        max_wait_seconds: Espera máxima desde a primeira notificação do lote
+        max_batch_size: Registros que fecham o lote imediatamente
+        clock: Relógio monotônico (substituível em testes)
+    """
+
+    def __init__(self, debounce_seconds: float = DEFAULT_DEBOUNCE_SECONDS,
+                 max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.debounce_seconds = debounce_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.max_batch_size = max_batch_size
+        self.clock = clock
+        self._messages: List[Dict] = []
+        self._records = 0
+        self._first_arrival: Optional[float] = None
+        self._last_arrival: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def put(self, s3_event: Dict) -> None:
+        """Enfileira uma notificação do S3 (evento com 'Records'), como o bucket faria no SQS"""
+        now = self.clock()
+        with self._lock:
+            self._messages.append({
+                'messageId': str(uuid.uuid4()),
+                'eventSource': 'aws:sqs',
+                'body': json.dumps(s3_event)
+            })
+            self._records += len(s3_event.get('Records', []))
+            if self._first_arrival is None:
+                self._first_arrival = now
+            self._last_arrival = now
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._records
+
+    def ready(self) -> bool:
+        """True se a janela do lote atual fechou"""
+        now = self.clock()
+        with self._lock:
+            if not self._messages:
+                return False
+            return (self._records >= self.max_batch_size
+                    or now - self._last_arrival >= self.debounce_seconds
+                    or now - self._first_arrival >= self.max_wait_seconds)
+
+    def drain(self, force: bool = False) -> Optional[Dict]:
+        """
+        Retira o lote atual se a janela fechou (ou sempre, com `force`)
+
+        Returns:
+            Evento no formato entregue pelo SQS à Lambda, ou None se não houver lote
+        """
+        if not force and not self.ready():
+            return None
+        with self._lock:
+            if not self._messages:
+                return None
+            event = {'Records': self._messages}
+            self._messages = []
+            self._records = 0
+            self._first_arrival = self._last_arrival = None
+        return event
+
+    def poll(self, handler: Callable, context=None, force: bool = False) -> Optional[Dict]:
+        """
+        Entrega o lote ao handler se a janela fechou; se o handler falhar,
+        as mensagens voltam à fila (como no fim do visibility timeout)
+
+        Returns:
+            Resposta do handler, ou None se não houver lote pronto
+        """
+        event = self.drain(force=force)
+        if event is None:
+            return None
+        try:
+            return handler(event, context)
+        except Exception:
+            with self._lock:
+                self._messages = event['Records'] + self._messages
+                self._records = sum(len(json.loads(message['body']).get('Records', []))
+                                    for message in self._messages)
+                now = self.clock()
+                self._first_arrival = self._first_arrival or now
+                self._last_arrival = self._last_arrival or now
+            raise
@@ -0,0 +1,517 @@
+"""
+ETL rápido na própria Lambda para lotes pequenos
+Um pregão do IBOV tem ~90 linhas: no job do Glue o tempo de subir o Spark
+domina a execução (e é cobrado por DPU-minuto). Este módulo aplica, com
+pyarrow, as mesmas transformações de src/glue/job_script.py e grava as
+mesmas saídas (layout de partições, colunas, tipos e encoding):
+
+- refined-data/bovespa/partition_year=/partition_month=/partition_day=
+  (linhas ordenadas por ticker, arquivos de até MAX_RECORDS_PER_FILE linhas)
+- refined-data/bovespa-aggregated/data_pregao=
+- refined-data/bovespa-changes/data_pregao= (variações em relação ao pregão
+  anterior, lido só da sua partição refinada)
+
+Os tipos seguem os do Spark: decimais com a precisão das regras de
+aritmética do Spark, inteiros de data como int32 e timestamps em INT96
+(padrão do writer de parquet do Glue). Qualquer mudança nas transformações
+do job deve ser repetida aqui
+
+O trigger usa este caminho para lotes abaixo de FAST_PATH_MAX_BYTES e o
+Glue para os demais
+"""
+
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Context, Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+REFINED_PREFIX = "refined-data/bovespa"
+AGGREGATED_PREFIX = "refined-data/bovespa-aggregated"
+CHANGES_PREFIX = "refined-data/bovespa-changes"
+REFINED_PARTITION_KEYS = ['partition_year', 'partition_month', 'partition_day']
+REFINED_SORT_KEYS = ['ticker_symbol']
+AGGREGATED_PARTITION_KEYS = ['data_pregao']
+CHANGES_PARTITION_KEYS = ['data_pregao']
+
+# Pregão anterior: o dia mais recente com partição refinada até N dias antes
+# (fins de semana e feriados, como o carnaval, não têm pregão)
+PREVIOUS_DAY_LOOKBACK_DAYS = 10
+
+# Colunas de um pregão usadas nas variações diárias
+SNAPSHOT_COLUMNS = ['data_pregao_date', 'indice', 'ticker_symbol', 'company_name',
+                    'participation_percentage', 'theoretical_quantity']
+
+# Mesma política de tamanho de arquivo do job (--target_file_mb padrão)
+TARGET_FILE_MB = 128
+ESTIMATED_BYTES_PER_ROW = 100
+MAX_RECORDS_PER_FILE = TARGET_FILE_MB * 1024 * 1024 // ESTIMATED_BYTES_PER_ROW
+
+# Partições raw anteriores ao multi-índice contêm apenas o IBOV
+DEFAULT_INDEX = 'IBOV'
+
+# dayofweek do Spark: 1 = domingo ... 7 = sábado
+DAY_NAMES = [None, 'Domingo', 'Segunda-feira', 'Terça-feira', 'Quarta-feira',
+             'Quinta-feira', 'Sexta-feira', 'Sábado']
+
+RENAMED_COLUMNS = {
+    'codigo_acao': 'ticker_symbol',
+    'nome_empresa': 'company_name',
+    'quantidade_teorica': 'theoretical_quantity',
+    'percentual_participacao': 'participation_percentage',
+}
+
+PUT_WORKERS = 8
+
+
+def _raw_column_types():
+    """
+    Tipos das colunas do schema raw atual (src/scraper/raw_schema.py)
+
+    Arquivos gravados antes do schema canônico têm data_pregao e
+    data_extracao como strings e números em double; o job converte para
+    esses tipos logo após a leitura e aqui é feito o mesmo
+    """
+    import pyarrow as pa
+
+    return {
+        'data_pregao': pa.date32(),
+        'quantidade_teorica': pa.int64(),
+        'percentual_participacao': pa.decimal128(9, 3),
+        'data_extracao': pa.timestamp('ms'),
+    }
+
+
+def _conform_raw_column(column, target):
+    """Converte uma coluna raw para o tipo do schema atual (sem efeito se já estiver nele)"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if column.type == target:
+        return column
+    if pa.types.is_timestamp(target) and pa.types.is_string(column.type):
+        return column.cast(pa.timestamp('us')).cast(target, safe=False)
+    if pa.types.is_integer(target) and pa.types.is_floating(column.type):
+        return pc.round(column, 0).cast(target)
+    if pa.types.is_decimal(target) and pa.types.is_floating(column.type):
+        return pc.round(column, target.scale).cast(target)
+    return column.cast(target)
+
+
+def read_raw_table(bodies: List[bytes]):
+    """
+    Junta os parquets raw do lote, com os tipos que o Spark leria
+
+    Colunas dictionary-encoded voltam a strings; arquivos antigos sem a
+    coluna 'indice' recebem o IBOV e os do schema antigo (datas em string,
+    números em double) são convertidos para os tipos atuais
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    column_types = _raw_column_types()
+    tables = []
+    for body in bodies:
+        table = pq.read_table(pa.BufferReader(body))
+        fields = [field.with_type(field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                  for field in table.schema]
+        table = table.cast(pa.schema(fields))
+        for name, target in column_types.items():
+            if name in table.column_names:
+                position = table.column_names.index(name)
+                table = table.set_column(position, name, _conform_raw_column(table[name], target))
+        if 'indice' not in table.column_names:
+            table = table.append_column('indice', pa.repeat(DEFAULT_INDEX, table.num_rows).cast(pa.string()))
+        tables.append(table)
+    return pa.concat_tables(tables, promote_options='permissive')
+
+
+def _spark_average(sums, counts, value_type):
+    """avg() do Spark sobre decimal(p, s): soma / contagem arredondada (HALF_UP) em decimal(p + 4, s + 4)"""
+    import pyarrow as pa
+
+    result_type = pa.decimal128(min(38, value_type.precision + 4), value_type.scale + 4)
+    quantum = Decimal(1).scaleb(-result_type.scale)
+    context = Context(prec=60)
+    values = []
+    for total, count in zip(sums.to_pylist(), counts.to_pylist()):
+        if total is None or not count:
+            values.append(None)
+        else:
+            values.append(context.divide(total, Decimal(count)).quantize(quantum, rounding=ROUND_HALF_UP))
+    return pa.array(values, result_type)
+
+
+def aggregate_by_type(df_clean):
+    """
+    REQUISITO A: agrupamento por índice, tipo de ação e pregão (ETAPA 3 do job)
+
+    Returns:
+        Tabela com as colunas do df_aggregated do job, na mesma ordem
+    """
+    import pyarrow as pa
+
+    keys = ['indice', 'tipo_acao', 'data_pregao']
+    percentage = df_clean['percentual_participacao']
+    is_decimal = pa.types.is_decimal(percentage.type)
+    if is_decimal:
+        # sum() do Spark amplia a precisão do decimal em 10 dígitos
+        sum_type = pa.decimal128(min(38, percentage.type.precision + 10), percentage.type.scale)
+        df_clean = df_clean.append_column('_percentual_soma', percentage.cast(sum_type))
+    else:
+        df_clean = df_clean.append_column('_percentual_soma', percentage)
+
+    grouped = df_clean.group_by(keys, use_threads=False).aggregate([
+        ('codigo_acao', 'count'),
+        ('quantidade_teorica', 'sum'),
+        ('_percentual_soma', 'sum'),
+        ('percentual_participacao', 'count'),
+        ('percentual_participacao', 'max'),
+        ('percentual_participacao', 'min'),
+    ] + ([] if is_decimal else [('percentual_participacao', 'mean')]))
+
+    if is_decimal:
+        average = _spark_average(grouped['_percentual_soma_sum'], grouped['percentual_participacao_count'],
+                                 percentage.type)
+    else:
+        average = grouped['percentual_participacao_mean']
+
+    aggregated = pa.table({
+        'indice': grouped['indice'],
+        'tipo_acao': grouped['tipo_acao'],
+        'data_pregao': grouped['data_pregao'],
+        'qtd_acoes_por_tipo': grouped['codigo_acao_count'],
+        'quantidade_teorica_total': grouped['quantidade_teorica_sum'],
+        'participacao_total_tipo': grouped['_percentual_soma_sum'].cast(df_clean['_percentual_soma'].type),
+        'participacao_media_tipo': average,
+        'maior_participacao_tipo': grouped['percentual_participacao_max'],
+        'menor_participacao_tipo': grouped['percentual_participacao_min'],
+    })
+    return aggregated.sort_by([(key, 'ascending') for key in keys])
+
+
+def transform(raw, now: Optional[datetime] = None):
+    """
+    Aplica as transformações do job do Glue (ETAPAS 2 a 5)
+
+    Args:
+        raw: Tabela raw do lote (ver read_raw_table)
+        now: Instante do processamento em UTC (current_date/current_timestamp do Spark)
+
+    Returns:
+        (refined, aggregated): refinados com as colunas de partição e agregados por tipo
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+
+    # ETAPA 2: LIMPEZA E VALIDAÇÃO INICIAL
+    valid = pc.and_(pc.and_(pc.is_valid(raw['codigo_acao']),
+                            pc.greater_equal(pc.utf8_length(raw['codigo_acao']), 4)),
+                    pc.and_(pc.is_valid(raw['quantidade_teorica']),
+                            pc.is_valid(raw['percentual_participacao'])))
+    df_clean = raw.filter(valid)
+
+    data_pregao_date = df_clean['data_pregao'].cast(pa.date32())
+    df_clean = df_clean.append_column('data_pregao_date', data_pregao_date)
+    df_clean = df_clean.append_column('data_extracao_timestamp', df_clean['data_extracao'].cast(pa.timestamp('us')))
+
+    # ETAPA 3 - REQUISITO A: agrupamento numérico, sumarização e contagem
+    df_aggregated = aggregate_by_type(df_clean)
+
+    # REQUISITO B: renomear colunas (mesma posição, como withColumnRenamed)
+    df_final = df_clean.rename_columns([RENAMED_COLUMNS.get(name, name) for name in df_clean.column_names])
+
+    # REQUISITO C: cálculos com campos de data
+    today = pa.scalar(now.date(), pa.date32())
+    day_of_week = pc.day_of_week(data_pregao_date, count_from_zero=False, week_start=7).cast(pa.int32())
+    df_final = df_final.append_column('dias_desde_extracao', pc.days_between(data_pregao_date, today).cast(pa.int32()))
+    df_final = df_final.append_column('semana_pregao', pc.iso_week(data_pregao_date).cast(pa.int32()))
+    df_final = df_final.append_column('trimestre_pregao', pc.quarter(data_pregao_date).cast(pa.int32()))
+    df_final = df_final.append_column('dia_semana_pregao', day_of_week)
+    df_final = df_final.append_column('nome_dia_semana', pc.take(pa.array(DAY_NAMES, pa.string()), day_of_week))
+
+    # ETAPA 4: MÉTRICAS ADICIONAIS
+    percentage = df_final['participation_percentage']
+    percentage_float = percentage.cast(pa.float64())
+    category = pc.case_when(
+        pc.make_struct(pc.greater_equal(percentage_float, 3.0),
+                       pc.greater_equal(percentage_float, 1.0),
+                       pc.greater_equal(percentage_float, 0.1)),
+        'Alta', 'Média', 'Baixa', 'Micro')
+    df_final = df_final.append_column('categoria_participacao', category)
+
+    quantity = df_final['theoretical_quantity']
+    if pa.types.is_decimal(percentage.type):
+        # bigint * decimal(p, s) no Spark: decimal(20, 0) * decimal(p, s)
+        quantity = quantity.cast(pa.decimal128(20, 0))
+    else:
+        quantity = quantity.cast(pa.float64())
+    df_final = df_final.append_column('valor_mercado_estimado', pc.multiply(quantity, percentage))
+    df_final = df_final.append_column('data_processamento',
+                                      pa.repeat(pa.scalar(now, pa.timestamp('us')), df_final.num_rows))
+
+    # ETAPA 5: colunas de particionamento
+    df_partitioned = df_final.append_column('partition_year', pc.year(data_pregao_date).cast(pa.int32()))
+    df_partitioned = df_partitioned.append_column('partition_month', pc.month(data_pregao_date).cast(pa.int32()))
+    df_partitioned = df_partitioned.append_column('partition_day', pc.day(data_pregao_date).cast(pa.int32()))
+
+    return df_partitioned, df_aggregated
+
+
+def refined_partition(trade_date: str) -> str:
+    """Partição refinada de um pregão (YYYY-MM-DD), como gravada pelo Spark"""
+    parsed = date.fromisoformat(trade_date)
+    return f"partition_year={parsed.year}/partition_month={parsed.month}/partition_day={parsed.day}"
+
+
+def previous_trade_date(trade_date: str, batch_dates, exists: Callable[[str], bool],
+                        lookback_days: int = PREVIOUS_DAY_LOOKBACK_DAYS) -> Optional[str]:
+    """
+    Pregão anterior a trade_date: o dia mais recente do lote ou com partição
+    refinada gravada (exists), até lookback_days antes; None se não houver
+    """
+    parsed = date.fromisoformat(trade_date)
+    for offset in range(1, lookback_days + 1):
+        candidate = (parsed - timedelta(days=offset)).isoformat()
+        if candidate in batch_dates or exists(candidate):
+            return candidate
+    return None
+
+
+def _with_positions(snapshot):
+    """Posição de cada ação no índice e pregão (maior participação = 1; empate pelo ticker)"""
+    import pyarrow as pa
+
+    snapshot = snapshot.sort_by([('data_pregao_date', 'ascending'), ('indice', 'ascending'),
+                                 ('participation_percentage', 'descending'), ('ticker_symbol', 'ascending')])
+    positions = []
+    previous_group = None
+    for group in zip(snapshot['data_pregao_date'].to_pylist(), snapshot['indice'].to_pylist()):
+        position = position + 1 if group == previous_group else 1
+        positions.append(position)
+        previous_group = group
+    return snapshot.append_column('posicao', pa.array(positions, pa.int32()))
+
+
+def daily_changes(current, previous, previous_dates: Dict[str, Optional[str]]):
+    """
+    Variações de cada ação entre o pregão e o pregão anterior
+
+    Args:
+        current: Refinados dos pregões do lote
+        previous: Refinados dos pregões anteriores (do lote ou lidos das partições gravadas)
+        previous_dates: Pregão do lote -> pregão anterior (None se não houver)
+
+    Returns:
+        Tabela de variações: participação, quantidade e posição atuais e
+        anteriores, diferenças e flags de entrada/saída do índice
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    current = _with_positions(current.select(SNAPSHOT_COLUMNS))
+    current_previous = [previous_dates.get(value.isoformat()) for value in current['data_pregao_date'].to_pylist()]
+    current = current.rename_columns(['data_pregao' if name == 'data_pregao_date' else name
+                                      for name in current.column_names])
+    current = current.append_column('pregao_anterior', pa.array(
+        [date.fromisoformat(value) if value else None for value in current_previous], pa.date32()))
+
+    # Cada pregão anterior serve ao pregão seguinte do lote
+    next_dates = {before: after for after, before in previous_dates.items() if before}
+    previous = _with_positions(previous.select(SNAPSHOT_COLUMNS))
+    previous = previous.filter(pc.is_in(previous['data_pregao_date'].cast(pa.string()),
+                                        value_set=pa.array(sorted(next_dates), pa.string())))
+    previous = previous.rename_columns(['pregao_anterior', 'indice', 'ticker_symbol', 'company_name_anterior',
+                                        'participacao_anterior', 'quantidade_anterior', 'posicao_anterior'])
+    previous = previous.append_column('data_pregao', pa.array(
+        [date.fromisoformat(next_dates[value.isoformat()]) for value in previous['pregao_anterior'].to_pylist()],
+        pa.date32()))
+
+    keys = ['data_pregao', 'indice', 'ticker_symbol', 'pregao_anterior']
+    joined = current.join(previous, keys=keys, join_type='full outer')
+
+    has_previous = pc.is_valid(joined['pregao_anterior'])
+    changes = pa.table({
+        'data_pregao': joined['data_pregao'],
+        'indice': joined['indice'],
+        'ticker_symbol': joined['ticker_symbol'],
+        'company_name': pc.coalesce(joined['company_name'], joined['company_name_anterior']),
+        'pregao_anterior': joined['pregao_anterior'],
+        'participation_percentage': joined['participation_percentage'],
+        'participacao_anterior': joined['participacao_anterior'],
+        'variacao_participacao': pc.subtract(joined['participation_percentage'], joined['participacao_anterior']),
+        'theoretical_quantity': joined['theoretical_quantity'],
+        'quantidade_anterior': joined['quantidade_anterior'],
+        'variacao_quantidade': pc.subtract(joined['theoretical_quantity'], joined['quantidade_anterior']),
+        'posicao': joined['posicao'],
+        'posicao_anterior': joined['posicao_anterior'],
+        'variacao_posicao': pc.subtract(joined['posicao_anterior'], joined['posicao']),
+        'entrou': pc.and_(has_previous, pc.is_null(joined['posicao_anterior'])),
+        'saiu': pc.is_null(joined['posicao']),
+    })
+    return changes.sort_by([('data_pregao', 'ascending'), ('indice', 'ascending'),
+                            ('posicao', 'ascending'), ('ticker_symbol', 'ascending')])
+
+
+def _read_refined_partition(read: Callable[[str], bytes], keys: List[str]):
+    """Colunas do pregão (SNAPSHOT_COLUMNS) a partir dos parquets de uma partição refinada"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    return pa.concat_tables([pq.read_table(pa.BufferReader(read(key)), columns=SNAPSHOT_COLUMNS) for key in keys])
+
+
+def _partition_value(value) -> str:
+    """Valor da partição no formato do Spark (datas em yyyy-MM-dd, nulos como no Hive)"""
+    if value is None:
+        return '__HIVE_DEFAULT_PARTITION__'
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def partitioned_files(table, prefix: str, partition_keys: List[str], run_id: str,
+                      sort_keys: Optional[List[str]] = None,
+                      max_records_per_file: int = MAX_RECORDS_PER_FILE) -> List[Tuple[str, bytes]]:
+    """
+    Divide a tabela em parquets por partição, como o writer do Spark com partitionBy
+
+    As colunas de partição ficam só no caminho; timestamps em INT96 e snappy
+
+    Args:
+        sort_keys: Colunas que ordenam as linhas dentro de cada partição
+        max_records_per_file: Linhas por arquivo (maxRecordsPerFile)
+
+    Returns:
+        Lista de (chave, conteúdo)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Ordenado pelas partições (e depois por sort_keys): cada partição vira
+    # um trecho contíguo, gravado sem cópias
+    table = table.sort_by([(key, 'ascending') for key in partition_keys + (sort_keys or [])])
+    data = table.drop_columns(partition_keys).combine_chunks()
+
+    boundaries = []
+    previous = None
+    for position, values in enumerate(zip(*(table[key].to_pylist() for key in partition_keys))):
+        if values != previous:
+            boundaries.append((position, values))
+            previous = values
+    boundaries.append((table.num_rows, None))
+
+    files = []
+    for (start, values), (end, _) in zip(boundaries, boundaries[1:]):
+        partition = '/'.join(f"{key}={_partition_value(value)}" for key, value in zip(partition_keys, values))
+        for part, offset in enumerate(range(start, end, max_records_per_file)):
+            sink = pa.BufferOutputStream()
+            pq.write_table(data.slice(offset, min(max_records_per_file, end - offset)), sink,
+                           compression='snappy', use_deprecated_int96_timestamps=True)
+            files.append((f"{prefix}/{partition}/part-{part:05d}-{run_id}.c000.snappy.parquet",
+                          sink.getvalue().to_pybytes()))
+    return files
+
+
+def stale_keys(list_keys: Callable[[str], List[str]], written_keys: List[str]) -> List[str]:
+    """
+    Arquivos das partições gravadas que não são desta execução (gravações
+    anteriores do mesmo pregão, inclusive de layouts antigos sob a partição)
+    """
+    written = set(written_keys)
+    partitions = sorted({key.rsplit('/', 1)[0] + '/' for key in written})
+    return [key for partition in partitions for key in list_keys(partition) if key not in written]
+
+
+def run_fast_path(read: Callable[[str], bytes], write: Callable[[str, bytes], None],
+                  source_keys: List[str], run_id: Optional[str] = None,
+                  now: Optional[datetime] = None,
+                  list_keys: Optional[Callable[[str], List[str]]] = None,
+                  delete: Optional[Callable[[List[str]], None]] = None) -> Dict:
+    """
+    Executa o ETL do lote na própria Lambda
+
+    Com list_keys e delete, as partições gravadas são substituídas (como o
+    overwrite dinâmico de partições do job): os arquivos anteriores delas são
+    removidos depois que os novos estão gravados
+
+    Args:
+        read: Lê o conteúdo de uma chave (ex.: get_object do bucket)
+        write: Grava o conteúdo em uma chave (ex.: put_object)
+        source_keys: Parquets raw do lote
+        run_id: Identificador da execução (nome dos arquivos gravados)
+        now: Instante do processamento em UTC
+        list_keys: Lista as chaves sob um prefixo (ex.: list_objects_v2)
+        delete: Remove uma lista de chaves (ex.: delete_objects)
+
+    Returns:
+        Resumo: linhas lidas, refinadas, agregadas e de variações, pregões
+        anteriores usados, arquivos gravados e substituídos, pregões gravados
+        e duração
+    """
+    import pyarrow as pa
+
+    started = time.perf_counter()
+    run_id = run_id or f"fastpath-{uuid.uuid4().hex[:12]}"
+
+    with ThreadPoolExecutor(max_workers=min(PUT_WORKERS, len(source_keys))) as executor:
+        bodies = list(executor.map(read, source_keys))
+    raw = read_raw_table(bodies)
+    refined, aggregated = transform(raw, now)
+
+    # Pregões com linhas gravadas (partições a registrar no catálogo)
+    trade_dates = sorted({value.isoformat() for value in refined['data_pregao_date'].to_pylist()})
+
+    # Variações diárias: cada pregão anterior vem do próprio lote ou da sua
+    # partição refinada (uma listagem e uma leitura por pregão, nunca o histórico)
+    stored = {}
+
+    def partition_keys(trade_date):
+        if list_keys is None:
+            return []
+        if trade_date not in stored:
+            stored[trade_date] = [key for key in list_keys(f"{REFINED_PREFIX}/{refined_partition(trade_date)}/")
+                                  if key.endswith('.parquet')]
+        return stored[trade_date]
+
+    previous_dates = {trade_date: previous_trade_date(trade_date, trade_dates, partition_keys)
+                      for trade_date in trade_dates}
+    previous = [refined.select(SNAPSHOT_COLUMNS)]
+    previous.extend(_read_refined_partition(read, partition_keys(before)) for before in previous_dates.values()
+                    if before and before not in trade_dates)
+    changes = daily_changes(refined, pa.concat_tables(previous), previous_dates)
+
+    # Todas as saídas são geradas antes da primeira gravação: um erro nas
+    # transformações não deixa partições pela metade
+    files = (partitioned_files(refined, REFINED_PREFIX, REFINED_PARTITION_KEYS, run_id, REFINED_SORT_KEYS)
+             + partitioned_files(aggregated, AGGREGATED_PREFIX, AGGREGATED_PARTITION_KEYS, run_id)
+             + partitioned_files(changes, CHANGES_PREFIX, CHANGES_PARTITION_KEYS, run_id))
+    with ThreadPoolExecutor(max_workers=PUT_WORKERS) as executor:
+        list(executor.map(lambda item: write(*item), files))
+
+    replaced = []
+    if list_keys is not None and delete is not None:
+        replaced = stale_keys(list_keys, [key for key, _ in files])
+        if replaced:
+            delete(replaced)
+
+    summary = {
+        'run_id': run_id,
+        'source_files': len(source_keys),
+        'input_rows': raw.num_rows,
+        'refined_rows': refined.num_rows,
+        'aggregated_rows': aggregated.num_rows,
+        'change_rows': changes.num_rows,
+        'previous_dates': previous_dates,
+        'files_written': len(files),
+        'files_replaced': len(replaced),
+        'trade_dates': trade_dates,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+    logger.info(f"ETL rápido {run_id}: {summary['refined_rows']} registros refinados, "
+                f"{summary['files_written']} arquivos em {summary['duration_ms']} ms")
+    return summary
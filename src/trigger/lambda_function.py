@@ -1,122 +1,183 @@
 import json
-import boto3
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import urllib.parse
 import os
 import sys
 
 # Adiciona o diretório raiz do projeto ao path para importar config
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+# Adiciona o diretório do trigger para importar os módulos irmãos
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+# storage.py do scraper (no deploy ele é copiado para o pacote do trigger)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scraper'))
 
-try:
-    from config import config
-    CONFIG_AVAILABLE = True
-except ImportError:
-    CONFIG_AVAILABLE = False
+from event_queue import LocalEventQueue, extract_s3_records, is_queue_event, s3_notification
+from run_ledger import STATUS_FAILED, finished_status, ledger_from_env
 
 # Configuração de logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Cliente do AWS Glue
-glue_client = boto3.client('glue')
+# Clientes AWS e config.py carregados no primeiro uso (cold start enxuto);
+# eventos ignorados nem chegam a importar o boto3
+_clients = {}
+_storages = {}
+_config = None
+_config_loaded = False
+_ledger = None
+_ledger_loaded = False
+_catalog = None
+_catalog_loaded = False
+
+# Tamanho máximo da lista de chaves passada direto nos argumentos do job;
+# acima disso ela vai para um manifest no bucket
+MAX_INLINE_KEYS_LENGTH = 4096
+BATCH_MANIFEST_PREFIX = "glue-batches/bovespa"
+HEAD_OBJECT_WORKERS = 8
+
+# Lotes com até esse total de bytes raw rodam o ETL na própria Lambda
+# (ver fast_etl); acima disso, ou com 0, vão para o Glue
+DEFAULT_FAST_PATH_MAX_BYTES = 256 * 1024
+
+# Evento do EventBridge com o fim de um job do Glue (atualiza o ledger)
+JOB_STATE_CHANGE_DETAIL_TYPE = 'Glue Job State Change'
+
+# Reentrega dos arquivos de jobs falhos: tentativas por arquivo, atraso na
+# fila (máximo do SQS: 900 s) e chaves por mensagem
+DEFAULT_MAX_RUN_ATTEMPTS = 3
+DEFAULT_REDRIVE_DELAY_SECONDS = 300
+REDRIVE_KEYS_PER_MESSAGE = 500
+
+
+def get_client(service: str):
+    """Cliente boto3 do serviço, criado no primeiro uso e reaproveitado nas invocações quentes"""
+    if service not in _clients:
+        import boto3
+        # S3 local (MinIO, moto) para rodar o pipeline em uma única máquina
+        endpoint_url = os.environ.get('STORAGE_S3_ENDPOINT_URL') if service == 's3' else None
+        _clients[service] = boto3.client(service, endpoint_url=endpoint_url or None)
+    return _clients[service]
+
+
+def get_storage(bucket_name: str):
+    """
+    Armazenamento do bucket (ver storage.storage_from_env), criado no primeiro uso
+    
+    STORAGE_BACKEND=local lê e grava no diretório STORAGE_LOCAL_DIR, com o
+    mesmo layout de chaves do bucket
+    """
+    if bucket_name not in _storages:
+        from storage import storage_from_env
+        _storages[bucket_name] = storage_from_env(bucket_name, client_factory=lambda: get_client('s3'))
+    return _storages[bucket_name]
+
+
+def storage_root(bucket_name: str) -> str:
+    """Raiz das tabelas no catálogo e no job: s3://bucket ou file:// do diretório local"""
+    from storage import LocalObjectStore
+    
+    store = get_storage(bucket_name)
+    if isinstance(store, LocalObjectStore):
+        return store.root.resolve().as_uri()
+    return f"s3://{bucket_name}"
+
+
+def get_config():
+    """Configuração do projeto (config.py), carregada no primeiro uso; None se indisponível"""
+    global _config, _config_loaded
+    if not _config_loaded:
+        try:
+            from config import config
+            _config = config
+        except ImportError:
+            _config = None
+        _config_loaded = True
+    return _config
+
+
+def get_ledger():
+    """Ledger de execuções do ETL (ver run_ledger), criado no primeiro uso; None se desativado"""
+    global _ledger, _ledger_loaded
+    if not _ledger_loaded:
+        _ledger = ledger_from_env(lambda: get_client('dynamodb'))
+        _ledger_loaded = True
+    return _ledger
+
+def get_catalog():
+    """Catálogo das tabelas refinadas (ver catalog), criado no primeiro uso; None se desativado"""
+    global _catalog, _catalog_loaded
+    if not _catalog_loaded:
+        from catalog import catalog_from_env
+        _catalog = catalog_from_env(lambda: get_client('glue'))
+        _catalog_loaded = True
+    return _catalog
 
 def lambda_handler(event, context):
     """
-    Lambda acionada pelo S3 quando um novo arquivo parquet é carregado
-    Inicia o job do Glue para processamento ETL
+    Lambda acionada pelas notificações de novos arquivos parquet da camada raw
+    Inicia um único job do Glue para todos os arquivos do lote, exceto os já
+    processados ou em processamento (ver run_ledger); também recebe do
+    EventBridge o fim dos jobs, que é registrado no ledger
     
     Args:
-        event: Evento do S3 com informações do arquivo
+        event: Lote da fila SQS com notificações do S3 (ou evento direto do S3),
+            ou evento 'Glue Job State Change'
         context: Contexto de execução do Lambda
         
     Returns:
         Resposta com status da execução
     """
+    if (event or {}).get('detail-type') == JOB_STATE_CHANGE_DETAIL_TYPE:
+        return handle_job_state_change(event)
+    
+    from_queue = is_queue_event(event)
+    
     try:
         # Obter configurações
-        if CONFIG_AVAILABLE:
+        config = get_config()
+        if config is not None:
             glue_job_name = config.glue_job_name
             raw_data_prefix = config.s3_raw_data_prefix
         else:
             glue_job_name = os.environ.get('GLUE_JOB_NAME', 'bovespa-etl-job')
             raw_data_prefix = os.environ.get('S3_RAW_DATA_PREFIX', 'raw-data/bovespa/')
         
-        logger.info("Iniciando processamento do evento S3")
-        
-        # Processar cada registro do evento S3
-        for record in event['Records']:
-            # Extrair informações do S3
-            bucket_name = record['s3']['bucket']['name']
-            object_key = urllib.parse.unquote_plus(record['s3']['object']['key'], encoding='utf-8')
-            
-            logger.info(f"Arquivo detectado: s3://{bucket_name}/{object_key}")
-            
-            # Verificar se é um arquivo de dados brutos
-            if not object_key.startswith(raw_data_prefix) or not object_key.endswith('.parquet'):
-                logger.info(f"Arquivo ignorado (não é dado bruto): {object_key}")
-                continue
-            
-            # Extrair data do caminho do arquivo
-            try:
-                # Formato: raw-data/bovespa/year=2025/month=01/day=19/ibov_carteira_20250119.parquet
-                path_parts = object_key.split('/')
-                year = path_parts[2].split('=')[1]
-                month = path_parts[3].split('=')[1]
-                day = path_parts[4].split('=')[1]
-                processing_date = f"{year}-{month}-{day}"
-            except (IndexError, ValueError) as e:
-                logger.error(f"Erro ao extrair data do caminho: {e}")
-                continue
-            
-            # Parâmetros para o job Glue
-            job_arguments = {
-                '--source_bucket': bucket_name,
-                '--source_key': object_key,
-                '--target_bucket': bucket_name,
-                '--processing_date': processing_date,
-                '--job-bookmark-option': 'job-bookmark-enable',
-                '--enable-metrics': '',
-                '--enable-continuous-cloudwatch-log': 'true'
+        records = extract_s3_records(event)
+        logger.info(f"Iniciando processamento de {len(records)} notificações do S3")
+        
+        # Arquivos raw do lote, sem repetições (o S3 pode notificar o mesmo PUT mais de uma vez)
+        batches = collect_raw_keys(records, raw_data_prefix)
+        
+        if not batches:
+            return {
+                'statusCode': 200,
+                'body': json.dumps({
+                    'message': 'Nenhum arquivo raw novo no lote',
+                    'processed_files': 0,
+                    'timestamp': datetime.now().isoformat()
+                })
             }
-            
-            # Gerar nome único para o job run
-            job_run_name = f"bovespa-etl-{processing_date.replace('-', '')}-{int(datetime.now().timestamp())}"
-            
-            logger.info(f"Iniciando job Glue: {glue_job_name}")
-            logger.info(f"Job run name: {job_run_name}")
-            logger.info(f"Argumentos: {job_arguments}")
-            
-            # Iniciar job Glue
-            response = glue_client.start_job_run(
-                JobName=glue_job_name,
-                Arguments=job_arguments,
-                JobRunId=job_run_name,
-                AllocatedCapacity=2,  # Número de DPUs
-                Timeout=60,  # Timeout em minutos
-                MaxConcurrentRuns=1
-            )
-            
-            job_run_id = response['JobRunId']
-            
-            logger.info(f"Job Glue iniciado com sucesso. Job Run ID: {job_run_id}")
-            
-            # Log para CloudWatch
-            logger.info({
-                'event': 'GLUE_JOB_STARTED',
-                'job_name': glue_job_name,
-                'job_run_id': job_run_id,
-                'source_file': f"s3://{bucket_name}/{object_key}",
-                'processing_date': processing_date,
-                'timestamp': datetime.now().isoformat()
-            })
+        
+        # Um job por bucket (na prática, um único job por lote)
+        job_runs = []
+        duplicates = 0
+        for bucket_name, keys in batches.items():
+            job_run, suppressed = launch_batch(glue_job_name, bucket_name, keys)
+            duplicates += suppressed
+            if job_run:
+                job_runs.append(job_run)
         
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': 'Jobs Glue iniciados com sucesso',
-                'processed_files': len(event['Records']),
+                'message': ('ETL iniciado com sucesso' if job_runs
+                            else 'Nenhum job iniciado: arquivos já processados ou em processamento'),
+                'processed_files': sum(job_run['source_files'] for job_run in job_runs),
+                'duplicates_suppressed': duplicates,
+                'job_runs': job_runs,
                 'timestamp': datetime.now().isoformat()
             })
         }
@@ -132,6 +193,12 @@ def lambda_handler(event, context):
             's3_event': event
         })
         
+        if from_queue:
+            # O lote volta à fila após o visibility timeout e é reentregue
+            # (ex.: limite de execuções concorrentes do job); depois de
+            # maxReceiveCount tentativas vai para a DLQ
+            raise
+        
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -140,6 +207,446 @@ def lambda_handler(event, context):
             })
         }
 
+def collect_raw_keys(records: List[Dict], raw_data_prefix: str) -> Dict[str, List[str]]:
+    """
+    Filtra as notificações para os parquets diários da camada raw
+    
+    Args:
+        records: Registros de notificação do S3
+        raw_data_prefix: Prefixo da camada raw
+        
+    Returns:
+        Chaves ordenadas e sem repetições, por bucket
+    """
+    batches = {}
+    
+    for record in records:
+        # Extrair informações do S3
+        bucket_name = record['s3']['bucket']['name']
+        object_key = urllib.parse.unquote_plus(record['s3']['object']['key'], encoding='utf-8')
+        
+        logger.info(f"Arquivo detectado: s3://{bucket_name}/{object_key}")
+        
+        # Verificar se é um arquivo de dados brutos
+        if not object_key.startswith(raw_data_prefix) or not object_key.endswith('.parquet'):
+            logger.info(f"Arquivo ignorado (não é dado bruto): {object_key}")
+            continue
+        
+        # Arquivo mensal da compactação (sem 'day='): dados já processados
+        if '/day=' not in object_key:
+            logger.info(f"Arquivo ignorado (compactação mensal da camada raw): {object_key}")
+            continue
+        
+        if processing_date_from_key(object_key) is None:
+            logger.error(f"Erro ao extrair data do caminho: {object_key}")
+            continue
+        
+        batches.setdefault(bucket_name, set()).add(object_key)
+    
+    return {bucket_name: sorted(keys) for bucket_name, keys in batches.items()}
+
+def processing_date_from_key(object_key: str) -> Optional[str]:
+    """
+    Data do pregão (YYYY-MM-DD) a partir da chave do parquet raw
+    
+    Formato: raw-data/bovespa/year=2025/month=01/day=19/ibov_carteira_20250119.parquet
+    """
+    parts = dict(part.split('=', 1) for part in object_key.split('/') if '=' in part)
+    try:
+        return f"{int(parts['year']):04d}-{int(parts['month']):02d}-{int(parts['day']):02d}"
+    except (KeyError, ValueError):
+        return None
+
+def launch_batch(glue_job_name: str, bucket_name: str, object_keys: List[str]) -> Tuple[Optional[Dict], int]:
+    """
+    Reivindica os arquivos do lote no ledger e inicia o job com os que não são duplicatas
+    
+    Arquivos já processados ou em processamento (mesmo pregão e mesmo conteúdo)
+    são suprimidos; lotes pequenos rodam o ETL na própria Lambda (ver
+    fast_etl) e os demais no Glue. Se o job não iniciar, as reivindicações
+    são devolvidas para que a reentrega do lote tente de novo
+    
+    Returns:
+        Resumo da execução iniciada (ou None se todos forem duplicatas) e
+        número de duplicatas suprimidas
+    """
+    objects = describe_raw_objects(bucket_name, object_keys)
+    ledger = get_ledger()
+    claims = []
+    suppressed = 0
+    
+    if ledger is not None:
+        for object_key in object_keys:
+            content_hash = objects[object_key]['content_hash']
+            if not content_hash:
+                # Sem hash não há como reconhecer a duplicata: o arquivo segue para o job
+                logger.warning(f"Arquivo sem hash de conteúdo, fora do ledger: {object_key}")
+                continue
+            claim = {
+                'processing_date': processing_date_from_key(object_key),
+                'content_hash': content_hash,
+                'source_key': object_key
+            }
+            if ledger.claim(claim['processing_date'], content_hash, object_key):
+                claims.append(claim)
+                continue
+            suppressed += 1
+            objects.pop(object_key)
+            logger.info({
+                'event': 'DUPLICATE_RUN_SUPPRESSED',
+                'source_bucket': bucket_name,
+                'source_key': object_key,
+                'processing_date': claim['processing_date'],
+                'content_hash': content_hash,
+                'timestamp': datetime.now().isoformat()
+            })
+    
+    keys = [key for key in object_keys if key in objects]
+    if not keys:
+        logger.info(f"Nenhum arquivo novo em s3://{bucket_name}: {suppressed} duplicatas suprimidas")
+        return None, suppressed
+    
+    job_run = None
+    if use_fast_path([objects[key] for key in keys]):
+        try:
+            job_run = start_fast_path_run(bucket_name, keys)
+        except ImportError as e:
+            # Pacote sem o pyarrow (ver requirements.txt): todo lote iria para o Glue
+            logger.error(f"ETL rápido indisponível ({e}), lote enviado ao Glue")
+        except Exception as e:
+            # O Glue reprocessa o lote; as saídas só são gravadas depois das transformações
+            logger.warning(f"ETL rápido falhou, lote enviado ao Glue: {e}")
+    
+    if job_run is None:
+        indices = {index for key in keys for index in objects[key]['indices'].split(',') if index}
+        try:
+            job_run = start_batch_job_run(glue_job_name, bucket_name, keys, ','.join(sorted(indices)))
+        except Exception:
+            if claims:
+                ledger.release(claims)
+            raise
+    
+    if claims:
+        ledger.mark_started(claims, job_run['job_run_id'], bucket_name)
+        if job_run['engine'] == 'lambda':
+            # Executado de forma síncrona: não há evento de fim do Glue
+            ledger.mark_finished(job_run['job_run_id'], 'SUCCEEDED')
+    job_run['duplicates_suppressed'] = suppressed
+    return job_run, suppressed
+
+def use_fast_path(objects: List[Dict]) -> bool:
+    """
+    True se o lote cabe no ETL rápido (FAST_PATH_MAX_BYTES, padrão 256 KiB)
+    
+    Lotes com algum tamanho desconhecido vão para o Glue
+    """
+    max_bytes = int(os.environ.get('FAST_PATH_MAX_BYTES', DEFAULT_FAST_PATH_MAX_BYTES))
+    if max_bytes <= 0 or any(item['size'] is None for item in objects):
+        return False
+    return sum(item['size'] for item in objects) <= max_bytes
+
+def start_fast_path_run(bucket_name: str, object_keys: List[str]) -> Dict:
+    """
+    Executa o ETL do lote na própria Lambda, com as transformações do job do Glue
+    
+    Returns:
+        Resumo da execução, no mesmo formato do job do Glue
+    """
+    from fast_etl import run_fast_path
+    
+    store = get_storage(bucket_name)
+    processing_dates = sorted({processing_date_from_key(key) for key in object_keys})
+    run_id = f"fastpath-{processing_dates[0].replace('-', '')}-{int(datetime.now().timestamp())}"
+    
+    logger.info(f"Iniciando ETL rápido ({run_id}): {len(object_keys)} arquivos "
+                f"de {processing_dates[0]} a {processing_dates[-1]}")
+    
+    def read(key):
+        body = store.read(key)
+        if body is None:
+            raise FileNotFoundError(f"Objeto não encontrado: {store.uri(key)}")
+        return body
+    
+    summary = run_fast_path(
+        read=read,
+        write=store.write,
+        source_keys=object_keys,
+        run_id=run_id,
+        list_keys=lambda prefix: list_object_keys(bucket_name, prefix),
+        delete=lambda keys: delete_object_keys(bucket_name, keys)
+    )
+    
+    # Os arquivos já foram gravados: uma falha no catálogo não refaz o ETL
+    # (o registro é idempotente e a próxima execução do pregão o repete)
+    partitions_registered = register_partitions(storage_root(bucket_name), summary['trade_dates'])
+    
+    # Log para CloudWatch
+    logger.info({
+        'event': 'FAST_PATH_ETL_COMPLETED',
+        'run_id': run_id,
+        'source_bucket': bucket_name,
+        'source_files': len(object_keys),
+        'processing_dates': processing_dates,
+        'refined_rows': summary['refined_rows'],
+        'change_rows': summary['change_rows'],
+        'previous_dates': summary['previous_dates'],
+        'files_written': summary['files_written'],
+        'files_replaced': summary['files_replaced'],
+        'partitions_registered': partitions_registered,
+        'duration_ms': summary['duration_ms'],
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    return {
+        'job_run_id': run_id,
+        'engine': 'lambda',
+        'source_files': len(object_keys),
+        'first_date': processing_dates[0],
+        'last_date': processing_dates[-1],
+        'refined_rows': summary['refined_rows'],
+        'duration_ms': summary['duration_ms']
+    }
+
+def list_object_keys(bucket_name: str, prefix: str) -> List[str]:
+    """Chaves dos objetos sob um prefixo do bucket"""
+    return [item['key'] for item in get_storage(bucket_name).list(prefix)]
+
+def delete_object_keys(bucket_name: str, object_keys: List[str]) -> None:
+    """Remove objetos do bucket (no S3, até 1000 por chamada do DeleteObjects)"""
+    get_storage(bucket_name).delete(object_keys)
+
+def register_partitions(storage_root: str, trade_dates: List[str]) -> Optional[int]:
+    """
+    Registra no catálogo as partições refinadas, agregadas e de variações dos pregões gravados
+    
+    Returns:
+        Partições novas no catálogo, ou None se o catálogo estiver desativado ou falhar
+    """
+    catalog = get_catalog()
+    if catalog is None or not trade_dates:
+        return None
+    
+    from catalog import OUTPUT_TABLES
+    
+    try:
+        return sum(catalog.register_partitions(table_name, storage_root, trade_dates)
+                   for table_name in OUTPUT_TABLES)
+    except Exception as e:
+        logger.error(f"Erro ao registrar partições de {', '.join(trade_dates)} no catálogo: {str(e)}")
+        return None
+
+def start_batch_job_run(glue_job_name: str, bucket_name: str, object_keys: List[str],
+                        indices: str = '') -> Dict:
+    """
+    Inicia um único job do Glue para todos os arquivos raw do lote
+    
+    As chaves vão no argumento '--source_keys'; listas que não cabem nos
+    argumentos do job são gravadas em um manifest no bucket ('--source_manifest')
+    
+    Returns:
+        Resumo da execução iniciada (job run id, arquivos e pregões)
+    """
+    processing_dates = sorted({processing_date_from_key(key) for key in object_keys})
+    job_run_name = (f"bovespa-etl-{processing_dates[0].replace('-', '')}-"
+                    f"{processing_dates[-1].replace('-', '')}-{int(datetime.now().timestamp())}")
+    
+    # Parâmetros para o job Glue
+    job_arguments = {
+        '--source_bucket': bucket_name,
+        '--target_bucket': bucket_name,
+        # Sem bookmark: o job lê exatamente as chaves do lote, e um job falho
+        # não pode marcar os arquivos como lidos antes da reentrega
+        '--job-bookmark-option': 'job-bookmark-disable',
+        '--enable-metrics': '',
+        '--enable-continuous-cloudwatch-log': 'true'
+    }
+    
+    source_keys = ','.join(object_keys)
+    if len(source_keys) <= MAX_INLINE_KEYS_LENGTH:
+        job_arguments['--source_keys'] = source_keys
+    else:
+        manifest_key = f"{BATCH_MANIFEST_PREFIX}/{job_run_name}.txt"
+        get_storage(bucket_name).write(manifest_key, '\n'.join(object_keys).encode('utf-8'),
+                                       content_type='text/plain')
+        job_arguments['--source_manifest'] = manifest_key
+        logger.info(f"Lista de {len(object_keys)} arquivos gravada em s3://{bucket_name}/{manifest_key}")
+    
+    # Backend local: o job lê e grava no mesmo diretório (--storage_root)
+    root = storage_root(bucket_name)
+    if not root.startswith('s3://'):
+        job_arguments['--storage_root'] = root
+    
+    # Índices gravados nas partições: um único job processa todos
+    if indices:
+        job_arguments['--indices'] = indices
+        logger.info(f"Índices no lote: {indices}")
+    
+    logger.info(f"Iniciando job Glue: {glue_job_name} ({job_run_name})")
+    logger.info(f"{len(object_keys)} arquivos de {processing_dates[0]} a {processing_dates[-1]}")
+    
+    # Iniciar job Glue (workers e DPUs vêm da definição do job)
+    response = get_client('glue').start_job_run(
+        JobName=glue_job_name,
+        Arguments=job_arguments,
+        Timeout=60  # Timeout em minutos
+    )
+    
+    job_run_id = response['JobRunId']
+    
+    logger.info(f"Job Glue iniciado com sucesso. Job Run ID: {job_run_id}")
+    
+    # Log para CloudWatch
+    logger.info({
+        'event': 'GLUE_JOB_STARTED',
+        'job_name': glue_job_name,
+        'job_run_id': job_run_id,
+        'source_bucket': bucket_name,
+        'source_files': len(object_keys),
+        'processing_dates': processing_dates,
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    return {
+        'job_run_id': job_run_id,
+        'engine': 'glue',
+        'source_files': len(object_keys),
+        'first_date': processing_dates[0],
+        'last_date': processing_dates[-1]
+    }
+
+def describe_raw_objects(bucket_name: str, object_keys: List[str]) -> Dict[str, Dict]:
+    """
+    Metadados dos objetos raw do lote, lidos em paralelo
+    
+    Returns:
+        Por chave: índices, hash do conteúdo e tamanho
+    """
+    with ThreadPoolExecutor(max_workers=min(HEAD_OBJECT_WORKERS, len(object_keys))) as executor:
+        found = executor.map(lambda key: get_object_metadata(bucket_name, key), object_keys)
+        return dict(zip(object_keys, found))
+
+def get_object_metadata(bucket_name: str, object_key: str) -> Dict:
+    """
+    Lê os metadados gravados pelo scraper no objeto raw
+    
+    Args:
+        bucket_name: Bucket do objeto
+        object_key: Chave do parquet raw
+        
+    Returns:
+        'indices': códigos separados por vírgula (ex.: 'IBOV,SMLL') ou '';
+        'content_hash': 'content_sha256' do scraper, o ETag, ou None se ausentes;
+        'size': tamanho em bytes, ou None se desconhecido
+    """
+    try:
+        stored = get_storage(bucket_name).head(object_key)
+        if stored is None:
+            raise FileNotFoundError(f"Objeto não encontrado: {object_key}")
+    except Exception as e:
+        # Sem os metadados o Glue processa os índices encontrados no arquivo
+        logger.warning(f"Não foi possível ler os metadados de {object_key}: {e}")
+        return {'indices': '', 'content_hash': None, 'size': None}
+    
+    metadata = stored.get('metadata') or {}
+    content_hash = metadata.get('content_sha256')
+    if not content_hash and stored.get('etag'):
+        etag = stored['etag'].strip('"')
+        content_hash = f"etag:{etag}"
+    return {'indices': metadata.get('indices', ''), 'content_hash': content_hash,
+            'size': stored.get('size')}
+
+def handle_job_state_change(event: Dict) -> Dict:
+    """
+    Registra no ledger o fim de um job do Glue (evento do EventBridge)
+    
+    Os arquivos de um job falho voltam à fila (ver redrive_failed_run): as
+    mensagens originais já foram removidas quando o job foi iniciado
+    
+    Returns:
+        Resposta com o número de arquivos atualizados no ledger e reenviados
+    """
+    detail = event.get('detail', {})
+    job_run_id = detail.get('jobRunId')
+    job_state = detail.get('state')
+    ledger = get_ledger()
+    
+    updated = ledger.mark_finished(job_run_id, job_state) if ledger is not None and job_run_id else 0
+    
+    redrive = {'redriven': [], 'abandoned': []}
+    if updated and finished_status(job_state) == STATUS_FAILED:
+        redrive = redrive_failed_run(ledger, job_run_id)
+    
+    logger.info({
+        'event': 'GLUE_JOB_FINISHED',
+        'job_name': detail.get('jobName'),
+        'job_run_id': job_run_id,
+        'state': job_state,
+        'ledger_entries': updated,
+        'redriven_files': len(redrive['redriven']),
+        'timestamp': datetime.now().isoformat()
+    })
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'job_run_id': job_run_id,
+            'state': job_state,
+            'ledger_entries': updated,
+            'redriven_files': len(redrive['redriven']),
+            'abandoned_files': len(redrive['abandoned']),
+            'timestamp': datetime.now().isoformat()
+        })
+    }
+
+def redrive_failed_run(ledger, job_run_id: str) -> Dict[str, List[str]]:
+    """
+    Reenvia à fila do trigger os arquivos de um job falho, lidos do ledger
+    
+    Arquivos que já tiveram MAX_RUN_ATTEMPTS tentativas (padrão 3), ou sem
+    fila configurada (RAW_EVENTS_QUEUE_URL), não são reenviados: o evento
+    'ETL_RUN_ABANDONED' no log dispara o alarme (ver infrastructure/lambda.tf)
+    
+    Returns:
+        Chaves reenviadas ('redriven') e abandonadas ('abandoned')
+    """
+    run = ledger.get_run(job_run_id)
+    failed = [entry for entry in (run or {}).get('entries', [])
+              if entry['status'] == STATUS_FAILED and entry['source_key']]
+    if not failed:
+        return {'redriven': [], 'abandoned': []}
+    
+    max_attempts = int(os.environ.get('MAX_RUN_ATTEMPTS', DEFAULT_MAX_RUN_ATTEMPTS))
+    queue_url = os.environ.get('RAW_EVENTS_QUEUE_URL')
+    bucket_name = run['source_bucket']
+    
+    redriven = sorted(entry['source_key'] for entry in failed if entry['attempts'] < max_attempts)
+    if not (queue_url and bucket_name):
+        redriven = []
+    abandoned = sorted(entry['source_key'] for entry in failed if entry['source_key'] not in redriven)
+    
+    if redriven:
+        delay = int(os.environ.get('REDRIVE_DELAY_SECONDS', DEFAULT_REDRIVE_DELAY_SECONDS))
+        sqs = get_client('sqs')
+        for start in range(0, len(redriven), REDRIVE_KEYS_PER_MESSAGE):
+            keys = redriven[start:start + REDRIVE_KEYS_PER_MESSAGE]
+            sqs.send_message(QueueUrl=queue_url, DelaySeconds=min(delay, 900),
+                             MessageBody=json.dumps(s3_notification(bucket_name, keys, 'ObjectCreated:Redrive')))
+        logger.warning(f"Job {job_run_id} falhou: {len(redriven)} arquivos reenviados à fila")
+    
+    if abandoned:
+        # Log de erro estruturado (filtro de métrica + alarme)
+        logger.error({
+            'event': 'ETL_RUN_ABANDONED',
+            'job_run_id': job_run_id,
+            'source_bucket': bucket_name,
+            'source_keys': abandoned,
+            'max_attempts': max_attempts,
+            'queue_configured': bool(queue_url),
+            'timestamp': datetime.now().isoformat()
+        })
+    
+    return {'redriven': redriven, 'abandoned': abandoned}
+
 def get_job_status(job_name: str, job_run_id: str) -> dict:
     """
     Verifica o status de um job Glue
@@ -152,7 +659,7 @@ def get_job_status(job_name: str, job_run_id: str) -> dict:
         Informações do status do job
     """
     try:
-        response = glue_client.get_job_run(
+        response = get_client('glue').get_job_run(
             JobName=job_name,
             RunId=job_run_id
         )
@@ -172,23 +679,25 @@ def get_job_status(job_name: str, job_run_id: str) -> dict:
 
 # Para teste local
 if __name__ == "__main__":
-    # Simular evento S3
-    test_event = {
-        'Records': [
-            {
-                's3': {
-                    'bucket': {
-                        'name': 'bovespa-pipeline-bucket'
-                    },
-                    'object': {
-                        'key': 'raw-data/bovespa/year=2025/month=01/day=19/ibov_carteira_20250119.parquet'
+    # Simular um backfill: três notificações S3 coalescidas pela fila local em um único job
+    queue = LocalEventQueue(debounce_seconds=0)
+    for day in ('17', '18', '19'):
+        queue.put({
+            'Records': [
+                {
+                    's3': {
+                        'bucket': {
+                            'name': 'bovespa-pipeline-bucket'
+                        },
+                        'object': {
+                            'key': f'raw-data/bovespa/year=2025/month=01/day={day}/ibov_carteira_202501{day}.parquet'
+                        }
                     }
                 }
-            }
-        ]
-    }
+            ]
+        })
     
     os.environ['GLUE_JOB_NAME'] = 'bovespa-etl-job'
     
-    result = lambda_handler(test_event, None)
+    result = queue.poll(lambda_handler)
     print(json.dumps(result, indent=2))
@@ -0,0 +1,420 @@
+"""
+Registro de execuções do ETL (ledger)
+Cada arquivo raw é identificado pelo pregão e pelo hash do conteúdo
+(metadado 'content_sha256' gravado pelo scraper, ou o ETag do objeto).
+Antes de iniciar um job o trigger reivindica cada par (pregão, hash); pares
+já em processamento ou já processados são duplicatas, suprimidas e contadas.
+O fim do job (evento 'Glue Job State Change' do EventBridge) marca os pares
+como concluídos ou falhos; pares falhos podem ser reivindicados de novo, e
+get_run devolve os arquivos de um job falho para a reentrega (o número de
+tentativas de cada par fica em 'attempts')
+
+- DynamoDbRunLedger: tabela do DynamoDB (ver infrastructure/dynamodb.tf)
+- SqliteRunLedger: arquivo SQLite local, com a mesma semântica
+
+RUN_LEDGER_BACKEND escolhe o backend ('dynamodb', 'sqlite' ou 'none'); sem
+ele, o DynamoDB é usado se RUN_LEDGER_TABLE estiver definido
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+STATUS_RUNNING = 'RUNNING'
+STATUS_SUCCEEDED = 'SUCCEEDED'
+STATUS_FAILED = 'FAILED'
+
+# Reivindicações sem fim registrado após esse tempo podem ser retomadas
+# (o job tem timeout de 60 minutos; o evento de fim pode se perder)
+DEFAULT_RUNNING_TIMEOUT_SECONDS = 2 * 60 * 60
+# Itens expiram (TTL do DynamoDB) depois de 90 dias
+DEFAULT_RETENTION_SECONDS = 90 * 24 * 60 * 60
+
+DEFAULT_SQLITE_PATH = "run_ledger.sqlite3"
+
+
+def finished_status(job_state: str) -> str:
+    """Status do ledger para o estado final de um job do Glue"""
+    return STATUS_SUCCEEDED if job_state == 'SUCCEEDED' else STATUS_FAILED
+
+
+class DynamoDbRunLedger:
+    """
+    Ledger em uma tabela do DynamoDB (chave pk + sk)
+
+    Itens por conteúdo: pk='date#<pregão>', sk='content#<hash>'
+    Itens por execução: pk='run#<job run id>', sk='run', com os pares do job
+
+    Args:
+        table_name: Nome da tabela
+        client: Cliente boto3 do DynamoDB
+        running_timeout: Segundos até uma reivindicação sem fim poder ser retomada
+        clock: Relógio em segundos (substituível em testes)
+    """
+
+    def __init__(self, table_name: str, client,
+                 running_timeout: int = DEFAULT_RUNNING_TIMEOUT_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.table_name = table_name
+        self.client = client
+        self.running_timeout = running_timeout
+        self.clock = clock
+
+    @staticmethod
+    def _content_key(processing_date: str, content_hash: str) -> Dict:
+        return {'pk': {'S': f"date#{processing_date}"}, 'sk': {'S': f"content#{content_hash}"}}
+
+    @staticmethod
+    def _run_key(job_run_id: str) -> Dict:
+        return {'pk': {'S': f"run#{job_run_id}"}, 'sk': {'S': 'run'}}
+
+    @staticmethod
+    def _is_conditional_failure(error: Exception) -> bool:
+        code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+        return code == 'ConditionalCheckFailedException'
+
+    def _expires_at(self, now: float) -> Dict:
+        return {'N': str(int(now + DEFAULT_RETENTION_SECONDS))}
+
+    def claim(self, processing_date: str, content_hash: str, source_key: str) -> bool:
+        """
+        Reivindica o par (pregão, hash) para um novo job
+
+        Returns:
+            True se reivindicado; False se já estiver em processamento ou
+            processado (a duplicata é contada no item)
+        """
+        now = self.clock()
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key=self._content_key(processing_date, content_hash),
+                UpdateExpression=('SET #status = :running, source_key = :source_key, '
+                                  'updated_at = :now, created_at = if_not_exists(created_at, :now), '
+                                  'expires_at = :expires_at REMOVE job_run_id ADD attempts :one'),
+                ConditionExpression=('attribute_not_exists(pk) OR #status = :failed OR '
+                                     '(#status = :running AND updated_at < :stale)'),
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={
+                    ':running': {'S': STATUS_RUNNING},
+                    ':failed': {'S': STATUS_FAILED},
+                    ':one': {'N': '1'},
+                    ':source_key': {'S': source_key},
+                    ':now': {'N': str(now)},
+                    ':stale': {'N': str(now - self.running_timeout)},
+                    ':expires_at': self._expires_at(now)
+                }
+            )
+            return True
+        except Exception as e:
+            if not self._is_conditional_failure(e):
+                raise
+
+        self.client.update_item(
+            TableName=self.table_name,
+            Key=self._content_key(processing_date, content_hash),
+            UpdateExpression='ADD duplicate_count :one SET last_duplicate_at = :now',
+            ExpressionAttributeValues={':one': {'N': '1'}, ':now': {'N': str(now)}}
+        )
+        return False
+
+    def release(self, claims: List[Dict]) -> None:
+        """Devolve reivindicações cujo job não chegou a iniciar (podem ser retomadas)"""
+        now = self.clock()
+        for claim in claims:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key=self._content_key(claim['processing_date'], claim['content_hash']),
+                UpdateExpression='SET #status = :failed, updated_at = :now',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':failed': {'S': STATUS_FAILED}, ':now': {'N': str(now)}}
+            )
+
+    def mark_started(self, claims: List[Dict], job_run_id: str, source_bucket: Optional[str] = None) -> None:
+        """Associa as reivindicações ao job iniciado (e ao bucket dos arquivos, para a reentrega)"""
+        now = self.clock()
+        entries = [[claim['processing_date'], claim['content_hash']] for claim in claims]
+        item = {**self._run_key(job_run_id),
+                'status': {'S': STATUS_RUNNING},
+                'entries': {'S': json.dumps(entries)},
+                'started_at': {'N': str(now)},
+                'expires_at': self._expires_at(now)}
+        if source_bucket:
+            item['source_bucket'] = {'S': source_bucket}
+        self.client.put_item(TableName=self.table_name, Item=item)
+        for processing_date, content_hash in entries:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key=self._content_key(processing_date, content_hash),
+                UpdateExpression='SET job_run_id = :job_run_id, updated_at = :now',
+                ExpressionAttributeValues={':job_run_id': {'S': job_run_id}, ':now': {'N': str(now)}}
+            )
+
+    def mark_finished(self, job_run_id: str, job_state: str) -> int:
+        """
+        Registra o fim de um job nos pares que ele processou
+
+        Returns:
+            Número de pares atualizados (0 se o job não estiver no ledger)
+        """
+        response = self.client.get_item(TableName=self.table_name, Key=self._run_key(job_run_id))
+        item = response.get('Item')
+        if not item:
+            return 0
+
+        now = self.clock()
+        status = finished_status(job_state)
+        updated = 0
+        for processing_date, content_hash in json.loads(item['entries']['S']):
+            try:
+                # Só atualiza se o par ainda pertence a este job (não foi retomado por outro)
+                self.client.update_item(
+                    TableName=self.table_name,
+                    Key=self._content_key(processing_date, content_hash),
+                    UpdateExpression='SET #status = :status, updated_at = :now',
+                    ConditionExpression='job_run_id = :job_run_id',
+                    ExpressionAttributeNames={'#status': 'status'},
+                    ExpressionAttributeValues={':status': {'S': status}, ':now': {'N': str(now)},
+                                               ':job_run_id': {'S': job_run_id}}
+                )
+                updated += 1
+            except Exception as e:
+                if not self._is_conditional_failure(e):
+                    raise
+
+        self.client.update_item(
+            TableName=self.table_name,
+            Key=self._run_key(job_run_id),
+            UpdateExpression='SET #status = :status, finished_at = :now, job_state = :state',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':status': {'S': status}, ':now': {'N': str(now)},
+                                       ':state': {'S': job_state}}
+        )
+        return updated
+
+    def get(self, processing_date: str, content_hash: str) -> Optional[Dict]:
+        """Entrada do par (status, job, duplicatas), ou None se nunca reivindicado"""
+        response = self.client.get_item(TableName=self.table_name,
+                                        Key=self._content_key(processing_date, content_hash))
+        item = response.get('Item')
+        if not item:
+            return None
+        return {
+            'processing_date': processing_date,
+            'content_hash': content_hash,
+            'status': item['status']['S'],
+            'source_key': item.get('source_key', {}).get('S'),
+            'job_run_id': item.get('job_run_id', {}).get('S'),
+            'duplicate_count': int(item.get('duplicate_count', {}).get('N', 0)),
+            'attempts': int(item.get('attempts', {}).get('N', 0))
+        }
+
+    def get_run(self, job_run_id: str) -> Optional[Dict]:
+        """
+        Job registrado no ledger (status, bucket e pares), ou None se desconhecido
+
+        'entries' traz só os pares que ainda pertencem ao job (não retomados
+        por outro), com a chave do arquivo e o número de tentativas
+        """
+        response = self.client.get_item(TableName=self.table_name, Key=self._run_key(job_run_id))
+        item = response.get('Item')
+        if not item:
+            return None
+        entries = [self.get(processing_date, content_hash)
+                   for processing_date, content_hash in json.loads(item['entries']['S'])]
+        return {
+            'job_run_id': job_run_id,
+            'status': item['status']['S'],
+            'source_bucket': item.get('source_bucket', {}).get('S'),
+            'entries': [entry for entry in entries if entry and entry['job_run_id'] == job_run_id]
+        }
+
+
+class SqliteRunLedger:
+    """
+    Ledger em um arquivo SQLite, no lugar do DynamoDB fora da AWS
+
+    Args:
+        path: Arquivo do banco (':memory:' para um ledger temporário)
+        running_timeout: Segundos até uma reivindicação sem fim poder ser retomada
+        clock: Relógio em segundos (substituível em testes)
+    """
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH,
+                 running_timeout: int = DEFAULT_RUNNING_TIMEOUT_SECONDS,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.running_timeout = running_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        # isolation_level=None: transações explícitas (BEGIN IMMEDIATE) entre processos
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS content_runs (
+                processing_date TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                source_key TEXT,
+                job_run_id TEXT,
+                duplicate_count INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (processing_date, content_hash)
+            );
+            CREATE TABLE IF NOT EXISTS job_runs (
+                job_run_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                entries TEXT NOT NULL,
+                source_bucket TEXT,
+                job_state TEXT,
+                started_at REAL NOT NULL,
+                finished_at REAL
+            );
+        """)
+        # Colunas adicionadas depois da primeira versão do ledger
+        for table, column, definition in (('content_runs', 'attempts', 'INTEGER NOT NULL DEFAULT 0'),
+                                          ('job_runs', 'source_bucket', 'TEXT')):
+            columns = {row[1] for row in self._connection.execute(f'PRAGMA table_info({table})')}
+            if column not in columns:
+                self._connection.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    def _transaction(self, statements: Callable):
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                result = statements(cursor)
+                cursor.execute('COMMIT')
+                return result
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+
+    def claim(self, processing_date: str, content_hash: str, source_key: str) -> bool:
+        now = self.clock()
+
+        def statements(cursor):
+            row = cursor.execute(
+                'SELECT status, updated_at FROM content_runs WHERE processing_date = ? AND content_hash = ?',
+                (processing_date, content_hash)).fetchone()
+            if row is None:
+                cursor.execute(
+                    'INSERT INTO content_runs (processing_date, content_hash, status, source_key, '
+                    'attempts, created_at, updated_at) VALUES (?, ?, ?, ?, 1, ?, ?)',
+                    (processing_date, content_hash, STATUS_RUNNING, source_key, now, now))
+                return True
+            status, updated_at = row
+            if status == STATUS_FAILED or (status == STATUS_RUNNING and updated_at < now - self.running_timeout):
+                cursor.execute(
+                    'UPDATE content_runs SET status = ?, source_key = ?, job_run_id = NULL, '
+                    'attempts = attempts + 1, updated_at = ? WHERE processing_date = ? AND content_hash = ?',
+                    (STATUS_RUNNING, source_key, now, processing_date, content_hash))
+                return True
+            cursor.execute(
+                'UPDATE content_runs SET duplicate_count = duplicate_count + 1 '
+                'WHERE processing_date = ? AND content_hash = ?', (processing_date, content_hash))
+            return False
+
+        return self._transaction(statements)
+
+    def release(self, claims: List[Dict]) -> None:
+        now = self.clock()
+
+        def statements(cursor):
+            cursor.executemany(
+                'UPDATE content_runs SET status = ?, updated_at = ? WHERE processing_date = ? AND content_hash = ?',
+                [(STATUS_FAILED, now, claim['processing_date'], claim['content_hash']) for claim in claims])
+
+        self._transaction(statements)
+
+    def mark_started(self, claims: List[Dict], job_run_id: str, source_bucket: Optional[str] = None) -> None:
+        now = self.clock()
+        entries = [[claim['processing_date'], claim['content_hash']] for claim in claims]
+
+        def statements(cursor):
+            cursor.execute(
+                'INSERT OR REPLACE INTO job_runs (job_run_id, status, entries, source_bucket, started_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (job_run_id, STATUS_RUNNING, json.dumps(entries), source_bucket, now))
+            cursor.executemany(
+                'UPDATE content_runs SET job_run_id = ?, updated_at = ? WHERE processing_date = ? AND content_hash = ?',
+                [(job_run_id, now, processing_date, content_hash) for processing_date, content_hash in entries])
+
+        self._transaction(statements)
+
+    def mark_finished(self, job_run_id: str, job_state: str) -> int:
+        now = self.clock()
+        status = finished_status(job_state)
+
+        def statements(cursor):
+            row = cursor.execute('SELECT entries FROM job_runs WHERE job_run_id = ?', (job_run_id,)).fetchone()
+            if row is None:
+                return 0
+            updated = 0
+            for processing_date, content_hash in json.loads(row[0]):
+                cursor.execute(
+                    'UPDATE content_runs SET status = ?, updated_at = ? '
+                    'WHERE processing_date = ? AND content_hash = ? AND job_run_id = ?',
+                    (status, now, processing_date, content_hash, job_run_id))
+                updated += cursor.rowcount
+            cursor.execute('UPDATE job_runs SET status = ?, job_state = ?, finished_at = ? WHERE job_run_id = ?',
+                           (status, job_state, now, job_run_id))
+            return updated
+
+        return self._transaction(statements)
+
+    def get(self, processing_date: str, content_hash: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT status, source_key, job_run_id, duplicate_count, attempts FROM content_runs '
+                'WHERE processing_date = ? AND content_hash = ?', (processing_date, content_hash)).fetchone()
+        if row is None:
+            return None
+        return {'processing_date': processing_date, 'content_hash': content_hash, 'status': row[0],
+                'source_key': row[1], 'job_run_id': row[2], 'duplicate_count': row[3], 'attempts': row[4]}
+
+    def get_run(self, job_run_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT status, source_bucket, entries FROM job_runs WHERE job_run_id = ?', (job_run_id,)).fetchone()
+        if row is None:
+            return None
+        entries = [self.get(processing_date, content_hash) for processing_date, content_hash in json.loads(row[2])]
+        return {'job_run_id': job_run_id, 'status': row[0], 'source_bucket': row[1],
+                'entries': [entry for entry in entries if entry and entry['job_run_id'] == job_run_id]}
+
+
+def ledger_from_env(client_factory: Optional[Callable] = None):
+    """
+    Cria o ledger a partir das variáveis de ambiente
+
+    RUN_LEDGER_BACKEND: 'dynamodb', 'sqlite' ou 'none' (padrão: 'dynamodb' se
+    RUN_LEDGER_TABLE estiver definido, senão 'none')
+    RUN_LEDGER_TABLE: tabela do DynamoDB
+    RUN_LEDGER_PATH: arquivo do SQLite (padrão: ./run_ledger.sqlite3)
+
+    Args:
+        client_factory: Cria o cliente do DynamoDB (ex.: lambda: get_client('dynamodb'))
+    """
+    table_name = os.environ.get('RUN_LEDGER_TABLE')
+    backend = os.environ.get('RUN_LEDGER_BACKEND', 'dynamodb' if table_name else 'none').lower()
+
+    if backend == 'none':
+        return None
+    if backend == 'sqlite':
+        return SqliteRunLedger(os.environ.get('RUN_LEDGER_PATH', DEFAULT_SQLITE_PATH))
+    if backend == 'dynamodb':
+        if not table_name:
+            raise ValueError("RUN_LEDGER_TABLE não definido para o ledger no DynamoDB")
+        if client_factory is None:
+            import boto3
+            client = boto3.client('dynamodb')
+        else:
+            client = client_factory()
+        return DynamoDbRunLedger(table_name, client)
+
+    raise ValueError(f"RUN_LEDGER_BACKEND inválido: {backend}")
@@ -0,0 +1,198 @@
+"""
+Configuração comum dos testes
+Os módulos das Lambdas importam os irmãos pelo nome (cada diretório é
+empacotado sozinho): os diretórios do scraper e do trigger entram no path
+"""
+
+import hashlib
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+for directory in (ROOT, ROOT / "src", ROOT / "src" / "scraper", ROOT / "src" / "trigger"):
+    if str(directory) not in sys.path:
+        sys.path.insert(0, str(directory))
+
+
+def load_module(name: str, path: Path):
+    """Carrega um módulo por caminho (os dois handlers se chamam lambda_function)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_glue_job(storage_root: Path, source_keys, *extra_args: str) -> None:
+    """
+    Roda src/glue/job_script.py em um Spark local sobre o layout do backend
+    local (requer pyspark e as bibliotecas do Glue, ex.: aws-glue-libs)
+    """
+    env = dict(os.environ)
+    # catalog.py vai para o job em --extra-py-files
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(ROOT / "src" / "trigger"), env.get('PYTHONPATH')]))
+    subprocess.run([sys.executable, str(ROOT / "src" / "glue" / "job_script.py"),
+                    '--JOB_NAME', 'bovespa-etl-test',
+                    '--source_bucket', 'local', '--target_bucket', 'local',
+                    '--storage_root', f"file://{storage_root}",
+                    '--source_keys', ','.join(source_keys),
+                    '--catalog_backend', 'none',
+                    *extra_args], check=True, env=env)
+
+
+class FakeS3:
+    """
+    Cliente S3 em memória com as chamadas usadas pelo pipeline
+
+    Objetos ficam em `objects` (chave -> dict com Body, Metadata e ETag);
+    `calls` registra o nome de cada chamada
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.calls = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _not_found(operation: str):
+        from botocore.exceptions import ClientError
+        return ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, operation)
+
+    def _record(self, name: str) -> None:
+        with self._lock:
+            self.calls.append(name)
+
+    def put_object(self, Bucket, Key, Body=b'', ContentType=None, Metadata=None, **kwargs):
+        self._record('put_object')
+        body = Body if isinstance(Body, bytes) else Body.encode('utf-8')
+        with self._lock:
+            self.objects[Key] = {'Body': body, 'Metadata': dict(Metadata or {}),
+                                 'ETag': f'"{hashlib.md5(body).hexdigest()}"'}
+        return {'ETag': self.objects[Key]['ETag']}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self._record('get_object')
+        if Key not in self.objects:
+            raise self._not_found('GetObject')
+        return {'Body': io.BytesIO(self.objects[Key]['Body']), 'Metadata': self.objects[Key]['Metadata']}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._record('head_object')
+        if Key not in self.objects:
+            raise self._not_found('HeadObject')
+        item = self.objects[Key]
+        return {'ContentLength': len(item['Body']), 'ETag': item['ETag'], 'Metadata': item['Metadata']}
+
+    def get_paginator(self, name):
+        assert name == 'list_objects_v2'
+        return self
+
+    def paginate(self, Bucket, Prefix='', PaginationConfig=None, **kwargs):
+        self._record('list_objects_v2')
+        keys = sorted(key for key in self.objects if key.startswith(Prefix))
+        # Páginas de 1000 chaves, como o S3
+        for start in range(0, max(1, len(keys)), 1000):
+            page = keys[start:start + 1000]
+            yield {'Contents': [{'Key': key, 'Size': len(self.objects[key]['Body']),
+                                 'ETag': self.objects[key]['ETag']} for key in page]} if page else {}
+
+    def delete_objects(self, Bucket, Delete):
+        self._record('delete_objects')
+        assert len(Delete['Objects']) <= 1000
+        with self._lock:
+            for item in Delete['Objects']:
+                self.objects.pop(item['Key'], None)
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, ContentType=None, Metadata=None):
+        self._record('create_multipart_upload')
+        upload_id = f"upload-{len(self.uploads) + 1}"
+        self.uploads[upload_id] = {'Key': Key, 'Metadata': dict(Metadata or {}), 'parts': {},
+                                   'state': 'open'}
+        return {'UploadId': upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self._record('upload_part')
+        with self._lock:
+            self.uploads[UploadId]['parts'][PartNumber] = bytes(Body)
+        return {'ETag': f'"part-{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self._record('complete_multipart_upload')
+        upload = self.uploads[UploadId]
+        numbers = [part['PartNumber'] for part in MultipartUpload['Parts']]
+        assert numbers == sorted(upload['parts'])
+        body = b''.join(upload['parts'][number] for number in numbers)
+        upload['state'] = 'completed'
+        self.objects[Key] = {'Body': body, 'Metadata': upload['Metadata'],
+                             'ETag': f'"{hashlib.md5(body).hexdigest()}-{len(numbers)}"'}
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self._record('abort_multipart_upload')
+        self.uploads[UploadId]['state'] = 'aborted'
+        return {}
+
+
+class FakeGlue:
+    """
+    Cliente Glue em memória: execuções iniciadas ficam em `runs` (argumentos
+    de cada job) e o catálogo em `tables` (nome -> TableInput) e `partitions`
+    (nome -> valores -> partição); `fail_start` faz o start_job_run falhar
+    """
+
+    def __init__(self, fail_start: bool = False):
+        self.runs = []
+        self.fail_start = fail_start
+        self.tables = {}
+        self.partitions = {}
+        self.calls = []
+
+    @staticmethod
+    def _error(code: str, operation: str):
+        from botocore.exceptions import ClientError
+        return ClientError({'Error': {'Code': code}}, operation)
+
+    def get_table(self, DatabaseName, Name):
+        self.calls.append('get_table')
+        if Name not in self.tables:
+            raise self._error('EntityNotFoundException', 'GetTable')
+        return {'Table': self.tables[Name]}
+
+    def create_table(self, DatabaseName, TableInput):
+        self.calls.append('create_table')
+        self.tables[TableInput['Name']] = TableInput
+        return {}
+
+    def update_table(self, DatabaseName, TableInput):
+        self.calls.append('update_table')
+        self.tables[TableInput['Name']] = TableInput
+        return {}
+
+    def batch_create_partition(self, DatabaseName, TableName, PartitionInputList):
+        self.calls.append('batch_create_partition')
+        assert len(PartitionInputList) <= 100
+        partitions = self.partitions.setdefault(TableName, {})
+        errors = []
+        for partition in PartitionInputList:
+            values = tuple(partition['Values'])
+            if values in partitions:
+                errors.append({'PartitionValues': partition['Values'],
+                               'ErrorDetail': {'ErrorCode': 'AlreadyExistsException'}})
+            else:
+                partitions[values] = partition
+        return {'Errors': errors}
+
+    def start_job_run(self, JobName, Arguments, **kwargs):
+        if self.fail_start:
+            from botocore.exceptions import ClientError
+            raise ClientError({'Error': {'Code': 'ConcurrentRunsExceededException'}}, 'StartJobRun')
+        self.runs.append(Arguments)
+        return {'JobRunId': f'jr_{len(self.runs)}'}
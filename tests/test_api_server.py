@@ -0,0 +1,62 @@
+"""Testes do filtro por índice da API local (api_server.py)"""
+
+from datetime import datetime
+
+import pytest
+
+from columnar import PortfolioTableBuilder, concat_portfolio_tables
+from conftest import ROOT, load_module
+
+ROWS = {'IBOV': [('PETR4', 'PETROBRAS', 'PN N2', '2.000', '60,000'),
+                 ('VALE3', 'VALE', 'ON NM', '1.000', '40,000')],
+        'SMLL': [('WEGE3', 'WEG', 'ON NM', '500', '100,000')]}
+
+
+def _portfolio(indices=('IBOV', 'SMLL')):
+    tables = []
+    for index in indices:
+        builder = PortfolioTableBuilder('2025-07-18', '2025-07-18T18:00:00', f'B3_{index}', indice=index)
+        for row in ROWS[index]:
+            builder.append(*row)
+        tables.append(builder.build())
+    return concat_portfolio_tables(tables)
+
+
+@pytest.fixture
+def api():
+    pytest.importorskip('fastapi')
+    module = load_module('api_server', ROOT / 'api_server.py')
+    # Dados já coletados: nenhuma requisição à B3
+    module.cached_data = _portfolio()
+    module.last_update = datetime.now()
+    return module
+
+
+def test_filter_index(api):
+    data = _portfolio()
+    assert api.filter_index(data, None) is data
+    assert api.filter_index(data, 'smll')['codigo_acao'].to_pylist() == ['WEGE3']
+    assert api.filter_index(data, 'IDIV').num_rows == 0
+
+    # Partições anteriores ao multi-índice: apenas o IBOV
+    legacy = data.drop_columns(['indice'])
+    assert api.filter_index(legacy, 'IBOV') is legacy
+    assert api.filter_index(legacy, 'SMLL').num_rows == 0
+
+
+def test_endpoints_filter_by_index(api):
+    # O TestClient do FastAPI depende do httpx
+    client = pytest.importorskip('fastapi.testclient').TestClient(api.app)
+
+    response = client.get('/api/v1/bovespa/latest', params={'indice': 'SMLL'})
+    assert response.status_code == 200
+    assert [row['codigo_acao'] for row in response.json()['data']] == ['WEGE3']
+    assert client.get('/api/v1/bovespa/latest').json()['total_available'] == 3
+
+    response = client.get('/api/v1/bovespa/indices')
+    assert response.json()['indices'] == [{'indice': 'IBOV', 'total_acoes': 2},
+                                          {'indice': 'SMLL', 'total_acoes': 1}]
+
+    statistics = client.get('/api/v1/bovespa/statistics').json()['statistics']
+    assert statistics['por_indice']['IBOV']['participacao_total'] == 100.0
+    assert statistics['por_indice']['SMLL']['total_acoes'] == 1
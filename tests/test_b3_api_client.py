@@ -0,0 +1,244 @@
+"""Testes do cliente da API JSON da B3 (src/scraper/b3_api_client.py)"""
+
+import base64
+import json
+import threading
+from datetime import date
+from urllib.parse import urlsplit
+
+import pyarrow.parquet as pq
+import pytest
+
+from b3_api_client import PORTFOLIO_API_URL, B3PortfolioClient, encode_query
+from conftest import FIXTURES, ROOT, load_module
+
+PAGE = (FIXTURES / 'b3_pages' / 'ibov_portfolio.html').read_bytes()
+
+
+def _decode(url: str) -> dict:
+    query = urlsplit(url).path.rsplit('/', 1)[-1]
+    return json.loads(base64.b64decode(query))
+
+
+def _item(code, qty='1.000', part='1,000', kind='ON      NM'):
+    return {'cod': code, 'asset': f' {code[:4]} SA ', 'type': kind, 'theoricalQty': qty, 'part': part}
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class _FakeHttp:
+    """Serve as páginas da API a partir de uma lista de 'results' por página"""
+
+    def __init__(self, pages, date='18/07/25'):
+        self.pages = pages
+        self.date = date
+        self.requested = []
+        self._lock = threading.Lock()
+
+    def get(self, url, headers=None, timeout=None, conditional=True, rate_limiter=None):
+        assert conditional is False
+        query = _decode(url)
+        with self._lock:
+            self.requested.append(query['pageNumber'])
+        return _FakeResponse({
+            'page': {'pageNumber': query['pageNumber'], 'totalPages': len(self.pages)},
+            'header': {'date': self.date, 'theoricalQty': '100'},
+            'results': self.pages[query['pageNumber'] - 1]
+        })
+
+
+class _FakeB3:
+    """
+    Sessão HTTP da B3: a API JSON serve a carteira vigente de cada índice
+    (`portfolios`, uma página) e a página HTML de cada índice responde 304
+    nas requisições condicionais dos índices em `not_modified`
+    """
+
+    def __init__(self, portfolios=None, date='18/07/25'):
+        self.portfolios = portfolios or {}
+        self.date = date
+        self.not_modified = set()
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None, conditional=True, rate_limiter=None):
+        if url.startswith(PORTFOLIO_API_URL.split('{')[0]):
+            index = _decode(url)['index']
+            with self._lock:
+                self.requests.append(('api', index, conditional))
+            return _FakeResponse({'page': {'pageNumber': 1, 'totalPages': 1},
+                                  'header': {'date': self.date},
+                                  'results': self.portfolios.get(index, [])})
+
+        index = url.rsplit('/', 1)[-1]
+        with self._lock:
+            self.requests.append(('html', index, conditional))
+        response = _FakeResponse(None)
+        response.url = url
+        response.status_code = 304 if conditional and index in self.not_modified else 200
+        response.content = b'' if response.status_code == 304 else PAGE
+        return response
+
+    def ensure_pool_size(self, pool_size):
+        pass
+
+    def store_validators(self, response):
+        pass
+
+    def log_stats(self):
+        pass
+
+
+@pytest.fixture
+def scraper_module(monkeypatch, tmp_path):
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('STORAGE_LOCAL_DIR', str(tmp_path))
+    monkeypatch.setenv('SCRAPER_ARCHIVE_BACKEND', 'none')
+    monkeypatch.delenv('SCRAPER_USE_JSON_API', raising=False)
+    return load_module('scraper_lambda_function', ROOT / 'src' / 'scraper' / 'lambda_function.py')
+
+
+def _scraper(module, http, indices):
+    scraper = module.B3Scraper('bovespa-bucket', indices)
+    scraper.http = http
+    scraper.api_client = B3PortfolioClient(http)
+    return scraper
+
+
+def test_encode_query_is_compact_base64_json():
+    encoded = encode_query({'index': 'IBOV', 'pageNumber': 1})
+    assert base64.b64decode(encoded) == b'{"index":"IBOV","pageNumber":1}'
+
+
+def test_fetch_portfolio_joins_pages_in_order():
+    pages = [[_item(f'AAA{n}'), _item(f'BBB{n}')] for n in range(1, 6)]
+    http = _FakeHttp(pages)
+    client = B3PortfolioClient(http, page_size=2, max_workers=3)
+
+    portfolio = client.fetch_portfolio('SMLL')
+
+    assert sorted(http.requested) == [1, 2, 3, 4, 5]
+    assert [item['cod'] for item in portfolio['results']] == [
+        code for n in range(1, 6) for code in (f'AAA{n}', f'BBB{n}')
+    ]
+    assert _decode(client.page_url('SMLL', 3)) == {
+        'language': 'pt-br', 'pageNumber': 3, 'pageSize': 2, 'index': 'SMLL', 'segment': '1'
+    }
+
+
+def test_portfolio_date_formats():
+    assert B3PortfolioClient.portfolio_date({'date': '18/07/25'}) == '2025-07-18'
+    assert B3PortfolioClient.portfolio_date({'date': '18/07/2025'}) == '2025-07-18'
+    assert B3PortfolioClient.portfolio_date({'date': '2025-07-18'}) is None
+    assert B3PortfolioClient.portfolio_date({}) is None
+
+
+def test_build_table_normalizes_cells():
+    results = [_item('PETR4', qty='4.566.445.852', part='6,743', kind='PN      N2'),
+               _item('X1'),
+               _item('VALE3', qty='', part='10,845')]
+    table = B3PortfolioClient.build_table(results, '2025-07-18', '2025-07-18T18:00:00', 'IBOV')
+
+    assert table.column('codigo_acao').to_pylist() == ['PETR4', 'VALE3']
+    assert table.column('nome_empresa').to_pylist() == ['PETR SA', 'VALE SA']
+    assert table.column('tipo_acao').to_pylist() == ['PN N2', 'ON NM']
+    assert table.column('quantidade_teorica').to_pylist() == [4566445852, None]
+    assert table.column('fonte').to_pylist() == ['B3_IBOV_API'] * 2
+
+
+def test_fetch_table_returns_none_for_other_dates():
+    http = _FakeHttp([[_item('PETR4')]], date='18/07/25')
+    client = B3PortfolioClient(http)
+
+    assert client.fetch_table('2025-07-17', '2025-07-18T18:00:00') is None
+    assert client.current_portfolio_date == '2025-07-18'
+    # Datas anteriores à carteira vigente nem chegam a consultar a API
+    calls = len(http.requested)
+    assert client.fetch_table('2025-07-10', '2025-07-18T18:00:00') is None
+    assert len(http.requested) == calls
+
+    table = client.fetch_table('2025-07-18', '2025-07-18T18:00:00')
+    assert table.num_rows == 1
+
+
+def test_fetch_table_returns_none_without_header_date():
+    http = _FakeHttp([[_item('PETR4')]], date=None)
+    client = B3PortfolioClient(http)
+
+    # A carteira vigente não vai para a partição do pregão pedido
+    assert client.fetch_table('2025-01-17', '2025-07-18T18:00:00') is None
+    assert client.current_portfolio_date is None
+    assert http.requested == [1]
+
+
+def test_serialize_portfolio_is_canonical():
+    first = B3PortfolioClient.serialize_portfolio({'results': [1], 'header': {'b': 1, 'a': 'ç'}})
+    second = B3PortfolioClient.serialize_portfolio({'header': {'a': 'ç', 'b': 1}, 'results': [1]})
+    assert first == second
+    assert 'ç'.encode('utf-8') in first
+
+
+def test_requested_date_reaches_partition_and_data_pregao(scraper_module, tmp_path):
+    http = _FakeB3({'IBOV': [_item('PETR4'), _item('VALE3')]}, date='18/07/25')
+    scraper = _scraper(scraper_module, http, ['IBOV'])
+
+    # Carteira vigente da API para o próprio pregão
+    table = scraper.fetch_portfolio_table('2025-07-18')
+    assert table['fonte'].to_pylist() == ['B3_IBOV_API'] * 2
+
+    # Backfill: a API tem outra data e a página HTML é gravada no pregão pedido
+    backfill = scraper.fetch_portfolio_table('2025-01-17')
+    assert ('html', 'IBOV', True) in http.requests
+    assert set(backfill['data_pregao'].to_pylist()) == {'2025-01-17'}
+
+    for trade_date, expected in (('2025-07-18', table), ('2025-01-17', backfill)):
+        uri = scraper.save_to_s3_parquet(expected, trade_date)
+        year, month, day = trade_date.split('-')
+        assert uri == str(tmp_path / f'raw-data/bovespa/year={year}/month={month}/day={day}/'
+                                     f'ibov_carteira_{year}{month}{day}.parquet')
+        stored = pq.read_table(uri)
+        assert set(stored['data_pregao'].to_pylist()) == {date.fromisoformat(trade_date)}
+        assert (set(stored['year'].to_pylist()), set(stored['month'].to_pylist()),
+                set(stored['day'].to_pylist())) == ({int(year)}, {int(month)}, {int(day)})
+
+
+def test_multi_index_partition_has_indice_column(scraper_module):
+    http = _FakeB3({'IBOV': [_item('PETR4'), _item('VALE3')], 'SMLL': [_item('WEGE3')]})
+    scraper = _scraper(scraper_module, http, 'ibov, smll')
+
+    table = scraper.fetch_portfolio_table('2025-07-18')
+    assert sorted(zip(table['indice'].to_pylist(), table['codigo_acao'].to_pylist())) == [
+        ('IBOV', 'PETR4'), ('IBOV', 'VALE3'), ('SMLL', 'WEGE3')]
+    assert set(zip(table['indice'].to_pylist(), table['fonte'].to_pylist())) == {
+        ('IBOV', 'B3_IBOV_API'), ('SMLL', 'B3_SMLL_API')}
+
+
+def test_partially_unchanged_indices_are_fetched_again(scraper_module, monkeypatch):
+    monkeypatch.setenv('SCRAPER_USE_JSON_API', 'false')
+    http = _FakeB3()
+    scraper = _scraper(scraper_module, http, ['IBOV', 'SMLL'])
+    rows = scraper.parse_portfolio_page(PAGE, '2025-07-18', '2025-07-18T18:00:00').num_rows
+
+    # IBOV inalterado (304) e SMLL novo: a partição precisa dos dois índices
+    http.not_modified = {'IBOV'}
+    table = scraper.fetch_portfolio_table('2025-07-18')
+    assert sorted(set(table['indice'].to_pylist())) == ['IBOV', 'SMLL']
+    assert table.num_rows == 2 * rows
+    assert ('html', 'IBOV', False) in http.requests
+    assert '2025-07-18' not in scraper.not_modified_dates
+
+    # Nenhum índice mudou: nada a gravar
+    http.not_modified = {'IBOV', 'SMLL'}
+    http.requests.clear()
+    assert scraper.fetch_portfolio_table('2025-07-18').num_rows == 0
+    assert '2025-07-18' in scraper.not_modified_dates
+    assert all(conditional for _, _, conditional in http.requests)
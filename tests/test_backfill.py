@@ -0,0 +1,113 @@
+"""Testes do backfill histórico (src/scraper/backfill.py)"""
+
+import threading
+import time
+
+import pyarrow as pa
+import pytest
+
+from backfill import BackfillRunner, HostRateLimiter, RateLimiter, trading_days
+
+
+def test_trading_days_skips_weekends():
+    # 2025-01-03 é sexta; 04 e 05 são fim de semana
+    assert trading_days('2025-01-02', '2025-01-07') == ['2025-01-02', '2025-01-03', '2025-01-06', '2025-01-07']
+
+
+def test_trading_days_single_day_and_weekend_only():
+    assert trading_days('2025-01-02', '2025-01-02') == ['2025-01-02']
+    assert trading_days('2025-01-04', '2025-01-05') == []
+
+
+def test_trading_days_rejects_inverted_range():
+    with pytest.raises(ValueError):
+        trading_days('2025-01-07', '2025-01-02')
+
+
+def test_rate_limiter_paces_requests():
+    limiter = RateLimiter(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    # O primeiro token está disponível; os outros 5 saem a 20/s
+    assert time.monotonic() - started >= 5 / 20 * 0.9
+
+
+def test_rate_limiter_burst_is_immediate():
+    limiter = RateLimiter(rate=1, burst=5)
+    started = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.5
+
+
+def test_rate_limiter_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
+
+
+def test_host_rate_limiter_is_independent_per_host():
+    limiter = HostRateLimiter(rate=2, burst=1)
+    started = time.monotonic()
+    limiter.acquire('https://a.example/x')
+    limiter.acquire('https://b.example/y')
+    assert time.monotonic() - started < 0.3
+
+    limiter.acquire('https://a.example/z')
+    assert time.monotonic() - started >= 0.4
+
+
+class _FakeHttp:
+    def __init__(self):
+        self.pool_size = None
+
+    def ensure_pool_size(self, size):
+        self.pool_size = size
+
+    def stats(self):
+        return {}
+
+    def log_stats(self):
+        pass
+
+
+class _FakeScraper:
+    def __init__(self, empty=(), failing=()):
+        self.http = _FakeHttp()
+        self.indices = ['IBOV', 'SMLL']
+        self.empty = set(empty)
+        self.failing = set(failing)
+        self.saved = []
+        self.lock = threading.Lock()
+
+    def fetch_portfolio_table(self, date_str):
+        if date_str in self.failing:
+            raise RuntimeError("falha simulada")
+        rows = 0 if date_str in self.empty else 3
+        return pa.table({'codigo_acao': pa.array(['PETR4'] * rows, pa.string())})
+
+    def save_to_s3_parquet(self, table, date_str):
+        with self.lock:
+            self.saved.append(date_str)
+        return f"s3://bucket/{date_str}.parquet"
+
+
+def test_backfill_runner_summary():
+    scraper = _FakeScraper(empty={'2025-01-03'}, failing={'2025-01-06'})
+    runner = BackfillRunner(scraper, max_workers=3, rate_limit=1000)
+
+    summary = runner.run('2025-01-02', '2025-01-07')
+
+    assert scraper.http.pool_size == 6
+    assert summary['requested_days'] == 4
+    assert summary['written_days'] == 2
+    assert summary['records_count'] == 6
+    assert summary['empty_days'] == ['2025-01-03']
+    assert [failure['date'] for failure in summary['failed_days']] == ['2025-01-06']
+    assert summary['s3_paths'] == ['s3://bucket/2025-01-02.parquet', 's3://bucket/2025-01-07.parquet']
+    assert sorted(scraper.saved) == ['2025-01-02', '2025-01-07']
+
+
+def test_backfill_runner_rejects_zero_workers():
+    with pytest.raises(ValueError):
+        BackfillRunner(_FakeScraper(), max_workers=0)
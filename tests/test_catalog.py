@@ -0,0 +1,131 @@
+"""Testes do catálogo das tabelas refinadas (src/trigger/catalog.py)"""
+
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from catalog import (AGGREGATED_TABLE, CHANGES_TABLE, OUTPUT_TABLES, REFINED_TABLE, TABLES, GlueCatalog,
+                     LocalCatalog, catalog_from_env, partition_values, table_input)
+from conftest import FIXTURES, FakeGlue
+
+ROOT_URI = 's3://bovespa-bucket'
+
+# Tipos do Hive para os tipos das saídas gravadas (pyarrow)
+HIVE_TYPES = {'string': 'string', 'int64': 'bigint', 'int32': 'int', 'bool': 'boolean',
+              'date32[day]': 'date', 'timestamp[ns]': 'timestamp'}
+
+
+def _trade_dates(count, first=date(2024, 1, 2)):
+    return [(first + timedelta(days=offset)).isoformat() for offset in range(count)]
+
+
+def _hive_type(arrow_type):
+    if arrow_type.startswith('decimal128'):
+        return 'decimal(' + arrow_type[len('decimal128('):].replace(' ', '')
+    return HIVE_TYPES[arrow_type]
+
+
+def test_tables_match_written_outputs():
+    expected = json.loads((FIXTURES / 'fast_etl' / 'expected_outputs.json').read_text(encoding='utf-8'))
+    prefixes = {TABLES[table_name]['prefix']: table_name for table_name in OUTPUT_TABLES}
+    for partition, contents in expected.items():
+        table_name = prefixes['/'.join(partition.split('/')[:2])]
+        columns = [(name, _hive_type(arrow_type)) for name, arrow_type in contents['columns'].items()]
+        assert TABLES[table_name]['columns'] == columns, table_name
+
+
+def test_partition_values_follow_spark_layout():
+    # Mês e dia dos refinados sem zero à esquerda, como o Spark grava os inteiros
+    assert partition_values(REFINED_TABLE, '2024-01-02') == ['2024', '1', '2']
+    assert partition_values(CHANGES_TABLE, '2024-01-02') == ['2024-01-02']
+
+    definition = table_input(AGGREGATED_TABLE, ROOT_URI + '/')
+    assert definition['StorageDescriptor']['Location'] == 's3://bovespa-bucket/refined-data/bovespa-aggregated/'
+    assert definition['PartitionKeys'] == [{'Name': 'data_pregao', 'Type': 'date'}]
+
+
+def test_glue_catalog_batches_partitions_by_100():
+    glue = FakeGlue()
+    catalog = GlueCatalog('bovespa_database', glue)
+
+    assert catalog.register_partitions(REFINED_TABLE, ROOT_URI, _trade_dates(250)) == 250
+    assert glue.calls.count('create_table') == 1
+    assert glue.calls.count('batch_create_partition') == 3
+
+    partition = glue.partitions[REFINED_TABLE][('2024', '1', '2')]
+    assert partition['StorageDescriptor']['Location'] == \
+        's3://bovespa-bucket/refined-data/bovespa/partition_year=2024/partition_month=1/partition_day=2/'
+
+    # Partições existentes são ignoradas; só as novas contam
+    assert catalog.register_partitions(REFINED_TABLE, ROOT_URI, _trade_dates(260)) == 10
+    assert glue.calls.count('create_table') == 1
+    assert len(glue.partitions[REFINED_TABLE]) == 260
+
+
+def test_glue_catalog_raises_on_other_errors():
+    glue = FakeGlue()
+    glue.batch_create_partition = lambda **kwargs: {'Errors': [
+        {'PartitionValues': ['2024-01-02'],
+         'ErrorDetail': {'ErrorCode': 'InternalServiceException', 'ErrorMessage': 'falha'}}]}
+    catalog = GlueCatalog('bovespa_database', glue)
+    with pytest.raises(RuntimeError, match='InternalServiceException'):
+        catalog.register_partitions(CHANGES_TABLE, ROOT_URI, ['2024-01-02'])
+
+
+def test_glue_catalog_projection_registers_nothing():
+    glue = FakeGlue()
+    # Tabela criada antes, sem projection
+    GlueCatalog('bovespa_database', glue).ensure_table(REFINED_TABLE, ROOT_URI)
+
+    catalog = GlueCatalog('bovespa_database', glue, projection=True)
+    assert catalog.register_partitions(REFINED_TABLE, ROOT_URI, _trade_dates(5)) == 0
+    assert 'batch_create_partition' not in glue.calls
+    assert glue.calls.count('update_table') == 1
+
+    parameters = glue.tables[REFINED_TABLE]['Parameters']
+    assert parameters['projection.enabled'] == 'true'
+    assert parameters['storage.location.template'] == (
+        's3://bovespa-bucket/refined-data/bovespa/partition_year=${partition_year}/'
+        'partition_month=${partition_month}/partition_day=${partition_day}/')
+
+    # Já ligada: nenhuma atualização nova
+    catalog.ensure_table(REFINED_TABLE, ROOT_URI)
+    assert glue.calls.count('update_table') == 1
+
+
+def test_local_catalog(tmp_path):
+    path = str(tmp_path / 'catalog.json')
+    catalog = LocalCatalog(path)
+
+    assert catalog.register_partitions(CHANGES_TABLE, 'file:///dados', ['2024-01-03', '2024-01-02', '2024-01-02']) == 2
+    assert catalog.register_partitions(CHANGES_TABLE, 'file:///dados', ['2024-01-03', '2024-01-04']) == 1
+    assert LocalCatalog(path).partitions(CHANGES_TABLE) == {
+        day: f'file:///dados/refined-data/bovespa-changes/data_pregao={day}/'
+        for day in ('2024-01-02', '2024-01-03', '2024-01-04')}
+    assert catalog.partitions(REFINED_TABLE) == {}
+
+    projected = LocalCatalog(str(tmp_path / 'projection.json'), projection=True)
+    assert projected.register_partitions(REFINED_TABLE, 'file:///dados', _trade_dates(3)) == 0
+    assert projected.partitions(REFINED_TABLE) == {}
+    assert projected.ensure_table(REFINED_TABLE, 'file:///dados')['Parameters']['projection.enabled'] == 'true'
+
+
+def test_catalog_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv('CATALOG_DATABASE', raising=False)
+    monkeypatch.delenv('CATALOG_BACKEND', raising=False)
+    assert catalog_from_env() is None
+
+    monkeypatch.setenv('CATALOG_DATABASE', 'bovespa_database')
+    monkeypatch.setenv('CATALOG_PARTITION_PROJECTION', 'true')
+    glue = FakeGlue()
+    catalog = catalog_from_env(lambda: glue)
+    assert isinstance(catalog, GlueCatalog) and catalog.client is glue and catalog.projection
+
+    monkeypatch.setenv('CATALOG_BACKEND', 'local')
+    monkeypatch.setenv('CATALOG_PATH', str(tmp_path / 'catalog.json'))
+    assert isinstance(catalog_from_env(), LocalCatalog)
+
+    monkeypatch.setenv('CATALOG_BACKEND', 'hive')
+    with pytest.raises(ValueError):
+        catalog_from_env()
@@ -0,0 +1,14 @@
+"""Cold start dos handlers: nenhuma dependência pesada no import (ver benchmark.py importtime)"""
+
+import pytest
+
+from benchmark import COLD_START_HANDLERS, _importtime
+
+
+@pytest.mark.parametrize('handler', sorted(COLD_START_HANDLERS))
+def test_handler_import_skips_heavy_dependencies(handler):
+    directory, module, forbidden = COLD_START_HANDLERS[handler]
+    _, modules = _importtime(directory, module)
+
+    assert module in modules
+    assert [name for name in forbidden if name in modules] == []
@@ -0,0 +1,75 @@
+"""Testes da construção colunar da carteira (src/scraper/columnar.py)"""
+
+import pyarrow as pa
+
+from columnar import (RECORD_COLUMNS, PortfolioTableBuilder, concat_portfolio_tables,
+                      empty_portfolio_table, records_to_table, table_content_hash,
+                      with_partition_columns)
+
+
+def _builder(index='IBOV', extraction='2025-07-18T18:00:00'):
+    builder = PortfolioTableBuilder('2025-07-18', extraction, f'B3_{index}', indice=index)
+    builder.append('PETR4', 'PETROBRAS', 'PN N2', '4.566.445.852', '6,743')
+    builder.append('VALE3', 'VALE', 'ON NM', '4.196.924.316', '10,845')
+    builder.append('XPTO3', None, None, '-', '')
+    return builder
+
+
+def test_builder_produces_record_columns():
+    table = _builder().build()
+    assert table.column_names == RECORD_COLUMNS
+    assert table.num_rows == 3
+    assert table.column('quantidade_teorica').to_pylist() == [4566445852.0, 4196924316.0, None]
+    assert table.column('percentual_participacao').to_pylist() == [6.743, 10.845, None]
+    assert set(table.column('indice').to_pylist()) == {'IBOV'}
+    assert set(table.column('data_pregao').to_pylist()) == {'2025-07-18'}
+
+
+def test_builder_drop_null_numbers():
+    table = _builder().build(drop_null_numbers=True)
+    assert table.column('codigo_acao').to_pylist() == ['PETR4', 'VALE3']
+    empty = PortfolioTableBuilder('2025-07-18', '2025-07-18T18:00:00', 'B3_IBOV').build(drop_null_numbers=True)
+    assert empty.num_rows == 0
+
+
+def test_records_to_table_fills_index():
+    records = [{'data_pregao': '2025-07-18', 'codigo_acao': 'PETR4', 'nome_empresa': 'PETROBRAS',
+                'tipo_acao': 'PN', 'quantidade_teorica': 1.0, 'percentual_participacao': 2.0,
+                'data_extracao': '2025-07-18T18:00:00', 'fonte': 'B3_IBOV_SAMPLE'}]
+    table = records_to_table(records, indice='SMLL')
+    assert table.column_names == RECORD_COLUMNS
+    assert table.column('indice').to_pylist() == ['SMLL']
+    assert records_to_table([]).num_rows == 0
+
+
+def test_concat_portfolio_tables_skips_empty():
+    ibov = _builder('IBOV').build()
+    smll = _builder('SMLL').build()
+    assert concat_portfolio_tables([ibov, None, empty_portfolio_table()]) is ibov
+    joined = concat_portfolio_tables([ibov, smll])
+    assert joined.num_rows == 6
+    assert concat_portfolio_tables([]).num_rows == 0
+
+
+def test_with_partition_columns_sets_or_replaces():
+    table = with_partition_columns(_builder().build(), '2025-07-18')
+    assert table.schema.field('year').type == pa.int32()
+    assert table.column('month').to_pylist() == [7, 7, 7]
+
+    moved = with_partition_columns(table, '2024-01-02')
+    assert moved.column_names == table.column_names
+    assert moved.column('day').to_pylist() == [2, 2, 2]
+
+
+def test_content_hash_ignores_volatile_columns_and_order():
+    first = with_partition_columns(_builder(extraction='2025-07-18T18:00:00').build(), '2025-07-18')
+    later = _builder(extraction='2025-07-19T09:30:00').build()
+    reversed_rows = later.take([2, 1, 0])
+    assert table_content_hash(first) == table_content_hash(reversed_rows)
+
+    # Mesmo conteúdo com dicionários (schema da camada raw)
+    encoded = later.set_column(2, 'codigo_acao', later.column('codigo_acao').dictionary_encode())
+    assert table_content_hash(encoded) == table_content_hash(later)
+
+    changed = _builder().build().slice(0, 2)
+    assert table_content_hash(changed) != table_content_hash(later)
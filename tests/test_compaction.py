@@ -0,0 +1,156 @@
+"""Testes da compactação mensal da camada raw (src/scraper/compaction.py)"""
+
+import io
+import json
+from datetime import date
+
+import pyarrow.parquet as pq
+import pytest
+
+from columnar import PortfolioTableBuilder, table_content_hash, with_partition_columns
+from compaction import (RawCompactor, compacted_key, is_month_closed, manifest_key, parse_daily_key)
+from conftest import FakeS3
+from page_archive import raw_object_key
+from raw_schema import conform_table, write_raw_parquet
+from storage import LocalObjectStore, S3ObjectStore
+
+DAYS = ['2025-01-02', '2025-01-03', '2025-01-06']
+TODAY = date(2025, 2, 10)
+
+
+def _day_table(date_str, quantity='1.000'):
+    builder = PortfolioTableBuilder(date_str, f'{date_str}T18:00:00', 'B3_IBOV')
+    builder.append('VALE3', 'VALE', 'ON NM', quantity, '10,845')
+    builder.append('PETR4', 'PETROBRAS', 'PN N2', '2.000', '6,743')
+    return conform_table(with_partition_columns(builder.build(), date_str))
+
+
+def _write_day(store, date_str, quantity='1.000'):
+    with store.open_write(raw_object_key(date_str)) as handle:
+        write_raw_parquet(_day_table(date_str, quantity), handle)
+
+
+def _read(store, key):
+    return pq.read_table(io.BytesIO(store.read(key)))
+
+
+@pytest.fixture(params=['local', 's3'])
+def store(request, tmp_path):
+    if request.param == 'local':
+        return LocalObjectStore(str(tmp_path))
+    return S3ObjectStore('bucket', FakeS3())
+
+
+def test_keys_and_month_closing():
+    assert parse_daily_key(raw_object_key('2025-01-02')) == '2025-01-02'
+    assert parse_daily_key(compacted_key(2025, 1)) is None
+    assert manifest_key(2025, 1) == 'raw-data/bovespa/year=2025/month=01/_compaction/manifest.json'
+    assert is_month_closed(2024, 12, today=date(2025, 1, 6), grace_days=5)
+    assert not is_month_closed(2024, 12, today=date(2025, 1, 5), grace_days=5)
+
+
+def test_pending_months_skip_open_month(store):
+    for date_str in DAYS + ['2025-02-03']:
+        _write_day(store, date_str)
+    compactor = RawCompactor(store, today=TODAY)
+    assert compactor.pending_months() == [(2025, 1)]
+    assert compactor.pending_months(start_month='2025-02') == []
+
+
+def test_compact_month_swaps_and_commits(store):
+    for date_str in DAYS:
+        _write_day(store, date_str)
+    compactor = RawCompactor(store, today=TODAY)
+
+    assert compactor.run(dry_run=True)['pending_months'] == ['2025-01']
+    assert store.exists(raw_object_key(DAYS[0]))
+
+    summary = compactor.run()
+    assert summary['compacted_months'] == ['2025-01']
+    assert summary['replaced_files'] == 3
+
+    keys = sorted(item['key'] for item in store.list('raw-data/bovespa'))
+    assert keys == sorted([compacted_key(2025, 1), manifest_key(2025, 1)])
+
+    month = _read(store, compacted_key(2025, 1))
+    assert month.num_rows == 6
+    # Um único arquivo ordenado por ticker
+    assert month.column('codigo_acao').to_pylist() == ['PETR4'] * 3 + ['VALE3'] * 3
+
+    manifest = compactor.read_manifest(2025, 1)
+    assert manifest['status'] == 'committed'
+    assert sorted(manifest['dates']) == DAYS
+    assert manifest['dates'][DAYS[0]]['content_sha256'] == table_content_hash(_day_table(DAYS[0]))
+    assert [item['key'] for item in manifest['runs'][0]['replaced']] == [raw_object_key(d) for d in DAYS]
+
+    # Nada pendente: a próxima execução não faz nada
+    assert compactor.run()['compacted_months'] == []
+
+
+def test_rescraped_day_replaces_compacted_rows(store):
+    for date_str in DAYS:
+        _write_day(store, date_str)
+    compactor = RawCompactor(store, today=TODAY)
+    compactor.run()
+
+    # Pregão regravado depois da compactação volta como diário
+    _write_day(store, DAYS[1], quantity='9.999')
+    assert compactor.pending_months() == [(2025, 1)]
+    compactor.run()
+
+    month = _read(store, compacted_key(2025, 1)).to_pylist()
+    assert len(month) == 6
+    vale = {row['data_pregao'].isoformat(): row['quantidade_teorica'] for row in month
+            if row['codigo_acao'] == 'VALE3'}
+    assert vale == {DAYS[0]: 1000, DAYS[1]: 9999, DAYS[2]: 1000}
+
+    manifest = compactor.read_manifest(2025, 1)
+    assert sorted(manifest['dates']) == DAYS
+    assert len(manifest['runs']) == 2
+    assert manifest['dates'][DAYS[1]]['content_sha256'] == table_content_hash(_day_table(DAYS[1], '9.999'))
+
+
+def test_interrupted_swap_is_completed_by_rerun(store, monkeypatch):
+    for date_str in DAYS:
+        _write_day(store, date_str)
+    compactor = RawCompactor(store, today=TODAY)
+
+    def failing_delete(keys):
+        raise OSError('falha ao remover os diários')
+
+    monkeypatch.setattr(store, 'delete', failing_delete)
+    assert compactor.run()['failed_months'] == ['2025-01']
+
+    # Arquivo do mês gravado, manifest em 'swapping' e diários ainda presentes
+    assert compactor.read_manifest(2025, 1)['status'] == 'swapping'
+    assert _read(store, compacted_key(2025, 1)).num_rows == 6
+    assert all(store.exists(raw_object_key(d)) for d in DAYS)
+
+    monkeypatch.undo()
+    compactor.run()
+
+    manifest = compactor.read_manifest(2025, 1)
+    assert manifest['status'] == 'committed'
+    # Sem linhas duplicadas: os diários substituem as mesmas datas
+    assert _read(store, compacted_key(2025, 1)).num_rows == 6
+    assert not any(store.exists(raw_object_key(d)) for d in DAYS)
+
+
+def test_daily_rewritten_during_compaction_is_kept(store, monkeypatch):
+    for date_str in DAYS:
+        _write_day(store, date_str)
+    compactor = RawCompactor(store, today=TODAY)
+    original_write_manifest = compactor._write_manifest
+
+    def rewrite_during_swap(year, month, manifest):
+        if manifest['status'] == 'swapping':
+            _write_day(store, DAYS[2], quantity='5.555')
+        original_write_manifest(year, month, manifest)
+
+    monkeypatch.setattr(compactor, '_write_manifest', rewrite_during_swap)
+    compactor.run()
+
+    # O diário regravado fica para a próxima execução
+    assert store.exists(raw_object_key(DAYS[2]))
+    assert not store.exists(raw_object_key(DAYS[0]))
+    assert json.loads(store.read(manifest_key(2025, 1)))['status'] == 'committed'
@@ -0,0 +1,131 @@
+"""Testes da fila das notificações da camada raw (src/trigger/event_queue.py)"""
+
+import json
+
+import pytest
+
+from conftest import ROOT, FakeGlue, FakeS3, load_module
+from event_queue import LocalEventQueue, extract_s3_records, is_queue_event
+
+BUCKET = 'bovespa-pipeline-bucket'
+
+
+def _s3_event(day, bucket=BUCKET):
+    key = f'raw-data/bovespa/year=2025/month=01/day={day}/ibov_carteira_202501{day}.parquet'
+    return {'Records': [{'eventSource': 'aws:s3', 's3': {'bucket': {'name': bucket}, 'object': {'key': key}}}]}
+
+
+class _Clock:
+    """Relógio manual para a janela de debounce"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_direct_s3_event():
+    event = _s3_event('17')
+    assert not is_queue_event(event)
+    assert extract_s3_records(event) == event['Records']
+    assert not is_queue_event({})
+    assert extract_s3_records(None) == []
+
+
+def test_sqs_batch_unwraps_bodies_and_skips_test_event():
+    event = {'Records': [
+        {'eventSource': 'aws:sqs', 'body': json.dumps(_s3_event('17'))},
+        {'eventSource': 'aws:sqs', 'body': json.dumps({'Service': 'Amazon S3', 'Event': 's3:TestEvent'})},
+        {'eventSource': 'aws:sqs', 'body': json.dumps(_s3_event('18'))},
+    ]}
+    assert is_queue_event(event)
+    records = extract_s3_records(event)
+    assert [record['s3']['object']['key'][-16:] for record in records] == ['20250117.parquet', '20250118.parquet']
+
+
+def test_debounce_window():
+    clock = _Clock()
+    queue = LocalEventQueue(debounce_seconds=10, max_wait_seconds=100, clock=clock)
+    assert queue.drain() is None
+
+    queue.put(_s3_event('17'))
+    clock.now = 9
+    queue.put(_s3_event('18'))
+    # Cada notificação reabre a janela
+    clock.now = 18
+    assert not queue.ready()
+    assert queue.drain() is None
+
+    clock.now = 19
+    event = queue.drain()
+    assert len(extract_s3_records(event)) == 2
+    assert len(queue) == 0
+    assert queue.drain(force=True) is None
+
+
+def test_max_wait_closes_busy_batch():
+    clock = _Clock()
+    queue = LocalEventQueue(debounce_seconds=10, max_wait_seconds=30, clock=clock)
+    for second in range(0, 31, 5):
+        clock.now = second
+        queue.put(_s3_event(f'{second + 1:02d}'))
+    # Notificações a cada 5 s nunca fecham o debounce; a espera máxima fecha
+    assert queue.ready()
+    assert len(extract_s3_records(queue.drain())) == 7
+
+
+def test_max_batch_size_and_force():
+    clock = _Clock()
+    queue = LocalEventQueue(debounce_seconds=10, max_batch_size=3, clock=clock)
+    queue.put(_s3_event('17'))
+    assert not queue.ready()
+    assert len(extract_s3_records(queue.drain(force=True))) == 1
+
+    for day in ('17', '18', '19'):
+        queue.put(_s3_event(day))
+    assert len(queue) == 3
+    assert queue.ready()
+
+
+def test_poll_requeues_on_handler_failure():
+    clock = _Clock()
+    queue = LocalEventQueue(debounce_seconds=0, clock=clock)
+    queue.put(_s3_event('17'))
+    queue.put(_s3_event('18'))
+
+    def failing_handler(event, context):
+        raise RuntimeError('limite de execuções concorrentes')
+
+    with pytest.raises(RuntimeError):
+        queue.poll(failing_handler)
+    assert len(queue) == 2
+
+    # A reentrega mantém a ordem e junta as novas notificações
+    queue.put(_s3_event('19'))
+    delivered = []
+    assert queue.poll(lambda event, context: delivered.append(event) or 'ok') == 'ok'
+    days = [record['s3']['object']['key'][-10:-8] for record in extract_s3_records(delivered[0])]
+    assert days == ['17', '18', '19']
+    assert queue.poll(lambda event, context: 'vazio') is None
+
+
+def test_backfill_coalesces_into_one_glue_run(monkeypatch):
+    monkeypatch.setenv('FAST_PATH_MAX_BYTES', '0')
+    monkeypatch.delenv('RUN_LEDGER_TABLE', raising=False)
+    monkeypatch.delenv('CATALOG_DATABASE', raising=False)
+    trigger = load_module('trigger_lambda_function', ROOT / 'src' / 'trigger' / 'lambda_function.py')
+    glue = FakeGlue()
+    trigger._clients.update({'s3': FakeS3(), 'glue': glue})
+
+    queue = LocalEventQueue(debounce_seconds=0)
+    for day in ('17', '18', '19'):
+        queue.put(_s3_event(day))
+    # Notificação repetida do mesmo PUT
+    queue.put(_s3_event('19'))
+
+    response = queue.poll(trigger.lambda_handler)
+    body = json.loads(response['body'])
+    assert body['processed_files'] == 3
+    assert len(glue.runs) == 1
+    assert glue.runs[0]['--source_keys'].count('.parquet') == 3
@@ -0,0 +1,220 @@
+"""Testes do ETL rápido na Lambda (src/trigger/fast_etl.py) contra as saídas esperadas do job"""
+
+import io
+import json
+from datetime import datetime
+
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pytest
+
+import fast_etl
+from columnar import PortfolioTableBuilder, with_partition_columns
+from conftest import FIXTURES, run_glue_job
+from page_archive import raw_object_key
+from raw_schema import conform_table, write_raw_parquet
+
+# Quinta e sexta-feira: ABEV3 sai do índice, WEGE3 entra; XX1 (código
+# inválido) e ITUB4 (quantidade nula) são rejeitados na limpeza
+RAW_ROWS = {
+    '2025-07-17': [('VALE3', 'VALE', 'ON NM', '1.000', '10,845'),
+                   ('PETR4', 'PETROBRAS', 'PN N2', '2.000', '6,743'),
+                   ('ABEV3', 'AMBEV S/A', 'ON', '3.000', '2,885'),
+                   ('XX1', 'INVALIDA', 'ON', '10', '1,000')],
+    '2025-07-18': [('VALE3', 'VALE', 'ON NM', '1.000', '11,000'),
+                   ('PETR4', 'PETROBRAS', 'PN N2', '2.500', '6,743'),
+                   ('WEGE3', 'WEG', 'ON NM', '500', '0,050'),
+                   ('ITUB4', 'ITAUUNIBANCO', 'PN N1', '', '5,000')],
+}
+NOW = datetime(2025, 7, 21, 12, 0, 0)
+EXPECTED = json.loads((FIXTURES / 'fast_etl' / 'expected_outputs.json').read_text(encoding='utf-8'))
+OUTPUT_PREFIXES = (fast_etl.REFINED_PREFIX, fast_etl.AGGREGATED_PREFIX, fast_etl.CHANGES_PREFIX)
+TIMESTAMP_COLUMNS = ['data_extracao', 'data_extracao_timestamp', 'data_processamento']
+
+
+def _raw_bodies(dates=tuple(RAW_ROWS)):
+    bodies = {}
+    for trade_date in dates:
+        builder = PortfolioTableBuilder(trade_date, f'{trade_date}T18:00:00', 'B3_IBOV')
+        for row in RAW_ROWS[trade_date]:
+            builder.append(*row)
+        buffer = io.BytesIO()
+        write_raw_parquet(conform_table(with_partition_columns(builder.build(), trade_date)), buffer)
+        bodies[raw_object_key(trade_date)] = buffer.getvalue()
+    return bodies
+
+
+def _run(outputs, bodies, run_id='golden'):
+    # Um único bucket: a camada raw do lote e as saídas já gravadas
+    return fast_etl.run_fast_path(lambda key: bodies[key] if key in bodies else outputs[key],
+                                  outputs.__setitem__, list(bodies), run_id=run_id, now=NOW,
+                                  list_keys=lambda prefix: [key for key in outputs if key.startswith(prefix)],
+                                  delete=lambda keys: [outputs.pop(key) for key in keys])
+
+
+def _normalize(value):
+    """Valor comparável com o JSON esperado (decimais, datas e timestamps como texto)"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _partition_contents(table):
+    return {'columns': {field.name: str(field.type) for field in table.schema},
+            'rows': [[_normalize(value) for value in row.values()] for row in table.to_pylist()]}
+
+
+def test_outputs_match_expected_rows():
+    outputs = {}
+    summary = _run(outputs, _raw_bodies())
+
+    assert summary['input_rows'] == 8
+    assert summary['refined_rows'] == 6
+    assert summary['previous_dates'] == {'2025-07-17': None, '2025-07-18': '2025-07-17'}
+    assert summary['trade_dates'] == ['2025-07-17', '2025-07-18']
+
+    # Um arquivo por partição, com o nome do writer do Spark
+    assert sorted(outputs) == sorted(f'{partition}/part-00000-golden.c000.snappy.parquet' for partition in EXPECTED)
+
+    for key, body in outputs.items():
+        partition = key.rsplit('/', 1)[0]
+        # Coluna a coluna: nomes, ordem, tipos e valores
+        assert _partition_contents(pq.read_table(io.BytesIO(body))) == EXPECTED[partition], partition
+
+
+def test_refined_files_use_spark_physical_types():
+    outputs = {}
+    _run(outputs, _raw_bodies())
+    key = next(key for key in outputs if key.startswith(fast_etl.REFINED_PREFIX + '/'))
+    parquet = pq.ParquetFile(io.BytesIO(outputs[key]))
+
+    # Timestamps em INT96, como o writer de parquet do Glue; partições só no caminho
+    physical = {column.name: column.physical_type for column in parquet.schema}
+    assert [name for name in TIMESTAMP_COLUMNS if physical[name] == 'INT96'] == TIMESTAMP_COLUMNS
+    assert not set(fast_etl.REFINED_PARTITION_KEYS) & set(physical)
+    assert parquet.metadata.row_group(0).column(0).compression == 'SNAPPY'
+
+
+def test_previous_day_read_from_stored_partition():
+    bodies = _raw_bodies()
+    outputs = {}
+    _run(outputs, {key: body for key, body in bodies.items() if '20250717' in key}, run_id='run1')
+    summary = _run(outputs, {key: body for key, body in bodies.items() if '20250718' in key}, run_id='run2')
+
+    # O pregão anterior vem da partição refinada gravada, não do lote
+    assert summary['previous_dates'] == {'2025-07-18': '2025-07-17'}
+    partition = f'{fast_etl.CHANGES_PREFIX}/data_pregao=2025-07-18'
+    changes = pq.read_table(io.BytesIO(outputs[f'{partition}/part-00000-run2.c000.snappy.parquet']))
+    assert _partition_contents(changes) == EXPECTED[partition]
+
+
+def test_previous_trade_date_skips_weekend_and_holidays():
+    stored = {'2025-02-28'}
+    # Carnaval: segunda e terça sem pregão
+    assert fast_etl.previous_trade_date('2025-03-05', [], stored.__contains__) == '2025-02-28'
+    assert fast_etl.previous_trade_date('2025-03-05', ['2025-03-03'], stored.__contains__) == '2025-03-03'
+    assert fast_etl.previous_trade_date('2025-03-15', [], stored.__contains__) is None
+    assert fast_etl.refined_partition('2025-03-05') == 'partition_year=2025/partition_month=3/partition_day=5'
+
+
+def test_partitioned_files_split_large_partitions():
+    refined, _ = fast_etl.transform(fast_etl.read_raw_table(list(_raw_bodies().values())), NOW)
+    files = fast_etl.partitioned_files(refined, fast_etl.REFINED_PREFIX, fast_etl.REFINED_PARTITION_KEYS, 'r',
+                                       fast_etl.REFINED_SORT_KEYS, max_records_per_file=2)
+    assert [key.split('/', 2)[2] for key, _ in files] == [
+        'partition_year=2025/partition_month=7/partition_day=17/part-00000-r.c000.snappy.parquet',
+        'partition_year=2025/partition_month=7/partition_day=17/part-00001-r.c000.snappy.parquet',
+        'partition_year=2025/partition_month=7/partition_day=18/part-00000-r.c000.snappy.parquet',
+        'partition_year=2025/partition_month=7/partition_day=18/part-00001-r.c000.snappy.parquet',
+    ]
+    # Linhas ordenadas por ticker de um arquivo para o seguinte
+    tickers = [pq.read_table(io.BytesIO(body))['ticker_symbol'].to_pylist() for _, body in files[:2]]
+    assert tickers == [['ABEV3', 'PETR4'], ['VALE3']]
+
+
+def test_stale_keys_only_inside_written_partitions():
+    existing = ['refined-data/bovespa/partition_year=2025/partition_month=7/partition_day=18/part-00000-old.parquet',
+                'refined-data/bovespa/partition_year=2025/partition_month=7/partition_day=18/ticker_group=VALE/x.parquet',
+                'refined-data/bovespa/partition_year=2025/partition_month=7/partition_day=17/part-00000-old.parquet']
+    written = ['refined-data/bovespa/partition_year=2025/partition_month=7/partition_day=18/part-00000-new.parquet']
+
+    def list_keys(prefix):
+        return [key for key in existing + written if key.startswith(prefix)]
+
+    assert fast_etl.stale_keys(list_keys, written) == existing[:2]
+
+
+def test_failed_transform_writes_nothing(monkeypatch):
+    outputs = {}
+
+    def failing_changes(*args):
+        raise ValueError('falha nas variações')
+
+    monkeypatch.setattr(fast_etl, 'daily_changes', failing_changes)
+    with pytest.raises(ValueError):
+        _run(outputs, _raw_bodies())
+    assert outputs == {}
+
+
+def _table_rows(outputs, prefix):
+    return sum(pq.read_metadata(io.BytesIO(body)).num_rows for key, body in outputs.items()
+               if key.startswith(prefix + '/'))
+
+
+def test_rerun_keeps_row_counts_stable():
+    bodies = _raw_bodies()
+    outputs = {}
+    counts = []
+    # Lote, rescrape de um pregão e o lote de novo: cada gravação substitui as partições que toca
+    for run_id, keys in (('run1', list(bodies)), ('run2', list(bodies)[1:]), ('run3', list(bodies))):
+        summary = _run(outputs, {key: bodies[key] for key in keys}, run_id=run_id)
+        counts.append(tuple(_table_rows(outputs, prefix) for prefix in OUTPUT_PREFIXES))
+    assert counts == [(6, 5, 7)] * 3
+    assert summary['files_replaced'] == len(EXPECTED)
+    assert not [key for key in outputs if '-run1.' in key or '-run2.' in key]
+
+
+def test_glue_job_rerun_keeps_row_counts_stable(tmp_path):
+    """O writer do job em um Spark local: o mesmo pregão gravado de novo não duplica linhas"""
+    pytest.importorskip('pyspark')
+    pytest.importorskip('awsglue')
+
+    bodies = _raw_bodies()
+    for key, body in bodies.items():
+        (tmp_path / key).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / key).write_bytes(body)
+
+    counts = []
+    for keys in (list(bodies), list(bodies)[1:], list(bodies)):
+        run_glue_job(tmp_path, keys)
+        counts.append(tuple(ds.dataset(str(tmp_path / prefix), format='parquet', partitioning='hive').count_rows()
+                            for prefix in OUTPUT_PREFIXES))
+    assert counts == [(6, 5, 7)] * 3
+
+
+def test_glue_job_matches_fast_path(tmp_path):
+    """Paridade: o job do Glue em um Spark local grava as mesmas saídas, coluna a coluna"""
+    pytest.importorskip('pyspark')
+    pytest.importorskip('awsglue')
+
+    bodies = _raw_bodies()
+    for key, body in bodies.items():
+        (tmp_path / key).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / key).write_bytes(body)
+    run_glue_job(tmp_path, list(bodies))
+
+    outputs = {}
+    _run(outputs, bodies)
+    for partition in EXPECTED:
+        table = ds.dataset(str(tmp_path / partition), format='parquet').to_table()
+        expected = pq.read_table(io.BytesIO(outputs[f'{partition}/part-00000-golden.c000.snappy.parquet']))
+        # current_date/current_timestamp do job: o instante do processamento fica fora
+        volatile = [name for name in ('dias_desde_extracao', 'data_processamento') if name in expected.column_names]
+        table, expected = table.drop_columns(volatile), expected.drop_columns(volatile)
+
+        assert table.schema.names == expected.schema.names, partition
+        for name in expected.column_names:
+            assert table.schema.field(name).type == expected.schema.field(name).type, (partition, name)
+        sort_keys = [(name, 'ascending') for name in ('indice', 'ticker_symbol', 'tipo_acao')
+                     if name in expected.column_names]
+        assert table.sort_by(sort_keys).to_pylist() == expected.sort_by(sort_keys).to_pylist(), partition
@@ -0,0 +1,109 @@
+"""Testes do cliente HTTP compartilhado (src/scraper/http_client.py)"""
+
+import requests
+from requests.adapters import BaseAdapter
+
+from http_client import PooledHttpClient
+from resilience import ResilientCaller, RetryPolicy
+
+
+class _FakeAdapter(BaseAdapter):
+    """Responde com base nos cabeçalhos condicionais, sem rede"""
+
+    def __init__(self, etag='"v1"', statuses=None):
+        super().__init__()
+        self.etag = etag
+        self.statuses = list(statuses or [])
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request)
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if self.statuses:
+            response.status_code = self.statuses.pop(0)
+        elif request.headers.get('If-None-Match') == self.etag:
+            response.status_code = 304
+        else:
+            response.status_code = 200
+            response._content = b'<table></table>'
+            response.headers['ETag'] = self.etag
+            response.headers['Last-Modified'] = 'Fri, 18 Jul 2025 21:00:00 GMT'
+        return response
+
+    def close(self):
+        pass
+
+
+def _client(adapter, **kwargs):
+    client = PooledHttpClient(pool_size=2, **kwargs)
+    client.session.mount('https://', adapter)
+    return client
+
+
+def test_conditional_get_after_store_validators():
+    adapter = _FakeAdapter()
+    client = _client(adapter)
+    url = 'https://b3.example/carteira'
+
+    first = client.get(url, params={'index': 'IBOV'})
+    assert first.status_code == 200
+    assert 'If-None-Match' not in adapter.sent[0].headers
+
+    # Sem store_validators a próxima chamada ainda é incondicional
+    assert client.get(url, params={'index': 'IBOV'}).status_code == 200
+
+    client.store_validators(first)
+    second = client.get(url, params={'index': 'IBOV'})
+    assert second.status_code == 304
+    assert adapter.sent[-1].headers['If-None-Match'] == '"v1"'
+    assert adapter.sent[-1].headers['If-Modified-Since'] == 'Fri, 18 Jul 2025 21:00:00 GMT'
+    assert client.not_modified_count == 1
+
+    # Outros parâmetros são outra URL no cache; conditional=False ignora os validadores
+    assert client.get(url, params={'index': 'SMLL'}).status_code == 200
+    assert client.get(url, params={'index': 'IBOV'}, conditional=False).status_code == 200
+
+
+def test_cache_key_includes_params():
+    key = PooledHttpClient.cache_key('https://b3.example/carteira', {'index': 'IBOV', 'date': '2025-07-18'})
+    assert key == 'https://b3.example/carteira?index=IBOV&date=2025-07-18'
+
+
+def test_ensure_pool_size_only_grows():
+    client = PooledHttpClient(pool_size=4)
+    adapter = client.session.get_adapter('https://b3.example')
+    client.ensure_pool_size(2)
+    assert client.pool_size == 4
+    assert client.session.get_adapter('https://b3.example') is adapter
+
+    closed = []
+    adapter.close = lambda: closed.append(adapter)
+    client.ensure_pool_size(16)
+    assert client.pool_size == 16
+    assert client.session.get_adapter('https://b3.example')._pool_maxsize == 16
+    # O pool substituído é fechado uma única vez (montado em https:// e http://)
+    assert closed == [adapter]
+
+
+def test_get_goes_through_resilience_layer():
+    adapter = _FakeAdapter(statuses=[503, 200])
+    resilience = ResilientCaller(retry=RetryPolicy(max_attempts=3, base_delay=0), sleep=lambda s: None)
+    client = _client(adapter, resilience=resilience)
+
+    acquired = []
+    limiter = type('Limiter', (), {'acquire': lambda self, url: acquired.append(url)})()
+
+    response = client.get('https://b3.example/carteira', rate_limiter=limiter)
+    assert response.status_code == 200
+    assert len(adapter.sent) == 2
+    # A retentativa também espera a vez do host
+    assert acquired == ['https://b3.example/carteira'] * 2
+
+    client.ensure_pool_size(32)
+    assert resilience.capacity == 32
+
+    stats = client.stats()
+    assert stats['retries'] == 1
+    assert stats['not_modified'] == 0
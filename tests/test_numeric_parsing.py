@@ -0,0 +1,57 @@
+"""Testes da conversão numérica vetorizada (src/scraper/numeric_parsing.py)"""
+
+import numpy as np
+import pyarrow as pa
+import pytest
+
+from b3_scraper_local import B3Scraper
+from numeric_parsing import (parse_br_number_array, parse_br_numbers, parse_br_percentage_array,
+                             parse_br_percentages)
+
+NUMBERS = ['1.234,5', '', '-', None, '  4.566.445.852 ', '0', '12,', ',5', '1.2.3,4,5', 'R$ 7,25', 'abc']
+PERCENTAGES = ['8,5%', '', '-', None, ' 10,845 ', '100', '0,2O1', '%', '1,2,3']
+
+
+def test_parse_br_number_array_edge_cases():
+    result = parse_br_number_array(NUMBERS).to_pylist()
+    assert result[:6] == [1234.5, None, None, None, 4566445852.0, 0.0]
+    assert result[6:9] == [12.0, 0.5, None]
+    # Caracteres não numéricos são descartados, como na versão célula a célula
+    assert result[9] == 7.25
+    assert result[10] is None
+
+
+@pytest.mark.parametrize('values, parse_vector, parse_cell', [
+    (NUMBERS, parse_br_number_array, '_parse_number'),
+    (PERCENTAGES, parse_br_percentage_array, '_parse_percentage'),
+])
+def test_vectorized_matches_cell_by_cell(values, parse_vector, parse_cell):
+    parse = getattr(B3Scraper, parse_cell)
+    expected = [parse(None, value) for value in values]
+    assert parse_vector(values).to_pylist() == expected
+
+
+def test_parse_br_number_array_as_int_truncates():
+    result = parse_br_number_array(['1.234,9', '-', '9.000.000.000'], as_int=True)
+    assert result.type == pa.int64()
+    assert result.to_pylist() == [1234, None, 9_000_000_000]
+
+
+def test_parse_br_percentage_array():
+    assert parse_br_percentage_array(PERCENTAGES[:6]).to_pylist() == [8.5, None, None, None, 10.845, 100.0]
+
+
+def test_accepts_arrow_and_numpy_input():
+    chunked = pa.chunked_array([['1,5'], ['2.000']])
+    assert parse_br_number_array(chunked).to_pylist() == [1.5, 2000.0]
+    assert parse_br_number_array(np.array(['3,25'])).to_pylist() == [3.25]
+
+
+def test_numpy_variants_return_mask():
+    values, mask = parse_br_numbers(['1.234,5', '-', ''])
+    assert values.tolist() == [1234.5, 0.0, 0.0]
+    assert mask.tolist() == [False, True, True]
+
+    values, mask = parse_br_percentages(['8,5%', None])
+    assert values.tolist() == [8.5, 0.0]
+    assert mask.tolist() == [False, True]
@@ -0,0 +1,99 @@
+"""Testes do arquivo de respostas da B3 (src/scraper/page_archive.py)"""
+
+import gzip
+import json
+
+import pytest
+
+from conftest import FIXTURES
+from page_archive import (LocalPageArchive, archive_from_env, content_hash, raw_object_key,
+                          raw_partition_prefix)
+
+PAGE = (FIXTURES / 'b3_pages' / 'ibov_portfolio.html').read_bytes()
+
+
+def test_partition_keys():
+    assert raw_partition_prefix('2025-01-02') == 'raw-data/bovespa/year=2025/month=01/day=02'
+    assert raw_object_key('2025-01-02') == \
+        'raw-data/bovespa/year=2025/month=01/day=02/ibov_carteira_20250102.parquet'
+
+
+def test_store_is_content_addressed(tmp_path):
+    archive = LocalPageArchive(str(tmp_path))
+    entry = archive.store('2025-07-18', PAGE, 'html', source_url='https://b3.example')
+
+    key = archive.archive_key('2025-07-18', entry['sha256'], 'html')
+    stored = tmp_path / key
+    assert entry['sha256'] == content_hash(PAGE)
+    assert gzip.decompress(stored.read_bytes()) == PAGE
+
+    # Mesma resposta de novo: o arquivo não é regravado
+    mtime = stored.stat().st_mtime_ns
+    archive.store('2025-07-18', PAGE, 'html')
+    assert stored.stat().st_mtime_ns == mtime
+
+    with pytest.raises(ValueError):
+        archive.store('2025-07-18', PAGE, 'pdf')
+
+
+def test_latest_only_moves_after_mark_latest(tmp_path):
+    archive = LocalPageArchive(str(tmp_path))
+    entry = archive.store('2025-07-18', PAGE, 'html')
+
+    assert archive.latest('2025-07-18') is None
+    assert not archive.is_unchanged('2025-07-18', PAGE)
+
+    smll = archive.store('2025-07-18', b'{"results": []}', 'json', index='SMLL')
+    archive.mark_latest('2025-07-18', [entry, smll])
+
+    assert archive.is_unchanged('2025-07-18', PAGE)
+    assert not archive.is_unchanged('2025-07-18', PAGE + b' ')
+    assert archive.load('2025-07-18') == (PAGE, entry)
+    assert archive.load('2025-07-18', index='SMLL')[0] == b'{"results": []}'
+    assert archive.load('2025-07-19') is None
+
+
+def test_latest_reads_single_index_format(tmp_path):
+    archive = LocalPageArchive(str(tmp_path))
+    entry = archive.store('2025-07-18', PAGE, 'html')
+    legacy = {key: value for key, value in entry.items() if key != 'index'}
+    (tmp_path / archive.latest_key('2025-07-18')).write_text(json.dumps(legacy))
+
+    assert archive.latest_entries('2025-07-18') == {'IBOV': legacy}
+    assert archive.load('2025-07-18')[0] == PAGE
+
+
+def test_load_detects_corruption(tmp_path):
+    archive = LocalPageArchive(str(tmp_path))
+    entry = archive.store('2025-07-18', PAGE, 'html')
+    archive.mark_latest('2025-07-18', [entry])
+    (tmp_path / archive.archive_key('2025-07-18', entry['sha256'], 'html')).write_bytes(
+        gzip.compress(b'outra pagina'))
+
+    with pytest.raises(ValueError):
+        archive.load('2025-07-18')
+
+
+def test_archived_dates_in_range(tmp_path):
+    archive = LocalPageArchive(str(tmp_path))
+    for date_str in ('2025-07-16', '2025-07-17', '2025-07-18'):
+        archive.mark_latest(date_str, [archive.store(date_str, PAGE, 'html')])
+
+    assert archive.archived_dates() == ['2025-07-16', '2025-07-17', '2025-07-18']
+    assert archive.archived_dates('2025-07-17', '2025-07-17') == ['2025-07-17']
+
+
+def test_archive_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('SCRAPER_ARCHIVE_BACKEND', 'none')
+    assert archive_from_env() is None
+
+    monkeypatch.setenv('SCRAPER_ARCHIVE_BACKEND', 'local')
+    monkeypatch.setenv('SCRAPER_ARCHIVE_DIR', str(tmp_path))
+    assert isinstance(archive_from_env(), LocalPageArchive)
+
+    monkeypatch.setenv('SCRAPER_ARCHIVE_BACKEND', 's3')
+    assert archive_from_env() is None
+
+    monkeypatch.setenv('SCRAPER_ARCHIVE_BACKEND', 'ftp')
+    with pytest.raises(ValueError):
+        archive_from_env()
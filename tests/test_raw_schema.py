@@ -0,0 +1,95 @@
+"""Testes do schema canônico da camada raw (src/scraper/raw_schema.py)"""
+
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import fast_etl
+from columnar import PortfolioTableBuilder, with_partition_columns
+from conftest import ROOT
+from raw_schema import (PARTITION_SCHEMA, RAW_SCHEMA, conform_table, plain_table, write_raw_parquet,
+                        write_raw_parquet_batches)
+
+# Arquivo gravado antes do schema canônico (strings e doubles, sem 'indice')
+LEGACY_PARQUET = ROOT / 'bovespa_data_20250719_172321.parquet'
+
+
+def _builder_table(trade_date='2025-07-18'):
+    builder = PortfolioTableBuilder(trade_date, f'{trade_date}T18:00:00.123456', 'B3_IBOV')
+    builder.append('VALE3', 'VALE', 'ON NM', '4.196.924.316', '10,845')
+    builder.append('ABEV3', 'AMBEV S/A', 'ON', '4.394.835.131,6', '2,8846')
+    builder.append('PETR4', 'PETROBRAS', 'PN N2', '4.566.445.852', '6,743')
+    return builder.build()
+
+
+def test_conform_table_schema_and_order():
+    table = conform_table(_builder_table())
+
+    assert table.schema == RAW_SCHEMA
+    assert table.column('codigo_acao').to_pylist() == ['ABEV3', 'PETR4', 'VALE3']
+    assert table.column('data_pregao').to_pylist() == [date(2025, 7, 18)] * 3
+    assert table.column('data_extracao').to_pylist()[0] == datetime(2025, 7, 18, 18, 0, 0, 123000)
+    # Inteiros arredondados e participação com 3 casas
+    assert table.column('quantidade_teorica').to_pylist()[0] == 4394835132
+    assert table.column('percentual_participacao').to_pylist()[0] == Decimal('2.885')
+
+
+def test_conform_table_keeps_partition_columns():
+    table = conform_table(with_partition_columns(_builder_table(), '2025-07-18'))
+    assert table.schema == pa.schema(list(RAW_SCHEMA) + list(PARTITION_SCHEMA))
+    # Idempotente sobre uma tabela já convertida
+    assert conform_table(table).equals(table)
+
+
+def test_conform_table_legacy_file():
+    legacy = pq.read_table(LEGACY_PARQUET)
+    table = conform_table(legacy)
+    assert table.schema == RAW_SCHEMA
+    assert set(table.column('indice').to_pylist()) == {'IBOV'}
+    assert table.num_rows == legacy.num_rows
+
+
+def test_write_raw_parquet_encoding():
+    buffer = io.BytesIO()
+    write_raw_parquet(_builder_table(), buffer)
+    metadata = pq.ParquetFile(io.BytesIO(buffer.getvalue())).metadata
+
+    assert pq.read_schema(io.BytesIO(buffer.getvalue())) == RAW_SCHEMA
+    columns = {metadata.row_group(0).column(i).path_in_schema: metadata.row_group(0).column(i)
+               for i in range(metadata.num_columns)}
+    assert columns['codigo_acao'].compression == 'ZSTD'
+    assert 'RLE_DICTIONARY' in columns['codigo_acao'].encodings
+    assert columns['codigo_acao'].statistics.min == 'ABEV3'
+
+
+def test_write_raw_parquet_batches_one_row_group_per_day():
+    buffer = io.BytesIO()
+    tables = [with_partition_columns(_builder_table(day), day) for day in ('2025-07-17', '2025-07-18')]
+    assert write_raw_parquet_batches(tables + [_builder_table().slice(0, 0)], buffer) == 6
+
+    parquet = pq.ParquetFile(io.BytesIO(buffer.getvalue()))
+    assert parquet.metadata.num_row_groups == 2
+    assert parquet.read().column('day').to_pylist() == [17] * 3 + [18] * 3
+
+
+def test_plain_table_types():
+    plain = plain_table(conform_table(_builder_table()))
+    assert plain.schema.field('codigo_acao').type == pa.string()
+    assert plain.schema.field('percentual_participacao').type == pa.float64()
+
+
+def test_fast_path_reads_legacy_and_current_files_together():
+    buffer = io.BytesIO()
+    write_raw_parquet(with_partition_columns(_builder_table(), '2025-07-18'), buffer)
+
+    raw = fast_etl.read_raw_table([LEGACY_PARQUET.read_bytes(), buffer.getvalue()])
+
+    assert raw.schema.field('data_pregao').type == pa.date32()
+    assert raw.schema.field('quantidade_teorica').type == pa.int64()
+    assert raw.schema.field('percentual_participacao').type == pa.decimal128(9, 3)
+    assert raw.schema.field('data_extracao').type == pa.timestamp('ms')
+    assert sorted(set(raw.column('data_pregao').to_pylist())) == [date(2025, 7, 18), date(2025, 7, 19)]
+    assert set(raw.column('indice').to_pylist()) == {'IBOV'}
@@ -0,0 +1,81 @@
+"""Testes do reprocessamento por intervalo (main.py --reprocess e o modo intervalo do job do Glue)"""
+
+import io
+import json
+
+import pyarrow.dataset as ds
+import pytest
+
+from columnar import PortfolioTableBuilder, with_partition_columns
+from compaction import manifest_key
+from conftest import ROOT, FakeGlue, load_module, run_glue_job
+from page_archive import LocalPageArchive, raw_object_key
+from raw_schema import write_raw_parquet
+
+JOB_ARGUMENTS = {'--source_bucket': 'bucket', '--target_bucket': 'bucket', '--start_date': '2024-01-01',
+                 '--end_date': '2024-12-31', '--job-bookmark-option': 'job-bookmark-disable'}
+
+
+@pytest.fixture
+def main_module():
+    return load_module('bovespa_main', ROOT / 'main.py')
+
+
+def test_reprocess_starts_one_job_for_the_range(main_module, monkeypatch):
+    import boto3
+
+    glue = FakeGlue()
+    monkeypatch.setattr(boto3, 'client', lambda service: glue)
+    assert main_module.run_reprocess(['2024-01-01', '2024-12-31', '--job', 'etl', '--bucket', 'bucket'])
+    assert glue.runs == [JOB_ARGUMENTS]
+
+
+def test_reprocess_dry_run_and_invalid_ranges(main_module, monkeypatch, capsys):
+    import boto3
+
+    monkeypatch.setattr(boto3, 'client', lambda service: pytest.fail('dry-run não inicia o job'))
+    assert main_module.run_reprocess(['2024-01-01', '2024-12-31', '--job', 'etl', '--bucket', 'bucket',
+                                      '--dry-run'])
+    printed = capsys.readouterr().out
+    assert '366 dias' in printed
+    assert json.loads(printed.split('etl: ', 1)[1]) == JOB_ARGUMENTS
+
+    # Um único pregão: data final igual à inicial
+    main_module.run_reprocess(['2024-03-01', '--job', 'etl', '--bucket', 'bucket', '--dry-run'])
+    assert '"--end_date": "2024-03-01"' in capsys.readouterr().out
+
+    assert not main_module.run_reprocess(['2024-12-31', '2024-01-01', '--job', 'etl', '--bucket', 'bucket'])
+    assert not main_module.run_reprocess(['31/12/2024', '--job', 'etl', '--bucket', 'bucket'])
+
+
+def _raw_parquet(trade_date, tickers):
+    builder = PortfolioTableBuilder(trade_date, f'{trade_date}T18:00:00', 'B3_IBOV')
+    for ticker in tickers:
+        builder.append(ticker, ticker, 'ON NM', '1.000', '10,000')
+    buffer = io.BytesIO()
+    write_raw_parquet(with_partition_columns(builder.build(), trade_date), buffer)
+    return buffer.getvalue()
+
+
+def test_glue_job_range_reads_only_the_requested_days(tmp_path):
+    """Modo intervalo em um Spark local: meses do intervalo, sem o arquivo de respostas nem manifests"""
+    pytest.importorskip('pyspark')
+    pytest.importorskip('awsglue')
+
+    days = {'2025-06-30': ['ABEV3'], '2025-07-17': ['PETR4', 'VALE3'], '2025-07-18': ['PETR4', 'VALE3', 'WEGE3']}
+    for trade_date, tickers in days.items():
+        (tmp_path / raw_object_key(trade_date)).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / raw_object_key(trade_date)).write_bytes(_raw_parquet(trade_date, tickers))
+
+    # Respostas arquivadas da B3 e manifest da compactação sob os mesmos prefixos
+    archive = LocalPageArchive(str(tmp_path))
+    archive.mark_latest('2025-07-18', [archive.store('2025-07-18', b'<html></html>', 'html')])
+    (tmp_path / manifest_key(2025, 7)).parent.mkdir(parents=True, exist_ok=True)
+    (tmp_path / manifest_key(2025, 7)).write_text(json.dumps({'dates': {}}))
+
+    run_glue_job(tmp_path, [], '--start_date', '2025-07-18', '--end_date', '2025-07-18')
+
+    refined = ds.dataset(str(tmp_path / 'refined-data' / 'bovespa'), format='parquet', partitioning='hive')
+    table = refined.to_table(columns=['partition_month', 'partition_day', 'ticker_symbol'])
+    assert sorted(zip(table['partition_month'].to_pylist(), table['partition_day'].to_pylist(),
+                      table['ticker_symbol'].to_pylist())) == [(7, 18, 'PETR4'), (7, 18, 'VALE3'), (7, 18, 'WEGE3')]
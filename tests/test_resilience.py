@@ -0,0 +1,183 @@
+"""Testes da camada de resiliência (src/scraper/resilience.py)"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceededError, LatencyTracker,
+                        ResilientCaller, RetryPolicy)
+
+
+def _response(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+
+class _Sequence:
+    """send() que devolve (ou levanta) os itens da lista em ordem"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.timeouts = []
+
+    def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return _response(outcome)
+
+
+def _caller(**kwargs):
+    sleeps = []
+    kwargs.setdefault('retry', RetryPolicy(max_attempts=3, base_delay=0.01))
+    caller = ResilientCaller(sleep=sleeps.append, **kwargs)
+    return caller, sleeps
+
+
+def test_retry_until_success():
+    caller, sleeps = _caller()
+    send = _Sequence(503, requests.exceptions.ConnectionError('reset'), 200)
+
+    assert caller.call('b3', send).status_code == 200
+    assert len(sleeps) == 2
+    assert caller.stats()['retries'] == 2
+    assert caller.breaker('b3').state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_status_returns_immediately():
+    caller, _ = _caller()
+    send = _Sequence(404)
+    assert caller.call('b3', send).status_code == 404
+    assert caller.stats()['attempts'] == 1
+
+
+def test_last_transient_response_after_attempts():
+    caller, _ = _caller()
+    assert caller.call('b3', _Sequence(503, 502, 500)).status_code == 500
+
+
+def test_retry_after_header_extends_backoff():
+    caller, sleeps = _caller()
+    send = lambda timeout: _response(429, {'Retry-After': '2'}) if not sleeps else _response(200)
+    assert caller.call('b3', send).status_code == 200
+    assert sleeps == [2.0]
+
+
+def test_network_error_is_raised_after_attempts():
+    caller, _ = _caller()
+    with pytest.raises(requests.exceptions.ConnectionError):
+        caller.call('b3', _Sequence(*[requests.exceptions.ConnectionError('down')] * 3))
+
+
+def test_circuit_opens_and_rejects():
+    caller, _ = _caller(retry=RetryPolicy(max_attempts=1), failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        caller.call('b3', _Sequence(503))
+
+    with pytest.raises(CircuitOpenError):
+        caller.call('b3', _Sequence(200))
+    # Outro host tem o próprio circuito
+    assert caller.call('outro', _Sequence(200)).status_code == 200
+    assert caller.stats()['circuits_opened'] == 1
+
+
+def test_half_open_probe_closes_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_deadline_exceeded():
+    caller, _ = _caller(deadline=0.05)
+
+    def slow(timeout):
+        time.sleep(0.06)
+        raise requests.exceptions.Timeout('lento')
+
+    with pytest.raises(DeadlineExceededError):
+        caller.call('b3', slow)
+    assert caller.stats()['deadline_exceeded'] == 1
+
+
+def test_throttle_runs_for_every_attempt():
+    caller, _ = _caller()
+    throttled = []
+    send = _Sequence(503, 503, 200)
+    caller.call('b3', send, throttle=lambda: throttled.append(len(send.timeouts)))
+    # Cada tentativa passa pelo limitador antes de ser enviada
+    assert throttled == [0, 1, 2]
+
+
+def test_hedge_goes_through_throttle():
+    caller, _ = _caller(retry=RetryPolicy(max_attempts=1), hedge_after=0.02)
+    throttled = []
+    calls = []
+
+    def send(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(0.3)
+        return _response(200)
+
+    assert caller.call('b3', send, timeout=5, throttle=lambda: throttled.append(1)).status_code == 200
+    stats = caller.stats()
+    assert stats['hedged_requests'] == 1
+    assert stats['hedge_wins'] == 1
+    # Original e hedge passaram pelo limitador
+    assert len(throttled) == 2
+
+
+def test_hedges_are_capped_per_host():
+    caller, _ = _caller(retry=RetryPolicy(max_attempts=1), hedge_after=0.02, max_hedges_per_host=1)
+    release = threading.Event()
+
+    def send(timeout):
+        release.wait(2)
+        return _response(200)
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        futures = [pool.submit(caller.call, 'b3', send, 5) for _ in range(3)]
+        time.sleep(0.2)
+        release.set()
+        assert [future.result().status_code for future in futures] == [200] * 3
+
+    stats = caller.stats()
+    assert stats['hedged_requests'] == 1
+    assert stats['hedges_capped'] == 2
+
+
+def test_executor_follows_capacity():
+    caller, _ = _caller(hedge_after=0.5, capacity=2)
+    assert caller._executor()._max_workers == 4
+    caller.ensure_capacity(1)
+    assert caller._executor()._max_workers == 4
+    caller.ensure_capacity(8)
+    assert caller._executor()._max_workers == 16
+
+
+def test_latency_percentiles():
+    tracker = LatencyTracker()
+    for ms in range(1, 101):
+        tracker.record(ms / 1000)
+    summary = tracker.summary()
+    assert summary['latency_samples'] == 100
+    assert summary['latency_p50_ms'] == 50
+    assert summary['latency_p99_ms'] == 99
+    assert summary['latency_max_ms'] == 100
+
+
+def test_backoff_is_bounded():
+    policy = RetryPolicy(max_attempts=5, base_delay=1, max_delay=3)
+    for attempt in range(1, 6):
+        assert 0 <= policy.backoff(attempt) <= min(3, 2 ** (attempt - 1))
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
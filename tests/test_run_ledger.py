@@ -0,0 +1,148 @@
+"""Testes do ledger de execuções do ETL (src/trigger/run_ledger.py)"""
+
+import sqlite3
+
+import pytest
+
+from run_ledger import (STATUS_FAILED, STATUS_RUNNING, STATUS_SUCCEEDED, SqliteRunLedger, finished_status,
+                        ledger_from_env)
+
+DATE = '2025-07-18'
+KEY = 'raw-data/bovespa/year=2025/month=07/day=18/ibov_carteira_20250718.parquet'
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return _Clock()
+
+
+@pytest.fixture
+def ledger(clock):
+    return SqliteRunLedger(':memory:', running_timeout=3600, clock=clock)
+
+
+def _claim(content_hash='abc'):
+    return {'processing_date': DATE, 'content_hash': content_hash, 'source_key': KEY}
+
+
+def test_claim_and_duplicate(ledger):
+    assert ledger.get(DATE, 'abc') is None
+    assert ledger.claim(DATE, 'abc', KEY)
+    # Mesmo pregão e mesmo conteúdo: duplicata contada
+    assert not ledger.claim(DATE, 'abc', KEY)
+    assert not ledger.claim(DATE, 'abc', KEY)
+    # Conteúdo diferente do mesmo pregão é outro par
+    assert ledger.claim(DATE, 'def', KEY)
+
+    entry = ledger.get(DATE, 'abc')
+    assert entry['status'] == STATUS_RUNNING
+    assert entry['duplicate_count'] == 2
+    assert entry['attempts'] == 1
+
+
+def test_release_allows_reclaim(ledger):
+    assert ledger.claim(DATE, 'abc', KEY)
+    ledger.release([_claim()])
+    assert ledger.get(DATE, 'abc')['status'] == STATUS_FAILED
+    assert ledger.claim(DATE, 'abc', KEY)
+    assert ledger.get(DATE, 'abc')['attempts'] == 2
+
+
+def test_finished_run_updates_entries(ledger):
+    ledger.claim(DATE, 'abc', KEY)
+    ledger.mark_started([_claim()], 'jr_1', 'bucket')
+
+    assert ledger.mark_finished('jr_1', 'SUCCEEDED') == 1
+    assert ledger.get(DATE, 'abc')['status'] == STATUS_SUCCEEDED
+    assert not ledger.claim(DATE, 'abc', KEY)
+    assert ledger.get_run('jr_1')['status'] == STATUS_SUCCEEDED
+    # Job desconhecido
+    assert ledger.mark_finished('jr_x', 'FAILED') == 0
+    assert ledger.get_run('jr_x') is None
+
+
+def test_failed_run_can_be_reclaimed(ledger):
+    ledger.claim(DATE, 'abc', KEY)
+    ledger.mark_started([_claim()], 'jr_1', 'bucket')
+    assert ledger.mark_finished('jr_1', 'TIMEOUT') == 1
+
+    run = ledger.get_run('jr_1')
+    assert run['source_bucket'] == 'bucket'
+    assert [(entry['source_key'], entry['status'], entry['attempts']) for entry in run['entries']] == \
+        [(KEY, STATUS_FAILED, 1)]
+
+    assert ledger.claim(DATE, 'abc', KEY)
+    ledger.mark_started([_claim()], 'jr_2', 'bucket')
+    # O par agora pertence ao novo job: o fim tardio do antigo não o altera
+    assert ledger.get_run('jr_1')['entries'] == []
+    assert ledger.mark_finished('jr_1', 'FAILED') == 0
+    assert ledger.get(DATE, 'abc')['status'] == STATUS_RUNNING
+
+
+def test_stale_running_claim_is_reclaimed(ledger, clock):
+    assert ledger.claim(DATE, 'abc', KEY)
+    clock.now += 3599
+    assert not ledger.claim(DATE, 'abc', KEY)
+    # Sem evento de fim depois do timeout: a reivindicação é retomada
+    clock.now += 2
+    assert ledger.claim(DATE, 'abc', KEY)
+    assert ledger.get(DATE, 'abc')['attempts'] == 2
+
+
+def test_sqlite_file_is_shared_and_migrated(tmp_path):
+    path = str(tmp_path / 'ledger.sqlite3')
+    # Arquivo criado pela primeira versão do ledger (sem 'attempts' e 'source_bucket')
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE content_runs (processing_date TEXT NOT NULL, content_hash TEXT NOT NULL,
+            status TEXT NOT NULL, source_key TEXT, job_run_id TEXT,
+            duplicate_count INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, updated_at REAL NOT NULL,
+            PRIMARY KEY (processing_date, content_hash));
+        CREATE TABLE job_runs (job_run_id TEXT PRIMARY KEY, status TEXT NOT NULL, entries TEXT NOT NULL,
+            job_state TEXT, started_at REAL NOT NULL, finished_at REAL);
+        INSERT INTO content_runs VALUES ('2025-07-17', 'old', 'SUCCEEDED', NULL, 'jr_0', 0, 1, 1);
+    """)
+    connection.close()
+
+    first = SqliteRunLedger(path)
+    assert first.get('2025-07-17', 'old')['attempts'] == 0
+    assert first.claim(DATE, 'abc', KEY)
+    first.mark_started([_claim()], 'jr_1', 'bucket')
+
+    second = SqliteRunLedger(path)
+    assert not second.claim(DATE, 'abc', KEY)
+    assert second.get_run('jr_1')['source_bucket'] == 'bucket'
+
+
+def test_finished_status():
+    assert finished_status('SUCCEEDED') == STATUS_SUCCEEDED
+    for state in ('FAILED', 'TIMEOUT', 'STOPPED', 'ERROR'):
+        assert finished_status(state) == STATUS_FAILED
+
+
+def test_ledger_from_env(monkeypatch, tmp_path):
+    monkeypatch.delenv('RUN_LEDGER_TABLE', raising=False)
+    monkeypatch.delenv('RUN_LEDGER_BACKEND', raising=False)
+    assert ledger_from_env() is None
+
+    monkeypatch.setenv('RUN_LEDGER_BACKEND', 'sqlite')
+    monkeypatch.setenv('RUN_LEDGER_PATH', str(tmp_path / 'ledger.sqlite3'))
+    assert isinstance(ledger_from_env(), SqliteRunLedger)
+
+    monkeypatch.setenv('RUN_LEDGER_BACKEND', 'dynamodb')
+    with pytest.raises(ValueError):
+        ledger_from_env()
+    monkeypatch.setenv('RUN_LEDGER_TABLE', 'ledger')
+    assert ledger_from_env(lambda: 'cliente').client == 'cliente'
+
+    monkeypatch.setenv('RUN_LEDGER_BACKEND', 'redis')
+    with pytest.raises(ValueError):
+        ledger_from_env()
@@ -0,0 +1,89 @@
+"""Testes do upload multipart em streaming (src/scraper/s3_stream.py)"""
+
+import io
+
+import pyarrow.parquet as pq
+import pytest
+
+from benchmark import _daily_tables
+from conftest import FakeS3
+from raw_schema import write_raw_parquet_batches
+from s3_stream import MIN_PART_SIZE, S3StreamingUpload
+
+
+def test_small_object_uses_single_put():
+    s3 = FakeS3()
+    with S3StreamingUpload(s3, 'bucket', 'raw/pequeno.parquet', metadata={'date': '2025-07-18'}) as upload:
+        upload.write(b'abc')
+        upload.write(b'')
+        upload.write(b'def')
+        assert upload.tell() == 6
+
+    assert s3.calls == ['put_object']
+    assert s3.objects['raw/pequeno.parquet']['Body'] == b'abcdef'
+    assert s3.objects['raw/pequeno.parquet']['Metadata'] == {'date': '2025-07-18'}
+
+
+def test_large_object_is_split_in_parts():
+    s3 = FakeS3()
+    payload = bytes(range(256)) * (MIN_PART_SIZE * 2 // 256 + 100)
+
+    upload = S3StreamingUpload(s3, 'bucket', 'raw/grande.bin', part_size=MIN_PART_SIZE, max_in_flight=2)
+    with upload:
+        # Escritas de tamanhos variados, como as do ParquetWriter
+        for start in range(0, len(payload), 700_001):
+            upload.write(payload[start:start + 700_001])
+
+    assert upload.parts_uploaded == 3
+    assert s3.calls.count('upload_part') == 3
+    assert s3.objects['raw/grande.bin']['Body'] == payload
+    assert all(len(part) == MIN_PART_SIZE for number, part in s3.uploads['upload-1']['parts'].items()
+               if number < 3)
+
+
+def test_parquet_written_in_streaming_is_readable():
+    s3 = FakeS3()
+    with S3StreamingUpload(s3, 'bucket', 'raw/backfill.parquet', part_size=MIN_PART_SIZE) as upload:
+        rows = write_raw_parquet_batches(_daily_tables(30, 2000), upload)
+
+    table = pq.read_table(io.BytesIO(s3.objects['raw/backfill.parquet']['Body']))
+    assert table.num_rows == rows == 30 * 2000
+
+
+def test_error_inside_block_aborts_upload():
+    s3 = FakeS3()
+    with pytest.raises(RuntimeError):
+        with S3StreamingUpload(s3, 'bucket', 'raw/falha.bin', part_size=MIN_PART_SIZE) as upload:
+            upload.write(b'x' * (MIN_PART_SIZE + 1))
+            raise RuntimeError('writer falhou')
+
+    assert 'raw/falha.bin' not in s3.objects
+    assert s3.uploads['upload-1']['state'] == 'aborted'
+    # Sem multipart iniciado, nada é gravado
+    with pytest.raises(RuntimeError):
+        with S3StreamingUpload(s3, 'bucket', 'raw/nada.bin') as upload:
+            upload.write(b'abc')
+            raise RuntimeError('writer falhou')
+    assert 'raw/nada.bin' not in s3.objects
+
+
+def test_failed_part_aborts_and_raises():
+    s3 = FakeS3()
+
+    def broken_upload_part(**kwargs):
+        raise ConnectionError('parte perdida')
+
+    s3.upload_part = broken_upload_part
+    with pytest.raises(ConnectionError):
+        with S3StreamingUpload(s3, 'bucket', 'raw/parte.bin', part_size=MIN_PART_SIZE) as upload:
+            upload.write(b'x' * (MIN_PART_SIZE * 2))
+
+    assert s3.uploads['upload-1']['state'] == 'aborted'
+    assert 'raw/parte.bin' not in s3.objects
+
+
+def test_write_after_close_fails():
+    upload = S3StreamingUpload(FakeS3(), 'bucket', 'raw/fechado.bin')
+    upload.close()
+    with pytest.raises(ValueError):
+        upload.write(b'x')
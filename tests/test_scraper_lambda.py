@@ -0,0 +1,66 @@
+"""Testes da gravação da partição raw pela Lambda do scraper (src/scraper/lambda_function.py)"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import raw_schema
+from columnar import PortfolioTableBuilder
+from conftest import ROOT, FakeS3, load_module
+
+BUCKET = 'bovespa-pipeline-bucket'
+TRADE_DATE = '2025-07-18'
+ROWS = [('VALE3', 'VALE', 'ON NM', '1.000', '10,845'),
+        ('PETR4', 'PETROBRAS', 'PN N2', '2.000', '6,743')]
+
+
+def _table(rows=ROWS, extraction_time='2025-07-18T18:00:00'):
+    builder = PortfolioTableBuilder(TRADE_DATE, extraction_time, 'B3_IBOV')
+    for row in rows:
+        builder.append(*row)
+    return builder.build()
+
+
+@pytest.fixture
+def s3_scraper(monkeypatch):
+    monkeypatch.setenv('STORAGE_BACKEND', 's3')
+    monkeypatch.setenv('SCRAPER_ARCHIVE_BACKEND', 'none')
+    module = load_module('scraper_lambda_function', ROOT / 'src' / 'scraper' / 'lambda_function.py')
+    module.s3_client = FakeS3()
+    return module.B3Scraper(BUCKET, ['IBOV'])
+
+
+def _uploads(s3):
+    return s3.calls.count('put_object') + s3.calls.count('create_multipart_upload')
+
+
+def test_unchanged_content_is_not_uploaded_again(s3_scraper):
+    s3 = s3_scraper.storage.client
+    s3_scraper.save_to_s3_parquet(_table(), TRADE_DATE)
+    assert _uploads(s3) == 1
+    assert TRADE_DATE not in s3_scraper.unchanged_uploads
+
+    # Nova coleta com o mesmo conteúdo (só o instante da extração muda): sem PUT
+    s3_scraper.save_to_s3_parquet(_table(extraction_time='2025-07-18T19:00:00'), TRADE_DATE)
+    assert _uploads(s3) == 1
+    assert TRADE_DATE in s3_scraper.unchanged_uploads
+
+    # Carteira alterada: grava de novo
+    s3_scraper.save_to_s3_parquet(_table(ROWS[:1]), TRADE_DATE)
+    assert _uploads(s3) == 2
+    assert TRADE_DATE not in s3_scraper.unchanged_uploads
+
+
+def test_raw_table_is_conformed_once(s3_scraper, monkeypatch):
+    calls = []
+    conform_table = raw_schema.conform_table
+    monkeypatch.setattr(raw_schema, 'conform_table', lambda table: calls.append(1) or conform_table(table))
+
+    s3_scraper.save_to_s3_parquet(_table(), TRADE_DATE)
+    assert len(calls) == 1
+
+    # Mesmo schema e mesma ordenação de uma gravação que conforma a tabela
+    body = next(iter(s3_scraper.storage.client.objects.values()))['Body']
+    stored = pq.read_table(pa.BufferReader(body))
+    assert stored.schema == pa.schema(list(raw_schema.RAW_SCHEMA) + list(raw_schema.PARTITION_SCHEMA))
+    assert stored['codigo_acao'].to_pylist() == ['PETR4', 'VALE3']
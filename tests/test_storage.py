@@ -0,0 +1,143 @@
+"""Testes dos backends de armazenamento (src/scraper/storage.py)"""
+
+import pytest
+
+from conftest import FakeS3
+from storage import LocalObjectStore, ObjectStore, S3ObjectStore, is_not_found, storage_from_env
+
+KEY = 'raw-data/bovespa/year=2025/month=07/day=18/ibov_carteira_20250718.parquet'
+
+
+@pytest.fixture(params=['local', 's3'])
+def store(request, tmp_path):
+    if request.param == 'local':
+        return LocalObjectStore(str(tmp_path))
+    return S3ObjectStore('bucket', FakeS3())
+
+
+def test_write_read_head(store):
+    assert store.read(KEY) is None
+    assert store.head(KEY) is None
+    assert not store.exists(KEY)
+
+    store.write(KEY, b'parquet', metadata={'content_sha256': 'abc'})
+
+    assert store.read(KEY) == b'parquet'
+    info = store.head(KEY)
+    assert info['size'] == 7
+    assert info['metadata'] == {'content_sha256': 'abc'}
+    assert store.etag(KEY) == info['etag']
+
+
+def test_overwrite_changes_etag_and_metadata(store):
+    store.write(KEY, b'v1', metadata={'content_sha256': 'a'})
+    first = store.etag(KEY)
+    store.write(KEY, b'versao 2')
+    assert store.etag(KEY) != first
+    assert store.head(KEY)['metadata'] == {}
+
+
+def test_open_write_is_all_or_nothing(store):
+    with store.open_write(KEY, metadata={'records_count': '2'}) as handle:
+        handle.write(b'par')
+        handle.write(b'quet')
+    assert store.read(KEY) == b'parquet'
+
+    other = KEY.replace('day=18', 'day=21')
+    with pytest.raises(RuntimeError):
+        with store.open_write(other) as handle:
+            handle.write(b'metade')
+            raise RuntimeError('writer falhou')
+    assert store.read(other) is None
+    assert [item['key'] for item in store.list('raw-data/bovespa')] == [KEY]
+
+
+def test_list_and_delete(store):
+    keys = [f'raw-data/bovespa/year=2025/month=07/day={day:02d}/x.parquet' for day in (16, 17, 18)]
+    for key in keys:
+        store.write(key, b'x')
+    store.write('refined-data/bovespa/y.parquet', b'y')
+
+    listed = store.list('raw-data/bovespa/')
+    assert [item['key'] for item in listed] == keys
+    assert all(item['size'] == 1 and item['etag'] for item in listed)
+    # O prefixo é um diretório: 'raw-data/bov' não casa com 'raw-data/bovespa'
+    assert store.list('raw-data/bov') == []
+
+    store.delete(keys[:2] + ['raw-data/bovespa/inexistente.parquet'])
+    assert [item['key'] for item in store.list('raw-data/bovespa')] == keys[2:]
+
+
+def test_local_metadata_is_hidden(tmp_path):
+    store = LocalObjectStore(str(tmp_path))
+    store.write(KEY, b'parquet', metadata={'a': '1'})
+    files = sorted(path.name for path in (tmp_path / KEY).parent.iterdir())
+    assert files == ['.ibov_carteira_20250718.parquet.meta.json', 'ibov_carteira_20250718.parquet']
+
+    store.delete([KEY])
+    # Partição vazia é removida
+    assert not (tmp_path / KEY).parent.exists()
+
+
+def test_s3_delete_in_batches_of_1000():
+    s3 = FakeS3()
+    store = S3ObjectStore('bucket', s3)
+    keys = [f'raw-data/bovespa/k{i:04d}' for i in range(2500)]
+    for key in keys:
+        s3.objects[key] = {'Body': b'', 'Metadata': {}, 'ETag': '"e"'}
+
+    store.delete(keys)
+    assert s3.calls.count('delete_objects') == 3
+    assert s3.objects == {}
+
+
+def test_s3_client_created_on_first_use():
+    created = []
+    store = S3ObjectStore('bucket', client_factory=lambda: created.append(1) or FakeS3())
+    assert created == []
+    assert store.uri(KEY) == f's3://bucket/{KEY}'
+    store.read(KEY)
+    store.read(KEY)
+    assert created == [1]
+
+
+def test_is_not_found():
+    from botocore.exceptions import ClientError
+    assert is_not_found(ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject'))
+    assert not is_not_found(ClientError({'Error': {'Code': 'AccessDenied'}}, 'GetObject'))
+    assert not is_not_found(ValueError('x'))
+
+
+def test_storage_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('STORAGE_LOCAL_DIR', str(tmp_path))
+    store = storage_from_env('bucket')
+    assert isinstance(store, LocalObjectStore)
+    assert store.root == tmp_path
+
+    monkeypatch.setenv('STORAGE_BACKEND', 's3')
+    monkeypatch.delenv('S3_BUCKET_NAME', raising=False)
+    assert storage_from_env('bucket').bucket_name == 'bucket'
+    with pytest.raises(ValueError):
+        storage_from_env()
+
+    monkeypatch.setenv('STORAGE_BACKEND', 'gcs')
+    with pytest.raises(ValueError):
+        storage_from_env('bucket')
+
+
+def test_incomplete_backend_fails_on_creation():
+    class ReadOnlyStore(ObjectStore):
+        def read(self, key):
+            return None
+
+    # Falha ao criar, não no meio de uma gravação
+    with pytest.raises(TypeError):
+        ReadOnlyStore()
+
+
+def test_s3_delete_raises_on_errors():
+    s3 = FakeS3()
+    s3.delete_objects = lambda Bucket, Delete: {'Errors': [{'Key': KEY, 'Code': 'AccessDenied'}]}
+    with pytest.raises(RuntimeError, match='AccessDenied'):
+        S3ObjectStore('bucket', s3).delete([KEY])
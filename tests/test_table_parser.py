@@ -0,0 +1,106 @@
+"""Testes do parser da tabela da carteira (src/scraper/table_parser.py)"""
+
+from types import SimpleNamespace
+
+import pytest
+
+import table_parser
+from conftest import FIXTURES, ROOT, load_module
+from table_parser import extract_rows_bs4, extract_rows_lxml, extract_table_rows
+
+PAGES = sorted((FIXTURES / 'b3_pages').glob('*.html'))
+
+# Opções usadas pela Lambda e pela versão local do scraper
+VARIANTS = {
+    'lambda': {},
+    'local': {'cell_tags': ('td', 'th'), 'first_table_only': True, 'strip_fragments': True}
+}
+
+
+@pytest.fixture(scope='module')
+def scraper_lambda():
+    return load_module('scraper_lambda_function', ROOT / 'src' / 'scraper' / 'lambda_function.py')
+
+
+def _page(name: str) -> bytes:
+    return (FIXTURES / 'b3_pages' / name).read_bytes()
+
+
+@pytest.mark.parametrize('variant', sorted(VARIANTS))
+@pytest.mark.parametrize('page', PAGES, ids=[page.name for page in PAGES])
+def test_backends_return_identical_rows(page, variant):
+    content = page.read_bytes()
+    options = VARIANTS[variant]
+    assert extract_rows_lxml(content, **options) == extract_rows_bs4(content, **options)
+
+
+@pytest.mark.parametrize('page', PAGES, ids=[page.name for page in PAGES])
+def test_backends_build_identical_records(scraper_lambda, page):
+    content = page.read_bytes()
+    tables = [
+        scraper_lambda.B3Scraper.parse_portfolio_page(SimpleNamespace(parser_backend=backend),
+                                                      content, '2025-07-18', '2025-07-18T18:00:00')
+        for backend in ('lxml', 'bs4')
+    ]
+    assert tables[0].equals(tables[1])
+
+
+def test_recorded_page_rows():
+    rows = extract_rows_lxml(_page('ibov_portfolio.html'))
+    codes = [row[0] for row in rows]
+    # Linhas do rodapé (colspan) ficam de fora; a legenda tem 5 células e entra
+    assert codes[:5] == ['ABEV3', 'ITUB4', 'PETR4', 'VALE3', 'WEGE3']
+    # Página em windows-1252: o acento é decodificado igual nos dois backends
+    assert rows[1][1] == 'ITAÚUNIBANCO'
+    assert rows[1][3] == '4.799.826.907'
+    assert rows[3] == ['VALE3', 'VALE', 'ON\xa0\xa0\xa0\xa0\xa0NM', '4.196.924.316', '10,845']
+
+
+def test_empty_table_has_only_header():
+    content = _page('empty_portfolio.html')
+    assert extract_rows_lxml(content) == []
+    assert extract_rows_lxml(content, **VARIANTS['local']) == [
+        ['Código', 'Ação', 'Tipo', 'Qtde. Teórica', 'Part. (%)']
+    ]
+
+
+def test_page_without_table():
+    content = b'<html><body><p>Sistema em manuten\xc3\xa7\xc3\xa3o</p></body></html>'
+    for extract in (extract_rows_lxml, extract_rows_bs4):
+        assert extract(content) == []
+        assert extract(content, first_table_only=True) is None
+
+
+def test_malformed_rows():
+    rows = extract_rows_bs4(_page('malformed_rows.html'))
+    by_code = {row[0]: row for row in rows}
+    # Linha com 4 células é descartada; a com 6 fica com as 5 primeiras
+    assert 'CASH3' not in by_code
+    assert by_code['CVCB3'] == ['CVCB3', 'CVC BRASIL', 'ON NM', '269.461.692', '0,734']
+    # <td> sem fechamento: as células são irmãs, como no lxml e no navegador
+    assert by_code['MRVE3'] == ['MRVE3', 'MRV', 'ON NM', '554.050.763', '1,205']
+    assert by_code['GOLL4'] == ['GOLL4', 'GOLLINHAS', 'PN N2', '-', '']
+    assert by_code['TEND3'][1] == 'TENDA & CIA'
+
+
+def test_nested_table_text_matches_lxml():
+    content = (b'<table><tr><td>A<table><tr><td>x</td></tr></table></td>'
+               b'<td>B</td><td>C</td><td>D</td><td>E</td></tr></table>')
+    assert extract_rows_bs4(content) == extract_rows_lxml(content)
+
+
+def test_extract_table_rows_falls_back_to_bs4(monkeypatch):
+    content = _page('ibov_portfolio.html')
+    expected = extract_rows_bs4(content)
+
+    assert extract_table_rows(content) == (expected, 'lxml')
+    assert extract_table_rows(content, backend='bs4') == (expected, 'bs4')
+
+    def broken(*args, **kwargs):
+        raise ValueError('documento inválido')
+
+    monkeypatch.setattr(table_parser, 'extract_rows_lxml', broken)
+    assert extract_table_rows(content) == (expected, 'bs4')
+
+    monkeypatch.setattr(table_parser, 'LXML_AVAILABLE', False)
+    assert extract_table_rows(content) == (expected, 'bs4')
@@ -0,0 +1,190 @@
+"""Testes do trigger do ETL (src/trigger/lambda_function.py) com o ledger em SQLite"""
+
+import io
+import json
+
+import pytest
+
+from catalog import CHANGES_TABLE, LocalCatalog
+from columnar import PortfolioTableBuilder, with_partition_columns
+from conftest import ROOT, FakeGlue, FakeS3, load_module
+from event_queue import extract_s3_records, s3_notification
+from raw_schema import write_raw_parquet
+from storage import LocalObjectStore
+
+BUCKET = 'bovespa-pipeline-bucket'
+KEYS = [f'raw-data/bovespa/year=2025/month=07/day={day}/ibov_carteira_202507{day}.parquet'
+        for day in ('16', '17', '18')]
+
+
+class _FakeSqs:
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody, DelaySeconds=0):
+        self.messages.append({'QueueUrl': QueueUrl, 'Body': json.loads(MessageBody), 'DelaySeconds': DelaySeconds})
+        return {'MessageId': str(len(self.messages))}
+
+
+@pytest.fixture
+def trigger(monkeypatch, tmp_path):
+    monkeypatch.setenv('RUN_LEDGER_BACKEND', 'sqlite')
+    monkeypatch.setenv('RUN_LEDGER_PATH', str(tmp_path / 'ledger.sqlite3'))
+    monkeypatch.setenv('FAST_PATH_MAX_BYTES', '0')
+    monkeypatch.setenv('RAW_EVENTS_QUEUE_URL', 'https://sqs.example/raw-events')
+    monkeypatch.setenv('MAX_RUN_ATTEMPTS', '2')
+    monkeypatch.delenv('CATALOG_DATABASE', raising=False)
+    module = load_module('trigger_lambda_function', ROOT / 'src' / 'trigger' / 'lambda_function.py')
+
+    s3 = FakeS3()
+    for key in KEYS:
+        s3.put_object(Bucket=BUCKET, Key=key, Body=key.encode(), Metadata={'content_sha256': key[-16:-8]})
+    module._clients.update({'s3': s3, 'glue': FakeGlue(), 'sqs': _FakeSqs()})
+    return module
+
+
+def _raw_parquet(trade_date):
+    builder = PortfolioTableBuilder(trade_date, f'{trade_date}T18:00:00', 'B3_IBOV')
+    builder.append('VALE3', 'VALE', 'ON NM', '1.000', '10,845')
+    builder.append('PETR4', 'PETROBRAS', 'PN N2', '2.000', '6,743')
+    buffer = io.BytesIO()
+    write_raw_parquet(with_partition_columns(builder.build(), trade_date), buffer)
+    return buffer.getvalue()
+
+
+def _state_change(job_run_id, state):
+    return {'detail-type': 'Glue Job State Change',
+            'detail': {'jobName': 'bovespa-etl-job', 'jobRunId': job_run_id, 'state': state}}
+
+
+def _body(response):
+    return json.loads(response['body'])
+
+
+def test_job_runs_without_bookmark(trigger):
+    body = _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS), None))
+    assert body['processed_files'] == 3
+
+    arguments = trigger._clients['glue'].runs[0]
+    assert arguments['--job-bookmark-option'] == 'job-bookmark-disable'
+    assert arguments['--source_keys'] == ','.join(KEYS)
+
+
+def test_duplicates_suppressed_while_running_and_after_success(trigger):
+    trigger.lambda_handler(s3_notification(BUCKET, KEYS), None)
+    body = _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS[:1]), None))
+    assert body['duplicates_suppressed'] == 1
+    assert len(trigger._clients['glue'].runs) == 1
+
+    trigger.lambda_handler(_state_change('jr_1', 'SUCCEEDED'), None)
+    assert trigger._clients['sqs'].messages == []
+    assert _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS[:1]), None))['duplicates_suppressed'] == 1
+
+
+def test_failed_run_is_redriven_then_abandoned(trigger, caplog):
+    sqs = trigger._clients['sqs']
+    trigger.lambda_handler(s3_notification(BUCKET, KEYS), None)
+
+    body = _body(trigger.lambda_handler(_state_change('jr_1', 'FAILED'), None))
+    assert body['ledger_entries'] == 3
+    assert body['redriven_files'] == 3
+
+    # Os arquivos voltam à fila como notificações do S3 (chaves codificadas), com atraso
+    message = sqs.messages[0]
+    assert message['QueueUrl'] == 'https://sqs.example/raw-events'
+    assert message['DelaySeconds'] == trigger.DEFAULT_REDRIVE_DELAY_SECONDS
+    redrive_event = {'Records': [{'eventSource': 'aws:sqs', 'body': json.dumps(message['Body'])}]}
+    assert trigger.collect_raw_keys(extract_s3_records(redrive_event), 'raw-data/bovespa/') == {BUCKET: KEYS}
+
+    # A reentrega reivindica os pares falhos e inicia outro job
+    assert _body(trigger.lambda_handler(redrive_event, None))['processed_files'] == 3
+    assert len(trigger._clients['glue'].runs) == 2
+
+    # Segunda falha: MAX_RUN_ATTEMPTS=2 esgotado, os arquivos vão para o alarme
+    body = _body(trigger.lambda_handler(_state_change('jr_2', 'TIMEOUT'), None))
+    assert body['redriven_files'] == 0
+    assert body['abandoned_files'] == 3
+    assert len(sqs.messages) == 1
+    assert 'ETL_RUN_ABANDONED' in caplog.text
+
+
+def test_failed_run_without_queue_raises_alarm(trigger, monkeypatch, caplog):
+    monkeypatch.delenv('RAW_EVENTS_QUEUE_URL')
+    trigger.lambda_handler(s3_notification(BUCKET, KEYS), None)
+
+    body = _body(trigger.lambda_handler(_state_change('jr_1', 'FAILED'), None))
+    assert body['abandoned_files'] == 3
+    assert trigger._clients['sqs'].messages == []
+    assert 'ETL_RUN_ABANDONED' in caplog.text
+
+
+def test_failed_start_releases_claims(trigger):
+    trigger._clients['glue'].fail_start = True
+    response = trigger.lambda_handler(s3_notification(BUCKET, KEYS), None)
+    assert response['statusCode'] == 500
+
+    # Reivindicações devolvidas: a reentrega do lote inicia o job
+    trigger._clients['glue'].fail_start = False
+    assert _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS), None))['processed_files'] == 3
+
+
+def test_queue_batch_failure_is_raised(trigger):
+    trigger._clients['glue'].fail_start = True
+    event = {'Records': [{'eventSource': 'aws:sqs', 'body': json.dumps(s3_notification(BUCKET, KEYS))}]}
+    # O lote volta à fila pelo visibility timeout
+    with pytest.raises(Exception):
+        trigger.lambda_handler(event, None)
+
+
+def test_small_batch_takes_fast_path(trigger, monkeypatch):
+    s3, glue = trigger._clients['s3'], trigger._clients['glue']
+    for key in KEYS:
+        s3.put_object(Bucket=BUCKET, Key=key, Body=_raw_parquet(trigger.processing_date_from_key(key)),
+                      Metadata={'content_sha256': key[-16:-8]})
+    sizes = [len(s3.objects[key]['Body']) for key in KEYS]
+
+    # Lote acima do limite: Glue
+    monkeypatch.setenv('FAST_PATH_MAX_BYTES', str(sizes[0] - 1))
+    assert _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS[:1]), None))['job_runs'][0]['engine'] == 'glue'
+    assert len(glue.runs) == 1
+
+    monkeypatch.setenv('FAST_PATH_MAX_BYTES', str(sum(sizes[1:])))
+    body = _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS[1:]), None))
+    assert body['processed_files'] == 2
+    assert body['job_runs'][0]['engine'] == 'lambda'
+    assert len(glue.runs) == 1
+    assert any(key.startswith('refined-data/bovespa/partition_year=2025/') for key in s3.objects)
+
+    # Executado na própria Lambda: o ledger já registra o sucesso
+    assert _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS[1:]), None))['duplicates_suppressed'] == 2
+
+
+def test_local_storage_runs_fast_path_end_to_end(trigger, monkeypatch, tmp_path):
+    data_dir = tmp_path / 'data'
+    monkeypatch.setenv('STORAGE_BACKEND', 'local')
+    monkeypatch.setenv('STORAGE_LOCAL_DIR', str(data_dir))
+    monkeypatch.setenv('FAST_PATH_MAX_BYTES', str(1024 * 1024))
+    monkeypatch.setenv('CATALOG_BACKEND', 'local')
+    monkeypatch.setenv('CATALOG_PATH', str(tmp_path / 'catalog.json'))
+    store = LocalObjectStore(str(data_dir))
+    for key in KEYS:
+        store.write(key, _raw_parquet(trigger.processing_date_from_key(key)),
+                    metadata={'content_sha256': key[-16:-8]})
+    trigger._clients['s3'].calls.clear()
+
+    body = _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS), None))
+    assert body['processed_files'] == 3
+    assert body['job_runs'][0]['engine'] == 'lambda'
+    # Tudo no diretório local: nenhuma chamada ao S3 nem ao Glue
+    assert trigger._clients['s3'].calls == []
+    assert trigger._clients['glue'].runs == []
+
+    changes = [item['key'] for item in store.list('refined-data/bovespa-changes')]
+    assert [key.split('/')[2] for key in changes] == [f'data_pregao=2025-07-{day}' for day in ('16', '17', '18')]
+    partitions = LocalCatalog(str(tmp_path / 'catalog.json')).partitions(CHANGES_TABLE)
+    assert partitions['2025-07-18'] == \
+        f"{data_dir.resolve().as_uri()}/refined-data/bovespa-changes/data_pregao=2025-07-18/"
+
+    # Mesmo conteúdo de novo: suprimido pelo ledger, sem regravar as saídas
+    assert _body(trigger.lambda_handler(s3_notification(BUCKET, KEYS), None))['duplicates_suppressed'] == 3
+    assert [item['key'] for item in store.list('refined-data/bovespa-changes')] == changes